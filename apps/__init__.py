@@ -60,6 +60,8 @@ def create_app():
 
     # 把标识为要进行身份验证的接口，注册到对象APP上
     from .base_view import url_required_map
+    from utils.view.required import compile_route_table
     app.url_required_map = url_required_map
+    app.route_table = compile_route_table(app, url_required_map)  # 编译为路由表，请求时直接按路由取身份验证类型
 
     return app
@@ -175,6 +175,7 @@ class RunCaseForm(BaseForm):
     env_list: List[str] = required_str_field(title="运行环境code")
     temp_variables: Optional[dict] = Field(title="临时指定参数")
     is_async: int = Field(default=0, title="执行模式", description="0：用例维度串行执行，1：用例维度并行执行")
+    max_workers: Optional[int] = Field(None, title="并行数", description="并行执行时同时执行的用例数，不传则取默认配置")
 
     def depends_validate(self):
         """ 公共变量参数的校验
@@ -77,7 +77,8 @@ class GetReportCaseForm(BaseForm):
 
     @field_validator("id")
     def validate_id(cls, value):
-        report_case = cls.validate_data_is_exist("数据不存在", ReportCase, id=value)
+        report_case = ReportCase.get_first(id=value) or ReportCase.get_from_archive(id=value)  # 报告可能已归档
+        cls.validate_is_true(report_case, "数据不存在")
         setattr(cls, "report_case", report_case)
         return value
 
@@ -94,10 +95,9 @@ class GetReportStepForm(BaseForm):
 
     def depends_validate(self):
         self.validate_is_true(self.id or self.report_id, '报告id或者报告步骤id必传')
-        if self.id:
-            report_step = self.validate_data_is_exist("数据不存在", ReportStep, id=self.id)
-        else:
-            report_step = self.validate_data_is_exist("数据不存在", ReportStep, report_id=self.report_id)
+        query = {"id": self.id} if self.id else {"report_id": self.report_id}
+        report_step = ReportStep.get_first(**query) or ReportStep.get_from_archive(**query)  # 报告可能已归档
+        self.validate_is_true(report_step, "数据不存在")
         setattr(self, "report_step", report_step)
 
 
@@ -110,3 +110,8 @@ class GetReportStatusForm(GetReportShowIdForm):
     """ 获取报告状态 """
     process: int = Field(1, title="当前进度")
     status: int = Field(1, title="当前进度下的状态")
+
+
+class GetReportStatusStreamForm(GetReportShowIdForm):
+    """ 订阅报告进度 """
+    report_id: Optional[int] = Field(None, title="报告id", description="不传则推送整个批次的报告进度")
@@ -70,6 +70,7 @@ class EditCaseSuiteForm(AddCaseSuiteForm, GetCaseSuiteForm):
 class RunCaseSuiteForm(GetCaseSuiteForm):
     """ 运行用例集 """
     is_async: int = Field(default=0, title="执行模式")
+    max_workers: Optional[int] = Field(None, title="并行数", description="并行执行时同时执行的用例数，不传则取默认配置")
     env_list: list = Field(default=[], title="运行环境")
 
     @field_validator('id')
@@ -98,6 +98,7 @@ class RunTaskForm(GetTaskForm):
     """ 运行任务 """
     env_list: Optional[list] = Field(None, title="运行环境")
     is_async: int = Field(default=0, title="任务的运行机制", description="0：串行，1：并行，默认0")
+    max_workers: Optional[int] = Field(None, title="并行数", description="并行执行时同时执行的用例数，不传则取默认配置")
     trigger_type: Optional[TriggerTypeEnum] = Field(
         TriggerTypeEnum.page, title="触发类型", description="pipeline/page/cron")  # pipeline 跑完过后会发送测试报告
     extend: Optional[Union[list, dict, str]] = Field(
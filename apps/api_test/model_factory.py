@@ -5,4 +5,5 @@ from .models.suite import ApiCaseSuite
 from .models.case import ApiCase
 from .models.step import ApiStep
 from .models.task import ApiTask
-from .models.report import ApiReport, ApiReportCase, ApiReportStep
+from .models.report import ApiReport, ApiReportCase, ApiReportStep, ApiReportArchive
+from .models.dashboard import ApiDashboardRollup
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy import Integer, String, JSON, Text
+from contextlib import ExitStack
+
+from sqlalchemy import Integer, String, JSON, Text, func, update
 from sqlalchemy.orm import Mapped, mapped_column
 
 from apps.base_model import BaseApi, UpFuncFiled, DownFuncFiled, HeadersFiled, ParamsFiled, DataFormFiled, \
     DataUrlencodedFiled, DataJsonFiled, ExtractsFiled, ValidatesFiled, BodyTypeFiled, StatusFiled
 from apps.enums import ApiMethodEnum, ApiLevelEnum
+from config import _api_use_count_config
 
 
 class ApiMsg(
@@ -23,3 +26,35 @@ class ApiMsg(
     data_text: Mapped[str] = mapped_column(Text(), nullable=True, default="", comment="文本参数")
     response: Mapped[dict] = mapped_column(JSON, default={}, comment="响应对象")
     use_count: Mapped[int] = mapped_column(Integer(), default=0, comment="被使用次数，即多少个步骤直接使用了此接口")
+
+    # 直接执行sql增减使用次数时要一起维护的数据，[func(connection, api_id_list)]，返回包住修改的上下文管理器，如首页统计
+    use_count_tracker_list = []
+
+    @classmethod
+    def refresh_use_count(cls, step_model):
+        """ 全量重算接口的使用次数：一次聚合查询统计每个接口的步骤数，只批量更新次数有变化的接口，返回更新的接口数 """
+        count_dict = dict(cls.db.session.query(step_model.api_id, func.count()).filter(
+            step_model.api_id.isnot(None)).group_by(step_model.api_id).all())
+        change_list = [
+            {"id": api_id, "use_count": count_dict.get(api_id, 0)}
+            for api_id, use_count in cls.db.session.query(cls.id, cls.use_count).all()
+            if use_count != count_dict.get(api_id, 0)
+        ]
+        batch_size = _api_use_count_config["batch_size"]
+        with cls.db.auto_commit():
+            for index in range(0, len(change_list), batch_size):
+                cls.db.session.execute(update(cls), change_list[index:index + batch_size])
+        return len(change_list)
+
+    @classmethod
+    def change_use_count(cls, connection, count_dict):
+        """ 增减接口的使用次数 count_dict: {接口id: 增量}，在当前连接（事务）里执行 """
+        count_dict = {api_id: increment for api_id, increment in count_dict.items() if api_id and increment}
+        if not count_dict:
+            return
+        with ExitStack() as stack:
+            for tracker in cls.use_count_tracker_list:
+                stack.enter_context(tracker(connection, list(count_dict.keys())))
+            for api_id, increment in count_dict.items():
+                connection.execute(update(cls.__table__).where(cls.__table__.c.id == api_id).values(
+                    use_count=func.coalesce(cls.__table__.c.use_count, 0) + increment))
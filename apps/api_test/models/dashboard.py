@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+from enum import Enum
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Integer, String, Date, UniqueConstraint, select, func, case, and_, event, insert, \
+    inspect
+from sqlalchemy.dialects import mysql, sqlite, postgresql
+from sqlalchemy.orm import Mapped, mapped_column
+from flask_sqlalchemy.session import Session
+
+from ...base_model import BaseModel, db
+from ...assist.models.hits import Hits
+from .project import ApiProject
+from .module import ApiModule
+from .api import ApiMsg
+from .suite import ApiCaseSuite
+from .case import ApiCase
+from .step import ApiStep
+from .task import ApiTask
+from .report import ApiReport
+from utils.util.time_util import get_week_start_and_end
+
+
+class ApiDashboardRollup(BaseModel):
+    """ 接口自动化首页统计的按天汇总表，每天、每个服务（业务线）、每种数据、每种状态一行，记录当天创建的数据数
+    数据新增、删除、修改状态时增量维护（包括批量修改、批量删除、直接执行sql修改接口使用次数），
+    上级数据修改、删除导致的服务、业务线变化不维护，由定时任务全量对账修正
+    """
+    __abstract__ = False
+    __tablename__ = "api_test_dashboard_rollup"
+    __table_args__ = (
+        UniqueConstraint("stat_date", "model_name", "project_id", "business_id", "status"),
+        {"comment": "接口自动化首页统计汇总表"}
+    )
+
+    stat_date: Mapped[date] = mapped_column(Date, nullable=False, comment="数据的创建日期")
+    model_name: Mapped[str] = mapped_column(String(64), nullable=False, comment="数据类型，project、api、case...")
+    project_id: Mapped[int] = mapped_column(Integer(), default=0, nullable=False, comment="所属的服务id，没有则为0")
+    business_id: Mapped[int] = mapped_column(Integer(), default=0, nullable=False, comment="所属的业务线id，没有则为0")
+    status: Mapped[str] = mapped_column(String(255), default="", nullable=False, comment="状态维度，多个字段用|拼接")
+    data_count: Mapped[int] = mapped_column(Integer(), default=0, nullable=False, comment="数据数")
+
+    key_column_list = ["stat_date", "model_name", "project_id", "business_id", "status"]
+    empty_date = date(1970, 1, 1)  # 创建时间为空的数据，统计到这一天
+    rollup_model_dict = {}  # {数据类型: 统计配置}，见 register_model
+
+    @classmethod
+    def register_model(cls, model_name, model, project_column, business_column, status_column_list=(),
+                       join_list=(), watch_list=()):
+        """ 注册要统计的数据
+            project_column、business_column: 服务id、业务线id的字段，关联不到的统计为0
+            status_column_list: 状态维度的字段
+            join_list: 取服务、业务线要关联的表 [(模型, 关联条件)]，都是左关联
+            watch_list: 修改了这些字段才重新统计这条数据
+        """
+        cls.rollup_model_dict[model_name] = {
+            "model": model,
+            "column_list": [
+                func.date(model.create_time),
+                func.coalesce(project_column, 0),
+                func.coalesce(business_column, 0),
+                *status_column_list
+            ],
+            "join_list": join_list,
+            "watch_list": ["create_time", *watch_list]
+        }
+
+    @classmethod
+    def get_model_name(cls, model):
+        for model_name, model_conf in cls.rollup_model_dict.items():
+            if model_conf["model"] is model:
+                return model_name
+
+    @classmethod
+    def get_dimension_query(cls, model_name, group=False):
+        """ 查数据的统计维度：创建日期、服务id、业务线id、状态，group为True时按维度聚合计数 """
+        model_conf = cls.rollup_model_dict[model_name]
+        query = select(*model_conf["column_list"]).select_from(model_conf["model"])
+        for join_model, on_clause in model_conf["join_list"]:
+            query = query.outerjoin(join_model, on_clause)
+        if group:
+            query = query.add_columns(func.count()).group_by(*model_conf["column_list"])
+        return query
+
+    @classmethod
+    def format_key(cls, model_name, row):
+        """ 维度查询的一行数据转为汇总表的唯一键 (stat_date, model_name, project_id, business_id, status) """
+        stat_date, project_id, business_id, *status_list = row
+        if stat_date is None:
+            stat_date = cls.empty_date
+        elif isinstance(stat_date, str):  # sqlite的date()返回的是字符串
+            stat_date = date.fromisoformat(stat_date)
+        elif isinstance(stat_date, datetime):
+            stat_date = stat_date.date()
+        status = "|".join(
+            "" if value is None else str(value.value if isinstance(value, Enum) else value) for value in status_list)
+        return stat_date, model_name, int(project_id), int(business_id), status
+
+    @classmethod
+    def get_key_by_id(cls, connection, model_name, data_id):
+        """ 查单条数据的统计维度，数据不存在则返回None """
+        model = cls.rollup_model_dict[model_name]["model"]
+        row = connection.execute(cls.get_dimension_query(model_name).where(model.id == data_id)).first()
+        return cls.format_key(model_name, row) if row else None
+
+    @classmethod
+    def count_by_id(cls, connection, model_name, id_list, batch_size=1000):
+        """ 按统计维度聚合一批数据的数量 {唯一键: 数量} """
+        model, count_dict = cls.rollup_model_dict[model_name]["model"], {}
+        for index in range(0, len(id_list), batch_size):
+            query = cls.get_dimension_query(model_name, group=True).where(
+                model.id.in_(id_list[index:index + batch_size]))
+            for row in connection.execute(query).all():
+                key = cls.format_key(model_name, row[:-1])
+                count_dict[key] = count_dict.get(key, 0) + row[-1]
+        return count_dict
+
+    @classmethod
+    @contextmanager
+    def track_update(cls, connection, model_name, id_list):
+        """ 包住批量修改数据的操作，按修改前后的统计维度增减计数 """
+        before_dict = cls.count_by_id(connection, model_name, id_list) if id_list else {}
+        yield
+        if not id_list:
+            return
+        after_dict = cls.count_by_id(connection, model_name, id_list)
+        cls.increase(connection, {
+            key: after_dict.get(key, 0) - before_dict.get(key, 0) for key in {*before_dict, *after_dict}})
+
+    @classmethod
+    def increase(cls, connection, count_dict):
+        """ 按唯一键增减计数，count_dict: {唯一键: 增量}，没有这一行则插入，在当前连接（事务）里执行 """
+        now, table = datetime.now(), cls.__table__
+        for key, increment in count_dict.items():
+            if not increment:
+                continue
+            values = {**dict(zip(cls.key_column_list, key)), "data_count": increment, "create_time": now,
+                      "update_time": now}
+            update_values = {"data_count": table.c.data_count + increment, "update_time": now}
+            if connection.dialect.name == "mysql":
+                statement = mysql.insert(table).values(**values).on_duplicate_key_update(**update_values)
+            else:
+                dialect_module = postgresql if connection.dialect.name == "postgresql" else sqlite
+                statement = dialect_module.insert(table).values(**values).on_conflict_do_update(
+                    index_elements=cls.key_column_list, set_=update_values)
+            connection.execute(statement)
+
+    @classmethod
+    def rebuild(cls, model_name_list=None):
+        """ 按业务表全量重算汇总数据（回填、对账），每种数据一次聚合查询，只写入有差异的行
+        重算期间有数据增删时，那部分增量可能会丢失或重复，下一次对账会修正
+        """
+        model_name_list = model_name_list or list(cls.rollup_model_dict.keys())
+        change_count = 0
+        with db.auto_commit():
+            for model_name in model_name_list:
+                count_dict = {}
+                for row in db.session.execute(cls.get_dimension_query(model_name, group=True)).all():
+                    key = cls.format_key(model_name, row[:-1])
+                    count_dict[key] = count_dict.get(key, 0) + row[-1]
+
+                for rollup in cls.query.filter(cls.model_name == model_name).all():
+                    data_count = count_dict.pop(tuple(getattr(rollup, column) for column in cls.key_column_list), 0)
+                    if data_count == 0:
+                        db.session.delete(rollup)
+                    elif data_count != rollup.data_count:
+                        rollup.data_count = data_count
+                    else:
+                        continue
+                    change_count += 1
+
+                if count_dict:
+                    db.session.execute(insert(cls), [{
+                        **dict(zip(cls.key_column_list, key)), "data_count": data_count
+                    } for key, data_count in count_dict.items()])
+                    change_count += len(count_dict)
+        return change_count
+
+    @classmethod
+    def get_count_by_time(cls, model_name):
+        """ 一次查询获取一种数据各状态的总数和各时间段的新增数
+        {"total": 总数, "status": {状态: 总数}, "last_day_add": 昨日新增, "to_day_add": 今日新增,
+         "current_week_add": 本周新增, "last_week_add": 上周新增, "last_month_add": 30日内新增}
+        """
+        today = date.today()
+        last_week_start, last_week_end = get_week_start_and_end(1)
+        current_week_start, current_week_end = get_week_start_and_end(0)
+        time_dict = {
+            "last_day_add": (today - timedelta(days=1), today - timedelta(days=1)),
+            "to_day_add": (today, today),
+            "current_week_add": (current_week_start.date(), current_week_end.date()),
+            "last_week_add": (last_week_start.date(), last_week_end.date()),
+            "last_month_add": (today - timedelta(days=30), today)
+        }
+        query_list = db.session.query(cls.status, func.sum(cls.data_count), *[
+            func.sum(case((and_(cls.stat_date >= start_date, cls.stat_date <= end_date), cls.data_count), else_=0))
+            for start_date, end_date in time_dict.values()
+        ]).filter(cls.model_name == model_name).group_by(cls.status).all()
+
+        count_data = {"total": 0, "status": {}, **{key: 0 for key in time_dict}}
+        for status, total, *time_count_list in query_list:
+            count_data["status"][status] = int(total or 0)
+            count_data["total"] += int(total or 0)
+            for key, time_count in zip(time_dict, time_count_list):
+                count_data[key] += int(time_count or 0)
+        return count_data
+
+    @classmethod
+    def get_total_by_model(cls, model_name_list):
+        """ 一次查询获取多种数据的总数 {数据类型: 总数} """
+        query_list = db.session.query(cls.model_name, func.sum(cls.data_count)).filter(
+            cls.model_name.in_(model_name_list)).group_by(cls.model_name).all()
+        total_dict = {model_name: int(total or 0) for model_name, total in query_list}
+        return {model_name: total_dict.get(model_name, 0) for model_name in model_name_list}
+
+
+ApiDashboardRollup.register_model("project", ApiProject, ApiProject.id, ApiProject.business_id)
+ApiDashboardRollup.register_model(
+    "module", ApiModule, ApiModule.project_id, ApiProject.business_id,
+    join_list=[(ApiProject, ApiProject.id == ApiModule.project_id)], watch_list=["project_id"])
+ApiDashboardRollup.register_model(
+    "api", ApiMsg, ApiMsg.project_id, ApiProject.business_id,
+    status_column_list=[ApiMsg.method, case((ApiMsg.use_count == 0, 0), else_=1)],  # 请求方法|是否已使用
+    join_list=[(ApiProject, ApiProject.id == ApiMsg.project_id)], watch_list=["project_id", "method", "use_count"])
+ApiDashboardRollup.register_model(
+    "case", ApiCase, ApiCaseSuite.project_id, ApiProject.business_id, status_column_list=[ApiCase.status],
+    join_list=[(ApiCaseSuite, ApiCaseSuite.id == ApiCase.suite_id), (ApiProject, ApiProject.id == ApiCaseSuite.project_id)],
+    watch_list=["suite_id", "status"])
+ApiDashboardRollup.register_model(
+    "step", ApiStep, ApiCaseSuite.project_id, ApiProject.business_id, status_column_list=[ApiStep.status],
+    join_list=[
+        (ApiCase, ApiCase.id == ApiStep.case_id),
+        (ApiCaseSuite, ApiCaseSuite.id == ApiCase.suite_id),
+        (ApiProject, ApiProject.id == ApiCaseSuite.project_id)
+    ],
+    watch_list=["case_id", "status"])
+ApiDashboardRollup.register_model(
+    "task", ApiTask, ApiTask.project_id, ApiProject.business_id, status_column_list=[ApiTask.status],
+    join_list=[(ApiProject, ApiProject.id == ApiTask.project_id)], watch_list=["project_id", "status"])
+ApiDashboardRollup.register_model(
+    "report", ApiReport, ApiReport.project_id, ApiProject.business_id,
+    status_column_list=[ApiReport.run_type, ApiReport.is_passed],  # 报告类型|是否通过
+    join_list=[(ApiProject, ApiProject.id == ApiReport.project_id)], watch_list=["project_id", "run_type", "is_passed"])
+# 问题记录的服务可能是接口、app、ui任意一种，不关联业务线
+ApiDashboardRollup.register_model(
+    "hit", Hits, Hits.project_id, 0, status_column_list=[Hits.hit_type], watch_list=["project_id", "hit_type"])
+
+
+def rollup_after_insert(mapper, connection, target):
+    """ 新增数据，当天对应维度计数+1 """
+    model_name = ApiDashboardRollup.get_model_name(mapper.class_)
+    key = ApiDashboardRollup.get_key_by_id(connection, model_name, target.id)
+    if key:
+        ApiDashboardRollup.increase(connection, {key: 1})
+
+
+def rollup_before_delete(mapper, connection, target):
+    """ 删除数据，删除前查出维度，计数-1 """
+    model_name = ApiDashboardRollup.get_model_name(mapper.class_)
+    key = ApiDashboardRollup.get_key_by_id(connection, model_name, target.id)
+    if key:
+        ApiDashboardRollup.increase(connection, {key: -1})
+
+
+def rollup_before_update(mapper, connection, target):
+    """ 修改了统计维度相关的字段，记下修改前的维度 """
+    model_name = ApiDashboardRollup.get_model_name(mapper.class_)
+    state = inspect(target)
+    for column_name in ApiDashboardRollup.rollup_model_dict[model_name]["watch_list"]:
+        if state.attrs[column_name].history.has_changes():
+            target._rollup_old_key = ApiDashboardRollup.get_key_by_id(connection, model_name, target.id)
+            return
+
+
+def rollup_after_update(mapper, connection, target):
+    """ 维度有变化，从修改前的维度移到修改后的维度 """
+    if "_rollup_old_key" not in target.__dict__:
+        return
+    old_key = target.__dict__.pop("_rollup_old_key")
+    model_name = ApiDashboardRollup.get_model_name(mapper.class_)
+    new_key = ApiDashboardRollup.get_key_by_id(connection, model_name, target.id)
+    if old_key != new_key:
+        count_dict = {}
+        if old_key:
+            count_dict[old_key] = -1
+        if new_key:
+            count_dict[new_key] = 1
+        ApiDashboardRollup.increase(connection, count_dict)
+
+
+def rollup_bulk_delete(orm_execute_state):
+    """ query.delete() 批量删除不会触发模型的删除事件，删除前按同样的条件聚合出各维度要减的数 """
+    if not orm_execute_state.is_delete or orm_execute_state.bind_mapper is None:
+        return
+    model_name = ApiDashboardRollup.get_model_name(orm_execute_state.bind_mapper.class_)
+    if not model_name:
+        return
+    query = ApiDashboardRollup.get_dimension_query(model_name, group=True)
+    where_clause = orm_execute_state.statement.whereclause
+    if where_clause is not None:
+        query = query.where(where_clause)
+    connection = orm_execute_state.session.connection()
+    count_dict = {}
+    for row in connection.execute(query).all():
+        key = ApiDashboardRollup.format_key(model_name, row[:-1])
+        count_dict[key] = count_dict.get(key, 0) - row[-1]
+    ApiDashboardRollup.increase(connection, count_dict)
+
+
+def rollup_bulk_update(orm_execute_state):
+    """ query.update()、session.execute(update(...)) 批量修改不会触发模型的修改事件
+    修改了统计维度相关的字段时，先按修改条件查出要修改的数据，按修改前后的维度增减计数
+    """
+    if not orm_execute_state.is_update or orm_execute_state.bind_mapper is None:
+        return
+    model_name = ApiDashboardRollup.get_model_name(orm_execute_state.bind_mapper.class_)
+    if not model_name:
+        return
+    statement, parameters = orm_execute_state.statement, orm_execute_state.parameters
+    parameter_list = parameters if isinstance(parameters, list) else []  # 按主键批量修改 [{"id": 1, ...}]
+    column_name_set = {getattr(key, "key", key) for key in statement._values or {}}
+    column_name_set.update(getattr(key, "key", key) for key, value in statement._ordered_values or [])
+    column_name_set.update(key for parameter in parameter_list for key in parameter)
+    if not column_name_set & set(ApiDashboardRollup.rollup_model_dict[model_name]["watch_list"]):
+        return
+
+    model, connection = orm_execute_state.bind_mapper.class_, orm_execute_state.session.connection()
+    if parameter_list:
+        id_list = [parameter["id"] for parameter in parameter_list if "id" in parameter]
+    else:
+        query = select(model.id)
+        if statement.whereclause is not None:
+            query = query.where(statement.whereclause)
+        id_list = connection.execute(query).scalars().all()
+    with ApiDashboardRollup.track_update(connection, model_name, id_list):
+        return orm_execute_state.invoke_statement()
+
+
+for rollup_model_conf in ApiDashboardRollup.rollup_model_dict.values():
+    event.listen(rollup_model_conf["model"], "after_insert", rollup_after_insert)
+    event.listen(rollup_model_conf["model"], "before_delete", rollup_before_delete)
+    event.listen(rollup_model_conf["model"], "before_update", rollup_before_update)
+    event.listen(rollup_model_conf["model"], "after_update", rollup_after_update)
+event.listen(Session, "do_orm_execute", rollup_bulk_delete)
+event.listen(Session, "do_orm_execute", rollup_bulk_update)
+ApiMsg.use_count_tracker_list.append(
+    lambda connection, api_id_list: ApiDashboardRollup.track_update(connection, "api", api_id_list))
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy import Integer, JSON, Text
+from sqlalchemy import Integer, JSON, Text, func, select, event, inspect
 from sqlalchemy.orm import Mapped, mapped_column
+from flask_sqlalchemy.session import Session
 
 from apps.base_model import BaseStep, HeadersFiled, ParamsFiled, DataFormFiled, DataUrlencodedFiled, DataJsonFiled, \
     ExtractsFiled, ValidatesFiled, BodyTypeFiled
+from config import _api_use_count_config
+from .api import ApiMsg
 
 
 class ApiStep(
@@ -22,3 +25,45 @@ class ApiStep(
     data_text: Mapped[str] = mapped_column(Text(), nullable=True, default="", comment="文本参数")
     pop_header_filed: Mapped[list] = mapped_column(JSON, default=[], comment="头部参数中去除指定字段")
     api_id: Mapped[int] = mapped_column(Integer(), nullable=True, comment="步骤所引用的接口的id")
+
+
+def use_count_after_insert(mapper, connection, target):
+    """ 新增步骤，引用的接口使用次数+1 """
+    ApiMsg.change_use_count(connection, {target.api_id: 1})
+
+
+def use_count_after_delete(mapper, connection, target):
+    """ 删除步骤，引用的接口使用次数-1 """
+    ApiMsg.change_use_count(connection, {target.api_id: -1})
+
+
+def use_count_after_update(mapper, connection, target):
+    """ 步骤改为引用别的接口，原接口-1，新接口+1 """
+    history = inspect(target).attrs.api_id.history
+    if history.has_changes():
+        count_dict = {}
+        for api_id in history.deleted:
+            count_dict[api_id] = count_dict.get(api_id, 0) - 1
+        for api_id in history.added:
+            count_dict[api_id] = count_dict.get(api_id, 0) + 1
+        ApiMsg.change_use_count(connection, count_dict)
+
+
+def use_count_bulk_delete(orm_execute_state):
+    """ query.delete() 批量删除步骤不会触发模型的删除事件，删除前按同样的条件统计每个接口要减的次数 """
+    if not orm_execute_state.is_delete or orm_execute_state.bind_mapper is None \
+            or orm_execute_state.bind_mapper.class_ is not ApiStep:
+        return
+    query = select(ApiStep.api_id, func.count()).where(ApiStep.api_id.isnot(None)).group_by(ApiStep.api_id)
+    where_clause = orm_execute_state.statement.whereclause
+    if where_clause is not None:
+        query = query.where(where_clause)
+    connection = orm_execute_state.session.connection()
+    ApiMsg.change_use_count(connection, {api_id: -count for api_id, count in connection.execute(query).all()})
+
+
+if _api_use_count_config["incremental"]:
+    event.listen(ApiStep, "after_insert", use_count_after_insert)
+    event.listen(ApiStep, "after_delete", use_count_after_delete)
+    event.listen(ApiStep, "after_update", use_count_after_update)
+    event.listen(Session, "do_orm_execute", use_count_bulk_delete)
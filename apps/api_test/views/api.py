@@ -1,6 +1,4 @@
 # -*- coding: utf-8 -*-
-from threading import Thread
-
 from flask import current_app as app, request, send_from_directory, g
 
 from ..blueprint import api_test
@@ -12,6 +10,7 @@ from ..forms.api import AddApiForm, EditApiForm, RunApiMsgForm, DeleteApiForm, A
 from utils.util.file_util import STATIC_ADDRESS
 from utils.parse.parse_excel import parse_file_content
 from utils.client.run_api_test import RunApi
+from utils.client.run_queue import run_queue
 from ...config.models.run_env import RunEnv
 
 
@@ -172,28 +171,42 @@ def api_delete_api():
 def api_run_api():
     """ 运行接口 """
     form = RunApiMsgForm()
+    if run_queue.is_full():
+        return app.restful.fail("当前排队执行的任务过多，请稍后再试")
     batch_id = Report.get_batch_id()
     summary = Report.get_summary_template()
-    for env_code in form.env_list:
-        env = RunEnv.get_data_by_id_or_code(env_code)
-        summary["env"]["code"], summary["env"]["name"] = env.code, env.name
-        report = Report.get_new_report(
-            batch_id=batch_id,
-            trigger_id=form.api_list,
-            name=form.api_name,
-            run_type="api",
-            env=env_code,
-            project_id=form.project_id,
-            summary=summary
-        )
-
-        # 新起线程运行接口
-        Thread(
-            target=RunApi(
-                api_id_list=form.run_api_id_list,
+    try:
+        for env_code in form.env_list:
+            env = RunEnv.get_data_by_id_or_code(env_code)
+            summary["env"]["code"], summary["env"]["name"] = env.code, env.name
+            report = Report.get_new_report(
+                batch_id=batch_id,
+                trigger_id=form.api_list,
+                name=form.api_name,
+                run_type="api",
+                env=env_code,
+                project_id=form.project_id,
+                summary=summary,
+                process=0,
+                status=1
+            )
+
+            # 放到执行队列，排队执行
+            run_queue.submit(
+                app=app._get_current_object(),
+                report_model=Report,
                 report_id=report.id,
-                env_code=env_code,
-                env_name=env.name
-            ).parse_and_run
-        ).start()
+                target=RunApi(
+                    api_id_list=form.run_api_id_list,
+                    report_id=report.id,
+                    env_code=env_code,
+                    env_name=env.name
+                ).parse_and_run,
+                project_id=form.project_id,
+                user_id=getattr(g, "user_id", None),
+                priority=run_queue.priority_debug
+            )
+    except Exception:  # 放不进执行队列时，取消已经在排队的环境
+        Report.cancel_queued_batch(batch_id)
+        raise
     return app.restful.trigger_success({"batch_id": batch_id})
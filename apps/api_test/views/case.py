@@ -169,6 +169,7 @@ def api_run_case():
             report_model=Report,
             env_code=env_code,
             is_async=form.is_async,
+            max_workers=form.max_workers,
             temp_variables=form.temp_variables,
             task_type="case",
             case_id_list=form.case_id_list,
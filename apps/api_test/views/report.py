@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
-from flask import current_app as app
+from flask import current_app as app, Response
 
 from utils.client.parse_model import StepModel
+from utils.client.run_queue import run_queue
 from ..blueprint import api_test
 from ..model_factory import ApiReport as Report, ApiReportStep as ReportStep, ApiReportCase as ReportCase, \
     ApiMsg, ApiCaseSuite as CaseSuite, ApiCase as Case, ApiStep as Step
 from ..forms.report import GetReportForm, GetReportListForm, DeleteReportForm, GetReportCaseForm, \
-    GetReportCaseListForm, GetReportStepForm, GetReportStepListForm, GetReportStatusForm, GetReportShowIdForm
+    GetReportCaseListForm, GetReportStepForm, GetReportStepListForm, GetReportStatusForm, GetReportShowIdForm, \
+    GetReportStatusStreamForm
 from ...enums import ApiCaseSuiteTypeEnum
 
 
@@ -31,6 +33,17 @@ def api_get_report_status():
         Report.select_is_all_status_by_batch_id(form.batch_id, [form.process, form.status]))
 
 
+@api_test.get("/report/status/stream")
+def api_get_report_status_stream():
+    """ 以 server-sent events 推送当次运行的报告进度，替代轮询 /report/status """
+    form = GetReportStatusStreamForm()
+    return Response(
+        Report.get_report_status_stream(form.batch_id, form.report_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # 不让nginx缓冲，有进度变化立即推送
+    )
+
+
 @api_test.get("/report/show-id")
 def api_get_report_show_id():
     """ 根据运行id获取当次要打开的报告 """
@@ -38,6 +51,16 @@ def api_get_report_show_id():
     return app.restful.get_success(Report.select_show_report_id(form.batch_id))
 
 
+@api_test.login_put("/report/cancel")
+def api_cancel_report():
+    """ 取消排队中的运行 """
+    form = GetReportForm()
+    if form.report.cancel_queued_report() is False:
+        return app.restful.fail("报告已开始执行，不能取消")
+    run_queue.cancel(Report, form.report.id)
+    return app.restful.success("取消成功")
+
+
 @api_test.post("/report/as-case")
 def api_save_report_as_case():
     """ 保存报告中的接口为用例（仅报告运行类型为接口使用） """
@@ -82,6 +82,7 @@ def api_run_case_suite():
             report_model=Report,
             env_code=env_code,
             is_async=form.is_async,
+            max_workers=form.max_workers,
             task_type="suite",
             trigger_id=form.id,
             case_id_list=case_id_list,
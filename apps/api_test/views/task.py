@@ -107,6 +107,7 @@ def api_run_task():
             env_code=env_code,
             trigger_type=form.trigger_type,
             is_async=form.is_async,
+            max_workers=form.max_workers,
             task_type="task",
             trigger_id=form.id,
             case_id_list=case_id_list,
@@ -166,6 +166,7 @@ class RunCaseForm(BaseForm):
     env_list: List[str] = required_str_field(title="运行环境code")
     temp_variables: Optional[dict] = Field(title="临时指定参数")
     is_async: int = Field(default=0, title="执行模式", description="0：用例维度串行执行，1：用例维度并行执行")
+    driver_pool_size: Optional[int] = Field(None, title="会话池大小", description="同一个浏览器/设备最多复用的会话数，不传则取默认配置")
 
     @field_validator("server_id")
     def validate_server_id(cls, value):
@@ -75,6 +75,7 @@ class RunCaseSuiteForm(GetCaseSuiteForm):
     no_reset: bool = Field(default=False, title="是否不重置手机")
     server_id: int = Field(..., title="执行服务器")
     phone_id: int = Field(..., title="执行手机")
+    driver_pool_size: Optional[int] = Field(None, title="会话池大小", description="同一个浏览器/设备最多复用的会话数，不传则取默认配置")
 
     @field_validator('id')
     def validate_id(cls, value):
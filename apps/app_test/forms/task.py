@@ -113,6 +113,7 @@ class RunTaskForm(GetTaskForm):
     server_id: Optional[int] = Field(None, title="执行服务器")
     phone_id: Optional[int] = Field(None, title="执行手机")
     no_reset: Optional[bool] = Field(None, title="是否不重置手机")
+    driver_pool_size: Optional[int] = Field(None, title="会话池大小", description="同一个浏览器/设备最多复用的会话数，不传则取默认配置")
 
     def depends_validate(self):
         self.validate_server_id()
@@ -7,4 +7,4 @@ from .models.suite import AppUiCaseSuite
 from .models.case import AppUiCase
 from .models.step import AppUiStep
 from .models.task import AppUiTask
-from .models.report import AppUiReport, AppUiReportCase, AppUiReportStep
+from .models.report import AppUiReport, AppUiReportCase, AppUiReportStep, AppUiReportArchive
@@ -153,6 +153,7 @@ def app_run_case():
         case_id_list=form.case_id_list,
         run_type="app",
         runner=RunCase,
-        appium_config=appium_config
+        appium_config=appium_config,
+        driver_pool_size=form.driver_pool_size
     )
     return app.restful.trigger_success({"batch_id": batch_id, "report_id": report_id})
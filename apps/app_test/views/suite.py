@@ -87,6 +87,7 @@ def app_run_case_suite():
         case_id_list=case_id_list,
         run_type="app",
         runner=RunCase,
-        appium_config=appium_config
+        appium_config=appium_config,
+        driver_pool_size=form.driver_pool_size
     )
     return app.restful.trigger_success({"batch_id": batch_id, "report_id": report_id})
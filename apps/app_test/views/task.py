@@ -114,6 +114,7 @@ def app_run_task():
         runner=RunCase,
         extend_data=form.extend,
         task_dict=form.task.to_dict(),
-        appium_config=appium_config
+        appium_config=appium_config,
+        driver_pool_size=getattr(form, 'driver_pool_size', None)
     )
     return app.restful.trigger_success({"batch_id": batch_id, "report_id": report_id})
@@ -1,5 +1,4 @@
 import re
-import importlib
 import traceback
 from typing import Optional
 
@@ -12,7 +11,7 @@ from ...api_test.model_factory import ApiProject, ApiCase
 from ...system.model_factory import User
 from ...ui_test.model_factory import WebUiProject, WebUiCase
 from ...app_test.model_factory import AppUiProject, AppUiCase
-from utils.util.file_util import FileUtil
+from utils.util.script_util import ScriptUtil
 
 
 class GetScriptListForm(PaginationForm):
@@ -137,12 +136,10 @@ class CreatScriptForm(BaseForm):
         """ 校验自定义脚本文件内容合法 """
         default_env = 'debug'
 
-        Script.create_script_file(default_env)  # 把自定义函数脚本内容写入到python脚本中, 重新发版时会把文件全部删除，所以全部创建
-        FileUtil.save_script_data(f'{default_env}_{self.name}', self.script_data, env=default_env)
-
-        # 动态导入脚本，语法有错误则不保存
+        # 动态编译脚本，语法有错误则不保存
         try:
-            script_obj = importlib.reload(importlib.import_module(f'script_list.{default_env}_{self.name}'))
+            ScriptUtil.compile_module(
+                f'script_list.{default_env}_{self.name}', ScriptUtil.build_script_source(self.script_data, default_env))
         except Exception as e:
             raise ValueError(
                 {"msg": "语法错误，请检查", "result": "\n".join("{}".format(traceback.format_exc()).split("↵"))})
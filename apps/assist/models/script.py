@@ -1,14 +1,11 @@
 # -*- coding: utf-8 -*-
-import importlib
-import types
-
 from sqlalchemy import Text, String
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.mysql import LONGTEXT
 
 from apps.base_model import NumFiled
 from ...config.model_factory import RunEnv
-from utils.util.file_util import FileUtil
+from utils.util.script_util import ScriptUtil
 
 
 class Script(NumFiled):
@@ -24,31 +21,25 @@ class Script(NumFiled):
         comment="脚本类型，test：执行测试、mock：mock脚本、encryption：加密、decryption：解密")
 
     @classmethod
-    def create_script_file(cls, env_code=None, not_create_list=[]):
-        """ 创建所有自定义函数 py 文件，默认在第一行加上运行环境
-        示例：
-            # coding:utf-8
-
-            env_code = "test"
-
-            脚本内容
+    def get_script_snapshot(cls, script_id_list: list = None):
+        """ 获取脚本当前的内容，一次运行使用同一份快照，运行过程中脚本被修改也不影响本次运行
+        {script_id: {"name": "xxx", "script_data": "xxx"}}
         """
-        env = env_code or RunEnv.get_first().code
-        for script in cls.get_all():
-            if script.name not in not_create_list:
-                FileUtil.save_script_data(f"{env}_{script.name}", script.script_data, env)
+        query = cls.db.session.query(cls.id, cls.name, cls.script_data)
+        if script_id_list is not None:
+            query = query.filter(cls.id.in_(script_id_list))
+        return {script_id: {"name": name, "script_data": script_data} for script_id, name, script_data in query.all()}
 
     @classmethod
     def get_func_by_script_id(cls, script_id_list: list, env_id=None):
         """ 获取指定脚本中的函数 """
-        env_code = RunEnv.query.first().code if env_id is None else RunEnv.query.filter(id=env_id).first().code
-        cls.create_script_file(env_code)  # 创建所有函数文件
+        env_code = RunEnv.query.first().code if env_id is None else RunEnv.query.filter_by(id=env_id).first().code
 
         func_dict = {}
-        script_name_list = cls.query.with_entities(cls.name).filter(cls.id.in_(script_id_list)).all()
-        for script_name in script_name_list:
-            func_list = importlib.reload(importlib.import_module(f"script_list.{env_code}_{script_name[0]}"))
-            func_dict.update({
-                name: item for name, item in vars(func_list).items() if isinstance(item, types.FunctionType)
-            })
+        script_dict = cls.get_script_snapshot(script_id_list)
+        for script_id in script_id_list:
+            if script_id in script_dict:
+                script = script_dict[script_id]
+                func_dict.update(
+                    ScriptUtil.get_script_functions(script_id, script["name"], script["script_data"], env_code))
         return func_dict
@@ -1,7 +1,5 @@
 # -*- coding: utf-8 -*-
-import importlib
 import sys
-import types
 import traceback
 
 from flask import current_app as app
@@ -11,7 +9,7 @@ from ..model_factory import Script
 from ...base_form import ChangeSortForm
 from ..forms.script import GetScriptForm, CreatScriptForm, EditScriptForm, DebuggerScriptForm, \
     DeleteScriptForm, GetScriptListForm
-from utils.util.file_util import FileUtil
+from utils.util.script_util import ScriptUtil
 from utils.logs.redirect_print_log import RedirectPrintLogToMemory
 from utils.client.test_runner.parser import parse_function, extract_functions
 
@@ -47,18 +45,12 @@ def assist_copy_script():
 def assist_debug_script():
     """ 函数调试 """
     form = DebuggerScriptForm()
-    name, expression = f'{form.env}_{form.script.name}', form.expression
+    expression = form.expression
 
-    # 把自定义函数脚本内容写入到python脚本中
-    Script.create_script_file(form.env)
-
-    # 动态导入脚本
+    # 动态编译脚本
     try:
-        import_path = f'script_list.{name}'
-        func_list = importlib.reload(importlib.import_module(import_path))
-        module_functions_dict = {
-            name: item for name, item in vars(func_list).items() if isinstance(item, types.FunctionType)
-        }
+        module_functions_dict = ScriptUtil.get_script_functions(
+            form.script.id, form.script.name, form.script.script_data, form.env)
         ext_func = extract_functions(expression)
         func = parse_function(ext_func[0])
 
@@ -72,7 +64,7 @@ def assist_debug_script():
             "expression": form.expression,
             "result": result,
             "script_print": script_print,
-            "script": FileUtil.get_func_data_by_script_name(f'{form.env}_{form.script.name}')
+            "script": ScriptUtil.build_script_source(form.script.script_data, form.env)
         })
     except Exception as e:
         sys.stdout = sys.__stdout__  # 恢复输出到console
@@ -82,7 +74,7 @@ def assist_debug_script():
             "env": form.env,
             "expression": form.expression,
             "result": error_data,
-            "script": FileUtil.get_func_data_by_script_name(f'{form.env}_{form.script.name}')
+            "script": ScriptUtil.build_script_source(form.script.script_data, form.env)
         })
 
 
@@ -1,25 +1,35 @@
 # -*- coding: utf-8 -*-
+import atexit
 import copy
 import os
+import threading
 import time
+import zlib
 from datetime import datetime
+from functools import lru_cache
 from contextlib import contextmanager
 from typing import Union
 
 import requests
-from flask import g, request
+from flask import g, request, current_app
 from flask_sqlalchemy import SQLAlchemy as _SQLAlchemy
 from flask_sqlalchemy.query import Query as BaseQuery
-from sqlalchemy import MetaData, or_, text, Integer, String, DateTime, JSON, Text, Boolean
+from sqlalchemy import MetaData, or_, text, insert, select, delete, Integer, String, DateTime, JSON, Text, Boolean, \
+    LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column
 from werkzeug.security import generate_password_hash
 
 from apps.enums import DataStatusEnum, ApiCaseSuiteTypeEnum, CaseStatusEnum, SendReportTypeEnum, ReceiveTypeEnum, \
     TriggerTypeEnum, ApiBodyTypeEnum
-from config import _main_server_host, ui_suite_list, api_suite_list, _job_server_host
+from config import _main_server_host, ui_suite_list, api_suite_list, _job_server_host, \
+    _report_step_write_buffer_config, _batch_insert_config, _report_archive_config
 from utils.make_data.make_xmind import get_xmind_first_sheet_data
 from utils.util.file_util import TEMP_FILE_ADDRESS
 from utils.util.json_util import JsonUtil
+from utils.logs.log import logger
+from utils.client.report_event import report_event_bus
+from utils.client.run_queue import run_queue
+from utils.client.report_retention import ChunkDeleter
 from utils.parse.parse import parse_list_to_dict, update_dict_to_list, parse_dict_to_list
 
 
@@ -169,6 +179,38 @@ class BaseModel(db.Model, JsonUtil):
                 obj_list.append(cls(**insert_dict))
             db.session.add_all(obj_list)
 
+    @classmethod
+    def model_batch_create_and_get(cls, data_list: list, **query_filter):
+        """ 批量插入并按插入顺序返回数据，每 batch_size 条一次插入，不逐条插入、逐条查询
+        有num字段时，只查一次最大的num，在内存中依次递增赋值
+        数据库支持 INSERT ... RETURNING（sqlite、MariaDB、PostgreSQL）时，插入的同时返回id；
+        不支持（MySQL）时，多行插入后按 query_filter 倒序查出刚插入的id，调用方要保证期间同样的筛选条件下没有别的插入，如同一个报告的解析
+        返回的是带上id的数据对象，不在数据库会话中，只用于取值和按id更新
+        """
+        column_name_list = cls.get_table_column_name_list()
+        if "num" in column_name_list:
+            insert_num = cls.get_insert_num()
+            for index, data_dict in enumerate(data_list):
+                data_dict["num"] = insert_num + index
+
+        insert_list = [cls.format_insert_data(data_dict) for data_dict in data_list]
+        obj_list = [cls(**insert_dict) for insert_dict in insert_list]
+        is_returning = db.engine.dialect.insert_executemany_returning_sort_by_parameter_order
+        batch_size = _batch_insert_config["batch_size"]
+        with db.auto_commit():
+            for index in range(0, len(insert_list), batch_size):
+                batch_list = insert_list[index:index + batch_size]
+                if is_returning:
+                    id_list = db.session.scalars(
+                        insert(cls).returning(cls.id, sort_by_parameter_order=True), batch_list).all()
+                else:
+                    db.session.execute(insert(cls), batch_list)
+                    id_query = db.session.query(cls.id).filter_by(**query_filter).order_by(cls.id.desc())
+                    id_list = [data[0] for data in id_query.limit(len(batch_list)).all()][::-1]
+                for obj, obj_id in zip(obj_list[index:index + batch_size], id_list):
+                    obj.id = obj_id
+        return obj_list
+
     def model_update(self, data_dict: dict):
         """ 更新数据 """
         if "num" in data_dict: data_dict.pop("num")
@@ -779,9 +821,10 @@ class BaseCase(ScriptListFiled, VariablesFiled, SkipIfFiled, NumFiled):
 
     @classmethod
     def batch_delete_step(cls, step_model):
-        """ 清理测试用例不存在的步骤 """
-        case_id_list = cls.get_id_list()
-        step_model.query.filter(step_model.case_id.notin_(case_id_list)).delete()
+        """ 清理测试用例不存在的步骤，按用例id分批判断、按主键分批删除 """
+        deleter = ChunkDeleter()
+        deleter.delete_orphan(step_model, step_model.case_id, cls, "step")
+        return deleter.stat
 
     def copy_case(self, step_model):
         old_case = self.to_dict()
@@ -1032,7 +1075,7 @@ class BaseReport(BaseModel):
     retry_count: Mapped[int] = mapped_column(Integer(), default=0, comment="已经执行重试的次数")
     env: Mapped[str] = mapped_column(String(255), default="test", comment="运行环境")
     temp_variables: Mapped[dict] = mapped_column(JSON, default={}, nullable=True, comment="临时参数")
-    process: Mapped[int] = mapped_column(Integer(), default=1, comment="进度节点, 1: 解析数据、2: 执行测试、3: 写入报告")
+    process: Mapped[int] = mapped_column(Integer(), default=1, comment="进度节点, 0: 排队中、1: 解析数据、2: 执行测试、3: 写入报告")
     trigger_type: Mapped[TriggerTypeEnum] = mapped_column(
         default=TriggerTypeEnum.page, comment="触发类型，pipeline:流水线、page:页面、cron:定时任务")
     batch_id: Mapped[str] = mapped_column(String(128), index=True, comment="运行批次id，用于查询报告")
@@ -1047,10 +1090,11 @@ class BaseReport(BaseModel):
 
     @classmethod
     def batch_delete_report_detail_data(cls, report_case_mode, report_step_mode):
-        """ 批量删除报告下的数据 """
-        report_list = cls.format_with_entities_query_list(cls.query.with_entities(cls.id).all())
-        report_case_mode.query.filter(report_case_mode.report_id.notin_(report_list)).delete()
-        report_step_mode.query.filter(report_step_mode.report_id.notin_(report_list)).delete()
+        """ 批量删除报告已不存在的用例、步骤数据，按报告id分批判断、按主键分批删除 """
+        deleter = ChunkDeleter()
+        deleter.delete_orphan(report_step_mode, report_step_mode.report_id, cls, "report_step")
+        deleter.delete_orphan(report_case_mode, report_case_mode.report_id, cls, "report_case")
+        return deleter.stat
 
     @staticmethod
     def get_summary_template():
@@ -1100,7 +1144,9 @@ class BaseReport(BaseModel):
         """ 生成一个测试报告 """
         if "summary" not in kwargs:
             kwargs["summary"] = cls.get_summary_template()
-        return cls.model_create_and_get(kwargs)
+        report = cls.model_create_and_get(kwargs)
+        report_event_bus.register(cls.__tablename__, report.batch_id, report.id, report.process, report.status)
+        return report
 
     def merge_test_result(self, case_summary_list):
         """ 汇总测试数据和结果
@@ -1127,8 +1173,9 @@ class BaseReport(BaseModel):
         return self.summary
 
     def update_report_process(self, **kwargs):
-        """ 更新执行进度 """
+        """ 更新执行进度，并推送到进度总线 """
         self.__class__.query.filter_by(id=self.id).update(kwargs)
+        report_event_bus.publish(self.__tablename__, self.id, kwargs.get("process"), kwargs.get("status"))
 
     def parse_data_start(self):
         """ 开始解析数据 """
@@ -1154,17 +1201,66 @@ class BaseReport(BaseModel):
         """ 保存报告完毕 """
         self.update_report_process(process=3, status=2)
 
+    @classmethod
+    def start_queued_report(cls, report_id):
+        """ 排队中的报告开始执行，报告已被取消的，返回False
+        取消请求可能落在其他进程，其他进程的进度总线中没有这个批次，这里把数据库中的进度同步到当前进程的进度总线
+        """
+        is_started = cls.query.filter_by(id=report_id, process=0, status=1).update({"process": 1, "status": 1}) > 0
+        if is_started:
+            report_event_bus.publish(cls.__tablename__, report_id, 1, 1)
+        else:
+            report = cls.db.session.query(cls.process, cls.status).filter(cls.id == report_id).first()
+            report_event_bus.publish(cls.__tablename__, report_id, *(report or (3, 2)))
+        return is_started
+
+    def cancel_queued_report(self):
+        """ 取消排队中的报告，报告不在排队中的（已开始执行），返回False """
+        summary = self.loads(self.dumps(self.summary))
+        summary["result"] = "skip"
+        is_canceled = self.__class__.query.filter_by(id=self.id, process=0, status=1).update(
+            {"process": 3, "status": 2, "is_passed": 0, "summary": summary}) > 0
+        if is_canceled:
+            report_event_bus.publish(self.__tablename__, self.id, 3, 2)
+        return is_canceled
+
+    @classmethod
+    def cancel_queued_batch(cls, batch_id):
+        """ 取消一个运行批次下还在排队中的报告，并从执行队列中移除（如多个环境依次放入队列时，后面的环境放不进去），返回取消的报告数 """
+        cancel_count = 0
+        for report in cls.query.filter_by(batch_id=batch_id, process=0, status=1).all():
+            if report.cancel_queued_report():
+                run_queue.cancel(cls, report.id)
+                cancel_count += 1
+        return cancel_count
+
     def update_report_result(self, run_result, status=2, summary=None):
         """ 测试运行结束后，更新状态和结果 """
         update_dict = {"is_passed": 1 if run_result == "success" else 0, "status": status}
         if summary:
             update_dict["summary"] = self.loads(self.dumps(summary))
         self.__class__.query.filter_by(id=self.id).update(update_dict)
+        report_event_bus.publish(self.__tablename__, self.id, status=status)
 
     @classmethod
     def select_is_all_status_by_batch_id(cls, batch_id, process_and_status=[1, 1]):
-        """ 查询一个运行批次下离初始化状态最近的报告 """
-        status_list = [[1, 1], [1, 2], [2, 1], [2, 2], [3, 1], [3, 2]]
+        """ 查询一个运行批次下离初始化状态最近的报告，批次在当前进程的进度总线中的，直接读内存
+        批次下还有排队中的报告时，不管传入的状态，都返回排队中，以及在当前进程执行队列中的排队位置（在其他进程排队的为None）
+        """
+        snapshot = cls.get_batch_snapshot(batch_id)
+        if snapshot:
+            queued_id_list = [
+                report_id for report_id, report_status in snapshot["reports"].items() if list(report_status) == [0, 1]]
+        else:
+            queued_id_list = cls.db.session.execute(select(cls.id).where(
+                cls.batch_id == batch_id, cls.process == 0, cls.status == 1)).scalars().all()
+        if queued_id_list:
+            return {"process": 0, "status": 1, "queue_index": run_queue.get_queue_index(cls, queued_id_list)}
+
+        if snapshot:
+            return report_event_bus.select_status(snapshot["reports"], process_and_status)
+
+        status_list = report_event_bus.status_list
         index = status_list.index(process_and_status)
         for process, status in status_list[index:]:  # 只查传入状态之后的状态
             data = cls.db.session.query(cls.id).filter(
@@ -1174,8 +1270,47 @@ class BaseReport(BaseModel):
 
     @classmethod
     def select_is_all_done_by_batch_id(cls, batch_id):
-        """ 报告是否全部生成 """
-        return cls.query.filter(cls.batch_id == batch_id, cls.process != 3, cls.status != 2).first() is None
+        """ 报告是否全部生成，批次在当前进程的进度总线中的，直接读内存
+        内存中没有全部生成时，再用数据库中的进度校正一次（其他进程可能取消了排队中的报告），避免漏发批次的通知
+        """
+        snapshot = report_event_bus.get_batch(cls.__tablename__, batch_id)
+        if snapshot is None:
+            return cls.query.filter(cls.batch_id == batch_id, cls.process != 3, cls.status != 2).first() is None
+        if report_event_bus.is_all_done(snapshot["reports"]):
+            return True
+        return report_event_bus.is_all_done(cls.sync_batch_status(batch_id))
+
+    @classmethod
+    def sync_batch_status(cls, batch_id):
+        """ 用数据库中的进度校正进度总线中的批次，返回数据库中的进度 {report_id: [process, status]} """
+        report_list = cls.db.session.query(cls.id, cls.process, cls.status).filter_by(batch_id=batch_id).all()
+        reports = {report[0]: [report[1], report[2]] for report in report_list}
+        report_event_bus.sync(cls.__tablename__, batch_id, reports)
+        return reports
+
+    @classmethod
+    def get_batch_snapshot(cls, batch_id):
+        """ 进度总线中批次的进度快照，批次长时间没有变化的，先用数据库中的进度校正 """
+        if report_event_bus.is_stale(cls.__tablename__, batch_id):
+            cls.sync_batch_status(batch_id)
+        return report_event_bus.get_batch(cls.__tablename__, batch_id)
+
+    @classmethod
+    def get_report_status_stream(cls, batch_id, report_id=None):
+        """ 报告进度的 server-sent events 消息流
+        批次在当前进程的进度总线中的，有变化才推送；不在的（在其他进程中执行），查一次数据库后结束，由浏览器按retry时间重连
+        """
+        if cls.get_batch_snapshot(batch_id):
+            app = current_app._get_current_object()
+
+            def refresh():
+                with app.app_context():
+                    cls.sync_batch_status(batch_id)
+
+            return report_event_bus.stream(cls.__tablename__, batch_id, report_id, refresh)
+        report_list = cls.db.session.query(cls.id, cls.process, cls.status).filter_by(batch_id=batch_id).all()
+        snapshot = {"reports": {report[0]: [report[1], report[2]] for report in report_list}}
+        return iter([report_event_bus.format_event(report_event_bus.build_event(snapshot, report_id), retry=3000)])
 
     @classmethod
     def select_show_report_id(cls, batch_id):
@@ -1188,6 +1323,128 @@ class BaseReport(BaseModel):
             return cls.db.session.query(cls.id).filter_by(batch_id=batch_id).first()[0]
 
 
+@lru_cache(maxsize=_report_archive_config["cache_size"])
+def load_report_archive_data(archive_model, report_id):
+    """ 读取并解压报告的归档数据，每个进程缓存最近打开的报告，归档数据写入后不会再修改
+    没有归档数据时抛 LookupError，不缓存，报告之后归档了也能取到
+    """
+    data = archive_model.db.session.execute(
+        select(archive_model.data).where(archive_model.report_id == report_id)).scalar()
+    if data is None:
+        raise LookupError(report_id)
+    return archive_model.decompress_data(data)
+
+
+class BaseReportArchive(BaseModel):
+    """ 测试报告归档基类表，执行完毕较久的报告，用例、步骤数据压缩成一条数据存到归档表，报告用例、步骤表只保留近期的数据
+    用例、步骤的id区间用于按用例id、步骤id找到所在的报告
+    """
+    __abstract__ = True
+
+    report_id: Mapped[int] = mapped_column(Integer(), unique=True, nullable=False, comment="测试报告id")
+    case_min_id: Mapped[int] = mapped_column(Integer(), index=True, nullable=True, comment="报告用例的最小id")
+    case_max_id: Mapped[int] = mapped_column(Integer(), nullable=True, comment="报告用例的最大id")
+    step_min_id: Mapped[int] = mapped_column(Integer(), index=True, nullable=True, comment="报告步骤的最小id")
+    step_max_id: Mapped[int] = mapped_column(Integer(), nullable=True, comment="报告步骤的最大id")
+    case_count: Mapped[int] = mapped_column(Integer(), default=0, comment="报告用例数")
+    step_count: Mapped[int] = mapped_column(Integer(), default=0, comment="报告步骤数")
+    raw_size: Mapped[int] = mapped_column(Integer(), default=0, comment="压缩前的数据大小，字节")
+    data_size: Mapped[int] = mapped_column(Integer(), default=0, comment="压缩后的数据大小，字节")
+    data: Mapped[bytes] = mapped_column(
+        LargeBinary(length=(2 ** 32) - 1), nullable=False, comment="zlib压缩的用例、步骤数据 {case_list, step_list}")
+
+    @classmethod
+    def compress_data(cls, data, level=None):
+        """ 序列化并压缩 """
+        level = _report_archive_config["compress_level"] if level is None else level
+        raw_data = cls.dumps(data).encode("utf-8")
+        return raw_data, zlib.compress(raw_data, level)
+
+    @classmethod
+    def decompress_data(cls, data):
+        """ 解压并反序列化 """
+        return cls.loads(zlib.decompress(data).decode("utf-8"))
+
+    @classmethod
+    def get_table_data_list(cls, model, report_id):
+        """ 查出报告在 model 表中的数据，直接查表，不创建模型实例 """
+        return [dict(row) for row in model.db.session.execute(
+            select(model.__table__).where(model.report_id == report_id).order_by(model.id)).mappings().all()]
+
+    @classmethod
+    def archive_report(cls, report_id, report_case_model, report_step_model, compress_level=None):
+        """ 归档一个报告：用例、步骤数据压缩后写入归档表，再删除报告用例、步骤表中的数据，返回归档的统计
+        先写归档再删数据，中途中断时报告用例、步骤表的数据还在，查看报告优先取这两个表的数据，
+        再次归档时已有归档数据则只删除剩下的数据
+        """
+        stat = {"case": 0, "step": 0, "raw_size": 0, "data_size": 0}
+        if cls.db.session.execute(select(cls.id).where(cls.report_id == report_id)).scalar() is None:
+            case_list = cls.get_table_data_list(report_case_model, report_id)
+            step_list = cls.get_table_data_list(report_step_model, report_id)
+            raw_data, data = cls.compress_data({"case_list": case_list, "step_list": step_list}, compress_level)
+            case_id_list, step_id_list = [case["id"] for case in case_list], [step["id"] for step in step_list]
+            stat = {"case": len(case_list), "step": len(step_list), "raw_size": len(raw_data), "data_size": len(data)}
+            with cls.db.auto_commit():
+                cls.db.session.execute(insert(cls), [{
+                    "report_id": report_id,
+                    "case_min_id": min(case_id_list, default=None),
+                    "case_max_id": max(case_id_list, default=None),
+                    "step_min_id": min(step_id_list, default=None),
+                    "step_max_id": max(step_id_list, default=None),
+                    "case_count": stat["case"],
+                    "step_count": stat["step"],
+                    "raw_size": stat["raw_size"],
+                    "data_size": stat["data_size"],
+                    "data": data
+                }])
+        with cls.db.auto_commit():
+            cls.db.session.execute(delete(report_step_model).where(
+                report_step_model.report_id == report_id).execution_options(synchronize_session=False))
+            cls.db.session.execute(delete(report_case_model).where(
+                report_case_model.report_id == report_id).execution_options(synchronize_session=False))
+        return stat
+
+    @classmethod
+    def get_archive_data(cls, report_id):
+        """ 获取报告的归档数据 {case_list, step_list}，没有归档则返回None """
+        try:
+            return load_report_archive_data(cls, report_id)
+        except LookupError:
+            return None
+
+    @classmethod
+    def get_report_id_list_by_range(cls, min_column, max_column, data_id):
+        """ 数据id在报告的 [最小id, 最大id] 区间内的报告id，同时执行的报告id区间可能交叉，会有多个 """
+        return cls.db.session.execute(select(cls.report_id).where(
+            min_column <= data_id, max_column >= data_id).order_by(min_column.desc())).scalars().all()
+
+    @classmethod
+    def find_archive_data(cls, data_type, **kwargs):
+        """ 从归档数据中找符合条件的用例/步骤数据
+        data_type: case、step
+        kwargs: 筛选条件，有 report_id 直接取报告的归档数据，否则按 id / report_case_id 所在的id区间找报告
+        """
+        if kwargs.get("report_id"):
+            report_id_list = [kwargs["report_id"]]
+        elif kwargs.get("id"):
+            report_id_list = cls.get_report_id_list_by_range(
+                getattr(cls, f'{data_type}_min_id'), getattr(cls, f'{data_type}_max_id'), kwargs["id"])
+        elif kwargs.get("report_case_id"):
+            report_id_list = cls.get_report_id_list_by_range(cls.case_min_id, cls.case_max_id, kwargs["report_case_id"])
+        else:
+            return []
+
+        for report_id in report_id_list:
+            archive_data = cls.get_archive_data(report_id) or {}
+            data_list = [
+                data for data in archive_data.get(f'{data_type}_list', [])
+                if all(data.get(key) == value for key, value in kwargs.items())
+            ]
+            if data_list:
+                return data_list
+        return []
+
+
 class BaseReportCase(BaseModel):
     """ 用例执行记录基类表 """
     __abstract__ = True
@@ -1202,6 +1459,16 @@ class BaseReportCase(BaseModel):
     summary: Mapped[dict] = mapped_column(JSON, default={}, comment="用例的报告统计")
     error_msg: Mapped[str] = mapped_column(Text(), default='', comment="用例错误信息")
 
+    archive_model = None  # 报告归档表，报告归档后用例数据从归档表取
+
+    @classmethod
+    def get_from_archive(cls, **kwargs):
+        """ 从报告的归档数据中取第一条符合条件的用例，返回不入库的模型实例，没有则返回None """
+        if cls.archive_model is None:
+            return None
+        data_list = cls.archive_model.find_archive_data("case", **kwargs)
+        return cls(**copy.deepcopy(data_list[0])) if data_list else None
+
     @staticmethod
     def get_summary_template():
         return {
@@ -1249,6 +1516,9 @@ class BaseReportCase(BaseModel):
 
         # [(1, '用例1', 'running')]
         query_data = cls.query.filter(cls.report_id == report_id).with_entities(*query_fields).all()
+        if not query_data and cls.archive_model:  # 报告已归档
+            return [{key: data[key] for key in field_title[:len(query_fields)]}
+                    for data in cls.archive_model.find_archive_data("case", report_id=report_id)]
 
         # [{ 'id': 1, 'name': '用例1', 'result': 'running' }]
         return [dict(zip(field_title, d)) for d in query_data]
@@ -1287,6 +1557,130 @@ class BaseReportCase(BaseModel):
         self.update_report_case_result("error", case_data, summary, error_msg)
 
 
+class ReportStepWriteBuffer:
+    """ 报告步骤执行进度、结果的写缓冲
+    执行一个步骤会多次更新步骤的执行进度和结果，先在内存中按步骤合并，再批量写入数据库：
+        1、待写入的步骤数达到 max_size 时写入
+        2、最早一条待写入的数据等待超过 max_delay 秒时，由后台线程写入，即页面上看到的状态最多延迟 max_delay 秒
+        3、用例执行完毕时写入
+    """
+
+    def __init__(self, max_size=None, max_delay=None, max_retry_times=None):
+        self.max_size = max_size or _report_step_write_buffer_config["max_size"]
+        self.max_delay = max_delay or _report_step_write_buffer_config["max_delay"]
+        self.max_retry_times = max_retry_times or _report_step_write_buffer_config["max_retry_times"]
+        self.pending = {}  # {(model, report_step_id): {"process": "run", "result": "running"}}
+        self.fail_count_dict = {}  # 写入失败的次数 {(model, report_step_id): 次数}
+        self.first_pending_at = None
+        self.app = None
+        self.lock = threading.Lock()  # 保护 pending、fail_count_dict
+        self.flush_lock = threading.Lock()  # 保证按顺序写入，后合并的数据不会被先合并的数据覆盖
+        self.flusher = None
+        self.stat = {
+            "flush": 0,  # 批量写入的次数
+            "split": 0,  # 整批写入失败，拆成逐条写入的次数
+            "drop": 0  # 写入失败超过 max_retry_times 次而丢弃的步骤数
+        }
+
+    def add(self, model, data_id, update_dict):
+        """ 记录待更新的数据，同一个步骤的多次更新合并为一次 """
+        with self.lock:
+            if self.app is None:
+                self.app = current_app._get_current_object()
+            self.pending.setdefault((model, data_id), {}).update(update_dict, update_time=datetime.now())
+            if self.first_pending_at is None:
+                self.first_pending_at = time.time()
+            is_full = len(self.pending) >= self.max_size
+            self.start_flusher()
+
+        if is_full:
+            self.flush()
+
+    def start_flusher(self):
+        """ 启动后台写入线程，一个进程只启动一个 """
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self.flush_on_time, daemon=True)
+            self.flusher.start()
+
+    def flush_on_time(self):
+        while True:
+            time.sleep(self.max_delay / 2)
+            if self.first_pending_at and time.time() - self.first_pending_at >= self.max_delay:
+                self.flush()
+
+    def write(self, pending):
+        """ 按表批量更新 """
+        model_data_dict = {}
+        for (model, data_id), update_dict in pending.items():
+            model_data_dict.setdefault(model, []).append({"id": data_id, **update_dict})
+        with self.app.app_context():
+            with db.auto_commit():
+                for model, data_list in model_data_dict.items():
+                    db.session.bulk_update_mappings(model, data_list)
+
+    def flush(self):
+        """ 把缓冲的数据按表批量写入数据库
+        整批写入失败时逐条写入，写不进去的步骤放回缓冲区，由后台线程过 max_delay 秒后再写入，
+        同一个步骤失败超过 max_retry_times 次后丢弃，不会一直重试、一直报错，返回是否全部写入成功
+        """
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending, self.first_pending_at = self.pending, {}, None
+            if not pending:
+                return True
+            self.stat["flush"] += 1
+
+            try:
+                self.write(pending)
+                fail_dict = {}
+            except Exception as error:
+                fail_dict = {key: (update_dict, error) for key, update_dict in pending.items()}
+                if len(pending) > 1:
+                    self.stat["split"] += 1
+                    fail_dict = {}
+                    for key, update_dict in pending.items():
+                        try:
+                            self.write({key: update_dict})
+                        except Exception as error:
+                            fail_dict[key] = (update_dict, error)
+
+            with self.lock:
+                for key in pending:
+                    if key not in fail_dict:
+                        self.fail_count_dict.pop(key, None)
+            if fail_dict:
+                self.restore(fail_dict)
+            return not fail_dict
+
+    def restore(self, fail_dict):
+        """ 写入失败的数据放回缓冲区，写入期间又有更新的步骤以新的数据为准，失败次数超过 max_retry_times 的丢弃
+            fail_dict: {(model, report_step_id): (待更新的数据, 错误)}
+        """
+        drop_list = []
+        with self.lock:
+            for key, (update_dict, error) in fail_dict.items():
+                fail_count = self.fail_count_dict.get(key, 0) + 1
+                if fail_count >= self.max_retry_times:
+                    self.fail_count_dict.pop(key, None)
+                    drop_list.append((key, error))
+                    continue
+                self.fail_count_dict[key] = fail_count
+                self.pending[key] = {**update_dict, **self.pending.get(key, {})}
+                if self.first_pending_at is None:
+                    self.first_pending_at = time.time()
+            self.stat["drop"] += len(drop_list)
+
+        error = list(fail_dict.values())[0][1]
+        logger.error(f'写入 {len(fail_dict)} 个步骤的执行进度失败，其中 {len(drop_list)} 个已失败 '
+                     f'{self.max_retry_times} 次不再写入，其他的稍后重新写入，错误信息: {error!r}')
+        for (model, data_id), error in drop_list:
+            logger.error(f'丢弃步骤执行进度【{model.__tablename__}: {data_id}】，错误信息: {error!r}')
+
+
+report_step_write_buffer = ReportStepWriteBuffer()
+atexit.register(lambda: report_step_write_buffer.app and report_step_write_buffer.flush())
+
+
 class BaseReportStep(BaseModel):
     """ 步骤执行记录基类表 """
     __abstract__ = True
@@ -1309,6 +1703,16 @@ class BaseReportStep(BaseModel):
         JSON, comment="步骤的统计",
         default={"response_time_ms": 0, "elapsed_ms": 0, "content_size": 0, "request_at": "", "response_at": ""})
 
+    archive_model = None  # 报告归档表，报告归档后步骤数据从归档表取
+
+    @classmethod
+    def get_from_archive(cls, **kwargs):
+        """ 从报告的归档数据中取第一条符合条件的步骤，返回不入库的模型实例，没有则返回None """
+        if cls.archive_model is None:
+            return None
+        data_list = cls.archive_model.find_archive_data("step", **kwargs)
+        return cls(**copy.deepcopy(data_list[0])) if data_list else None
+
     @staticmethod
     def get_summary_template():
         return {
@@ -1329,6 +1733,9 @@ class BaseReportStep(BaseModel):
 
         # [(1, '步骤1', 'before', 'running')]
         query_data = cls.query.filter(cls.report_case_id == report_case_id).with_entities(*query_fields).all()
+        if not query_data and cls.archive_model:  # 报告已归档
+            return [{key: data[key] for key in field_title[:len(query_fields)]}
+                    for data in cls.archive_model.find_archive_data("step", report_case_id=report_case_id)]
 
         # [{ 'id': 1, 'name': '步骤1', 'process': 'before', 'result': 'success' }]
         return [dict(zip(field_title, d)) for d in query_data]
@@ -1357,16 +1764,21 @@ class BaseReportStep(BaseModel):
         elif step_meta_data["result"] == "skip":
             case_summary["stat"]["skip"] += 1
 
+    @classmethod
+    def flush_write_buffer(cls):
+        """ 把缓冲的步骤进度、结果写入数据库 """
+        report_step_write_buffer.flush()
+
     def update_report_step_data(self, **kwargs):
         """ 更新测试数据 """
-        self.__class__.query.filter_by(id=self.id).update(kwargs)
+        report_step_write_buffer.add(self.__class__, self.id, kwargs)
 
     def update_test_result(self, result, step_data):
         """ 更新测试状态 """
         update_dict = {"result": result}
         if step_data:
             update_dict["step_data"] = self.loads(self.dumps(step_data))
-        self.__class__.query.filter_by(id=self.id).update(update_dict)
+        report_step_write_buffer.add(self.__class__, self.id, update_dict)
 
     def test_is_running(self, step_data=None):
         self.update_test_result("running", step_data)
@@ -1388,7 +1800,7 @@ class BaseReportStep(BaseModel):
         update_dict = {"process": process}
         if step_data:
             update_dict["step_data"] = self.loads(self.dumps(step_data))
-        self.__class__.query.filter_by(id=self.id).update(update_dict)
+        report_step_write_buffer.add(self.__class__, self.id, update_dict)
 
     def test_is_start_parse(self, step_data=None):
         self.update_step_process("parse", step_data)
@@ -1,10 +1,9 @@
 # -*- coding: utf-8 -*-
-from threading import Thread
-
-from flask import current_app
+from flask import current_app, g
 
 from .app_test.model_factory import AppUiProject
 from .config.model_factory import RunEnv, Config
+from utils.client.run_queue import run_queue
 
 
 class RunCaseBusiness:
@@ -14,26 +13,42 @@ class RunCaseBusiness:
     def run(
             cls, is_async, task_type, project_id, batch_id, report_model, report_name, case_id_list, runner, env_code,
             run_type=None, temp_variables={}, trigger_id=None, browser=None, trigger_type="page", task_dict={},
-            appium_config={}, extend_data={}
+            appium_config={}, extend_data={}, driver_pool_size=None, max_workers=None
     ):
-        """ 运行用例/任务 """
+        """ 运行用例/任务
+        放不进执行队列时，取消这个运行批次下已经在排队的报告（包括多个环境依次运行时前面已放入队列的环境），再抛出异常
+        """
+        try:
+            if run_queue.is_full():
+                raise ValueError("当前排队执行的任务过多，请稍后再试")
 
-        env = RunEnv.get_data_by_id_or_code(env_code)
-        summary = report_model.get_summary_template()
-        summary["env"]["code"], summary["env"]["name"] = env.code, env.name
+            env = RunEnv.get_data_by_id_or_code(env_code)
+            summary = report_model.get_summary_template()
+            summary["env"]["code"], summary["env"]["name"] = env.code, env.name
 
-        report = report_model.get_new_report(
-            project_id=project_id, batch_id=batch_id, trigger_id=trigger_id or case_id_list, name=report_name,
-            run_type=task_type, env=env.code, trigger_type=trigger_type, temp_variables=temp_variables, summary=summary
-        )
-        # 新起线程运行任务
-        Thread(
-            target=runner(
-                report_id=report.id, case_id_list=case_id_list, is_async=is_async, env_code=env.code, env_name=env.name,
-                browser=browser, task_dict=task_dict, temp_variables=temp_variables, run_type=run_type,
-                extend=extend_data, appium_config=appium_config, current_app=current_app
-            ).parse_and_run
-        ).start()
+            report = report_model.get_new_report(
+                project_id=project_id, batch_id=batch_id, trigger_id=trigger_id or case_id_list, name=report_name,
+                run_type=task_type, env=env.code, trigger_type=trigger_type, temp_variables=temp_variables,
+                summary=summary, process=0, status=1
+            )
+            # 放到执行队列，排队执行
+            run_queue.submit(
+                app=current_app._get_current_object(),
+                report_model=report_model,
+                report_id=report.id,
+                target=runner(
+                    report_id=report.id, case_id_list=case_id_list, is_async=is_async, env_code=env.code,
+                    env_name=env.name, browser=browser, task_dict=task_dict, temp_variables=temp_variables,
+                    run_type=run_type, extend=extend_data, appium_config=appium_config,
+                    driver_pool_size=driver_pool_size, max_workers=max_workers, current_app=current_app
+                ).parse_and_run,
+                project_id=project_id,
+                user_id=getattr(g, "user_id", None),
+                priority=run_queue.get_priority(task_type, trigger_type)
+            )
+        except Exception:
+            report_model.cancel_queued_batch(batch_id)
+            raise
         return report.id
 
     @classmethod
@@ -46,11 +46,12 @@ class GetConfigValueForm(BaseForm):
             elif self.code == "ui_key_board_code":
                 conf = {key: f'按键【{key}】' for key in dir(Keys) if key.startswith('_') is False}
             else:
-                conf_data = self.validate_data_is_exist("配置不存在", Config, name=self.code)
+                all_config = Config.get_all_config()  # 前端频繁调用，取缓存
+                self.validate_is_true(self.code in all_config, "配置不存在")
                 try:
-                    conf = json.loads(conf_data.value)
+                    conf = json.loads(all_config[self.code])
                 except:
-                    conf = conf_data.value
+                    conf = all_config[self.code]
             setattr(self, 'conf', conf)
 
 
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
+import os
+
 from sqlalchemy import Integer, Text, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from apps.base_model import BaseModel
+from utils.util.config_cache import ConfigCache
+from utils.util.file_util import TEMP_FILE_ADDRESS
 
 
 class ConfigType(BaseModel):
@@ -26,9 +30,39 @@ class Config(BaseModel):
     value: Mapped[str] = mapped_column(Text(), comment="配置值")
     desc: Mapped[str] = mapped_column(Text(), nullable=True, comment="描述")
 
+    cache = ConfigCache(os.path.join(TEMP_FILE_ADDRESS, "config_version"))  # 配置缓存，所有配置一次性加载
+
+    @classmethod
+    def load_all_config(cls):
+        """ 一次查询加载所有配置 {config_name: config_value} """
+        return {name: value for name, value in cls.db.session.query(cls.name, cls.value).all()}
+
+    @classmethod
+    def get_all_config(cls):
+        """ 获取所有配置，优先取缓存 """
+        return cls.cache.get_all(cls.load_all_config)
+
     @classmethod
-    def get_config_value(cls, config_name):
-        return cls.db.session.query(cls.value).filter(cls.name == config_name).first()[0]  # ('60',)
+    def clear_config_cache(cls):
+        """ 配置有修改，通知所有进程重新加载配置 """
+        cls.cache.change_version()
+
+    @classmethod
+    def get_config_value(cls, config_name, value_type=None):
+        """ 获取配置值，value_type: 转换的类型，如int、float，转换失败则返回原始值 """
+        value = cls.get_all_config().get(config_name)
+        if value_type and value not in (None, ''):
+            try:
+                return value_type(value)
+            except (TypeError, ValueError):
+                return value
+        return value
+
+    @classmethod
+    def get_config_values(cls, *config_names):
+        """ 批量获取配置值 {config_name: config_value}，一次运行需要的配置一起取 """
+        all_config = cls.get_all_config()
+        return {config_name: all_config.get(config_name) for config_name in config_names}
 
     @classmethod
     def get_kym(cls):
@@ -57,11 +91,11 @@ class Config(BaseModel):
 
     @classmethod
     def get_request_time_out(cls):
-        return cls.get_config_value("request_time_out")
+        return cls.get_config_value("request_time_out", float)
 
     @classmethod
     def get_wait_time_out(cls):
-        return cls.get_config_value("wait_time_out")
+        return cls.get_config_value("wait_time_out", float)
 
     @classmethod
     def get_report_host(cls):
@@ -89,7 +123,7 @@ class Config(BaseModel):
 
     @classmethod
     def get_appium_new_command_timeout(cls):
-        return cls.get_config_value("appium_new_command_timeout")
+        return cls.get_config_value("appium_new_command_timeout", int)
 
     @classmethod
     def get_ui_report_addr(cls):
@@ -106,3 +140,7 @@ class Config(BaseModel):
     @classmethod
     def get_call_back_msg_addr(cls):
         return cls.get_config_value("call_back_msg_addr")
+
+    @classmethod
+    def get_holiday_list(cls):
+        return cls.get_config_value("holiday_list")
@@ -35,6 +35,7 @@ def config_add_config():
     """ 新增配置 """
     form = PostConfigForm()
     Config.model_create(form.model_dump())
+    Config.clear_config_cache()
     return app.restful.add_success()
 
 
@@ -43,6 +44,7 @@ def config_change_config():
     """ 修改配置 """
     form = PutConfigForm()
     Config.query.filter(Config.id == form.id).update(form.model_dump())
+    Config.clear_config_cache()
     return app.restful.change_success()
 
 
@@ -51,6 +53,7 @@ def config_delete_config():
     """ 删除配置 """
     form = DeleteConfigForm()
     form.conf.delete()
+    Config.clear_config_cache()
     return app.restful.delet_success()
 
 
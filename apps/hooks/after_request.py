@@ -1,13 +1,32 @@
 # -*- coding: utf-8 -*-
-import copy
-import json
+import random
 
 from flask import request, g
 
+from config import _response_config
 from utils.logs.log import logger
+from ..system.models.user_operation_log import UserOperationLog, user_operation_log_writer
 
 
-def save_response_log(result):
+def get_response_log_body(response):
+    """ 日志中打印的响应体
+    统一的json响应直接用保留的原始数据判断，不再解析响应体，处理成功的响应按比例采样打印，超长的截断
+    """
+    payload = getattr(response, "payload", None)
+    if payload is not None:
+        if payload.get("status") == 200 and random.random() >= _response_config["log_sample_rate"]:
+            return f'未采样，状态：{payload.get("status")}，信息：{payload.get("message")}'
+        body = response.get_log_body()
+    else:
+        body = response.get_data(as_text=True)
+
+    max_length = _response_config["log_max_length"]
+    if max_length and len(body) > max_length:
+        return f'{body[:max_length]}...(已截断，共{len(body)}个字符)'
+    return body
+
+
+def save_response_log(response):
     """ 判断是否打日志
     HEAD请求不打日志
     获取报告步骤截图不打日志
@@ -16,7 +35,16 @@ def save_response_log(result):
         return
     else:
         logger.info(
-            f'【{g.get("request_id")}】【{g.get("user_name")}】【{g.user_ip}】【{request.method}】【{request.full_path}】, \n响应数据:{json.loads(result[0])}\n')
+            f'【{g.get("request_id")}】【{g.get("user_name")}】【{g.user_ip}】【{request.method}】【{request.full_path}】, \n响应数据:{get_response_log_body(response)}\n')
+
+
+def save_operation_log():
+    """ 增删改的请求记录为用户操作，只放入写入队列，不等待写库 """
+    if request.method in ("POST", "PUT", "DELETE", "PATCH"):
+        try:
+            user_operation_log_writer.add(UserOperationLog.get_request_record())
+        except Exception as error:
+            logger.error(f'【{g.get("request_id")}】记录用户操作失败: {error}')
 
 
 def register_after_hook(app):
@@ -26,14 +54,20 @@ def register_after_hook(app):
     def after_request_save_response_log(response):
         """ 后置钩子函数，每个请求最后都会经过此函数 """
         response.headers['X-Request-Id'] = str(g.request_id)
+        save_operation_log()
 
         if "download" in request.path or "." in request.path or request.path.endswith("swagger"):
             return response
 
-        # result = copy.copy(response.response)
-        # if isinstance(result[0], bytes):
-        #     result[0] = bytes.decode(result[0])
-        # save_response_log(result)
+        # 统一的json响应（包括流式返回的大列表），用保留的原始数据打日志
+        if hasattr(response, "payload"):
+            save_response_log(response)
+            return response
+
+        # 文件、截图、server-sent events 等流式响应，不是json，不打日志
+        if response.direct_passthrough or response.is_streamed:
+            return response
+
         response.headers['Content-Type'] = 'application/json'
-        save_response_log(response.response)
+        save_response_log(response)
         return response
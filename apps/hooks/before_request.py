@@ -22,9 +22,7 @@ def register_before_hook(app):
     @app.before_request
     def set_default_user():
         """ 设置一个默认用户 """
-        if hasattr(g, "common_user_id") is False:
-            current_user_query = User.db.session.query(User.id).filter(User.account == "common").first()
-            g.common_user_id = current_user_query[0] if current_user_query else None
+        g.common_user_id = User.get_common_user_id()
 
     @app.before_request
     def parse_request_ip():
@@ -3,4 +3,4 @@ from ..base_view import Blueprint
 
 system_manage = Blueprint("system", __name__)
 
-from .views import permission, role, user, error_record, job, sso
+from .views import permission, role, user, error_record, job, sso, user_operation_log, notification
@@ -0,0 +1,27 @@
+from typing import Optional, List
+
+from pydantic import Field
+
+from ...base_form import BaseForm, PaginationForm
+from ..model_factory import Notification
+
+
+class GetNotificationListForm(PaginationForm):
+    status: Optional[int] = Field(None, title="发送状态", description="0待发送，1发送中，2发送成功，3发送失败")
+    kind: Optional[str] = Field(None, title="通知类型", description="webhook、call_back")
+    addr: Optional[str] = Field(None, title="发送地址")
+
+    def get_query_filter(self, *args, **kwargs):
+        """ 查询条件，状态走 (status, next_run_time) 索引 """
+        filter_list = []
+        if self.status is not None:
+            filter_list.append(Notification.status == self.status)
+        if self.kind:
+            filter_list.append(Notification.kind == self.kind)
+        if self.addr:
+            filter_list.append(Notification.addr_key.like(f'%{self.addr}%'))
+        return filter_list
+
+
+class RetryNotificationForm(BaseForm):
+    id_list: Optional[List[int]] = Field(None, title="通知id list", description="不传则重发全部发送失败的通知")
@@ -0,0 +1,29 @@
+from typing import Optional
+
+from pydantic import Field
+
+from ...base_form import PaginationForm
+from ..model_factory import UserOperationLog
+
+
+class GetUserOperationLogListForm(PaginationForm):
+    user_id: Optional[int] = Field(None, title="操作用户id")
+    method: Optional[str] = Field(None, title="请求方法")
+    url: Optional[str] = Field(None, title="请求地址")
+    start_time: Optional[str] = Field(None, title="开始时间")
+    end_time: Optional[str] = Field(None, title="结束时间")
+
+    def get_query_filter(self, *args, **kwargs):
+        """ 查询条件，用户、时间段走 (create_user, create_time)、create_time 索引 """
+        filter_list = []
+        if self.user_id:
+            filter_list.append(UserOperationLog.create_user == self.user_id)
+        if self.start_time:
+            filter_list.append(UserOperationLog.create_time >= self.start_time)
+        if self.end_time:
+            filter_list.append(UserOperationLog.create_time <= self.end_time)
+        if self.method:
+            filter_list.append(UserOperationLog.method == self.method)
+        if self.url:
+            filter_list.append(UserOperationLog.url.like(f'%{self.url}%'))
+        return filter_list
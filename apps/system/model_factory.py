@@ -2,3 +2,4 @@ from .models.error_record import SystemErrorRecord, SaveRequestLog
 from .models.job import JobRunLog, ApschedulerJobs
 from .models.user import Permission, Role, RolePermissions, User, UserRoles
 from .models.user_operation_log import UserOperationLog
+from .models.notification import Notification
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from sqlalchemy import Index, Integer, String, DateTime, JSON, Text, select, insert, update, delete, or_
+from sqlalchemy.orm import Mapped, mapped_column
+
+from apps.base_model import BaseModel
+
+
+class Notification(BaseModel):
+    """ 通知发送队列表，即时通讯消息、流水线回调先写入这个表，再由发送线程发送，进程退出、重启都不会丢失 """
+    __tablename__ = "system_notification"
+    __table_args__ = (
+        Index("ix_system_notification_status_next_run_time", "status", "next_run_time"),  # 取待发送的通知
+        {"comment": "通知发送队列表"}
+    )
+
+    kind: Mapped[str] = mapped_column(
+        String(32), nullable=False, comment="通知类型，webhook：即时通讯消息，call_back：流水线回调")
+    addr: Mapped[str] = mapped_column(String(1024), nullable=False, comment="发送地址，webhook为已加签的地址")
+    addr_key: Mapped[str] = mapped_column(
+        String(255), index=True, nullable=False, comment="去掉签名参数的发送地址，同一个webhook的消息按它合并、限流")
+    msg: Mapped[dict] = mapped_column(JSON, default={}, comment="webhook为消息内容，call_back为请求参数")
+    status: Mapped[int] = mapped_column(Integer(), default=0, comment="发送状态，0待发送，1发送中，2发送成功，3发送失败")
+    retry_count: Mapped[int] = mapped_column(Integer(), default=0, comment="已重试的次数")
+    next_run_time: Mapped[datetime] = mapped_column(DateTime, nullable=False, comment="下次发送的时间")
+    sender: Mapped[str] = mapped_column(String(128), nullable=True, comment="正在发送的线程标识")
+    result: Mapped[str] = mapped_column(Text(), default="", nullable=True, comment="最后一次发送的结果或错误信息")
+    call_back_id: Mapped[int] = mapped_column(Integer(), nullable=True, comment="流水线回调对应的回调记录id")
+
+    @staticmethod
+    def get_addr_key(addr):
+        """ 去掉钉钉加签的 timestamp、sign 参数，同一个webhook每次加签的地址不一样 """
+        addr_split = urlsplit(addr)
+        query = urlencode(
+            [(key, value) for key, value in parse_qsl(addr_split.query) if key not in ("timestamp", "sign")])
+        return f'{addr_split.scheme}://{addr_split.netloc}{addr_split.path}{"?" + query if query else ""}'[:255]
+
+    @classmethod
+    def add(cls, kind, addr, msg, delay=0, call_back_id=None):
+        """ 写入待发送的通知，delay 秒后发送 """
+        with cls.db.auto_commit():
+            cls.db.session.execute(insert(cls).values(
+                kind=kind, addr=addr, addr_key=cls.get_addr_key(addr), msg=msg, status=0, retry_count=0,
+                next_run_time=datetime.now() + timedelta(seconds=delay), call_back_id=call_back_id))
+
+    @classmethod
+    def claim(cls, sender, max_count):
+        """ 认领一组到了发送时间的通知：最早到期的一个地址，webhook最多 max_count 条，回调1条（回调的地址不合并）
+        按 状态+待认领 条件更新，多个进程同时认领时一条通知只会被一个线程认领到，返回认领到的通知数据 [dict]
+        """
+        now = datetime.now()
+        first = cls.db.session.execute(select(cls.kind, cls.addr_key).where(
+            cls.status == 0, cls.next_run_time <= now).order_by(cls.next_run_time, cls.id).limit(1)).first()
+        if first is None:
+            cls.db.session.rollback()
+            return []
+        # 同一个webhook还没到合并窗口结束时间的新消息一起发送，重试中的消息要等到重试时间
+        id_list = cls.db.session.execute(select(cls.id).where(
+            cls.status == 0, or_(cls.next_run_time <= now, cls.retry_count == 0),
+            cls.kind == first.kind, cls.addr_key == first.addr_key
+        ).order_by(cls.id).limit(max_count if first.kind == "webhook" else 1)).scalars().all()
+        with cls.db.auto_commit():
+            cls.db.session.execute(update(cls).where(cls.id.in_(id_list), cls.status == 0).values(
+                status=1, sender=sender).execution_options(synchronize_session=False))
+        data_list = [dict(data) for data in cls.db.session.execute(select(cls.__table__).where(
+            cls.id.in_(id_list), cls.status == 1, cls.sender == sender).order_by(cls.id)).mappings().all()]
+        cls.db.session.rollback()
+        return data_list
+
+    @classmethod
+    def change_status(cls, id_list, status, result="", **kwargs):
+        """ 更新一组通知的发送结果 """
+        if not id_list:
+            return
+        with cls.db.auto_commit():
+            cls.db.session.execute(update(cls).where(cls.id.in_(id_list)).values(
+                status=status, sender=None, result=result, **kwargs).execution_options(synchronize_session=False))
+
+    @classmethod
+    def release(cls, id_list, delay=0, result=None):
+        """ 放回待发送，delay 秒后再发送，不算重试次数（如被限流、没有合并的消息） """
+        update_dict = {"next_run_time": datetime.now() + timedelta(seconds=delay)}
+        if result is not None:
+            update_dict["result"] = result
+        cls.change_status(id_list, 0, **update_dict)
+
+    @classmethod
+    def reset_stale(cls, stale_time):
+        """ 发送中超过 stale_time 秒的通知（发送的进程中途退出）放回待发送 """
+        with cls.db.auto_commit():
+            return cls.db.session.execute(update(cls).where(
+                cls.status == 1, cls.update_time < datetime.now() - timedelta(seconds=stale_time)
+            ).values(status=0, sender=None).execution_options(synchronize_session=False)).rowcount
+
+    @classmethod
+    def retry_fail(cls, id_list=None):
+        """ 发送失败的通知重新发送，不传id则重发全部发送失败的通知 """
+        filter_list = [cls.status == 3]
+        if id_list:
+            filter_list.append(cls.id.in_(id_list))
+        with cls.db.auto_commit():
+            return cls.db.session.execute(update(cls).where(*filter_list).values(
+                status=0, retry_count=0, next_run_time=datetime.now()
+            ).execution_options(synchronize_session=False)).rowcount
+
+    @classmethod
+    def clear_finish(cls, keep_days):
+        """ 删除超过保留天数的已发送完的通知 """
+        with cls.db.auto_commit():
+            return cls.db.session.execute(delete(cls).where(
+                cls.status.in_([2, 3]), cls.create_time < datetime.now() - timedelta(days=keep_days)
+            ).execution_options(synchronize_session=False)).rowcount
@@ -129,6 +129,16 @@ class User(BaseModel):
     status: Mapped[int] = mapped_column(Integer(), default=1, comment="状态，1为启用，0为冻结")
     business_list: Mapped[str] = mapped_column(JSON, default=[], comment="用户拥有的业务线")
 
+    common_user_id = None  # 预设用户的id，进程内只查一次
+
+    @classmethod
+    def get_common_user_id(cls):
+        """ 获取预设用户（common）的id，查到后缓存在进程内，还没有初始化预设用户时每次都查 """
+        if cls.common_user_id is None:
+            current_user_query = cls.db.session.query(cls.id).filter(cls.account == "common").first()
+            cls.common_user_id = current_user_query[0] if current_user_query else None
+        return cls.common_user_id
+
     @classmethod
     def password_to_hash(cls, password: str) -> str:
         return generate_password_hash(password)
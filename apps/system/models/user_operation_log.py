@@ -1,8 +1,171 @@
 # -*- coding: utf-8 -*-
-from apps.base_model import SaveRequestLog
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+import traceback
+from datetime import datetime
+
+from flask import request, g, current_app
+from sqlalchemy import Index, insert
+
+from apps.base_model import SaveRequestLog, db
+from config import _user_operation_log_config
+from utils.logs.log import logger
 
 
 class UserOperationLog(SaveRequestLog):
-    """ 用户操作记录表 """
+    """ 用户操作记录表，create_user 为操作的用户 """
     __tablename__ = "system_user_operation_log"
-    __table_args__ = {"comment": "用户操作记录表"}
+    __table_args__ = (
+        Index("ix_system_user_operation_log_create_time", "create_time"),  # 按时间段查
+        Index("ix_system_user_operation_log_create_user_create_time", "create_user", "create_time"),  # 按用户+时间段查
+        {"comment": "用户操作记录表"}
+    )
+
+    @classmethod
+    def sanitize(cls, data):
+        """ 字段名包含敏感词的值替换为 ******，过长的数据截断为字符串 """
+
+        def mask(value):
+            if isinstance(value, dict):
+                return {
+                    key: "******" if any(word in str(key).lower() for word in sensitive_keys) else mask(item)
+                    for key, item in value.items()
+                }
+            if isinstance(value, list):
+                return [mask(item) for item in value]
+            return value
+
+        sensitive_keys, max_length = _user_operation_log_config["sensitive_keys"], _user_operation_log_config[
+            "max_body_length"]
+        data = mask(data)
+        data_str = json.dumps(data, ensure_ascii=False, default=str)
+        if max_length and len(data_str) > max_length:
+            return f'{data_str[:max_length]}...(已截断，共{len(data_str)}个字符)'
+        return data
+
+    @classmethod
+    def get_request_record(cls):
+        """ 从当前请求中取要记录的数据，在请求上下文中调用 """
+        now = datetime.now()
+        return {
+            "ip": g.get("user_ip"),
+            "url": request.path[:256],
+            "method": request.method,
+            "headers": cls.sanitize(dict(request.headers)),
+            "params": cls.sanitize(request.args.to_dict()),
+            "data_form": cls.sanitize(request.form.to_dict()),
+            "data_json": cls.sanitize(request.get_json(silent=True) or {}),
+            "create_user": g.get("user_id"),
+            "update_user": g.get("user_id"),
+            "create_time": now,
+            "update_time": now
+        }
+
+
+class UserOperationLogWriter:
+    """
+    用户操作记录的异步批量写入，请求线程只把记录放入进程内的有界队列，由进程内唯一的后台线程多行插入数据库
+        1、凑够 batch_size 条，或最早一条等待超过 max_delay 秒时写入
+        2、队列满了（数据库写入跟不上）时丢弃新的记录，不阻塞请求，丢弃的条数记到日志
+        3、进程退出时（atexit、gunicorn 的 worker_exit）把队列中的记录写完
+    gunicorn 的 worker 是 fork 出来的，写入线程在每个进程第一次记录时启动
+    """
+
+    def __init__(self, queue_size=None, batch_size=None, max_delay=None):
+        self.queue_size = queue_size or _user_operation_log_config["queue_size"]
+        self.batch_size = batch_size or _user_operation_log_config["batch_size"]
+        self.max_delay = max_delay or _user_operation_log_config["max_delay"]
+        self.queue, self.writer, self.writer_pid, self.app = None, None, None, None
+        self.drop_count, self.is_closed = 0, False
+        self.writer_lock = threading.Lock()
+
+    def start_writer(self):
+        """ 启动当前进程的写入线程，fork 出来的进程重新创建队列 """
+        with self.writer_lock:
+            if self.writer_pid == os.getpid():
+                return
+            self.app = current_app._get_current_object()
+            self.queue, self.drop_count = queue.Queue(maxsize=self.queue_size), 0
+            self.writer = threading.Thread(target=self.run_writer, name="operation-log-writer", daemon=True)
+            self.writer.start()
+            self.writer_pid = os.getpid()
+            atexit.register(self.close)
+
+    def add(self, data_dict):
+        """ 放入队列，不等待写库，满了则丢弃 """
+        if self.is_closed:
+            return
+        if self.writer_pid != os.getpid():
+            self.start_writer()
+        try:
+            self.queue.put_nowait(data_dict)
+        except queue.Full:
+            with self.writer_lock:
+                self.drop_count += 1
+
+    def get_batch(self):
+        """ 阻塞获取一条记录，再在 max_delay 秒内凑成一批，收到停止标识（None）则不再等待 """
+        item_list = [self.queue.get()]
+        end_at = time.time() + self.max_delay
+        while len(item_list) < self.batch_size and item_list[-1] is not None:
+            try:
+                item_list.append(self.queue.get(timeout=max(end_at - time.time(), 0)))
+            except queue.Empty:
+                break
+        return item_list
+
+    def run_writer(self):
+        log_queue = self.queue
+        while True:
+            item_list = self.get_batch()
+            write_list = [item for item in item_list if item is not None]
+            with self.writer_lock:
+                drop_count, self.drop_count = self.drop_count, 0
+            if drop_count:
+                logger.warning(f'用户操作记录队列已满，丢弃了 {drop_count} 条记录')
+            try:
+                if write_list:
+                    self.write_batch(write_list)
+            except Exception:
+                logger.error(f'用户操作记录写入失败，丢弃了 {len(write_list)} 条记录: \n{traceback.format_exc()}')
+            finally:
+                for _ in item_list:
+                    log_queue.task_done()
+            if item_list[-1] is None:
+                return
+
+    def write_batch(self, data_list):
+        """ 多行插入 """
+        with self.app.app_context():
+            with db.auto_commit():
+                db.session.execute(insert(UserOperationLog), data_list)
+
+    def flush(self, time_out=None):
+        """ 等待队列中的记录写入完成 """
+        if self.writer_pid != os.getpid():
+            return
+        time_out = _user_operation_log_config["flush_time_out"] if time_out is None else time_out
+        end_at = time.time() + time_out
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and end_at > time.time():
+                self.queue.all_tasks_done.wait(end_at - time.time())
+
+    def close(self):
+        """ 进程退出时，把队列中的记录写完再停止写入线程 """
+        if self.is_closed:
+            return
+        self.is_closed = True
+        if self.writer_pid == os.getpid() and self.writer.is_alive():
+            time_out = _user_operation_log_config["flush_time_out"]
+            try:
+                self.queue.put(None, timeout=time_out)
+                self.writer.join(time_out)
+            except queue.Full:
+                pass
+
+
+user_operation_log_writer = UserOperationLogWriter()
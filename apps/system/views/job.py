@@ -10,16 +10,18 @@ from flask import current_app as app, request
 from ..forms.job import GetJobRunLogList, GetJobForm, GetJobLogForm, EnableJobForm, DisableJobForm, RunJobForm
 from ..model_factory import ApschedulerJobs
 from ..blueprint import system_manage
-from ..model_factory import JobRunLog
+from ..model_factory import JobRunLog, Notification
 from ...config.model_factory import BusinessLine, WebHook
 from ...api_test.model_factory import ApiProject, ApiReport, ApiReportCase, ApiReportStep, ApiCase, ApiStep, \
-    ApiMsg, ApiProjectEnv, ApiCaseSuite, ApiTask
+    ApiMsg, ApiProjectEnv, ApiCaseSuite, ApiTask, ApiDashboardRollup
 from ...ui_test.model_factory import WebUiReport, WebUiReportCase, WebUiReportStep, WebUiCase, WebUiStep, \
     WebUiProjectEnv, WebUiProject, WebUiCaseSuite, WebUiTask
 from ...app_test.model_factory import AppUiReport, AppUiReportCase, AppUiReportStep, AppUiCase, AppUiStep, \
     AppUiProjectEnv, AppUiProject, AppUiCaseSuite, AppUiTask
 from utils.message.send_report import send_business_stage_count
-from config import _job_server_host
+from utils.client.report_retention import ReportRetention
+from utils.client.report_archive import ReportArchiver
+from config import _job_server_host, _notification_config
 from ... import create_app
 
 
@@ -30,15 +32,32 @@ class JobFuncs:
     def cron_clear_report(cls):
         """
         {
-            "name": "清理测试报告不存在的报告数据",
+            "name": "按保留策略清理测试报告及其数据、截图",
             "id": "cron_clear_report",
             "cron": "0 0 2 * * ?"
         }
         """
         with create_app().app_context():
-            ApiReport.batch_delete_report_detail_data(ApiReportCase, ApiReportStep)
-            WebUiReport.batch_delete_report_detail_data(WebUiReportCase, WebUiReportStep)
-            AppUiReport.batch_delete_report_detail_data(AppUiReportCase, AppUiReportStep)
+            run_log = JobRunLog.model_create_and_get({"func_name": "cron_clear_report"})
+            result = {}
+            try:
+                for report_model, report_case_model, report_step_model, report_img_type in [
+                    (ApiReport, ApiReportCase, ApiReportStep, None),
+                    (WebUiReport, WebUiReportCase, WebUiReportStep, "ui"),
+                    (AppUiReport, AppUiReportCase, AppUiReportStep, "app")
+                ]:
+                    table_name = report_model.__tablename__
+
+                    def on_progress(stat):  # 执行记录中实时展示进度
+                        run_log.model_update({"detail": run_log.dumps({**result, table_name: stat})})
+
+                    result[table_name] = ReportRetention(
+                        report_model, report_case_model, report_step_model, report_img_type, on_progress=on_progress
+                    ).run()
+            except Exception as error:
+                run_log.run_fail({**result, "error": str(error)})
+                raise error
+            run_log.run_success(result)
 
     @classmethod
     def cron_clear_step(cls):
@@ -64,10 +83,62 @@ class JobFuncs:
         }
         """
         with create_app().app_context():
-            api_id_list = ApiMsg.get_id_list()
-            for api_id in api_id_list:
-                use_count = ApiStep.query.filter_by(api_id=api_id).count()
-                ApiMsg.query.filter_by(id=api_id).update({"use_count": use_count})
+            if ApiMsg.refresh_use_count(ApiStep):
+                ApiDashboardRollup.rebuild(["api"])  # 首页统计的接口是否已使用，批量更新不会增量维护
+
+    @classmethod
+    def cron_dashboard_rollup(cls):
+        """
+        {
+            "name": "首页统计数据对账",
+            "id": "cron_dashboard_rollup",
+            "cron": "0 30 2,13 * * ?"
+        }
+        """
+        with create_app().app_context():
+            ApiDashboardRollup.rebuild()
+
+    @classmethod
+    def cron_archive_report(cls):
+        """
+        {
+            "name": "归档执行完毕较久的测试报告的用例、步骤数据",
+            "id": "cron_archive_report",
+            "cron": "0 40 2 * * ?"
+        }
+        """
+        with create_app().app_context():
+            run_log = JobRunLog.model_create_and_get({"func_name": "cron_archive_report"})
+            result = {}
+            try:
+                for report_model, report_case_model, report_step_model in [
+                    (ApiReport, ApiReportCase, ApiReportStep),
+                    (WebUiReport, WebUiReportCase, WebUiReportStep),
+                    (AppUiReport, AppUiReportCase, AppUiReportStep)
+                ]:
+                    table_name = report_model.__tablename__
+
+                    def on_progress(stat):  # 执行记录中实时展示进度
+                        run_log.model_update({"detail": run_log.dumps({**result, table_name: stat})})
+
+                    result[table_name] = ReportArchiver(
+                        report_model, report_case_model, report_step_model, on_progress=on_progress).run()
+            except Exception as error:
+                run_log.run_fail({**result, "error": str(error)})
+                raise error
+            run_log.run_success(result)
+
+    @classmethod
+    def cron_clear_notification(cls):
+        """
+        {
+            "name": "清理超过保留天数的通知发送记录",
+            "id": "cron_clear_notification",
+            "cron": "0 50 2 * * ?"
+        }
+        """
+        with create_app().app_context():
+            Notification.clear_finish(_notification_config["keep_days"])
 
     @classmethod
     def cron_clear_project_env(cls):
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from flask import current_app as app
+
+from ..blueprint import system_manage
+from ..forms.notification import GetNotificationListForm, RetryNotificationForm
+from ..model_factory import Notification
+from utils.message.notification import notification_sender
+
+
+@system_manage.admin_get("/notification/list")
+def system_manage_get_notification_list():
+    """ 获取通知发送记录的列表，按id倒序，可按状态查看发送失败的通知 """
+    form = GetNotificationListForm()
+    return app.restful.get_success(Notification.make_pagination(form, order_by=Notification.id.desc()))
+
+
+@system_manage.admin_put("/notification/retry")
+def system_manage_retry_notification():
+    """ 重新发送发送失败的通知 """
+    form = RetryNotificationForm()
+    retry_count = Notification.retry_fail(form.id_list)
+    notification_sender.wake()
+    return app.restful.success(f'已重新加入发送队列 {retry_count} 条通知')
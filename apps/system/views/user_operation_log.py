@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from flask import current_app as app
+
+from ..blueprint import system_manage
+from ..forms.user_operation_log import GetUserOperationLogListForm
+from ..model_factory import UserOperationLog
+
+
+@system_manage.admin_get("/operation-log/list")
+def system_manage_get_operation_log_list():
+    """ 获取用户操作记录的列表，按时间倒序 """
+    form = GetUserOperationLogListForm()
+    return app.restful.get_success(UserOperationLog.make_pagination(
+        form, order_by=UserOperationLog.create_time.desc()))
@@ -6,13 +6,14 @@ import datetime
 import importlib
 import traceback
 
-import requests
 from flask import request, jsonify, current_app as app
 
 from apps.tools.blueprint import tool
 from utils.util.file_util import CALL_BACK_ADDRESS, FileUtil
 from apps.assist.models.script import Script
 from apps.config.models.config import Config
+from utils.message.send_report import send_msg
+from utils.message.notification import notification_sender
 
 
 def send_msg_by_webhook(msg_type, msg):
@@ -23,11 +24,7 @@ def send_msg_by_webhook(msg_type, msg):
             "content": f'{msg}'
         }
     }
-    try:
-        print(
-            f'{msg_type}发送企业微信：{requests.post(Config.get_callback_webhook(), json=msg_format).json()}')
-    except Exception as error:
-        print(f'向企业微信发送{msg_type}失败，错误信息：\n{error}')
+    send_msg(Config.get_callback_webhook(), msg_format)  # 写入通知队列，发送失败会重试
 
 
 def actions(action):
@@ -57,24 +54,23 @@ def get_auto_test_mock_data():
     # 根据是否有json参数判断是否为异步回调
     if datas and datas.get("is_async"):
         api_record_id, rating_request_id = datas.get("apiRecordId"), datas.get("ratingRequestId")
-        try:
-            # 发送异步回调
-            res = requests.post(
-                url=datas.get("addr", Config.get_data_source_callback_addr()),
-                headers={"x-auth-token": datas.get("token", Config.get_data_source_callback_token())},
-                json={
-                    "applyType": 1,
-                    "code": 200,
-                    "apiRecordId": api_record_id,
-                    "ratingRequestId": rating_request_id,
-                    "message": "成功",
-                    "content": datas,
-                    "status": 200
-                }
-            )
-            msg = {"message": "异步数据源回调成功", "status": 200, "apiRecordId": api_record_id, "data": res.json()}
-        except Exception as error:
-            msg = {"message": "异步数据源回调失败", "status": 500, "apiRecordId": api_record_id, "data": str(error)}
+        addr = datas.get("addr", Config.get_data_source_callback_addr())
+        # 异步回调写入通知队列，由发送线程回调，有超时、失败重试，不阻塞当前请求
+        notification_sender.add("call_back", addr, {
+            "method": "POST",
+            "url": addr,
+            "headers": {"x-auth-token": datas.get("token", Config.get_data_source_callback_token())},
+            "json": {
+                "applyType": 1,
+                "code": 200,
+                "apiRecordId": api_record_id,
+                "ratingRequestId": rating_request_id,
+                "message": "成功",
+                "content": datas,
+                "status": 200
+            }
+        })
+        msg = {"message": "异步数据源回调已加入发送队列", "status": 200, "apiRecordId": api_record_id}
         return jsonify(msg)
     return jsonify(datas)
 
@@ -164,6 +164,7 @@ class RunCaseForm(BaseForm):
     temp_variables: Optional[dict] = Field(title="临时指定参数")
     is_async: int = Field(default=0, title="执行模式", description="0：用例维度串行执行，1：用例维度并行执行")
     browser: str = Field("chrome", title="浏览器")
+    driver_pool_size: Optional[int] = Field(None, title="会话池大小", description="同一个浏览器/设备最多复用的会话数，不传则取默认配置")
 
     def depends_validate(self):
         """ 公共变量参数的校验
@@ -77,7 +77,8 @@ class GetReportCaseForm(BaseForm):
 
     @field_validator("id")
     def validate_id(cls, value):
-        report_case = cls.validate_data_is_exist("数据不存在", ReportCase, id=value)
+        report_case = ReportCase.get_first(id=value) or ReportCase.get_from_archive(id=value)  # 报告可能已归档
+        cls.validate_is_true(report_case, "数据不存在")
         setattr(cls, "report_case", report_case)
         return value
 
@@ -93,7 +94,8 @@ class GetReportStepForm(BaseForm):
 
     @field_validator("id")
     def validate_id(cls, value):
-        report_step = cls.validate_data_is_exist("数据不存在", ReportStep, id=value)
+        report_step = ReportStep.get_first(id=value) or ReportStep.get_from_archive(id=value)  # 报告可能已归档
+        cls.validate_is_true(report_step, "数据不存在")
         setattr(cls, "report_step", report_step)
         return value
 
@@ -109,6 +111,11 @@ class GetReportStatusForm(GetReportShowIdForm):
     status: int = Field(1, title="当前进度下的状态")
 
 
+class GetReportStatusStreamForm(GetReportShowIdForm):
+    """ 订阅报告进度 """
+    report_id: Optional[int] = Field(None, title="报告id", description="不传则推送整个批次的报告进度")
+
+
 class GetReportStepImgForm(BaseForm):
     """ 获取报告步骤截图 """
     report_id: int = Field(..., title="报告id")
@@ -72,6 +72,7 @@ class RunCaseSuiteForm(GetCaseSuiteForm):
     is_async: int = Field(default=0, title="执行模式")
     env_list: list = Field(default=[], title="运行环境")
     browser: str = Field("chrome", title="浏览器")
+    driver_pool_size: Optional[int] = Field(None, title="会话池大小", description="同一个浏览器/设备最多复用的会话数，不传则取默认配置")
 
     @field_validator('id')
     def validate_id(cls, value):
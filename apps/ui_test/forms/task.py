@@ -109,3 +109,4 @@ class RunTaskForm(GetTaskForm):
     extend: Optional[Union[list, dict, str]] = Field(
         None, title="扩展字段", description="运维传过来的扩展字段，接收的什么就返回什么")
     browser: str = Field("chrome", title="浏览器")
+    driver_pool_size: Optional[int] = Field(None, title="会话池大小", description="同一个浏览器/设备最多复用的会话数，不传则取默认配置")
@@ -6,4 +6,4 @@ from .models.suite import WebUiCaseSuite
 from .models.case import WebUiCase
 from .models.step import WebUiStep
 from .models.task import WebUiTask
-from .models.report import WebUiReport, WebUiReportCase, WebUiReportStep
+from .models.report import WebUiReport, WebUiReportCase, WebUiReportStep, WebUiReportArchive
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from apps.base_model import BaseReport, BaseReportCase, BaseReportStep
+from apps.base_model import BaseReport, BaseReportCase, BaseReportStep, BaseReportArchive
 
 
 class WebUiReport(BaseReport):
@@ -9,11 +9,19 @@ class WebUiReport(BaseReport):
     __table_args__ = {"comment": "web-ui测试报告表"}
 
 
+class WebUiReportArchive(BaseReportArchive):
+    """ 测试报告归档表 """
+    __abstract__ = False
+    __tablename__ = "web_ui_test_report_archive"
+    __table_args__ = {"comment": "web-ui测试报告的归档数据表"}
+
+
 class WebUiReportCase(BaseReportCase):
     """ 测试报告用例表 """
     __abstract__ = False
     __tablename__ = "web_ui_test_report_case"
     __table_args__ = {"comment": "web-ui测试报告的用例数据表"}
+    archive_model = WebUiReportArchive
 
 
 class WebUiReportStep(BaseReportStep):
@@ -21,3 +29,4 @@ class WebUiReportStep(BaseReportStep):
     __abstract__ = False
     __tablename__ = "web_ui_test_report_step"
     __table_args__ = {"comment": "web-ui测试报告的步骤数据表"}
+    archive_model = WebUiReportArchive
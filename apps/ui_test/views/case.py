@@ -147,6 +147,7 @@ def ui_run_case():
             report_model=Report,
             env_code=env_code,
             browser=form.browser,
+            driver_pool_size=form.driver_pool_size,
             is_async=form.is_async,
             temp_variables=form.temp_variables,
             task_type="case",
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
-from flask import current_app as app
+from flask import current_app as app, send_file, Response
 
 from ..blueprint import ui_test
 from ..model_factory import WebUiReport as Report, WebUiReportStep as ReportStep, WebUiReportCase as ReportCase
 from ..forms.report import GetReportForm, GetReportListForm, DeleteReportForm, GetReportCaseForm, \
     GetReportCaseListForm, GetReportStepForm, GetReportStepListForm, GetReportStatusForm, GetReportShowIdForm, \
-    GetReportStepImgForm
+    GetReportStepImgForm, GetReportStatusStreamForm
 from utils.util.file_util import FileUtil
+from utils.client.run_queue import run_queue
 
 
 @ui_test.login_get("/report/list")
@@ -30,6 +31,17 @@ def ui_get_report_status():
         Report.select_is_all_status_by_batch_id(form.batch_id, [form.process, form.status]))
 
 
+@ui_test.get("/report/status/stream")
+def ui_get_report_status_stream():
+    """ 以 server-sent events 推送当次运行的报告进度，替代轮询 /report/status """
+    form = GetReportStatusStreamForm()
+    return Response(
+        Report.get_report_status_stream(form.batch_id, form.report_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # 不让nginx缓冲，有进度变化立即推送
+    )
+
+
 @ui_test.get("/report/show-id")
 def ui_get_report_show_id():
     """ 根据运行id获取当次要打开的报告 """
@@ -37,6 +49,16 @@ def ui_get_report_show_id():
     return app.restful.get_success(Report.select_show_report_id(form.batch_id))
 
 
+@ui_test.login_put("/report/cancel")
+def ui_cancel_report():
+    """ 取消排队中的运行 """
+    form = GetReportForm()
+    if form.report.cancel_queued_report() is False:
+        return app.restful.fail("报告已开始执行，不能取消")
+    run_queue.cancel(Report, form.report.id)
+    return app.restful.success("取消成功")
+
+
 @ui_test.get("/report")
 def ui_get_report():
     """ 获取测试报告 """
@@ -89,3 +111,13 @@ def ui_get_report_step_img():
     form = GetReportStepImgForm()
     data = FileUtil.get_report_step_img(form.report_id, form.report_step_id, form.img_type, 'ui')
     return app.restful.get_success({"data": data, "total": 1 if data else 0})
+
+
+@ui_test.get("/report/step-img/file")
+def ui_get_report_step_img_file():
+    """ 报告的步骤截图，直接返回图片 """
+    form = GetReportStepImgForm()
+    img_file = FileUtil.get_report_step_img_file(form.report_id, form.report_step_id, form.img_type, 'ui')
+    if img_file is None:
+        return app.restful.url_not_find("截图不存在")
+    return send_file(img_file, mimetype="image/png", max_age=30 * 24 * 60 * 60)  # 截图不会变，让浏览器缓存
@@ -82,6 +82,7 @@ def ui_run_case_suite():
             report_model=Report,
             env_code=env_code,
             browser=form.browser,
+            driver_pool_size=form.driver_pool_size,
             is_async=form.is_async,
             report_name=form.suite.name,
             task_type="suite",
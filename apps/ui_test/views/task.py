@@ -103,6 +103,7 @@ def ui_run_task():
             batch_id=batch_id,
             env_code=env_code,
             browser=form.browser if hasattr(form, 'browser') else form.task.browser,
+            driver_pool_size=getattr(form, 'driver_pool_size', None),
             trigger_type=form.trigger_type,
             is_async=form.is_async,
             project_id=form.task.project_id,
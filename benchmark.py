@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+用压测数据库（空的sqlite文件或临时的mysql库）生成数据，启动本地桩服务，通过 RunTestRunner 执行接口调试、用例、任务，
+统计耗时、sql语句数、内存峰值、各阶段（解析、请求、提取、断言、写库）耗时，结果写入json，可和基线对比是否有性能回退
+
+执行压测:
+    python benchmark.py run --cases 20 --steps 10 --output benchmark/result.json
+执行压测并和基线对比，有回退则退出码为1:
+    python benchmark.py run --output benchmark/result.json --baseline benchmark/baseline.json
+对比两次结果:
+    python benchmark.py compare benchmark/result.json benchmark/baseline.json --threshold 0.2
+前置钩子函数每个请求的开销:
+    python benchmark.py hooks --count 2000
+多线程打日志的吞吐量:
+    python benchmark.py logs --threads 50 --records 2000
+步骤中已提取较大的json时，每个步骤处理变量的耗时:
+    python benchmark.py variables --steps 20 --items 2000
+处理多兆的json、html响应的耗时:
+    python benchmark.py responses --size-mb 5
+测试报告归档前后报告用例、步骤表的查询耗时，以及打开已归档报告的耗时:
+    python benchmark.py archive --reports 200 --cases 5 --steps 10
+发送10000条 RabbitMQ 消息的吞吐量，默认使用模拟的连接，传 --host 则发送到真实的 MQ:
+    python benchmark.py mq --messages 10000
+编译模板和改造前的 parse_data 对比随机模板的解析结果（有不一致则退出码为1），以及典型请求数据的解析耗时:
+    python benchmark.py parser --diff-count 60000 --count 20000
+报告步骤执行进度逐条更新和写缓冲批量写入的sql语句数、耗时:
+    python benchmark.py step-buffer --steps 1000
+每个请求新建连接和报告共享连接池的请求耗时:
+    python benchmark.py transport --requests 1000 --threads 4
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+from utils.benchmark.bench import SCENARIO_LIST, run_benchmark, compare_result, format_compare_result, \
+    save_result, load_result
+from utils.benchmark.hooks import run_hook_benchmark
+from utils.benchmark.logs import run_log_benchmark
+from utils.benchmark.variables import run_variable_benchmark
+from utils.benchmark.responses import run_response_benchmark
+from utils.benchmark.archive import run_archive_benchmark
+from utils.benchmark.mq import run_mq_benchmark
+from utils.benchmark.parser import run_parser_diff, run_parser_benchmark
+from utils.benchmark.transport import run_transport_benchmark
+from utils.benchmark.step_buffer import run_step_buffer_benchmark
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    sub_parsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub_parsers.add_parser("run", help="执行压测")
+    run_parser.add_argument("--db-uri", help="压测数据库地址，需为空库，默认在临时目录新建sqlite文件")
+    run_parser.add_argument("--scenarios", nargs="+", choices=SCENARIO_LIST, default=SCENARIO_LIST, help="执行的场景")
+    run_parser.add_argument("--projects", type=int, default=2, help="服务数")
+    run_parser.add_argument("--apis", type=int, default=50, help="接口数")
+    run_parser.add_argument("--cases", type=int, default=20, help="用例数")
+    run_parser.add_argument("--steps", type=int, default=10, help="每条用例的步骤数")
+    run_parser.add_argument("--repeat", type=int, default=3, help="每个场景执行的次数，结果取中位数")
+    run_parser.add_argument("--stub-delay", type=float, default=0, help="桩服务每个请求的响应延时（秒）")
+    run_parser.add_argument("--items", type=int, default=10, help="桩服务响应中列表的长度")
+    run_parser.add_argument("--no-trace-memory", action="store_true", help="不统计内存峰值，tracemalloc会让执行变慢")
+    run_parser.add_argument("--output", default="benchmark_result.json", help="结果文件")
+    run_parser.add_argument("--baseline", help="基线结果文件，传了则和基线对比")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="比基线大多少（比例）视为回退")
+
+    compare_parser = sub_parsers.add_parser("compare", help="和基线对比")
+    compare_parser.add_argument("current", help="本次结果文件")
+    compare_parser.add_argument("baseline", help="基线结果文件")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="比基线大多少（比例）视为回退")
+
+    hooks_parser = sub_parsers.add_parser("hooks", help="前置钩子函数每个请求的开销")
+    hooks_parser.add_argument("--db-uri", help="压测数据库地址，需为空库，默认在临时目录新建sqlite文件")
+    hooks_parser.add_argument("--count", type=int, default=2000, help="每种接口请求的次数")
+
+    logs_parser = sub_parsers.add_parser("logs", help="多线程打日志的吞吐量")
+    logs_parser.add_argument("--threads", type=int, default=50, help="同时打日志的线程数")
+    logs_parser.add_argument("--records", type=int, default=2000, help="每个线程打的日志条数")
+
+    variables_parser = sub_parsers.add_parser("variables", help="步骤中已提取较大的json时，每个步骤处理变量的耗时")
+    variables_parser.add_argument("--steps", type=int, default=20, help="用例的步骤数，每个步骤提取一个json响应")
+    variables_parser.add_argument("--items", type=int, default=2000, help="每个json响应中列表的长度")
+
+    responses_parser = sub_parsers.add_parser("responses", help="处理多兆的json、html响应的耗时")
+    responses_parser.add_argument("--size-mb", type=float, default=5, help="响应体大小（MB）")
+    responses_parser.add_argument("--repeat", type=int, default=3, help="每种响应处理的次数，结果取平均")
+
+    archive_parser = sub_parsers.add_parser("archive", help="测试报告归档前后报告用例、步骤表的查询耗时")
+    archive_parser.add_argument("--db-uri", help="压测数据库地址，需为空库，默认在临时目录新建sqlite文件")
+    archive_parser.add_argument("--reports", type=int, default=200, help="报告数，前90%%的报告会被归档")
+    archive_parser.add_argument("--cases", type=int, default=5, help="每个报告的用例数")
+    archive_parser.add_argument("--steps", type=int, default=10, help="每条用例的步骤数")
+    archive_parser.add_argument("--step-size-kb", type=float, default=4, help="每个步骤数据的大小（KB）")
+    archive_parser.add_argument("--repeat", type=int, default=20, help="每种查询执行的次数，结果取中位数")
+
+    mq_parser = sub_parsers.add_parser("mq", help="发送 RabbitMQ 消息的吞吐量")
+    mq_parser.add_argument("--messages", type=int, default=10000, help="发送的消息数")
+    mq_parser.add_argument("--host", help="真实的 MQ 地址，不传则使用模拟的连接")
+    mq_parser.add_argument("--port", type=int, default=5672, help="MQ 端口")
+    mq_parser.add_argument("--account", default="guest", help="MQ 账号")
+    mq_parser.add_argument("--password", default="guest", help="MQ 密码")
+    mq_parser.add_argument("--queue", default="benchmark", help="发送到的队列")
+    mq_parser.add_argument("--handshake-ms", type=float, default=5, help="模拟的连接建立握手耗时（毫秒）")
+    mq_parser.add_argument("--rtt-ms", type=float, default=0.2, help="模拟的每次请求往返耗时（毫秒）")
+    mq_parser.add_argument("--per-message-count", type=int, default=1000, help="每条消息新建连接的方式发送的消息数")
+
+    parser_parser = sub_parsers.add_parser("parser", help="编译模板和改造前的 parse_data 对比解析结果、解析耗时")
+    parser_parser.add_argument("--diff-count", type=int, default=60000, help="对比的随机模板数")
+    parser_parser.add_argument("--seed", type=int, default=1, help="生成随机模板的种子")
+    parser_parser.add_argument("--count", type=int, default=20000, help="典型请求数据解析的次数")
+
+    step_buffer_parser = sub_parsers.add_parser("step-buffer", help="报告步骤执行进度逐条更新和写缓冲批量写入的sql语句数、耗时")
+    step_buffer_parser.add_argument("--db-uri", help="压测数据库地址，需为空库，默认在临时目录新建sqlite文件")
+    step_buffer_parser.add_argument("--steps", type=int, default=1000, help="步骤数，每个步骤更新9次执行进度、结果")
+
+    transport_parser = sub_parsers.add_parser("transport", help="每个请求新建连接和报告共享连接池的请求耗时")
+    transport_parser.add_argument("--requests", type=int, default=1000, help="发送的请求数")
+    transport_parser.add_argument("--threads", type=int, default=1, help="同时发送的线程数，模拟并行执行的用例")
+    transport_parser.add_argument("--stub-delay", type=float, default=0, help="桩服务每个请求的响应延时（秒）")
+    transport_parser.add_argument("--max-keep-alive-requests", type=int, help="连接池最多处理的请求数，不传则取默认配置")
+    return parser
+
+
+def compare(current, baseline, threshold):
+    """ 打印对比结果，有回退返回1 """
+    compare_list = compare_result(current, baseline, threshold)
+    print(format_compare_result(compare_list))
+    regression_list = [item for item in compare_list if item["is_regression"]]
+    print(f'\n共 {len(compare_list)} 项指标，{len(regression_list)} 项回退（阈值 {threshold:.0%}）')
+    return 1 if regression_list else 0
+
+
+def hooks(db_uri, count):
+    """ 打印前置钩子函数的开销，cold为每次请求都查预设用户、解码token，warm为命中进程内缓存 """
+    result = run_hook_benchmark(db_uri, count)
+    for name, data in result.items():
+        print(f'{name:<10} {data["path"]:<40} '
+              f'cold {data["cold"]["us_per_request"]:>8}us / {data["cold"]["sql_per_request"]} sql，'
+              f'warm {data["warm"]["us_per_request"]:>8}us / {data["warm"]["sql_per_request"]} sql')
+    return 0
+
+
+def logs(thread_count, record_count):
+    """ 打印每条日志加锁直接写入（sync）和队列批量写入（queue）的吞吐量 """
+    for mode, data in run_log_benchmark(thread_count, record_count).items():
+        print(f'{mode:<6} 业务线程耗时 {data["emit_time"]}s，写完耗时 {data["total_time"]}s，'
+              f'{data["records_per_second"]} 条/秒，写入 {data["written"]} 条，丢弃 {data["dropped"]} 条')
+    return 0
+
+
+def variables(step_count, item_count):
+    """ 打印每个步骤深拷贝变量（deepcopy）和变量作用域写时复制（scope）的耗时 """
+    for mode, data in run_variable_benchmark(step_count, item_count).items():
+        print(f'{mode:<9} 总耗时 {data["total_time"]}s，平均每个步骤 {data["ms_per_step"]}ms，'
+              f'最后一个步骤 {data["last_step_ms"]}ms')
+    return 0
+
+
+def responses(size_mb, repeat):
+    """ 打印每种响应记录响应信息、提取数据的耗时 """
+    for name, data in run_response_benchmark(size_mb, repeat).items():
+        print(f'{name:<16} {data["size"] / 1024 / 1024:.1f}MB，记录响应信息 {data["record_ms"]}ms，'
+              f'提取数据 {data["extract_ms"]}ms')
+    return 0
+
+
+def archive(db_uri, report_count, case_count, step_count, step_size_kb, repeat):
+    """ 打印归档前后热表的查询耗时、数据库大小，以及打开已归档报告的耗时 """
+    result = run_archive_benchmark(db_uri, report_count, case_count, step_count, step_size_kb, repeat)
+    for phase in ["before", "after"]:
+        data = result[phase]
+        db_size = f'{data["db_size"] / 1024 / 1024:.1f}MB' if data["db_size"] else "-"
+        print(f'归档{"前" if phase == "before" else "后"} 用例 {data["case_rows"]} 条，步骤 {data["step_rows"]} 条，'
+              f'数据库 {db_size}，用例列表 {data["case_list_ms"]}ms，步骤列表 {data["step_list_ms"]}ms，'
+              f'步骤数据 {data["step_ms"]}ms，统计失败步骤 {data["fail_step_count_ms"]}ms')
+    data = result["archive"]
+    print(f'归档 {data.get("report", 0)} 个报告，用例 {data.get("case", 0)} 条，步骤 {data.get("step", 0)} 条，'
+          f'压缩前 {data.get("raw_size", 0) / 1024 / 1024:.1f}MB，压缩后 {data.get("data_size", 0) / 1024 / 1024:.1f}MB，'
+          f'耗时 {data["time"]}s')
+    for mode in ["cold", "warm"]:
+        data = result["archived"][mode]
+        print(f'打开已归档报告（{mode}） 用例列表 {data["case_list_ms"]}ms，步骤列表 {data["step_list_ms"]}ms，'
+              f'步骤数据 {data["step_ms"]}ms')
+    return 0
+
+
+def mq(args):
+    """ 打印每条消息新建连接（new_connection）、连接池逐条发送（pooled）、连接池批量发送（batch）的吞吐量 """
+    info = {
+        "host": args.host, "port": args.port, "account": args.account, "password": args.password,
+        "queue_name": args.queue
+    } if args.host else None
+    result = run_mq_benchmark(args.messages, info, args.handshake_ms, args.rtt_ms, args.per_message_count)
+    for mode, data in result.items():
+        print(f'{mode:<15} 发送 {data["count"]} 条，耗时 {data["time"]}s，{data["messages_per_second"]} 条/秒'
+              + (f'，新建连接 {data["new_connection"]} 个' if "new_connection" in data else ''))
+    return 0
+
+
+def parser(diff_count, seed, count):
+    """ 打印解析结果不一致的模板（最多10个），以及改造前（legacy）、编译模板（compiled）每次解析的耗时，有不一致返回1 """
+    from tests.legacy_parser import parse_data as legacy_parse_data
+
+    diff_list = run_parser_diff(legacy_parse_data, diff_count, seed)
+    for diff in diff_list[:10]:
+        print(f'{diff["content"]!r}\n  legacy:   {diff["legacy"]}\n  compiled: {diff["compiled"]}')
+    print(f'对比 {diff_count} 个随机模板，{len(diff_list)} 个解析结果不一致')
+    for mode, data in run_parser_benchmark(legacy_parse_data, count).items():
+        print(f'{mode:<9} 解析 {data["count"]} 次，平均每次 {data["us_per_parse"]}us')
+    return 1 if diff_list else 0
+
+
+def step_buffer(db_uri, step_count):
+    """ 打印逐条更新（direct）和写缓冲（buffered）的sql语句数、耗时，写完后步骤数据不一致返回1 """
+    result = run_step_buffer_benchmark(db_uri, step_count)
+    for mode in ["direct", "buffered"]:
+        data = result[mode]
+        print(f'{mode:<9} {data["step"]} 个步骤，sql {data["sql"]} 条（update {data["update"]} 条），耗时 {data["time"]}s')
+    print(f'写完后步骤数据{"一致" if result["is_same"] else "不一致"}')
+    return 0 if result["is_same"] else 1
+
+
+def transport(request_count, thread_count, stub_delay, max_keep_alive_requests):
+    """ 打印每个请求新建连接（new_connection）和连接池（pooled）的耗时，以及连接池的连接复用统计 """
+    result = run_transport_benchmark(request_count, thread_count, stub_delay, max_keep_alive_requests)
+    for mode, data in result.items():
+        print(f'{mode:<15} 请求 {data["count"]} 次，耗时 {data["time"]}s，平均每次 {data["ms_per_request"]}ms，'
+              f'失败 {data["error"]} 次' + (f'，连接统计 {data["connection"]}' if "connection" in data else ''))
+    return 1 if any(data["error"] for data in result.values()) else 0
+
+
+def main():
+    args = get_parser().parse_args()
+    if args.command == "compare":
+        return compare(load_result(args.current), load_result(args.baseline), args.threshold)
+    if args.command == "logs":
+        return logs(args.threads, args.records)
+    if args.command == "variables":
+        return variables(args.steps, args.items)
+    if args.command == "responses":
+        return responses(args.size_mb, args.repeat)
+    if args.command == "mq":
+        return mq(args)
+    if args.command == "parser":
+        return parser(args.diff_count, args.seed, args.count)
+    if args.command == "transport":
+        return transport(args.requests, args.threads, args.stub_delay, args.max_keep_alive_requests)
+
+    db_uri = args.db_uri or f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "benchmark.db")}'
+    if args.command == "hooks":
+        return hooks(db_uri, args.count)
+    if args.command == "step-buffer":
+        return step_buffer(db_uri, args.steps)
+    if args.command == "archive":
+        return archive(db_uri, args.reports, args.cases, args.steps, args.step_size_kb, args.repeat)
+
+    result = run_benchmark(
+        db_uri, scenario_list=args.scenarios, repeat=args.repeat, stub_delay=args.stub_delay, item_count=args.items,
+        trace_memory=not args.no_trace_memory, project_count=args.projects, api_count=args.apis,
+        case_count=args.cases, step_count=args.steps
+    )
+    save_result(result, args.output)
+    for scenario, scenario_result in result["scenarios"].items():
+        print(f'{scenario:<6} 耗时 {scenario_result["wall_time"]}s，sql {scenario_result["sql"]["total"]} 条，'
+              f'结果 {scenario_result["report"]["result"]}')
+    print(f'结果已写入 {args.output}')
+    if args.baseline:
+        return compare(result, load_result(args.baseline), args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
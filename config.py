@@ -21,6 +21,161 @@ _default_web_hook_type = 'ding_ding'  # 默认通知的webhook类型，见枚举
 _default_web_hook = ''
 _web_hook_secret = ''  # secret，若是关键词模式，不用设置
 
+# 执行接口测试时的http连接池配置，一次报告运行期间，同一个域名复用连接
+_http_pool_config = {
+    "pool_maxsize": 20,  # 每个域名连接池的最大连接数
+    "max_keep_alive_requests": 1000,  # 单个域名连接池最多处理的请求数，达到后回收连接池，重新建立连接
+    "idle_time_out": 60  # 域名连接池空闲超时时间（秒），超过这个时间没有请求，则回收连接池
+}
+
+# 执行接口测试时的响应处理配置
+_http_response_config = {
+    "sniff_size": 64 * 1024,  # 响应头没有声明编码、且不能按utf-8解码时，只取响应体前面这么多字节识别编码
+    "record_max_size": 2 * 1024 * 1024,  # 报告中记录解析后的json响应体的最大字节数，超过则只记录截断的文本
+    "record_text_length": 512  # 报告中记录的文本响应体的最大字符数
+}
+
+# 报告步骤执行进度、结果的写缓冲配置
+_report_step_write_buffer_config = {
+    "max_size": 200,  # 待写入的步骤数达到这个数量时，批量写入数据库
+    "max_delay": 1,  # 最早一条待写入的数据等待超过这个时间（秒）时，批量写入数据库，即步骤状态最多延迟这么久
+    "max_retry_times": 3  # 同一个步骤的数据写入失败这么多次后丢弃（如步骤已删除、数据不符合约束），不再重试
+}
+
+# 批量插入数据（如解析测试时创建报告的用例、步骤数据）的配置
+_batch_insert_config = {
+    "batch_size": 200  # 每条插入语句最多插入的数据条数，步骤数据较大，避免单条语句过长
+}
+
+# 接口使用次数（被多少个步骤直接使用）的统计配置
+_api_use_count_config = {
+    "incremental": True,  # 步骤新增、删除、修改引用的接口时，是否同步增减接口的使用次数，定时任务全量重算兜底
+    "batch_size": 500  # 全量重算时，每批更新的接口数
+}
+
+# 测试报告保留策略，定时任务 cron_clear_report 按此清理报告及其用例、步骤数据、截图
+# 默认不按天数、个数清理报告，确认好保留策略后再打开，避免上线当晚就删掉历史报告
+_report_retention_config = {
+    "keep_days": 0,  # 通过的报告保留天数，0为不按天数清理，如 30
+    "keep_fail_days": 0,  # 不通过、未执行完的报告保留天数，0为不按天数清理，如 90
+    "keep_count_per_project": 0,  # 每个服务最多保留的通过的报告数，0为不限制，不通过的报告只按 keep_fail_days 清理
+    "chunk_size": 500,  # 每批删除的数据条数（按主键），每批一个短事务
+    "chunk_pause": 0.1,  # 每批删除之后暂停的秒数，给线上读写让出资源
+    "dry_run": False  # 只统计要清理的数据，不删除
+}
+
+# 测试报告归档配置，执行完毕较久的报告，用例、步骤数据压缩后移到归档表，报告用例、步骤表只保留近期的数据
+_report_archive_config = {
+    "archive_days": 15,  # 执行完毕超过这个天数的报告归档，0为不归档
+    "compress_level": 6,  # zlib压缩级别，1~9，越大压缩率越高、越慢
+    "max_report_per_run": 2000,  # 每次归档最多处理的报告数，剩下的下次继续
+    "report_pause": 0.05,  # 每归档一个报告之后暂停的秒数，给线上读写让出资源
+    "cache_size": 32  # 每个进程缓存的解压后的归档报告数
+}
+
+# RabbitMQ 消息发送配置，每个 MQ 地址维护长连接池，不用每条消息都重新建立连接
+_rabbit_mq_publisher_config = {
+    "pool_size": 2,  # 每个 MQ 地址最多保持的连接数（每个连接一个通道），同时发送的线程超出时等待空闲连接
+    "acquire_time_out": 30,  # 等待空闲连接的最长时间（秒）
+    "confirm_delivery": True,  # 是否开启发布确认，开启后每条消息等 MQ 确认收到才返回
+    "retry_times": 3,  # 连接断开、发送失败时的重试次数，每次重试前重新建立连接
+    "retry_backoff": 0.5,  # 第一次重试前等待的秒数，之后每次翻倍
+    "max_backoff": 5,  # 重试前最多等待的秒数
+    "heartbeat": 60,  # 连接的心跳间隔（秒）
+    "batch_size": 500  # 批量发送时，每占用一次连接发送的消息数，发完放回池中，避免其他线程等待太久
+}
+
+# 即时通讯消息、流水线回调的发送队列配置，通知先写入通知表，由每个进程的发送线程发送，失败按退避时间重试
+_notification_config = {
+    "worker_count": 2,  # 每个进程的发送线程数
+    "coalesce_window": 3,  # 同一个webhook在这个时间（秒）内的文本、markdown消息合并成一条发送
+    "max_coalesce": 10,  # 一次最多合并的消息数
+    "max_coalesce_length": 4000,  # 合并后的消息正文最多字节数（企业微信markdown限制4096字节），超出的下一次发送
+    "rate_limit_per_minute": 20,  # 每个webhook每分钟最多发送的消息数（钉钉、企业微信机器人限制为20条/分钟），0为不限制
+    "retry_times": 5,  # 发送失败的重试次数，超过后标记为发送失败
+    "retry_backoff": 10,  # 第一次重试前等待的秒数，之后每次翻倍
+    "max_backoff": 600,  # 重试前最多等待的秒数
+    "time_out": 10,  # 每次请求的超时时间（秒）
+    "poll_interval": 5,  # 没有待发送的通知时，每隔这么久检查一次其他进程写入的、到了重试时间的通知
+    "stale_time": 120,  # 发送中的通知超过这么久（秒）没有结果（进程中途退出），重新放回待发送
+    "keep_days": 7  # 通知记录保留天数，定时任务清理
+}
+
+# ui自动化、app自动化的浏览器/appium会话池配置，一次报告运行期间，用例之间复用会话
+_driver_pool_config = {
+    "pool_size": 1,  # 每个浏览器类型/设备最多保留的会话数，可在运行时指定
+    "max_reuse_count": 20  # 单个会话最多被使用的次数，达到后关闭会话，重新创建
+}
+
+# ui自动化、app自动化的步骤截图配置，截图由后台线程写入文件，不阻塞步骤执行
+_screenshot_config = {
+    "policy": "always",  # 截图策略，always：执行前后都截图，after：只截执行后的图，fail：只在步骤执行失败时截图
+    "max_width": 0,  # 截图最大宽度，超过则等比缩小，0为不缩小，需要安装 Pillow
+    "queue_size": 500  # 后台写入队列的大小，队列满了则在步骤线程中直接写入
+}
+
+# 测试执行队列配置，每个进程内的执行队列，超过并发数的运行排队执行
+_run_queue_config = {
+    "max_workers": 10,  # 同时执行的运行数
+    "max_queue_size": 200,  # 最多排队的运行数，超过则拒绝新的运行
+    "project_max_running": 5,  # 同一个服务同时执行的运行数
+    "user_max_running": 3  # 同一个用户同时执行的运行数
+}
+
+# 用例维度并行执行（is_async）的配置，用例在线程池中执行
+_parallel_run_config = {
+    "max_workers": 5,  # 默认的并行数，可在运行时指定
+    "limit": 20  # 运行时指定的并行数的上限
+}
+
+# 测试报告进度推送配置，报告进度保存在进程内存中，由执行线程推送，查询进度不再查数据库
+_report_event_config = {
+    "keep_time": 600,  # 批次下的报告全部生成后，进度在内存中保留的时间（秒）
+    "max_keep_time": 86400,  # 批次登记后在内存中保留的最长时间（秒），没有全部生成的（如执行进程中途退出）也会清除
+    "check_time": 60,  # 批次没有全部生成、且超过这个时间（秒）进度没有变化时，用数据库中的进度校正（其他进程中修改的进度）
+    "heartbeat": 15  # server-sent events 心跳间隔（秒），没有进度变化时发送心跳，避免连接被代理断开
+}
+
+# 配置表（config_config）的进程内缓存配置，修改配置时更新版本文件，各个进程检查到版本变化后重新加载
+_config_cache_config = {
+    "check_interval": 1,  # 检查版本文件的间隔（秒）
+    "time_out": 300  # 缓存的最长有效时间（秒），超过则重新加载，兜底直接改数据库的情况
+}
+
+# 请求身份校验时，已校验通过的token的进程内缓存配置，同一个token只解码一次，命中缓存时仍按token的过期时间判断
+_token_cache_config = {
+    "max_size": 10000  # 每个进程最多缓存的token数，超过则淘汰最久没有使用的
+}
+
+# 日志写入配置，队列模式下打日志只放入队列，由每个进程的后台线程批量写入文件，不再每条日志都加文件锁
+_log_config = {
+    "mode": "queue",  # queue：队列模式，sync：每条日志加锁后直接写入文件
+    "queue_size": 10000,  # 每个进程的日志队列大小
+    "batch_size": 500,  # 每批最多写入的日志条数
+    "block_time": 1,  # 队列满了时，介于 drop_level 和 block_level 之间的日志最多等待的时间（秒），超时则丢弃
+    "drop_level": "DEBUG",  # 队列满了时，低于等于这个级别的日志直接丢弃
+    "block_level": "ERROR",  # 队列满了时，高于等于这个级别的日志一直等待，不丢弃
+    "flush_time_out": 10  # 进程退出时等待队列中的日志写完的最长时间（秒）
+}
+
+# 用户操作记录配置，增删改的请求先放入进程内的队列，由后台线程批量写入数据库，请求不等待写库
+_user_operation_log_config = {
+    "queue_size": 10000,  # 每个进程最多缓冲的记录数，满了则丢弃新的记录，不阻塞请求
+    "batch_size": 200,  # 每条插入语句最多插入的记录数
+    "max_delay": 2,  # 最早一条待写入的记录等待超过这个时间（秒）时写入
+    "flush_time_out": 10,  # 进程退出时等待缓冲的记录写完的最长时间（秒）
+    "max_body_length": 5000,  # 请求参数序列化后超过这个长度则截断
+    "sensitive_keys": ["password", "pwd", "token", "secret", "cookie", "authorization"]  # 字段名包含这些则脱敏
+}
+
+# 接口响应的序列化和响应日志配置
+_response_config = {
+    "stream_min_items": 1000,  # 响应数据中的列表达到这个条数时，分块流式返回，不在内存中拼接完整的响应体
+    "stream_chunk_items": 200,  # 流式返回时每块序列化的条数
+    "log_max_length": 5000,  # 日志中响应体的最大长度，超过则截断，0为不截断
+    "log_sample_rate": 1  # 处理成功的响应打印响应体的比例（0~1），处理失败的响应都会打印
+}
+
 platform_name = "极测平台"  # 测试平台名字
 is_linux = platform.platform().startswith('Linux')
 # 从 testRunner.built_in 中获取断言方式并映射为字典和列表，分别给前端和运行测试用例时反射断言
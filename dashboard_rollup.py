@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+接口自动化首页统计汇总表回填
+新建汇总表（数据库迁移）后执行一次，按业务表全量重算汇总数据，之后由数据增删改增量维护、定时任务 cron_dashboard_rollup 对账
+
+全部回填:
+    python dashboard_rollup.py
+只回填指定数据:
+    python dashboard_rollup.py --models report case
+"""
+import argparse
+
+from apps import create_app
+from apps.api_test.model_factory import ApiDashboardRollup
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="接口自动化首页统计汇总表回填")
+    parser.add_argument(
+        "--models", nargs="+", choices=list(ApiDashboardRollup.rollup_model_dict.keys()),
+        default=list(ApiDashboardRollup.rollup_model_dict.keys()), help="要回填的数据类型")
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    with create_app().app_context():
+        for model_name in args.models:
+            change_count = ApiDashboardRollup.rebuild([model_name])
+            print(f'{model_name}: 更新了 {change_count} 行汇总数据')
+
+
+if __name__ == "__main__":
+    main()
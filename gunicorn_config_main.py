@@ -12,3 +12,17 @@ workers = multiprocessing.cpu_count() * 2 + 1  # 启动的进程数，cpu个数
 worker_class = 'gevent'  # 使用gevent模式，还可以使用sync 模式，默认的是sync模式
 threads = 20  # 每个进程开启的线程数
 x_forwarded_for_header = 'X_FORWARDED-FOR'
+
+
+def post_worker_init(worker):
+    """ worker启动后，启动通知发送线程，发送之前没发送完的通知 """
+    from utils.message.notification import notification_sender
+    notification_sender.start(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    """ worker退出时，把缓冲的用户操作记录写入数据库，停止通知发送线程 """
+    from apps.system.models.user_operation_log import user_operation_log_writer
+    from utils.message.notification import notification_sender
+    user_operation_log_writer.close()
+    notification_sender.close()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+测试报告归档
+把执行完毕较久的报告的用例、步骤数据压缩后移到归档表，新建归档表（数据库迁移）后可在后台反复执行，把存量报告分批归档，
+每次执行处理的报告数有上限，已归档的报告会跳过，中断后再次执行即可继续，之后由定时任务 cron_archive_report 每天归档
+
+按默认配置归档所有类型的报告:
+    python report_archive.py
+只统计要归档的报告和数据条数，不归档:
+    python report_archive.py --dry-run
+归档执行完毕超过30天的接口测试报告，每次200个，直到全部归档完:
+    python report_archive.py --types api --days 30 --limit 200 --loop
+"""
+import argparse
+
+from apps import create_app
+from apps.api_test.model_factory import ApiReport, ApiReportCase, ApiReportStep
+from apps.ui_test.model_factory import WebUiReport, WebUiReportCase, WebUiReportStep
+from apps.app_test.model_factory import AppUiReport, AppUiReportCase, AppUiReportStep
+from config import _report_archive_config
+from utils.client.report_archive import ReportArchiver
+
+REPORT_MODEL_DICT = {
+    "api": (ApiReport, ApiReportCase, ApiReportStep),
+    "ui": (WebUiReport, WebUiReportCase, WebUiReportStep),
+    "app": (AppUiReport, AppUiReportCase, AppUiReportStep)
+}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="测试报告归档")
+    parser.add_argument(
+        "--types", nargs="+", choices=list(REPORT_MODEL_DICT.keys()), default=list(REPORT_MODEL_DICT.keys()),
+        help="要归档的报告类型")
+    parser.add_argument(
+        "--days", type=int, default=_report_archive_config["archive_days"], help="归档执行完毕超过这个天数的报告")
+    parser.add_argument(
+        "--limit", type=int, default=_report_archive_config["max_report_per_run"], help="每次最多归档的报告数，0为不限")
+    parser.add_argument(
+        "--pause", type=float, default=_report_archive_config["report_pause"], help="每归档一个报告之后暂停的秒数")
+    parser.add_argument("--loop", action="store_true", help="每次归档 limit 个报告，直到全部归档完")
+    parser.add_argument("--dry-run", action="store_true", help="只统计要归档的报告和数据条数，不归档")
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    with create_app().app_context():
+        for report_type in args.types:
+            while True:
+                result = ReportArchiver(
+                    *REPORT_MODEL_DICT[report_type], archive_days=args.days, max_report_per_run=args.limit,
+                    report_pause=args.pause, dry_run=args.dry_run).run()
+                print(f'{report_type}: {result}')
+                if result["is_finish"] or not args.loop or args.dry_run:
+                    break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app():
+    """ 在临时目录新建sqlite库并建表，整个测试过程共用一个应用 """
+    from utils.benchmark.bench import init_db_config
+    init_db_config(f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="test_"), "test.db")}')
+
+    from apps import create_app
+    from utils.benchmark.seed import create_tables
+    test_app = create_app()
+    with test_app.app_context():
+        create_tables()
+    return test_app
+
+
+@pytest.fixture(scope="session")
+def seed_result(app):
+    """ 接口自动化的数据：每条用例引用一条公共用例，再加 step_count 个接口步骤，见 utils.benchmark.seed.seed_data """
+    from utils.benchmark.seed import seed_data
+    with app.app_context():
+        result = seed_data("http://127.0.0.1:1", project_count=2, api_count=10, case_count=6, step_count=8)
+    return {**result, "step_count": 8}
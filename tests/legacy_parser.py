@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+改造前（编译模板之前）的 parse_data，原样冻结自基线提交 9a77021 的 utils/client/test_runner/parser.py，
+只保留 parse_data 用到的函数，相对导入改为绝对导入，作为编译模板差异对比的基准，不要修改
+"""
+import ast
+import re
+
+from utils.client.test_runner import exceptions, utils
+from utils.client.test_runner.compat import basestring, builtin_str, numeric_types
+from utils.client.test_runner.validate_func import load_builtin_functions
+from utils.variables.regexp import variable_regexp, function_regexp, function_regexp_compile
+
+
+def parse_string_value(str_value):
+    """ 把能转成数字的字符串转成数字
+    "123" => 123
+    "12.2" => 12.3
+    "abc" => "abc"
+    "$var" => "$var"
+    """
+    try:
+        return str_value if '-' in str_value else ast.literal_eval(str_value)
+    except (ValueError, SyntaxError):
+        return str_value
+
+
+def extract_variables(content):
+    """ 从content中提取所有变量名为$variable的变量
+    Args:
+        content (str): 字符串
+    Returns:
+        extract_variables("$variable") >> ["variable"]
+        extract_variables("/blog/$postid") >> ["postid"]
+        extract_variables("/$var1/$var2") >> ["var1", "var2"]
+        extract_variables("abc") >> []
+    """
+    try:
+        return re.findall(variable_regexp, content)
+    except TypeError:
+        return []
+
+
+def extract_functions(content):
+    """ 从content中提取所有变量名为${fun()}的函数
+    Args:
+        content (str): 字符串
+    Returns:
+        extract_functions("${func(5)}") >>> ["func(5)"]
+        extract_functions("${func(a=1, b=2)}") >>> ["func(a=1, b=2)"]
+        extract_functions("/api/1000?_t=${get_timestamp()}") >>> ["get_timestamp()"]
+        extract_functions("/api/${add(1, 2)}") >>> ["add(1, 2)"]
+        extract_functions("/api/${add(1, 2)}?_t=${get_timestamp()}") >>> ["add(1, 2)", "get_timestamp()"]
+    """
+    try:
+        return re.findall(function_regexp, content)
+    except TypeError:
+        return []
+
+
+def parse_function(content):
+    """ 从字符串内容中解析函数名和参数。
+    Args:
+        content (str): 字符串
+    Returns:
+        parse_function("func()") >>> {'func_name': 'func', 'args': [], 'kwargs': {}}
+        parse_function("func(5)") >>> {'func_name': 'func', 'args': [5], 'kwargs': {}}
+        parse_function("func(1, 2)") >>> {'func_name': 'func', 'args': [1, 2], 'kwargs': {}}
+        parse_function("func(a=1, b=2)") >>> {'func_name': 'func', 'args': [], 'kwargs': {'a': 1, 'b': 2}}
+        parse_function("func(1, 2, a=3, b=4)") >>> {'func_name': 'func', 'args': [1, 2], 'kwargs': {'a':3, 'b':4}}
+    """
+    matched = function_regexp_compile.match(content)
+    if not matched:
+        raise exceptions.FunctionNotFound("{} not found!".format(content))
+    function_meta = {"func_name": matched.group(1), "args": [], "kwargs": {}}
+    args_str = matched.group(2).strip()
+    if args_str == "":
+        return function_meta
+    args_list = args_str.split(',')
+    for arg in args_list:
+        arg = arg.strip()
+        if '=' in arg:
+            key, value = arg.split('=')
+            function_meta["kwargs"][key.strip()] = parse_string_value(value.strip())
+        else:
+            function_meta["args"].append(parse_string_value(arg))
+
+    return function_meta
+
+
+
+def get_mapping_variable(variable_name, variables_mapping):
+    """ 从变量映射中获取变量值
+
+    Args:
+        variable_name (str): variable name
+        variables_mapping (dict): variables mapping
+    Returns:
+        映射变量的值
+    Raises:
+        exceptions.VariableNotFound: 找不到变量
+    """
+    try:
+        return variables_mapping[variable_name]
+    except KeyError:
+        raise exceptions.VariableNotFound(f"引用的变量 【{variable_name}】 没有找到")
+
+
+def get_mapping_function(function_name, functions_mapping):
+    """ get function from functions_mapping,
+        if not found, then try to check if builtin function.
+
+    Args:
+        variable_name (str): variable name
+        variables_mapping (dict): variables mapping
+
+    Returns:
+        mapping function object.
+
+    Raises:
+        exceptions.FunctionNotFound: function is neither defined in debugtalk.py nor builtin.
+
+    """
+    if function_name in functions_mapping:
+        return functions_mapping[function_name]
+
+    try:
+        # check if TestRunner builtin functions
+        # from . import loader
+        # built_in_functions = loader.load_builtin_functions()
+        built_in_functions = load_builtin_functions()
+        return built_in_functions[function_name]
+    except KeyError:
+        pass
+
+    try:
+        # check if Python builtin functions
+        item_func = eval(function_name)
+        if callable(item_func):
+            # is builtin function
+            return item_func
+    except (NameError, TypeError):
+        # is not builtin function
+        raise exceptions.FunctionNotFound(f"自定义函数 【{function_name}】 没有找到")
+
+
+def parse_string_functions(content, variables_mapping, functions_mapping):
+    """ 映射字符串中的函数
+    Args:
+        content (str): "abc${add_one(3)}def"
+        variables_mapping (dict): 变量字典
+        functions_mapping (dict): {"add_one": lambda x: x + 1}
+    Returns:
+        parse_string_functions(content, functions_mapping) >>> "abc4def"
+    """
+    functions_list = extract_functions(content)
+    for func_content in functions_list:
+        function_meta = parse_function(func_content)
+        func_name = function_meta["func_name"]
+
+        args = function_meta.get("args", [])
+        kwargs = function_meta.get("kwargs", {})
+        args = parse_data(args, variables_mapping, functions_mapping)
+        kwargs = parse_data(kwargs, variables_mapping, functions_mapping)
+
+        func = get_mapping_function(func_name, functions_mapping)
+        # eval_value = func(*args, **kwargs)
+        # 执行自定义函数，有可能会报错
+        try:
+            eval_value = func(*args, **kwargs)
+        except Exception as error:
+            # 记录错误信息
+            # FuncErrorRecord.create(
+            #     name='执行自定义函数错误',
+            #     detail=f'执行自定义函数【{func_name}】报错了 \n  args参数: {args} \n  kwargs参数: {kwargs} \n\n  '
+            #            f'错误信息: \n{traceback.format_exc()}'
+            # )
+            #
+            # # 发送自定义函数执行错误的信息
+            # send_run_func_error_message(content={
+            #     "title": "执行自定义函数错误",
+            #     "detail": f'### {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} \n> '
+            #               f'### 执行自定义函数【{func_name}】报错了 \n  args参数: {args} \n  kwargs参数: {kwargs} \n  '
+            #               f'### 错误信息: {traceback.format_exc()} \n> '
+            # })
+            raise
+
+        func_content = "${" + func_content + "}"
+        if func_content == content:
+            # content is a function, e.g. "${add_one(3)}"
+            content = eval_value
+        else:
+            # content contains one or many functions, e.g. "abc${add_one(3)}def"
+            content = content.replace(
+                func_content,
+                str(eval_value), 1
+            )
+
+    return content
+
+
+def parse_string_variables(content, variables_mapping, functions_mapping):
+    """ 从字符串中，解析引用变量
+
+    Args:
+        content (str): string content to be parsed.
+        variables_mapping (dict): variables mapping.
+
+    Returns:
+        str: parsed string content.
+
+    Examples:
+        >>> content = "/api/users/$uid"
+        >>> variables_mapping = {"$uid": 1000}
+        >>> parse_string_variables(content, variables_mapping, {})
+            "/api/users/1000"
+
+    """
+    variables_list = extract_variables(content)
+    for variable_name in variables_list:
+        variable_value = get_mapping_variable(variable_name, variables_mapping)
+
+        if variable_name == "request" and isinstance(variable_value, dict) \
+                and "url" in variable_value and "method" in variable_value:
+            # call setup_hooks action with $request
+            for key, value in variable_value.items():
+                variable_value[key] = parse_data(
+                    value,
+                    variables_mapping,
+                    functions_mapping
+                )
+            parsed_variable_value = variable_value
+        elif "${}".format(variable_name) == variable_value:
+            # variable_name = "token"
+            # variables_mapping = {"token": "$token"}
+            parsed_variable_value = variable_value
+        else:
+            parsed_variable_value = parse_data(
+                variable_value,
+                variables_mapping,
+                functions_mapping,
+                raise_if_variable_not_found=False
+            )
+            variables_mapping[variable_name] = parsed_variable_value
+        # TODO: replace variable label from $var to {{var}}
+        if "${}".format(variable_name) == content:
+            # content is a variable
+            content = parsed_variable_value
+        else:
+            # content contains one or several variables
+            if not isinstance(parsed_variable_value, str):
+                parsed_variable_value = builtin_str(parsed_variable_value)
+
+            content = content.replace(
+                "${}".format(variable_name),
+                parsed_variable_value, 1
+            )
+
+    return content
+
+
+def parse_data(content, variables_mapping=None, functions_mapping=None, raise_if_variable_not_found=True):
+    """ 用变量映射解析内容
+    Args:
+        content (str/dict/list/numeric/bool/type): 要解析的内容
+        variables_mapping (dict): 变量映射
+        functions_mapping (dict): 方法映射
+        raise_if_variable_not_found (bool): 如果设置为False，则在发生VariableNotFound异常时不会抛出。
+    Returns:
+        解析后的内容
+
+    Examples:
+        >>> content = {
+                'request': {
+                    'url': '/api/users/$uid',
+                    'headers': {'token': '$token'}
+                }
+            }
+        >>> variables_mapping = {"uid": 1000, "token": "abcdef"}
+        >>> parse_data(content, variables_mapping)
+            {
+                'request': {
+                    'url': '/api/users/1000',
+                    'headers': {'token': 'abcdef'}
+                }
+            }
+
+    """
+    if content is None or isinstance(content, (numeric_types, bool, type)):
+        return content
+
+    if isinstance(content, (list, set, tuple)):
+        return [
+            parse_data(
+                item,
+                variables_mapping,
+                functions_mapping,
+                raise_if_variable_not_found
+            )
+            for item in content
+        ]
+
+    if isinstance(content, dict):
+        parsed_content = {}
+        for key, value in content.items():
+            parsed_key = parse_data(
+                key,
+                variables_mapping,
+                functions_mapping,
+                raise_if_variable_not_found
+            )
+            parsed_value = parse_data(
+                value,
+                variables_mapping,
+                functions_mapping,
+                raise_if_variable_not_found
+            )
+            parsed_content[parsed_key] = parsed_value
+
+        return parsed_content
+
+    if isinstance(content, basestring):
+        # content is in string format here
+        variables_mapping = utils.list_to_dict(variables_mapping or {})
+        functions_mapping = functions_mapping or {}
+        content = content.strip()
+
+        try:
+            # 提取并执行自定义函数
+            content = parse_string_functions(content, variables_mapping, functions_mapping)
+
+            # 用公用变量替换字符串中的占位符
+            content = parse_string_variables(content, variables_mapping, functions_mapping)
+        except exceptions.VariableNotFound:
+            if raise_if_variable_not_found:
+                raise
+
+    return content
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from apps.api_test.model_factory import ApiCase, ApiStep, ApiMsg
+
+
+def get_use_count(api_id_list):
+    """ {接口id: 使用次数} """
+    return dict(ApiMsg.db.session.query(ApiMsg.id, ApiMsg.use_count).filter(ApiMsg.id.in_(api_id_list)).all())
+
+
+def assert_use_count_matches_recount(api_id_list, expect_dict):
+    """ 增量维护的使用次数和预期的一致，且全量重算时没有要修正的接口 """
+    assert get_use_count(api_id_list) == expect_dict
+    assert ApiMsg.refresh_use_count(ApiStep) == 0
+    assert get_use_count(api_id_list) == expect_dict
+
+
+def test_incremental_use_count_matches_recount(app, seed_result):
+    """ 步骤新增、删除、修改引用的接口、批量删除后，增量维护的接口使用次数和全量重算的一致 """
+    with app.app_context():
+        ApiMsg.refresh_use_count(ApiStep)
+        api_id_list = [
+            ApiMsg.model_create_and_get({
+                "name": f'use_count{index}', "project_id": seed_result["project_id"], "module_id": 1,
+                "addr": f'/use-count/{index}', "method": "GET"
+            }).id for index in range(3)
+        ]
+        api_1, api_2, api_3 = api_id_list
+        case_id = ApiCase.model_create_and_get(
+            {"name": "use_count", "desc": "use_count", "suite_id": 1}).id
+        assert_use_count_matches_recount(api_id_list, {api_1: 0, api_2: 0, api_3: 0})
+
+        # 新增
+        step_list = [
+            ApiStep.model_create_and_get({"name": "use_count", "case_id": case_id, "api_id": api_id})
+            for api_id in [api_1, api_1, api_2, api_2, api_3]
+        ]
+        assert_use_count_matches_recount(api_id_list, {api_1: 2, api_2: 2, api_3: 1})
+
+        # 删除单条
+        step_list[0].delete()
+        assert_use_count_matches_recount(api_id_list, {api_1: 1, api_2: 2, api_3: 1})
+
+        # 修改引用的接口
+        step_list[2].model_update({"api_id": api_3})
+        assert_use_count_matches_recount(api_id_list, {api_1: 1, api_2: 1, api_3: 2})
+
+        # 批量删除
+        ApiStep.query.filter(ApiStep.case_id == case_id, ApiStep.api_id.in_([api_2, api_3])).delete()
+        assert_use_count_matches_recount(api_id_list, {api_1: 1, api_2: 0, api_3: 0})
+        ApiStep.delete_by_id([step_list[1].id])
+        assert_use_count_matches_recount(api_id_list, {api_1: 0, api_2: 0, api_3: 0})
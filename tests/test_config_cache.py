@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import threading
+
+from utils.util.config_cache import ConfigCache
+
+
+def read_value(value_file):
+    """ 模拟从数据库加载配置 """
+    with open(value_file, "r", encoding="utf-8") as file:
+        return {"value": file.read()}
+
+
+def run_child(version_file, value_file, loaded_event, changed_event, result_queue):
+    """ 子进程（另一个worker）：先加载一次，等父进程修改配置后再取 """
+    cache = ConfigCache(version_file, check_interval=0, time_out=300)
+    result_queue.put(cache.get_all(lambda: read_value(value_file))["value"])
+    loaded_event.set()
+    changed_event.wait(10)
+    result_queue.put(cache.get_all(lambda: read_value(value_file))["value"])
+
+
+def test_change_version_invalidates_other_process(tmp_path):
+    """ 父进程修改配置并更新版本文件，已缓存旧值的子进程检查到版本变化后取到新值 """
+    version_file, value_file = str(tmp_path / "config_version"), str(tmp_path / "config_value")
+    with open(value_file, "w", encoding="utf-8") as file:
+        file.write("old")
+
+    context = multiprocessing.get_context("fork")  # 和 gunicorn 一样，worker 是 fork 出来的
+    loaded_event, changed_event, result_queue = context.Event(), context.Event(), context.Queue()
+    child = context.Process(
+        target=run_child, args=(version_file, value_file, loaded_event, changed_event, result_queue))
+    child.start()
+    try:
+        assert result_queue.get(timeout=10) == "old"
+        assert loaded_event.wait(10)
+
+        with open(value_file, "w", encoding="utf-8") as file:
+            file.write("new")
+        ConfigCache(version_file).change_version()
+        changed_event.set()
+
+        assert result_queue.get(timeout=10) == "new"
+    finally:
+        child.join(10)
+    assert child.exitcode == 0
+
+
+def test_cache_is_kept_until_version_changes(tmp_path):
+    """ 版本没变时直接读内存，多个线程同时加载时只查一次 """
+    version_file, load_count = str(tmp_path / "config_version"), []
+    cache = ConfigCache(version_file, check_interval=0, time_out=300)
+
+    def loader():
+        load_count.append(1)
+        return {"value": len(load_count)}
+
+    thread_list = [threading.Thread(target=cache.get_all, args=(loader,)) for _ in range(20)]
+    [thread.start() for thread in thread_list]
+    [thread.join() for thread in thread_list]
+    assert cache.get_all(loader) == {"value": 1} and len(load_count) == 1
+
+    cache.change_version()
+    assert cache.get_all(loader) == {"value": 2}
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import update
+
+from apps.base_model import db
+from apps.api_test.model_factory import ApiReport, ApiCase, ApiStep, ApiMsg, ApiCaseSuite
+from apps.api_test.models.dashboard import ApiDashboardRollup
+
+
+def get_rollup_count(model_name_list):
+    """ 汇总表中数据数不为0的行，增量维护时减到0的行会保留，全量重算时才删除 """
+    return {
+        tuple(getattr(rollup, column) for column in ApiDashboardRollup.key_column_list): rollup.data_count
+        for rollup in ApiDashboardRollup.query.filter(
+            ApiDashboardRollup.model_name.in_(model_name_list), ApiDashboardRollup.data_count != 0).all()
+    }
+
+
+def assert_rollup_matches_rebuild(model_name_list=("api", "case", "step", "report")):
+    """ 增量维护的汇总数据和全量重算的一致 """
+    rollup_count = get_rollup_count(model_name_list)
+    ApiDashboardRollup.rebuild()
+    assert get_rollup_count(model_name_list) == rollup_count
+
+
+def test_bulk_update_keeps_rollup_in_sync(app, seed_result):
+    """ 批量修改（query.update、按主键批量修改、直接执行sql修改接口使用次数）后，汇总数据和全量重算的一致 """
+    with app.app_context():
+        assert_rollup_matches_rebuild()
+
+        # 报告创建时默认通过，执行完再用 query.update 改为不通过
+        report = ApiReport.get_new_report(
+            project_id=seed_result["project_id"], batch_id="rollup", trigger_id=[], name="rollup", run_type="api",
+            env="test", trigger_type="page")
+        report.update_report_result("fail")
+        assert_rollup_matches_rebuild()
+
+        # 新建用例和步骤来修改，不影响其他测试用的数据
+        suite_id = ApiCase.get_first(id=seed_result["case_id_list"][0]).suite_id
+        case_id_list = [
+            ApiCase.model_create_and_get({"name": f'rollup{index}', "desc": "rollup", "suite_id": suite_id}).id
+            for index in range(6)
+        ]
+        for index, case_id in enumerate(case_id_list):
+            ApiStep.model_create({"name": "rollup", "case_id": case_id, "api_id": seed_result["api_id_list"][index]})
+        assert_rollup_matches_rebuild()
+        ApiCase.query.filter(ApiCase.id.in_(case_id_list[:3])).update({"status": 3})
+        suite = ApiCaseSuite.model_create_and_get(
+            {"name": "rollup", "project_id": seed_result["project_id"] + 1, "suite_type": "process"})
+        ApiCase.query.filter(ApiCase.id.in_(case_id_list[3:])).update({ApiCase.suite_id: suite.id})
+        # 用例换了用例集，步骤跟着换服务属于上级数据修改，不增量维护，由全量对账修正
+        assert_rollup_matches_rebuild(["case"])
+        ApiStep.query.filter(ApiStep.case_id == case_id_list[0]).update({"status": 0})
+        assert_rollup_matches_rebuild()
+
+        # 接口使用次数从0变为非0（新增步骤），再变回0（删除步骤、批量删除步骤）
+        api_id = ApiMsg.model_create_and_get({
+            "name": "rollup", "project_id": seed_result["project_id"], "module_id": 1, "addr": "/rollup",
+            "method": "POST"}).id
+        step = ApiStep.model_create_and_get(
+            {"name": "rollup", "case_id": case_id_list[0], "api_id": api_id})
+        assert_rollup_matches_rebuild()
+        step.delete()
+        assert_rollup_matches_rebuild()
+        ApiStep.model_create({"name": "rollup", "case_id": case_id_list[0], "api_id": api_id})
+        ApiStep.query.filter(ApiStep.api_id == api_id).delete()
+        assert_rollup_matches_rebuild()
+
+        # 按主键批量修改、全量重算使用次数
+        db.session.execute(update(ApiMsg), [{"id": api_id, "use_count": 0} for api_id in seed_result["api_id_list"]])
+        assert_rollup_matches_rebuild()
+        assert ApiMsg.refresh_use_count(ApiStep) > 0
+        assert_rollup_matches_rebuild()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from utils.client.test_runner.client.driver_pool import DriverPool
+
+APPIUM_CONFIG = {"host": "127.0.0.1", "port": 4723, "deviceName": "device"}
+
+
+class FakeAppiumDriver:
+    """ 模拟 appium 的 driver，记录调用，可以设置健康检查、重置失败 """
+
+    def __init__(self):
+        self.is_quit, self.is_broken, self.reset_fail, self.reset_count = False, False, False, 0
+
+    def get_window_size(self):
+        if self.is_broken or self.is_quit:
+            raise RuntimeError("会话已失效")
+        return {"width": 1, "height": 1}
+
+    def close_app(self):
+        if self.reset_fail:
+            raise RuntimeError("重置失败")
+
+    def launch_app(self):
+        self.reset_count += 1
+
+    def quit(self):
+        self.is_quit = True
+
+
+class FakeAppDriver:
+    """ 模拟 GetAppDriver，真正的 driver 在 .driver 上 """
+
+    def __init__(self, **appium_config):
+        self.driver = FakeAppiumDriver()
+
+
+@pytest.fixture
+def new_driver_list(monkeypatch):
+    """ 不启动 appium 会话，记录新建的会话 """
+    new_driver_list = []
+
+    def new_driver(run_type, browser_driver_path=None, browser_name=None, appium_config={}):
+        new_driver_list.append(FakeAppDriver(**appium_config))
+        return new_driver_list[-1]
+
+    monkeypatch.setattr(DriverPool, "new_driver", staticmethod(new_driver))
+    return new_driver_list
+
+
+def test_reuse_hit_and_miss(new_driver_list):
+    """ 放回的会话重置后复用，不同设备、超出池大小的新建，超出池大小的用完即关闭 """
+    pool = DriverPool(pool_size=1, max_reuse_count=10)
+    driver = pool.acquire("app", appium_config=APPIUM_CONFIG)
+    overflow_driver = pool.acquire("app", appium_config=APPIUM_CONFIG)
+    pool.release(driver, APPIUM_CONFIG)
+    pool.release(overflow_driver, APPIUM_CONFIG)
+    assert driver.driver.reset_count == 1 and not driver.driver.is_quit
+    assert overflow_driver.driver.is_quit
+
+    assert pool.acquire("app", appium_config=APPIUM_CONFIG) is driver
+    other_driver = pool.acquire("app", appium_config={**APPIUM_CONFIG, "deviceName": "other"})
+    assert other_driver is not driver and len(new_driver_list) == 3
+    stat = pool.close()
+    assert stat["acquire"] == 4 and stat["hit"] == 1 and stat["new_driver"] == 3 and stat["overflow"] == 1
+
+
+def test_broken_recycle_and_reset_fail_quit(new_driver_list):
+    """ 健康检查不通过、达到使用次数上限、重置失败的会话都关闭，不再放回池中 """
+    pool = DriverPool(pool_size=1, max_reuse_count=2)
+    driver = pool.acquire("app", appium_config=APPIUM_CONFIG)
+    pool.release(driver, APPIUM_CONFIG)
+    driver.driver.is_broken = True
+    new_driver = pool.acquire("app", appium_config=APPIUM_CONFIG)
+    assert new_driver is not driver and driver.driver.is_quit
+
+    new_driver.driver.reset_fail = True
+    pool.release(new_driver, APPIUM_CONFIG)
+    assert new_driver.driver.is_quit and not pool.idle_dict.get(pool.get_driver_key("app", None, APPIUM_CONFIG))
+
+    driver = pool.acquire("app", appium_config=APPIUM_CONFIG)
+    pool.release(driver, APPIUM_CONFIG)
+    assert pool.acquire("app", appium_config=APPIUM_CONFIG) is driver
+    pool.release(driver, APPIUM_CONFIG)
+    assert driver.driver.is_quit
+    stat = pool.close()
+    assert stat["broken"] == 1 and stat["reset_fail"] == 1 and stat["recycle"] == 1
+
+
+def test_close_quit_driver_in_use(new_driver_list):
+    """ 用例执行异常没有放回的会话，关闭会话池时也关闭，之后再放回直接关闭 """
+    pool = DriverPool(pool_size=2, max_reuse_count=10)
+    idle_driver = pool.acquire("app", appium_config=APPIUM_CONFIG)
+    in_use_driver = pool.acquire("app", appium_config=APPIUM_CONFIG)
+    pool.release(idle_driver, APPIUM_CONFIG)
+
+    pool.close()
+    assert idle_driver.driver.is_quit and in_use_driver.driver.is_quit
+    assert pool.idle_dict == {} and pool.driver_dict == {}
+    pool.release(in_use_driver, APPIUM_CONFIG)
+    assert pool.idle_dict == {}
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from apps.system.models.notification import Notification
+from utils.message.notification import NotificationSender
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    """ 本地的 webhook 桩服务：/ok 成功，/errcode 返回钉钉的错误码，/error 返回500，记录收到的请求 """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.request_list.append((self.path.split("?")[0], body))
+        status, data = {
+            "/ok": (200, {"errcode": 0}), "/errcode": (200, {"errcode": 310000, "errmsg": "sign not match"})
+        }.get(self.path.split("?")[0], (500, {"message": "error"}))
+        content = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWebhookHandler)
+    server.request_list = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.host = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sender(app):
+    """ 不启动发送线程，测试里手动认领、发送 """
+    with app.app_context():
+        Notification.query.delete()
+        yield NotificationSender(retry_times=2, retry_backoff=10, max_backoff=15, rate_limit_per_minute=0)
+
+
+def send_once(sender):
+    """ 认领一组到期的通知并发送，返回认领到的通知数 """
+    data_list = Notification.claim("test", sender.config["max_coalesce"])
+    if data_list:
+        sender.send(data_list)
+    return len(data_list)
+
+
+def text_msg(content):
+    return {"msgtype": "text", "text": {"content": content}}
+
+
+def test_coalesce_signed_webhook(stub_server, sender):
+    """ 同一个webhook每次加签的地址不同，合并成一条发送，用最后一条的地址 """
+    for index in range(5):
+        Notification.add("webhook", f'{stub_server.host}/ok?timestamp={index}&sign=s{index}', text_msg(f'消息{index}'))
+    assert send_once(sender) == 5
+    assert send_once(sender) == 0
+    assert len(stub_server.request_list) == 1
+    path, body = stub_server.request_list[0]
+    assert body["text"]["content"].split("\n\n--------\n\n") == [f'消息{index}' for index in range(5)]
+    assert {data.status for data in Notification.query.all()} == {2}
+
+
+def test_retry_backoff_then_fail(stub_server, sender):
+    """ 发送失败按退避时间重试，等待时间翻倍且不超过 max_backoff，超过重试次数标记为发送失败 """
+    Notification.add("webhook", f'{stub_server.host}/errcode', text_msg("失败"))
+    wait_list = []
+    for _ in range(3):
+        assert send_once(sender) == 1
+        notification = Notification.query.first()
+        Notification.db.session.rollback()
+        if notification.status == 0:
+            wait_list.append(round((notification.next_run_time - datetime.now()).total_seconds()))
+            # 不真的等待，把下次发送时间改到现在
+            Notification.query.filter(Notification.id == notification.id).update({"next_run_time": datetime.now()})
+    assert wait_list == [10, 15]
+    notification = Notification.query.first()
+    assert notification.status == 3 and notification.retry_count == 2 and "310000" in notification.result
+    assert len(stub_server.request_list) == 3
+    assert send_once(sender) == 0
+
+
+def test_call_back_retry_on_server_error(stub_server, sender):
+    """ 回调响应 5xx 时按退避时间重试 """
+    Notification.add("call_back", f'{stub_server.host}/error', {"method": "POST", "url": f'{stub_server.host}/error'})
+    assert send_once(sender) == 1
+    notification = Notification.query.first()
+    assert notification.status == 0 and notification.retry_count == 1 and "500" in notification.result
+    assert len(stub_server.request_list) == 1
+
+
+def test_rate_limit_delay(stub_server, sender):
+    """ 超过每分钟的发送数时不发送，放回通知表，等到可以发送时再发送 """
+    sender.config["rate_limit_per_minute"] = 2
+    for index in range(3):  # 链接消息不合并，每次发送一条，其他的放回马上再发送
+        Notification.add("webhook", f'{stub_server.host}/ok', {"msgtype": "link", "link": {"title": f'{index}'}})
+    for _ in range(3):
+        send_once(sender)
+    assert [body["link"]["title"] for path, body in stub_server.request_list] == ["0", "1"]
+    waiting = Notification.query.filter(Notification.status == 0).one()
+    assert 50 < (waiting.next_run_time - datetime.now()).total_seconds() <= 60
+    assert waiting.retry_count == 0 and "频率超限" in waiting.result
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from tests.legacy_parser import parse_data as legacy_parse_data
+from utils.benchmark.parser import run_parser_diff
+from utils.client.test_runner.parser import parse_data
+
+
+def test_compiled_template_matches_legacy_parser():
+    """ 随机模板用编译模板和改造前的 parse_data 解析，结果、变量回写、函数调用都要一致 """
+    diff_list = run_parser_diff(legacy_parse_data, count=20000, seed=1)
+    assert diff_list == [], diff_list[:5]
+
+
+def test_whole_string_keeps_value_type():
+    variables_mapping, functions_mapping = {"uid": 1000, "ids": [1, 2]}, {"get_ids": lambda: [3]}
+    for content in ["$uid", "$ids", "${get_ids()}", "/api/$uid/${get_ids()}"]:
+        assert parse_data(content, dict(variables_mapping), functions_mapping) == \
+               legacy_parse_data(content, dict(variables_mapping), functions_mapping)
+    assert parse_data("$ids", variables_mapping, functions_mapping) == [1, 2]
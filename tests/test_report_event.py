@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import time
+
+from apps.api_test.model_factory import ApiReport
+from utils.client.report_event import report_event_bus
+
+
+def new_report(batch_id, process=0, status=1):
+    return ApiReport.get_new_report(
+        project_id=1, batch_id=batch_id, trigger_id=[], name="test", run_type="api", env="test", trigger_type="page",
+        process=process, status=status)
+
+
+def test_cancel_from_other_process_is_synced_to_bus(app):
+    """ 排队的报告在其他进程被取消（只改了数据库），执行时把数据库中的进度同步到当前进程的进度总线 """
+    with app.app_context():
+        report = new_report("batch_cancel")
+        ApiReport.query.filter_by(id=report.id).update({"process": 3, "status": 2, "is_passed": 0})
+
+        assert ApiReport.start_queued_report(report.id) is False
+        assert report_event_bus.get_batch(ApiReport.__tablename__, "batch_cancel")["reports"][report.id] == [3, 2]
+        assert ApiReport.select_is_all_done_by_batch_id("batch_cancel") is True
+
+
+def test_batch_done_in_other_process_is_seen(app):
+    """ 批次中另一个报告在其他进程被取消，当前进程的报告生成后判断批次全部生成，流推送也能结束 """
+    with app.app_context():
+        report_1, report_2 = new_report("batch_done"), new_report("batch_done")
+        ApiReport.start_queued_report(report_1.id)
+        ApiReport.query.filter_by(id=report_2.id).update({"process": 3, "status": 2})
+        report_1.update_report_process(process=3, status=2)
+
+        assert ApiReport.select_is_all_done_by_batch_id("batch_done") is True
+        assert report_event_bus.get_batch(ApiReport.__tablename__, "batch_done")["reports"][report_2.id] == [3, 2]
+
+
+def test_stale_batch_is_refreshed_from_db(app, monkeypatch):
+    """ 批次超过 check_time 没有变化时，查询进度、server-sent events 都会用数据库中的进度校正 """
+    monkeypatch.setattr(report_event_bus, "check_time", 0)
+    monkeypatch.setattr(report_event_bus, "heartbeat", 0.05)
+    with app.app_context():
+        report = new_report("batch_stale")
+        ApiReport.query.filter_by(id=report.id).update({"process": 2, "status": 1})
+        assert ApiReport.select_is_all_status_by_batch_id("batch_stale", [0, 1]) == {"process": 2, "status": 1}
+
+        stream = ApiReport.get_report_status_stream("batch_stale")
+        assert '"is_done": false' in next(stream)
+        ApiReport.query.filter_by(id=report.id).update({"process": 3, "status": 2})
+    event_list = list(stream)  # 心跳时校正，批次保存完毕后流结束
+    assert '"is_done": true' in event_list[-1]
+
+
+def test_purge_unfinished_batch_by_age(app, monkeypatch):
+    """ 没有全部生成的批次，登记后超过最长保留时间也会被清除 """
+    with app.app_context():
+        new_report("batch_old")
+    monkeypatch.setattr(report_event_bus, "max_keep_time", 0)
+    with report_event_bus.condition:
+        report_event_bus.purge(time.time() + 1)
+    assert report_event_bus.get_batch(ApiReport.__tablename__, "batch_old") is None
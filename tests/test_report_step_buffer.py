@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import insert, select
+
+from apps.base_model import ReportStepWriteBuffer
+from apps.api_test.model_factory import ApiReportStep
+
+
+def new_report_step_id_list(count):
+    db = ApiReportStep.db
+    with db.auto_commit():
+        return [db.session.execute(insert(ApiReportStep).values(
+            name="写缓冲", report_id=1, report_case_id=1, element_id=1, process="waite", result="waite", step_data={},
+            summary={})).inserted_primary_key[0] for _ in range(count)]
+
+
+def get_process(step_id_list):
+    return ApiReportStep.db.session.execute(select(ApiReportStep.process).where(
+        ApiReportStep.id.in_(step_id_list)).order_by(ApiReportStep.id)).scalars().all()
+
+
+def test_bad_row_is_split_out_and_dropped(app):
+    """ 整批写入失败时逐条写入，正常的步骤写入成功，写不进去的步骤重试 max_retry_times 次后丢弃 """
+    with app.app_context():
+        good_id, bad_id, later_id = new_report_step_id_list(3)
+        write_buffer = ReportStepWriteBuffer(max_size=100, max_delay=3600, max_retry_times=2)
+        write_buffer.add(ApiReportStep, good_id, {"process": "run"})
+        write_buffer.add(ApiReportStep, bad_id, {"process": object()})  # 数据写不进数据库
+
+        assert write_buffer.flush() is False
+        assert get_process([good_id, bad_id]) == ["run", "waite"]
+        assert list(write_buffer.pending) == [(ApiReportStep, bad_id)]
+
+        write_buffer.add(ApiReportStep, later_id, {"process": "validate"})
+        assert write_buffer.flush() is False
+        assert get_process([later_id]) == ["validate"]
+        assert write_buffer.pending == {} and write_buffer.fail_count_dict == {}
+        assert write_buffer.stat == {"flush": 2, "split": 2, "drop": 1}
+
+        assert write_buffer.flush() is True
+
+
+def test_failed_batch_keeps_newer_update(app):
+    """ 写入失败放回缓冲区时，写入期间又有更新的步骤以新的数据为准，成功写入后清除失败次数 """
+    with app.app_context():
+        step_id, = new_report_step_id_list(1)
+        write_buffer = ReportStepWriteBuffer(max_size=100, max_delay=3600, max_retry_times=3)
+        write_buffer.add(ApiReportStep, step_id, {"process": object(), "result": "running"})
+        assert write_buffer.flush() is False
+        assert write_buffer.fail_count_dict == {(ApiReportStep, step_id): 1}
+
+        write_buffer.add(ApiReportStep, step_id, {"process": "after"})
+        assert write_buffer.flush() is True
+        assert get_process([step_id]) == ["after"]
+        assert write_buffer.fail_count_dict == {}
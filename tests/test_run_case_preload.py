@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from apps.api_test.model_factory import ApiCase, ApiStep
+from apps.assist.model_factory import Script
+from utils.benchmark.metrics import SqlCounter
+from utils.client.run_api_test import RunCase
+
+
+def count_sql(func, *args):
+    counter = SqlCounter()
+    counter.start()
+    try:
+        func(*args)
+    finally:
+        counter.stop()
+    return counter.count
+
+
+def new_runner(seed_result, case_id_list):
+    """ 和 parse_and_run 一样，解析前先取脚本快照 """
+    runner = RunCase(report_id=None, case_id_list=case_id_list, env_code=seed_result["env_code"],
+                     env_name=seed_result["env_name"])
+    runner.script_dict = Script.get_script_snapshot()
+    return runner
+
+
+def test_preload_query_count_is_fixed(app, seed_result):
+    """ 预加载的查询数只和引用层级有关，和用例数、步骤数无关；预加载后解析步骤不再查库
+    2层引用（用例、公共用例）各查一次用例和步骤，再查用例集、接口、运行环境、服务、服务环境各一次
+    """
+    with app.app_context():
+        for case_id_list in [seed_result["case_id_list"][:1], seed_result["case_id_list"]]:
+            runner = new_runner(seed_result, case_id_list)
+            count = count_sql(runner.preload_case_data, case_id_list)
+            assert count["select"] == count["total"] == 9, count
+
+            count = count_sql(lambda: [runner.get_all_steps(case_id) for case_id in case_id_list])
+            assert count["total"] == 0, count
+            assert runner.count_step == len(case_id_list) * (seed_result["step_count"] + 1)
+
+
+def test_quote_cycle_raises_value_error(app, seed_result):
+    """ 用例互相引用时报循环引用，不会无限递归 """
+    with app.app_context():
+        case_fields = {"suite_id": 1, "run_times": 1, "desc": "循环引用", "skip_if": [], "variables": [], "headers": []}
+        case_1 = ApiCase.model_create_and_get({"name": "循环用例1", **case_fields})
+        case_2 = ApiCase.model_create_and_get({"name": "循环用例2", **case_fields})
+        ApiStep.model_create({"name": "引用用例2", "case_id": case_1.id, "quote_case": case_2.id, "project_id": 1})
+        ApiStep.model_create({"name": "引用用例1", "case_id": case_2.id, "quote_case": case_1.id, "project_id": 1})
+
+        runner = new_runner(seed_result, [case_1.id])
+        runner.preload_case_data([case_1.id])
+        with pytest.raises(ValueError, match="循环用例1 -> 循环用例2 -> 循环用例1"):
+            runner.get_all_steps(case_1.id)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from apps.busines import RunCaseBusiness
+from apps.api_test.model_factory import ApiReport
+from utils.client.run_queue import run_queue
+
+
+class FakeRunner:
+    """ 不真正执行，只占位放到执行队列 """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def parse_and_run(self):
+        pass
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    """ 不启动执行线程，放进队列的运行一直排队 """
+    monkeypatch.setattr(run_queue, "pending_list", [])
+    monkeypatch.setattr(run_queue, "start_worker", lambda: None)
+    return run_queue
+
+
+def run_env_list(batch_id, env_list):
+    for env_code in env_list:
+        RunCaseBusiness.run(
+            is_async=False, batch_id=batch_id, env_code=env_code, trigger_type="page", report_name="排队",
+            task_type="case", report_model=ApiReport, case_id_list=[], run_type="api", runner=FakeRunner, project_id=1)
+
+
+def test_queued_batch_status_with_queue_index(app, seed_result, queue):
+    """ 批次下有排队中的报告时，默认的查询状态也返回排队中，以及在当前进程的排队位置 """
+    with app.test_request_context():
+        run_env_list("queue_first", ["benchmark"])
+        run_env_list("queue_second", ["benchmark"])
+        assert ApiReport.select_is_all_status_by_batch_id("queue_second") == {
+            "process": 0, "status": 1, "queue_index": 2}
+
+        first_id = queue.pending_list[0]["report_id"]
+        queue.cancel(ApiReport, first_id)
+        ApiReport.get_first(id=first_id).cancel_queued_report()
+        assert ApiReport.select_is_all_status_by_batch_id("queue_second")["queue_index"] == 1
+        assert ApiReport.select_is_all_status_by_batch_id("queue_first") == {"process": 3, "status": 2}
+
+
+def test_queue_full_cancels_queued_env(app, seed_result, queue, monkeypatch):
+    """ 多个环境依次放入队列，后面的环境放不进去时，取消前面已经在排队的报告，不留下一直排队的报告 """
+    monkeypatch.setattr(queue, "max_queue_size", 1)
+    with app.test_request_context():
+        with pytest.raises(ValueError):
+            run_env_list("queue_full", ["benchmark", "benchmark"])
+        assert queue.pending_list == []
+        report_list = ApiReport.query.filter_by(batch_id="queue_full").all()
+        assert [(report.process, report.status) for report in report_list] == [(3, 2)]
+        assert ApiReport.select_is_all_done_by_batch_id("queue_full") is True
+
+
+def test_submit_error_cancels_report(app, seed_result, queue, monkeypatch):
+    """ 检查队列没满之后放入队列出错，报告取消，不会一直是排队中 """
+    def submit(**kwargs):
+        raise ValueError("当前排队执行的任务过多，请稍后再试")
+
+    monkeypatch.setattr(queue, "submit", submit)
+    with app.test_request_context():
+        with pytest.raises(ValueError):
+            run_env_list("queue_submit_error", ["benchmark"])
+        report = ApiReport.query.filter_by(batch_id="queue_submit_error").one()
+        assert (report.process, report.status) == (3, 2)
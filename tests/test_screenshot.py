@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+from utils.client.test_runner.client.screenshot import ScreenshotWriter
+
+
+def test_flush_time_out_keeps_folder_until_written(tmp_path):
+    """ flush 等待超时后，队列中的截图照常写入，写入线程不退出，最后一张写完时释放截图记录 """
+    writer, gate = ScreenshotWriter(policy="fail", max_width=0, queue_size=10), threading.Event()
+    writer.resize = lambda png_data: gate.wait() and png_data
+    folder = str(tmp_path)
+    writer.submit(folder, 1, "after_page", b"1")
+    writer.submit(folder, 2, "after_page", b"2")
+
+    writer.flush(folder, time_out=0.05)
+    assert writer.folder_dict[folder]["pending"] == 2
+
+    gate.set()
+    with writer.condition:
+        assert writer.condition.wait_for(lambda: folder not in writer.folder_dict, timeout=5)
+    assert sorted(os.listdir(folder)) == ["1_after_page.png", "2_after_page.png"]
+    assert writer.worker.is_alive()
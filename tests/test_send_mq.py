@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import time
+import types
+import threading
+
+import pika
+import pytest
+
+from utils.message import send_mq
+from utils.message.send_mq import RabbitMqPublisher, send_rabbit_mq, send_rabbit_mq_batch
+from utils.benchmark.mq import FakeBlockingConnection, FakeChannel
+
+MQ_INFO = {"host": "mq", "port": "5672", "account": "guest", "password": "guest", "queue_name": "test"}
+
+
+class FakeBroker:
+    """ 模拟 MQ 服务端：记录收到的消息、连接数，可以设置断开连接、拒收、拒绝连接 """
+
+    def __init__(self):
+        self.message_list = []
+        self.lock = threading.RLock()  # 发送时断开连接会在持有锁时关闭连接
+        self.connection_count, self.open_count, self.max_open_count, self.declare_count = 0, 0, 0, 0
+        self.fail_after = None  # 再收到这么多条消息后断开连接
+        self.nack_times = 0  # 接下来拒收的次数
+        self.refuse_times = 0  # 接下来拒绝连接的次数
+
+    def connection_factory(self, parameters):
+        with self.lock:
+            if self.refuse_times:
+                self.refuse_times -= 1
+                raise pika.exceptions.AMQPConnectionError("拒绝连接")
+            self.connection_count += 1
+            self.open_count += 1
+            self.max_open_count = max(self.max_open_count, self.open_count)
+        return BrokerConnection(self, parameters)
+
+
+class BrokerChannel(FakeChannel):
+
+    def queue_declare(self, queue):
+        self.connection.broker.declare_count += 1
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        broker = self.connection.broker
+        with broker.lock:
+            if broker.nack_times:
+                broker.nack_times -= 1
+                raise pika.exceptions.NackError([body])
+            if broker.fail_after is not None:
+                if broker.fail_after == 0:
+                    broker.fail_after = None
+                    self.connection.close()
+                    raise pika.exceptions.StreamLostError("连接已断开")
+                broker.fail_after -= 1
+            broker.message_list.append(body)
+
+
+class BrokerConnection(FakeBlockingConnection):
+
+    def __init__(self, broker, parameters):
+        super(BrokerConnection, self).__init__(parameters, handshake_delay=0, rtt=0)
+        self.broker = broker
+
+    def channel(self):
+        return BrokerChannel(self)
+
+    def close(self):
+        with self.broker.lock:
+            if self.is_open:
+                self.broker.open_count -= 1
+        self.is_open = False
+
+
+@pytest.fixture
+def broker():
+    return FakeBroker()
+
+
+@pytest.fixture
+def sleep_list(monkeypatch):
+    """ 重试前的等待不真的sleep，只记录等待的秒数，只替换 send_mq 模块里的 time """
+    sleep_list = []
+    monkeypatch.setattr(send_mq, "time", types.SimpleNamespace(time=time.time, sleep=sleep_list.append))
+    return sleep_list
+
+
+@pytest.fixture
+def publisher(broker, sleep_list, monkeypatch):
+    """ send_rabbit_mq 使用的发送器，测试结束后关闭 """
+    monkeypatch.setattr(RabbitMqPublisher, "_publisher_dict", {})
+    monkeypatch.setattr(RabbitMqPublisher, "_publisher_pid", None)
+    publisher = RabbitMqPublisher.get_publisher(MQ_INFO, connection_factory=broker.connection_factory, batch_size=100)
+    yield publisher
+    RabbitMqPublisher.close_all()
+
+
+def test_reuse_connection(publisher, broker):
+    """ 同一个 MQ 地址复用发送器和连接，队列只声明一次 """
+    assert RabbitMqPublisher.get_publisher({**MQ_INFO, "queue_name": "other"}) is publisher
+    for index in range(50):
+        send_rabbit_mq(MQ_INFO, f'm{index}')
+    assert broker.message_list == [f'm{index}' for index in range(50)]
+    assert broker.connection_count == 1 and broker.declare_count == 1
+
+
+def test_reconnect_resume_without_loss_or_duplicate(publisher, broker, sleep_list):
+    """ 发送中途连接断开，重新建立连接后从失败的消息继续发送，不丢、不重复 """
+    send_rabbit_mq(MQ_INFO, "first")
+    broker.message_list.clear()
+    broker.fail_after = 130
+    message_list = [f'b{index}' for index in range(300)]
+    assert send_rabbit_mq_batch(MQ_INFO, message_list) == 300
+    assert broker.message_list == message_list
+    assert broker.connection_count == 2 and sleep_list == [0.5]
+    assert publisher.stat["retry"] == 1 and publisher.stat["message"] == 301
+
+
+def test_nack_retry(publisher, broker):
+    """ MQ 拒收的消息重试发送 """
+    broker.nack_times = 1
+    send_rabbit_mq(MQ_INFO, "nack")
+    assert broker.message_list == ["nack"]
+    assert publisher.stat["retry"] == 1 and publisher.stat["fail"] == 0
+
+
+def test_backoff_doubles_then_fail(publisher, broker, sleep_list):
+    """ 重新建立连接失败时等待时间翻倍，超过重试次数后报错，连接池的位置都已让出 """
+    send_rabbit_mq(MQ_INFO, "first")
+    broker.fail_after, broker.refuse_times = 0, 10
+    with pytest.raises(pika.exceptions.AMQPConnectionError):
+        send_rabbit_mq(MQ_INFO, "lost")
+    assert sleep_list == [0.5, 1.0, 2.0]
+    assert publisher.stat["fail"] == 1
+    assert publisher.link_count == len(publisher.idle_list) == 0
+
+    broker.refuse_times = 0
+    send_rabbit_mq(MQ_INFO, "recover")
+    assert broker.message_list == ["first", "recover"]
+
+
+def test_pool_limit_with_threads(publisher, broker):
+    """ 多线程同时发送，连接数不超过连接池大小，消息不丢 """
+
+    def worker(thread_index):
+        for index in range(200):
+            send_rabbit_mq(MQ_INFO, f'{thread_index}-{index}')
+
+    thread_list = [threading.Thread(target=worker, args=(thread_index,)) for thread_index in range(8)]
+    for thread in thread_list:
+        thread.start()
+    for thread in thread_list:
+        thread.join()
+    assert len(broker.message_list) == len(set(broker.message_list)) == 1600
+    assert broker.max_open_count <= publisher.pool_size
+    assert publisher.stat["message"] == 1600
+
+
+def test_acquire_time_out(broker):
+    """ 连接都在使用中时，等待超过 acquire_time_out 报错 """
+    publisher = RabbitMqPublisher(
+        MQ_INFO, connection_factory=broker.connection_factory, pool_size=1, acquire_time_out=0.05)
+    link = publisher.acquire()
+    with pytest.raises(TimeoutError):
+        publisher.publish(MQ_INFO["queue_name"], "wait")
+    publisher.release(link, is_broken=True)
+    assert publisher.link_count == 0
+    publisher.publish(MQ_INFO["queue_name"], "after")
+    assert broker.message_list == ["after"]
+    publisher.close()
+    assert broker.open_count == 0
+
+
+def test_stale_idle_connection_reconnect_without_backoff(publisher, broker, sleep_list):
+    """ 空闲期间被 MQ 断开的连接（如心跳超时），取出时直接重新建立，不等待、不算重试 """
+    send_rabbit_mq(MQ_INFO, "first")
+    publisher.idle_list[0]["connection"].close()
+    send_rabbit_mq(MQ_INFO, "second")
+    assert broker.message_list == ["first", "second"]
+    assert sleep_list == []
+    assert broker.connection_count == 2 and broker.open_count == 1
+    assert publisher.stat["retry"] == 0 and publisher.stat["stale_connection"] == 1
+    assert publisher.link_count == len(publisher.idle_list) == 1
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.benchmark.stub_server import StubServer
+from utils.benchmark.transport import send_with_transport
+from utils.client.test_runner.client.transport import HttpTransport
+
+
+def test_recycle_waits_for_in_flight_request(monkeypatch):
+    """ 达到请求数上限时换新的连接池，旧的连接池等正在发送的请求结束后再关闭 """
+    transport = HttpTransport(max_keep_alive_requests=1)
+    close_list = []
+    close_host_adapter = transport.close_host_adapter
+    monkeypatch.setattr(transport, "close_host_adapter", lambda host_adapter: close_list.append(
+        host_adapter) or close_host_adapter(host_adapter))
+
+    first = transport.acquire_host_adapter("http://127.0.0.1:1/a")
+    second = transport.acquire_host_adapter("http://127.0.0.1:1/b")
+    assert second is not first and first["is_retired"] and close_list == []
+
+    transport.release_host_adapter(first)
+    assert close_list == [first]
+    transport.release_host_adapter(second)
+    assert close_list == [first]
+
+    stat = transport.close()
+    assert close_list == [first, second]
+    assert stat["request"] == 2 and stat["host"] == 2 and stat["recycle"] == 1
+
+
+def test_parallel_requests_with_recycle():
+    """ 多线程共用连接池，频繁回收连接池时请求都成功，连接都被关闭 """
+    server = StubServer(delay=0.005).start()
+    transport = HttpTransport(max_keep_alive_requests=3)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            status_list = list(executor.map(
+                lambda index: send_with_transport(transport, f'{server.host}/{index}').status_code, range(200)))
+    finally:
+        stat = transport.close()
+        server.stop()
+    assert status_list == [200] * 200
+    assert stat["request"] == 200 and stat["recycle"] > 0
+    assert stat["new_connection"] + stat["reuse_connection"] == 200
+    assert transport.host_adapter_dict == {}
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import statistics
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, func, text
+
+from .bench import init_db_config
+
+RECENT_RATE = 0.1  # 最近执行的报告占比，这些报告不会归档
+
+
+def build_step_data(size):
+    """ 生成大约 size 字节的步骤数据，模拟记录下来的请求、响应 """
+    item = {"id": 0, "name": "数据", "desc": "x" * 60}
+    item_count = max(size // 100, 1)
+    return {
+        "request": {"url": "http://benchmark/api", "method": "GET", "headers": {"token": "benchmark"}},
+        "response": {"status_code": 200, "json": {"code": 0, "data": [{**item, "id": index} for index in range(item_count)]}},
+        "extract_msg": {"item_id": 1},
+        "attachment": None
+    }
+
+
+def seed_report(report_model, case_model, step_model, report_count, case_count, step_count, step_size):
+    """ 生成报告数据，前面的报告执行完毕超过60天，最近的 RECENT_RATE 的报告是今天执行的 """
+    db, step_data = report_model.db, build_step_data(step_size)
+    old_time, now = datetime.now() - timedelta(days=60), datetime.now()
+    for report_index in range(report_count):
+        create_time = now if report_index >= report_count * (1 - RECENT_RATE) else old_time
+        with db.auto_commit():
+            report_id = db.session.execute(insert(report_model).values(
+                name=f'压测报告{report_index}', status=2, process=3, project_id=1, batch_id=str(report_index),
+                trigger_id=[], summary={}, create_time=create_time, update_time=create_time)).inserted_primary_key[0]
+            db.session.execute(insert(case_model), [{
+                "name": f'压测用例{case_index}', "report_id": report_id, "case_id": case_index, "result": "success",
+                "case_data": {"variables": {}}, "summary": {"result": "success"}, "error_msg": "",
+                "create_time": create_time
+            } for case_index in range(case_count)])
+            report_case_id_list = db.session.execute(
+                select(case_model.id).where(case_model.report_id == report_id)).scalars().all()
+            db.session.execute(insert(step_model), [{
+                "name": f'压测步骤{step_index}', "report_id": report_id, "report_case_id": report_case_id,
+                "element_id": step_index, "result": "fail" if step_index == 0 else "success", "process": "validate",
+                "step_data": step_data, "summary": {"elapsed_ms": 1}, "create_time": create_time
+            } for report_case_id in report_case_id_list for step_index in range(step_count)])
+
+
+def time_ms(func_to_time, repeat, before_each=None):
+    """ 执行 repeat 次，返回耗时中位数（毫秒） """
+    time_list = []
+    for _ in range(repeat):
+        if before_each:
+            before_each()
+        start_at = time.perf_counter()
+        func_to_time()
+        time_list.append(time.perf_counter() - start_at)
+    return round(statistics.median(time_list) * 1000, 3)
+
+
+def get_db_size(db_uri, db):
+    """ sqlite 整理数据库文件后的大小（字节），其他数据库不统计 """
+    if not db_uri.startswith("sqlite:///"):
+        return None
+    db.session.execute(text("VACUUM"))
+    return os.path.getsize(db_uri[len("sqlite:///"):])
+
+
+def time_hot_query(report_model, case_model, step_model, repeat):
+    """ 最近的报告在报告用例、步骤表中的查询耗时 """
+    db = report_model.db
+    report_id = db.session.execute(select(func.max(report_model.id))).scalar()
+    report_case_id = db.session.execute(
+        select(func.max(case_model.id)).where(case_model.report_id == report_id)).scalar()
+    report_step_id = db.session.execute(
+        select(func.max(step_model.id)).where(step_model.report_id == report_id)).scalar()
+
+    def get_step():
+        step_model.query.filter_by(id=report_step_id).first()
+        db.session.expunge_all()
+
+    return {
+        "case_list_ms": time_ms(lambda: case_model.get_resport_case_list(report_id, True), repeat),
+        "step_list_ms": time_ms(lambda: step_model.get_resport_step_list(report_case_id, True), repeat),
+        "step_ms": time_ms(get_step, repeat),
+        "fail_step_count_ms": time_ms(lambda: db.session.execute(
+            select(func.count()).select_from(step_model).where(step_model.result == "fail")).scalar(), repeat),
+        "case_rows": db.session.execute(select(func.count()).select_from(case_model)).scalar(),
+        "step_rows": db.session.execute(select(func.count()).select_from(step_model)).scalar()
+    }
+
+
+def time_archive_query(report_model, case_model, step_model, repeat):
+    """ 打开已归档的报告：cold 为每次都从归档表读取、解压，warm 为命中进程内缓存 """
+    from apps.base_model import load_report_archive_data
+
+    archive_model = case_model.archive_model
+    archive = archive_model.query.order_by(archive_model.report_id).first()
+    report_id, report_case_id, report_step_id = archive.report_id, archive.case_max_id, archive.step_max_id
+    result = {"archive_raw_size": archive.raw_size, "archive_data_size": archive.data_size}
+    for mode, before_each in [("cold", load_report_archive_data.cache_clear), ("warm", None)]:
+        result[mode] = {
+            "case_list_ms": time_ms(lambda: case_model.get_resport_case_list(report_id, True), repeat, before_each),
+            "step_list_ms": time_ms(
+                lambda: step_model.get_resport_step_list(report_case_id, True), repeat, before_each),
+            "step_ms": time_ms(lambda: step_model.get_from_archive(id=report_step_id), repeat, before_each)
+        }
+    return result
+
+
+def run_archive_benchmark(db_uri, report_count=200, case_count=5, step_count=10, step_size_kb=4, repeat=20):
+    """ 归档前后报告用例、步骤表（热表）的查询耗时，以及打开已归档报告的耗时
+    前 90% 的报告执行完毕超过60天，归档后热表只剩最近的报告
+    """
+    init_db_config(db_uri)
+    from apps import create_app
+    from apps.api_test.model_factory import ApiReport, ApiReportCase, ApiReportStep
+    from utils.benchmark.seed import create_tables
+    from utils.client.report_archive import ReportArchiver
+    from utils.logs.log import logger
+
+    app = create_app()
+    with app.app_context():
+        create_tables()
+        seed_report(
+            ApiReport, ApiReportCase, ApiReportStep, report_count, case_count, step_count, int(step_size_kb * 1024))
+        result = {"before": time_hot_query(ApiReport, ApiReportCase, ApiReportStep, repeat)}
+        result["before"]["db_size"] = get_db_size(db_uri, ApiReport.db)
+
+        logger.disabled = True
+        start_at = time.perf_counter()
+        result["archive"] = ReportArchiver(
+            ApiReport, ApiReportCase, ApiReportStep, archive_days=30, max_report_per_run=0, report_pause=0).run()
+        result["archive"]["time"] = round(time.perf_counter() - start_at, 3)
+        logger.disabled = False
+
+        result["after"] = time_hot_query(ApiReport, ApiReportCase, ApiReportStep, repeat)
+        result["after"]["db_size"] = get_db_size(db_uri, ApiReport.db)
+        result["archived"] = time_archive_query(ApiReport, ApiReportCase, ApiReportStep, repeat)
+    return result
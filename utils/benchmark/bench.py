@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+
+import config
+from .metrics import PhaseTimer, measure
+from .stub_server import StubServer
+
+# 各个阶段统计的方法，persist（写库）由sql语句耗时统计
+PHASE_TARGET_LIST = [
+    ("utils.client.run_api_test", "RunCase", "parse_all_case", "parse"),
+    ("utils.client.run_api_test", "RunApi", "format_data_for_template", "parse"),
+    ("utils.client.test_runner.client.http", "HttpSession", "send_client_request", "request"),
+    ("utils.client.test_runner.response", "ResponseObject", "extract_response", "extract"),
+    ("utils.client.test_runner.runner_context", "SessionContext", "validate", "validate"),
+]
+
+SCENARIO_LIST = ["api", "case", "task"]
+
+
+def init_db_config(db_uri):
+    """ 使用压测数据库，sqlite 模拟 mysql 的自动提交 """
+    config._SystemConfig.SQLALCHEMY_DATABASE_URI = db_uri
+    if db_uri.startswith("sqlite"):
+        config._SystemConfig.SQLALCHEMY_ENGINE_OPTIONS = {
+            "isolation_level": "AUTOCOMMIT",
+            "connect_args": {"check_same_thread": False, "timeout": 30}
+        }
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=config._basedir, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def build_runner(scenario, seed_result, report_id):
+    """ 根据场景生成执行器，和页面触发运行时的参数一致 """
+    from utils.client.run_api_test import RunApi, RunCase
+    from apps.api_test.model_factory import ApiTask
+
+    kwargs = {"report_id": report_id, "env_code": seed_result["env_code"], "env_name": seed_result["env_name"]}
+    if scenario == "api":
+        return RunApi(api_id_list=seed_result["api_id_list"], **kwargs)
+    if scenario == "case":
+        return RunCase(case_id_list=seed_result["case_id_list"], is_async=0, **kwargs)
+    task = ApiTask.get_first(id=seed_result["task_id"]).to_dict()
+    return RunCase(case_id_list=task["case_ids"], is_async=task["is_async"], task_dict=task, **kwargs)
+
+
+def run_scenario(app, scenario, seed_result, phase_timer, trace_memory=True):
+    """ 执行一次场景，返回耗时、sql语句数、内存峰值、各阶段耗时、报告结果 """
+    from apps.api_test.model_factory import ApiReport
+
+    with app.app_context():
+        report = ApiReport.get_new_report(
+            project_id=seed_result["project_id"], batch_id=f'benchmark_{scenario}_{time.time_ns()}',
+            trigger_id=seed_result["case_id_list"], name=f'压测-{scenario}', run_type=scenario,
+            env=seed_result["env_code"], trigger_type="page", process=1, status=1
+        )
+        report_id = report.id
+        runner = build_runner(scenario, seed_result, report_id)
+
+    phase_timer.phase_dict = {}
+    with measure(trace_memory) as result:
+        runner.parse_and_run()
+
+    with app.app_context():
+        summary = ApiReport.get_first(id=report_id).summary
+    result["phases"].update({
+        phase: {"duration": round(data["duration"], 4), "count": data["count"]}
+        for phase, data in phase_timer.phase_dict.items()
+    })
+    result["report"] = {
+        "result": summary["result"],
+        "case": summary["stat"]["test_case"],
+        "step": summary["stat"]["test_step"]
+    }
+    return result
+
+
+def summarize_run_list(run_list):
+    """ 多次运行取中位数，避免偶发的抖动 """
+    def median(get_value):
+        return round(statistics.median([get_value(run) for run in run_list]), 4)
+
+    phase_name_list = sorted({phase for run in run_list for phase in run["phases"]})
+    return {
+        "wall_time": median(lambda run: run["wall_time"]),
+        "peak_memory_kb": median(lambda run: run["peak_memory_kb"] or 0),
+        "max_rss_kb": max(run["max_rss_kb"] or 0 for run in run_list),
+        "sql": {key: median(lambda run: run["sql"][key]) for key in run_list[0]["sql"]},
+        "phases": {
+            phase: {
+                "duration": median(lambda run: run["phases"].get(phase, {}).get("duration", 0)),
+                "count": median(lambda run: run["phases"].get(phase, {}).get("count", 0))
+            } for phase in phase_name_list
+        },
+        "report": run_list[-1]["report"],
+        "runs": run_list
+    }
+
+
+def run_benchmark(db_uri, scenario_list=None, repeat=3, stub_delay=0, item_count=10, trace_memory=True, **scale):
+    """ 执行压测，返回可序列化的结果
+    db_uri: 压测数据库，需为空库（sqlite文件或临时的mysql库），会建表并生成数据
+    scale: 数据规模，project_count、api_count、case_count、step_count
+    """
+    init_db_config(db_uri)
+    from apps import create_app
+    from .seed import init_database
+
+    stub_server = StubServer(delay=stub_delay, item_count=item_count).start()
+    app = create_app()
+    with app.app_context():
+        seed_result = init_database(stub_server.host, **scale)
+
+    phase_timer = PhaseTimer()
+    for module_name, class_name, attr_name, phase in PHASE_TARGET_LIST:
+        __import__(module_name)
+        phase_timer.wrap(getattr(sys.modules[module_name], class_name), attr_name, phase)
+
+    result = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db": db_uri.split(":", 1)[0],
+            "repeat": repeat,
+            "stub_delay": stub_delay,
+            "trace_memory": trace_memory,
+            "scale": scale
+        },
+        "scenarios": {}
+    }
+    try:
+        for scenario in scenario_list or SCENARIO_LIST:
+            run_list = [run_scenario(app, scenario, seed_result, phase_timer, trace_memory) for _ in range(repeat)]
+            result["scenarios"][scenario] = summarize_run_list(run_list)
+    finally:
+        phase_timer.restore()
+        stub_server.stop()
+    result["meta"]["stub_request_count"] = stub_server.request_count
+    return result
+
+
+def get_compare_metrics(scenario_result):
+    """ 需要对比的指标 {指标名: 值} """
+    metrics = {"wall_time": scenario_result["wall_time"], "sql.total": scenario_result["sql"]["total"]}
+    if scenario_result["peak_memory_kb"]:
+        metrics["peak_memory_kb"] = scenario_result["peak_memory_kb"]
+    for phase, data in scenario_result["phases"].items():
+        metrics[f'phases.{phase}'] = data["duration"]
+    return metrics
+
+
+def compare_result(current, baseline, threshold=0.2, min_time=0.005):
+    """ 和基线对比，指标比基线大 threshold（比例）以上的视为性能回退
+    耗时小于 min_time（秒）的指标抖动大，不参与判断
+    返回 [{"scenario", "metric", "baseline", "current", "change", "is_regression"}]
+    """
+    compare_list = []
+    for scenario, scenario_result in current["scenarios"].items():
+        if scenario not in baseline["scenarios"]:
+            continue
+        baseline_metrics = get_compare_metrics(baseline["scenarios"][scenario])
+        for metric, current_value in get_compare_metrics(scenario_result).items():
+            baseline_value = baseline_metrics.get(metric)
+            if baseline_value is None:
+                continue
+            change = (current_value - baseline_value) / baseline_value if baseline_value else 0
+            is_time_metric = metric == "wall_time" or metric.startswith("phases.")
+            is_too_small = is_time_metric and max(current_value, baseline_value) < min_time
+            compare_list.append({
+                "scenario": scenario,
+                "metric": metric,
+                "baseline": baseline_value,
+                "current": current_value,
+                "change": round(change, 4),
+                "is_regression": change > threshold and not is_too_small
+            })
+    return compare_list
+
+
+def format_compare_result(compare_list):
+    """ 对比结果的文本表格 """
+    line_list = [f'{"scenario":<8} {"metric":<22} {"baseline":>12} {"current":>12} {"change":>9}']
+    for item in compare_list:
+        flag = "  <-- 回退" if item["is_regression"] else ""
+        line_list.append(
+            f'{item["scenario"]:<8} {item["metric"]:<22} {item["baseline"]:>12} {item["current"]:>12} '
+            f'{item["change"]:>+9.1%}{flag}')
+    return "\n".join(line_list)
+
+
+def save_result(result, path):
+    dir_path = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(result, file, ensure_ascii=False, indent=4)
+
+
+def load_result(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import time
+import statistics
+
+from apps.enums import AuthType
+from .bench import init_db_config
+from .metrics import SqlCounter
+
+
+def get_route_path(app, auth_type, method="GET"):
+    """ 取一个指定身份验证类型的接口路径 """
+    for rule in app.url_map.iter_rules():
+        if method in rule.methods and app.route_table.get((rule.endpoint, method)) == auth_type:
+            return rule.rule
+
+
+def seed_user(app):
+    """ 生成预设用户和一个非管理员用户，返回非管理员用户的token，token中有需要权限验证的接口的权限 """
+    from apps.system.model_factory import User
+    from .seed import create_tables
+
+    create_tables()
+    User.model_create({"account": "common", "password": "common", "name": "测试员"})
+    user = User.model_create_and_get({"account": "benchmark", "password": "benchmark", "name": "压测"})
+    return user.make_access_token([get_route_path(app, AuthType.permission)])
+
+
+def time_hooks(app, path, headers, count, is_cold):
+    """ 执行 count 次前置钩子函数，返回每次请求的耗时（微秒）中位数、每次请求的sql语句数
+    is_cold: 每次请求前清空进程内的身份缓存，即每次都查预设用户、解码token
+    """
+    from apps.system.model_factory import User
+    from utils.view.required import token_cache
+
+    duration_list, sql_counter = [], SqlCounter()
+    sql_counter.start()
+    try:
+        for _ in range(count):
+            if is_cold:
+                token_cache.clear()
+                User.common_user_id = None
+            with app.test_request_context(path, method="GET", headers=headers):
+                start_at = time.perf_counter()
+                app.preprocess_request()
+                duration_list.append(time.perf_counter() - start_at)
+    finally:
+        sql_counter.stop()
+    return {
+        "us_per_request": round(statistics.median(duration_list) * 1000000, 1),
+        "sql_per_request": round(sql_counter.count["total"] / count, 2)
+    }
+
+
+def run_hook_benchmark(db_uri, count=2000):
+    """ 前置钩子函数（默认用户、身份验证、权限验证）每个请求的开销，分别统计命中缓存和不使用缓存的情况
+    请求日志的开销和身份层无关，统计期间不打日志
+    """
+    init_db_config(db_uri)
+    from apps import create_app
+    from utils.logs.log import logger
+
+    app = create_app()
+    with app.app_context():
+        token = seed_user(app)
+
+    result, logger.disabled = {}, True
+    for name, auth_type in [("not_auth", AuthType.not_auth), ("login", AuthType.login),
+                            ("permission", AuthType.permission)]:
+        path = get_route_path(app, auth_type)
+        headers = {} if auth_type == AuthType.not_auth else {"access-token": token}
+        result[name] = {
+            "path": path,
+            "cold": time_hooks(app, path, headers, count, is_cold=True),
+            "warm": time_hooks(app, path, headers, count, is_cold=False)
+        }
+    logger.disabled = False
+    return result
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+from utils.logs.log import ConcurrentTimedRotatingFileHandler, BatchTimedRotatingFileHandler, QueueLogHandler
+
+
+def build_handler(mode, file_name):
+    """ 和 GetLogger 中的文件句柄配置一致 """
+    handler_class = BatchTimedRotatingFileHandler if mode == "queue" else ConcurrentTimedRotatingFileHandler
+    file_handler = handler_class(filename=file_name, when="MIDNIGHT", interval=1, backupCount=30, encoding="UTF-8")
+    file_handler.suffix = "%Y-%m-%d.log"
+    file_handler.setFormatter(logging.Formatter(
+        "%(asctime)s [%(filename)s] [%(funcName)s] [%(lineno)d] [%(levelname)s] %(message)s"))
+    return QueueLogHandler(file_handler) if mode == "queue" else file_handler
+
+
+def count_lines(log_dir, keyword):
+    """ 日志文件中包含关键字的行数 """
+    line_count = 0
+    for file_name in os.listdir(log_dir):
+        if not file_name.startswith(".__"):  # 跳过锁文件
+            with open(os.path.join(log_dir, file_name), "r", encoding="UTF-8") as file:
+                line_count += sum(1 for line in file if keyword in line)
+    return line_count
+
+
+def run_log_mode(mode, thread_count, record_count):
+    """ thread_count 个线程同时各打 record_count 条日志
+    emit_time：所有线程打完日志的耗时，即业务线程被日志阻塞的时间
+    total_time：日志全部写入文件的耗时
+    """
+    log_dir = tempfile.mkdtemp(prefix="benchmark_log_")
+    handler = build_handler(mode, os.path.join(log_dir, "logger"))
+    bench_logger = logging.getLogger(f'benchmark_log_{mode}')
+    bench_logger.propagate, bench_logger.level = False, logging.DEBUG
+    bench_logger.addHandler(handler)
+    message = "执行步骤：" + "x" * 200
+
+    def log_records():
+        for index in range(record_count):
+            bench_logger.info(f'{message} {index}')
+
+    thread_list = [threading.Thread(target=log_records) for _ in range(thread_count)]
+    try:
+        start_at = time.perf_counter()
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+        emit_time = time.perf_counter() - start_at
+        handler.flush()
+        total_time = time.perf_counter() - start_at
+    finally:
+        bench_logger.removeHandler(handler)
+        handler.close()
+
+    total_count, written_count = thread_count * record_count, count_lines(log_dir, message)
+    result = {
+        "emit_time": round(emit_time, 4),
+        "total_time": round(total_time, 4),
+        "records_per_second": round(total_count / total_time),
+        "written": written_count,
+        "dropped": total_count - written_count
+    }
+    shutil.rmtree(log_dir, ignore_errors=True)
+    return result
+
+
+def run_log_benchmark(thread_count=50, record_count=2000, mode_list=("sync", "queue")):
+    """ 对比每条日志加锁直接写入（sync）和队列批量写入（queue）的吞吐量 """
+    return {mode: run_log_mode(mode, thread_count, record_count) for mode in mode_list}
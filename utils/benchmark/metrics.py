@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import resource
+except ImportError:  # windows 没有 resource 模块，不统计进程的最大常驻内存
+    resource = None
+
+
+class SqlCounter:
+    """ 统计执行的sql语句数和写库耗时，监听的是所有引擎（每次运行都会 create_app，会有多个引擎） """
+
+    write_types = ("insert", "update", "delete")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.count = {"total": 0, "select": 0, "insert": 0, "update": 0, "delete": 0, "other": 0}
+        self.duration = {"total": 0.0, "persist": 0.0}  # 所有语句的耗时、写库语句（insert、update、delete）的耗时
+        self.is_listening = False
+
+    def before_execute(self, conn, cursor, statement, *args):
+        self.local.start_at = time.perf_counter()
+
+    def after_execute(self, conn, cursor, statement, *args):
+        duration = time.perf_counter() - getattr(self.local, "start_at", time.perf_counter())
+        statement_type = statement.lstrip().split(" ", 1)[0].lower()
+        statement_type = statement_type if statement_type in self.count else "other"
+        with self.lock:
+            self.count["total"] += 1
+            self.count[statement_type] += 1
+            self.duration["total"] += duration
+            if statement_type in self.write_types:
+                self.duration["persist"] += duration
+
+    def start(self):
+        event.listen(Engine, "before_cursor_execute", self.before_execute)
+        event.listen(Engine, "after_cursor_execute", self.after_execute)
+        self.is_listening = True
+
+    def stop(self):
+        if self.is_listening:
+            event.remove(Engine, "before_cursor_execute", self.before_execute)
+            event.remove(Engine, "after_cursor_execute", self.after_execute)
+            self.is_listening = False
+
+
+class PhaseTimer:
+    """ 分阶段计时，把要统计的方法替换为计时的方法，统计累计耗时和调用次数
+    并行执行时各个线程的耗时累加，所以阶段耗时可能大于总耗时
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phase_dict = {}  # {phase: {"duration": 0, "count": 0}}
+        self.patch_list = []  # [(owner, attr_name, origin_func)]
+
+    def add(self, phase, duration):
+        with self.lock:
+            phase_data = self.phase_dict.setdefault(phase, {"duration": 0.0, "count": 0})
+            phase_data["duration"] += duration
+            phase_data["count"] += 1
+
+    def wrap(self, owner, attr_name, phase):
+        """ 把 owner.attr_name 替换为计时的方法 """
+        origin_func = owner.__dict__[attr_name]
+        is_classmethod, is_staticmethod = isinstance(origin_func, classmethod), isinstance(origin_func, staticmethod)
+        func = origin_func.__func__ if (is_classmethod or is_staticmethod) else origin_func
+        timer = self
+
+        def timed_func(*args, **kwargs):
+            start_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.add(phase, time.perf_counter() - start_at)
+
+        timed_func.__name__, timed_func.__doc__ = func.__name__, func.__doc__
+        if is_classmethod:
+            timed_func = classmethod(timed_func)
+        elif is_staticmethod:
+            timed_func = staticmethod(timed_func)
+        setattr(owner, attr_name, timed_func)
+        self.patch_list.append((owner, attr_name, origin_func))
+
+    def restore(self):
+        for owner, attr_name, origin_func in reversed(self.patch_list):
+            setattr(owner, attr_name, origin_func)
+        self.patch_list = []
+
+
+@contextmanager
+def measure(trace_memory=True):
+    """ 统计一次运行的耗时、sql语句数、内存峰值
+    trace_memory: 是否统计python内存分配峰值，tracemalloc 会让执行变慢，只看耗时的时候可以关掉
+    """
+    result, sql_counter = {}, SqlCounter()
+    if trace_memory:
+        tracemalloc.start()
+    sql_counter.start()
+    start_at = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["wall_time"] = round(time.perf_counter() - start_at, 4)
+        sql_counter.stop()
+        if trace_memory:
+            result["peak_memory_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+        else:
+            result["peak_memory_kb"] = None
+        result["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+        result["sql"] = {
+            **sql_counter.count,
+            "duration": round(sql_counter.duration["total"], 4)
+        }
+        result.setdefault("phases", {})["persist"] = {
+            "duration": round(sql_counter.duration["persist"], 4),
+            "count": sql_counter.count["insert"] + sql_counter.count["update"] + sql_counter.count["delete"]
+        }
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pika
+
+from utils.message.send_mq import RabbitMqPublisher
+
+
+class FakeChannel:
+    """ 模拟 pika 的 BlockingChannel，开启发布确认后每条消息等待 confirm_delay 秒（模拟等待 MQ 确认的往返） """
+
+    def __init__(self, connection):
+        self.connection, self.is_open, self.is_confirm = connection, True, False
+
+    def confirm_delivery(self):
+        self.is_confirm = True
+
+    def queue_declare(self, queue):
+        time.sleep(self.connection.rtt)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if not self.connection.is_open:
+            raise pika.exceptions.StreamLostError("连接已断开")
+        if self.is_confirm:
+            time.sleep(self.connection.rtt)
+        self.connection.message_list.append((routing_key, body))
+
+
+class FakeBlockingConnection:
+    """ 模拟 pika 的 BlockingConnection，建立连接等待 handshake_delay 秒（模拟 TCP + AMQP 握手），不连接真实的 MQ """
+
+    def __init__(self, parameters, handshake_delay=0.005, rtt=0.0002):
+        time.sleep(handshake_delay)
+        self.parameters, self.rtt, self.is_open, self.message_list = parameters, rtt, True, []
+
+    def channel(self):
+        time.sleep(self.rtt)
+        return FakeChannel(self)
+
+    def process_data_events(self, time_limit=0):
+        if not self.is_open:
+            raise pika.exceptions.StreamLostError("连接已断开")
+
+    def close(self):
+        self.is_open = False
+
+
+def send_with_new_connection(info, message, connection_factory):
+    """ 改造前的发送方式，每条消息建立连接、声明队列，发完关闭连接 """
+    connection = connection_factory(pika.ConnectionParameters(
+        host=info["host"], port=info["port"], credentials=pika.PlainCredentials(info["account"], info["password"])))
+    channel = connection.channel()
+    channel.queue_declare(queue=info["queue_name"])
+    channel.basic_publish(exchange='', routing_key=info["queue_name"], body=message)
+    connection.close()
+
+
+def run_mq_benchmark(message_count=10000, info=None, handshake_ms=5, rtt_ms=0.2, per_message_count=1000):
+    """ 发送 message_count 条消息的吞吐量
+    不传 info 时使用模拟的连接（握手 handshake_ms 毫秒、每次往返 rtt_ms 毫秒），传了则发送到真实的 MQ
+    每条消息新建连接的方式比较慢，只发送 per_message_count 条，按比例计算吞吐量
+    """
+    if info:
+        connection_factory = pika.BlockingConnection
+    else:
+        info = {"host": "benchmark", "port": 5672, "account": "guest", "password": "guest", "queue_name": "benchmark"}
+
+        def connection_factory(parameters):
+            return FakeBlockingConnection(parameters, handshake_ms / 1000, rtt_ms / 1000)
+
+    message_list = [f'{{"index": {index}}}' for index in range(message_count)]
+    result = {}
+
+    start_at = time.perf_counter()
+    for message in message_list[:per_message_count]:
+        send_with_new_connection(info, message, connection_factory)
+    result["new_connection"] = {"count": min(per_message_count, message_count), "time": time.perf_counter() - start_at}
+
+    for mode in ["pooled", "batch"]:
+        publisher = RabbitMqPublisher(info, connection_factory=connection_factory)
+        start_at = time.perf_counter()
+        if mode == "pooled":
+            for message in message_list:
+                publisher.publish(info["queue_name"], message)
+        else:
+            publisher.publish_batch(info["queue_name"], message_list)
+        result[mode] = {"count": message_count, "time": time.perf_counter() - start_at, **publisher.close()}
+
+    for data in result.values():
+        data["messages_per_second"] = round(data["count"] / data["time"]) if data["time"] else 0
+        data["time"] = round(data["time"], 3)
+    return result
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import time
+import random
+
+from utils.client.test_runner.parser import parse_data
+
+# 随机生成模板的片段，覆盖变量、函数、函数中引用变量、变量后紧跟函数、普通的 "$"、解析失败的函数等写法
+TEMPLATE_ATOM_LIST = [
+    "$a", "$b", "$ab", "$c", "$nope", "${f()}", "${g()}", "${f($a)}", "${h(a=$b)}", "${f(1, 2)}", "${len(abc)}",
+    "${x(a=b=c)}", "${nofunc()}", "$", "{", "x", "-", "a", " ", "$a$b", "${", "}", "1"
+]
+# 变量的取值，包括空字符串、非字符串、引用其他变量或函数、引用自己
+VARIABLE_VALUE_LIST = ["", "v", 1, "$b", "$a", "${f()}", [1], "$request", "$c", "  pad "]
+
+
+def build_functions_mapping(rand, call_list):
+    """ 自定义函数，返回值由 rand 决定，调用记录写入 call_list，用于对比函数的调用次数、参数 """
+    def f(*args, **kwargs):
+        call_list.append(("f", args, tuple(sorted(kwargs.items()))))
+        return rand.choice(["", "x", "$a", "${g()}", 3, None, "ab"])
+
+    def g(*args, **kwargs):
+        call_list.append(("g", args))
+        return rand.choice(["", "y$", "1", [1, 2], {"k": 1}])
+
+    def h(a=1):
+        call_list.append(("h", a))
+        return "$b"
+
+    return {"f": f, "g": g, "h": h}
+
+
+def run_parse(parse_func, content, seed):
+    """ 用同一个随机种子生成变量、函数并解析，返回 (解析结果或异常, 解析后的变量映射, 函数调用记录) """
+    rand, call_list = random.Random(seed), []
+    variables_mapping = {
+        "a": rand.choice(VARIABLE_VALUE_LIST), "b": rand.choice(VARIABLE_VALUE_LIST),
+        "ab": rand.choice(VARIABLE_VALUE_LIST), "c": "$c"
+    }
+    functions_mapping = build_functions_mapping(rand, call_list)
+    try:
+        result = parse_func(content, variables_mapping, functions_mapping, rand.random() < 0.5)
+        output = ("ok", repr(result), type(result))
+    except RecursionError:
+        output = ("error", "RecursionError", "")
+    except Exception as error:
+        output = ("error", type(error).__name__, str(error))
+    return output, repr(variables_mapping), call_list
+
+
+def run_parser_diff(legacy_parse_data, count=60000, seed=1):
+    """ 随机生成 count 个模板，分别用改造前的 parse_data（tests/legacy_parser.py）和编译模板的 parse_data 解析，
+    返回结果不一致的模板
+    """
+    rand, diff_list = random.Random(seed), []
+    for _ in range(count):
+        content = "".join(rand.choice(TEMPLATE_ATOM_LIST) for _ in range(rand.randint(0, 5)))
+        parse_seed = rand.random()
+        legacy_result = run_parse(legacy_parse_data, content, parse_seed)
+        compiled_result = run_parse(parse_data, content, parse_seed)
+        if legacy_result != compiled_result:
+            diff_list.append({"content": content, "legacy": legacy_result, "compiled": compiled_result})
+    return diff_list
+
+
+def run_parser_benchmark(legacy_parse_data, count=20000):
+    """ 典型请求数据每次解析的耗时（微秒），legacy为改造前的逐个replace（tests/legacy_parser.py），compiled为编译模板 """
+    request_data = {
+        "url": "/api/users/$uid/orders?ts=${get_ts()}",
+        "headers": {"token": "$token", "x": "plain", "ua": "agent $ua"},
+        "json": {"a": "$uid", "b": ["$token", "literal", "${str(1)}"], "c": 1}
+    }
+    functions_mapping = {"get_ts": lambda: 123}
+    result = {}
+    for mode, parse_func in [("legacy", legacy_parse_data), ("compiled", parse_data)]:
+        variables_mapping = {"uid": 1000, "token": "abc", "ua": "iOS"}
+        start_at = time.perf_counter()
+        for _ in range(count):
+            parse_func(request_data, variables_mapping, functions_mapping)
+        result[mode] = {"count": count, "us_per_parse": round((time.perf_counter() - start_at) / count * 1e6, 1)}
+    return result
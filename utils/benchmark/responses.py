@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utils.client.test_runner.client.http import HttpSession
+from utils.client.test_runner.response import ResponseObject
+from utils.client.test_runner.runner_context import SessionContext
+
+# 每种响应体的提取表达式
+EXTRACTOR_DICT = {
+    "json": [{"id": "content.data.id"}, {"first_name": "content.data.list.0.name"}, {"code": "content.code"}],
+    "html": [{"token": "token=(.*?);"}, {"title": "<title>(.*?)</title>"}]
+}
+
+
+def build_json_body(size):
+    """ 生成大约 size 字节的json响应体 """
+    item = {"id": 0, "name": "数据", "tags": ["a", "b", "c"], "detail": {"price": 1.5, "desc": "x" * 60}}
+    item_count = max(size // len(json.dumps(item, ensure_ascii=False).encode()), 1)
+    return json.dumps({"code": 0, "data": {"id": 1, "list": [
+        {**item, "id": index, "name": f'数据{index}'} for index in range(item_count)
+    ]}}, ensure_ascii=False).encode()
+
+
+def build_html_body(size, encoding="utf-8"):
+    """ 生成大约 size 字节的html响应体 """
+    row = "<div class='row'>页面内容 content {}</div>"
+    row_count = max(size // len(row.encode(encoding)), 1)
+    rows = "".join(row.format(index) for index in range(row_count))
+    return f'<html><head><title>压测页面</title></head><body>{rows}<span>token=abc123;</span></body></html>'.encode(
+        encoding)
+
+
+def build_response(body, content_type):
+    """ 构造请求已完成的响应对象，不发请求，只统计响应处理的耗时 """
+    response = requests.Response()
+    response._content, response.status_code, response.reason, response.url = body, 200, "OK", "http://benchmark/api"
+    response.headers = CaseInsensitiveDict({"Content-Type": content_type, "Content-Length": str(len(body))})
+    response.request = requests.Request("GET", response.url).prepare()
+    response.elapsed = datetime.timedelta(milliseconds=1)
+    return response
+
+
+def run_response_case(body, content_type, extractors, repeat):
+    """ 记录响应信息、提取数据，各执行 repeat 次取平均 """
+    record_time = extract_time = 0
+    for _ in range(repeat):
+        response = build_response(body, content_type)
+        start_at = time.perf_counter()
+        HttpSession("http://benchmark").record_response(response, "压测", {})
+        record_time += time.perf_counter() - start_at
+
+        start_at = time.perf_counter()
+        ResponseObject(response).extract_response(SessionContext({}), extractors)
+        extract_time += time.perf_counter() - start_at
+
+    return {
+        "size": len(body),
+        "record_ms": round(record_time / repeat * 1000, 3),
+        "extract_ms": round(extract_time / repeat * 1000, 3)
+    }
+
+
+def run_response_benchmark(size_mb=5, repeat=3):
+    """ 处理多兆的json、html响应的耗时：确定编码、记录响应信息、解析json、提取数据 """
+    size = int(size_mb * 1024 * 1024)
+    json_body, html_body = build_json_body(size), build_html_body(size)
+    case_list = [
+        ("json", json_body, "application/json", EXTRACTOR_DICT["json"]),
+        ("json-no-charset", json_body, "text/plain", EXTRACTOR_DICT["json"]),
+        ("html", html_body, "text/html; charset=utf-8", EXTRACTOR_DICT["html"]),
+        ("html-no-charset", html_body, "text/html", EXTRACTOR_DICT["html"]),
+        ("html-gbk", build_html_body(size, "gbk"), "text/html", EXTRACTOR_DICT["html"])
+    ]
+    return {
+        name: run_response_case(body, content_type, extractors, repeat)
+        for name, body, content_type, extractors in case_list
+    }
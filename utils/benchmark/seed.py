@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.mysql import LONGTEXT
+
+from apps.base_model import db
+from apps.enums import SendReportTypeEnum
+from apps.config.model_factory import Config, RunEnv
+from apps.api_test.model_factory import ApiProject, ApiProjectEnv, ApiModule, ApiMsg, ApiCaseSuite, ApiCase, \
+    ApiStep, ApiTask
+
+
+@compiles(LONGTEXT, "sqlite")
+def compile_long_text_for_sqlite(type_, compiler, **kwargs):
+    """ sqlite 没有 LONGTEXT，用 TEXT """
+    return "TEXT"
+
+
+def build_extracts():
+    """ 每个步骤都从响应中提取id，供下一个步骤使用 """
+    return [{
+        "status": 1, "key": "item_id", "data_source": "content", "value": "data.id", "remark": None,
+        "update_to_header": None
+    }]
+
+
+def build_validates():
+    """ 每个步骤都断言响应的code """
+    return [{
+        "status": 1, "key": "code", "value": "0", "remark": None, "data_type": "int", "data_source": "content",
+        "validate_method": "相等", "validate_type": "data"
+    }]
+
+
+def seed_config():
+    """ 运行需要的配置 """
+    for name, value in [
+        ("request_time_out", "60"), ("wait_time_out", "5"), ("report_host", "http://localhost"),
+        ("api_report_addr", "/api-test/report"), ("web_ui_report_addr", "/ui-test/report"),
+        ("app_ui_report_addr", "/app-test/report"), ("holiday_list", "[]")
+    ]:
+        Config.model_create({"type": 1, "name": name, "value": value})
+
+
+def seed_data(host, project_count=2, api_count=50, case_count=20, step_count=10):
+    """ 生成压测用的数据：服务、接口、用例集、用例、步骤、任务，返回各个数据的id
+    host: 服务的测试环境地址（桩服务地址）
+    每条用例第一个步骤引用一条公共用例，其他步骤按顺序使用接口，后一个步骤的查询参数使用前一个步骤提取的数据
+    """
+    seed_config()
+    env = RunEnv.model_create_and_get({"name": "压测环境", "code": "benchmark", "group": "压测"})
+
+    project_list = []
+    for project_index in range(project_count):
+        project = ApiProject.model_create_and_get({
+            "name": f'压测服务{project_index}', "manager": 1, "business_id": 1, "script_list": []
+        })
+        ApiProjectEnv.model_create({
+            "project_id": project.id, "env_id": env.id, "host": host, "variables": [], "headers": []
+        })
+        project_list.append(project)
+    project = project_list[0]
+    module = ApiModule.model_create_and_get({"name": "压测模块", "project_id": project.id})
+
+    api_list = []
+    for api_index in range(api_count):
+        api_list.append(ApiMsg.model_create_and_get({
+            "name": f'压测接口{api_index}', "project_id": project_list[api_index % project_count].id,
+            "module_id": module.id, "addr": f'/api/item/{api_index}', "method": "GET",
+            "extracts": build_extracts(), "validates": build_validates()
+        }))
+
+    suite = ApiCaseSuite.model_create_and_get({"name": "压测用例集", "project_id": project.id, "suite_type": "process"})
+    case_fields = {"suite_id": suite.id, "run_times": 1, "desc": "压测", "skip_if": [], "variables": [], "headers": []}
+    quote_case = ApiCase.model_create_and_get({"name": "压测公共用例", **case_fields})
+    ApiStep.model_create({
+        "name": "公共步骤", "case_id": quote_case.id, "api_id": api_list[0].id, "project_id": project.id,
+        "extracts": build_extracts(), "validates": build_validates()
+    })
+
+    case_id_list = []
+    for case_index in range(case_count):
+        case = ApiCase.model_create_and_get({"name": f'压测用例{case_index}', **case_fields})
+        case_id_list.append(case.id)
+        step_list = [{"name": "引用公共用例", "case_id": case.id, "quote_case": quote_case.id, "project_id": project.id}]
+        for step_index in range(step_count):
+            api = api_list[(case_index + step_index) % api_count]
+            step_list.append({
+                "name": f'压测步骤{case_index}_{step_index}', "case_id": case.id, "api_id": api.id,
+                "project_id": api.project_id, "num": step_index + 1,
+                "params": [{"key": "last_id", "value": "$item_id"}, {"key": "page", "value": str(step_index)}],
+                "extracts": build_extracts(), "validates": build_validates()
+            })
+        for step in step_list:
+            ApiStep.model_create(step)
+
+    task = ApiTask.model_create_and_get({
+        "name": "压测任务", "project_id": project.id, "env_list": [env.code], "case_ids": case_id_list,
+        "suite_ids": [suite.id], "cron": "0 0 * * *", "is_send": SendReportTypeEnum.not_send.value, "is_async": 1
+    })
+
+    return {
+        "env_code": env.code,
+        "env_name": env.name,
+        "project_id": project.id,
+        "api_id_list": [api.id for api in api_list],
+        "case_id_list": case_id_list,
+        "task_id": task.id
+    }
+
+
+def create_tables():
+    """ 建表，sqlite 的 LONGTEXT 已在本模块处理 """
+    db.create_all()
+
+
+def init_database(host, **scale):
+    """ 建表并生成数据 """
+    create_tables()
+    return seed_data(host, **scale)
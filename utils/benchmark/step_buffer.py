@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import time
+
+from sqlalchemy import insert, select, update
+
+from .bench import init_db_config
+from .metrics import SqlCounter
+
+# 执行一个步骤依次更新的执行进度、结果，和 BaseReportStep 的 test_is_xxx 一致
+STEP_UPDATE_LIST = [
+    {"result": "running"}, {"process": "parse"}, {"process": "before"}, {"process": "run"}, {"process": "extract"},
+    {"process": "after"}, {"process": "validate"}, {"result": "success"}, {"step_data": {"response": {"code": 0}}}
+]
+
+
+def write_direct(step_model, step_id_list):
+    """ 改造前的写法，每次更新单独执行一条 update 并提交 """
+    db = step_model.db
+    for step_id in step_id_list:
+        for update_dict in STEP_UPDATE_LIST:
+            with db.auto_commit():
+                db.session.execute(update(step_model).where(step_model.id == step_id).values(**update_dict))
+
+
+def write_buffered(step_model, step_id_list):
+    """ 写缓冲，每个步骤的多次更新合并，批量写入 """
+    from apps.base_model import ReportStepWriteBuffer
+
+    write_buffer = ReportStepWriteBuffer(max_delay=3600)  # 不让后台线程按时间写入，只按数量和最后一次写入
+    for step_id in step_id_list:
+        for update_dict in STEP_UPDATE_LIST:
+            write_buffer.add(step_model, step_id, dict(update_dict))
+    write_buffer.flush()
+
+
+def run_step_buffer_benchmark(db_uri, step_count=1000):
+    """ step_count 个步骤，每个步骤依次更新 len(STEP_UPDATE_LIST) 次，对比逐条更新（direct）和写缓冲（buffered）的sql语句数、耗时，
+    以及两种方式写完之后步骤数据是否一致
+    """
+    init_db_config(db_uri)
+    from apps import create_app
+    from apps.api_test.model_factory import ApiReportStep
+    from utils.benchmark.seed import create_tables
+
+    app = create_app()
+    result = {}
+    with app.app_context():
+        create_tables()
+        db, final_dict = ApiReportStep.db, {}
+        for mode, write in [("direct", write_direct), ("buffered", write_buffered)]:
+            with db.auto_commit():
+                db.session.execute(insert(ApiReportStep), [{
+                    "name": f'压测步骤{index}', "report_id": 1, "report_case_id": 1, "element_id": index,
+                    "process": "waite", "result": "waite", "step_data": {}, "summary": {}
+                } for index in range(step_count)])
+            step_id_list = db.session.execute(select(ApiReportStep.id).where(
+                ApiReportStep.process == "waite").order_by(ApiReportStep.id)).scalars().all()
+
+            counter = SqlCounter()
+            counter.start()
+            start_at = time.perf_counter()
+            try:
+                write(ApiReportStep, step_id_list)
+            finally:
+                counter.stop()
+            result[mode] = {
+                "step": step_count, "time": round(time.perf_counter() - start_at, 3), "sql": counter.count["total"],
+                "update": counter.count["update"]
+            }
+            final_dict[mode] = [tuple(row) for row in db.session.execute(select(
+                ApiReportStep.process, ApiReportStep.result, ApiReportStep.step_data
+            ).where(ApiReportStep.id.in_(step_id_list)).order_by(ApiReportStep.id)).all()]
+        result["is_same"] = final_dict["direct"] == final_dict["buffered"]
+    return result
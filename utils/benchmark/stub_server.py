@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ 压测用的桩服务，任意请求都返回固定结构的json，响应延时由服务的 delay 控制 """
+
+    protocol_version = "HTTP/1.1"  # 支持长连接，和真实服务一样可以复用连接
+    disable_nagle_algorithm = True  # 响应头、响应体分两次写，长连接上不关 Nagle 会和客户端的延迟确认叠加出约40ms的等待
+
+    def handle_request(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.request_count += 1
+        body = json.dumps({
+            "code": 0,
+            "message": "ok",
+            "data": {
+                "id": self.server.request_count,
+                "path": self.path,
+                "items": [{"id": index, "name": f'item_{index}'} for index in range(self.server.item_count)]
+            }
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_request
+
+    def log_message(self, *args):
+        """ 不打印访问日志 """
+
+
+class StubServer:
+    """ 在本地随机端口启动桩服务
+        delay: 每个请求的响应延时（秒）
+        item_count: 响应中列表的长度，控制响应体的大小
+    """
+
+    def __init__(self, delay=0, item_count=10):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.delay, self.server.item_count, self.server.request_count = delay, item_count, 0
+        self.server.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def host(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    @property
+    def request_count(self):
+        return self.server.request_count
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from utils.client.test_runner.client.transport import HttpTransport
+from .stub_server import StubServer
+
+
+def send_with_new_connection(url):
+    """ 改造前的发送方式，每个步骤 requests.request，每次都新建连接 """
+    return requests.request("GET", url)
+
+
+def send_with_transport(transport, url):
+    """ 和 HttpSession 一样，每次请求用新的session，挂载报告共享的连接池 """
+    with transport.mount(requests.Session()) as session:
+        return session.request("GET", url)
+
+
+def run_transport_benchmark(request_count=1000, thread_count=1, stub_delay=0, max_keep_alive_requests=None):
+    """ 向本地桩服务发送 request_count 个请求，对比每次新建连接（new_connection）和连接池（pooled）的耗时
+        thread_count: 同时发送的线程数，模拟并行执行的用例
+        max_keep_alive_requests: 连接池最多处理的请求数，设置得比较小时可以观察并行时回收连接池的开销
+    """
+    server = StubServer(delay=stub_delay).start()
+    url, result = f'{server.host}/api/benchmark', {}
+    try:
+        for mode in ["new_connection", "pooled"]:
+            transport = HttpTransport(max_keep_alive_requests=max_keep_alive_requests)
+            if mode == "new_connection":
+                def send(index):
+                    return send_with_new_connection(url).status_code
+            else:
+                def send(index):
+                    return send_with_transport(transport, url).status_code
+
+            start_at = time.perf_counter()
+            with ThreadPoolExecutor(thread_count) as executor:
+                status_list = list(executor.map(send, range(request_count)))
+            total_time = time.perf_counter() - start_at
+            result[mode] = {
+                "count": request_count,
+                "time": round(total_time, 3),
+                "ms_per_request": round(total_time / request_count * 1000, 3),
+                "error": len([status for status in status_list if status != 200])
+            }
+            if mode == "pooled":
+                result[mode]["connection"] = transport.close()
+    finally:
+        server.stop()
+    return result
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import time
+
+from utils.client.test_runner.runner_context import SessionContext
+
+
+def build_payload_list(step_count, item_count):
+    """ 模拟每个步骤都提取了一个较大的json响应，每个响应单独解析，互不共用对象 """
+    payload = json.dumps({"code": 0, "data": {"id": 1, "list": [{
+        "id": index, "name": f'数据{index}', "tags": ["a", "b", "c"],
+        "detail": {"price": index * 1.5, "desc": "x" * 50, "is_valid": True}
+    } for index in range(item_count)]}})
+    return [json.loads(payload) for _ in range(step_count)]
+
+
+def run_variable_mode(mode, payload_list):
+    """ 按执行步骤的流程处理变量：初始化步骤变量、解析请求、记录发起请求时的变量、把提取的数据更新到会话变量
+    scope：变量作用域写时复制，记录变量时只复制引用
+    deepcopy：改造前的方式，记录变量时深拷贝两次
+    """
+    context = SessionContext({})
+    step_variables = {"page": 1, "token": "benchmark"}
+    request_template = {"url": "/api/list/$page", "method": "GET", "headers": {"token": "$token"}, "json": {}}
+
+    step_time_list = []
+    for index, payload in enumerate(payload_list):
+        start_at = time.perf_counter()
+        context.init_test_variables(step_variables)
+        parsed_request = context.eval_content(request_template)
+        context.update_test_variables("request", parsed_request)
+        variables_mapping = context.test_variables_mapping.snapshot("request")
+        if mode == "deepcopy":
+            variables_mapping = copy.deepcopy(copy.deepcopy(variables_mapping))
+        context.update_session_variables({f'response_{index}': payload})
+        step_time_list.append(time.perf_counter() - start_at)
+
+    return {
+        "total_time": round(sum(step_time_list), 4),
+        "ms_per_step": round(sum(step_time_list) / len(step_time_list) * 1000, 3),
+        "last_step_ms": round(step_time_list[-1] * 1000, 3)  # 最后一个步骤时，会话中的已提取数据最多
+    }
+
+
+def run_variable_benchmark(step_count=20, item_count=2000, mode_list=("deepcopy", "scope")):
+    """ 对比每个步骤深拷贝变量（deepcopy）和变量作用域写时复制（scope）的耗时，已提取的数据越大，差距越大 """
+    return {mode: run_variable_mode(mode, build_payload_list(step_count, item_count)) for mode in mode_list}
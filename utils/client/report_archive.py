@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from config import _report_archive_config
+from utils.logs.log import logger
+from utils.client.report_retention import ChunkDeleter
+
+
+class ReportArchiver(ChunkDeleter):
+    """ 测试报告归档，把执行完毕超过 archive_days 天的报告的用例、步骤数据压缩后移到归档表
+    按主键顺序分批扫描报告，只处理报告用例表中还有数据的报告，每个报告一个归档操作，归档之后暂停 report_pause 秒，
+    每次最多处理 max_report_per_run 个报告，中断或超出个数时下次从头扫描、跳过已归档的报告，可以反复执行
+        policy: 覆盖默认的归档策略，见 _report_archive_config
+    """
+
+    def __init__(self, report_model, report_case_model, report_step_model, **policy):
+        policy = {**_report_archive_config, **policy}
+        super(ReportArchiver, self).__init__(
+            policy.get("chunk_size"), policy["report_pause"], policy.get("dry_run", False), policy.get("on_progress"))
+        self.report_model, self.report_case_model, self.report_step_model = \
+            report_model, report_case_model, report_step_model
+        self.archive_model = report_case_model.archive_model
+        self.archive_days, self.compress_level = policy["archive_days"], policy["compress_level"]
+        self.max_report = policy["max_report_per_run"]
+
+    def iter_report_id_list(self):
+        """ 按主键分批扫描报告，每次返回一批要归档的报告id，报告id随创建时间递增，扫描到不满归档天数的报告时结束 """
+        model, case_model = self.report_model, self.report_case_model
+        archive_before = datetime.now() - timedelta(days=self.archive_days)
+        last_id = 0
+        while True:
+            report_list = model.db.session.execute(
+                select(model.id, model.status, model.create_time).where(
+                    model.id > last_id).order_by(model.id).limit(self.chunk_size)).all()
+            if not report_list:
+                model.db.session.rollback()
+                return
+            last_id = report_list[-1].id
+            finish_id_list = [
+                report.id for report in report_list
+                if report.status == 2 and report.create_time and report.create_time < archive_before
+            ]
+            if finish_id_list:  # 报告用例表中还有数据的才要归档，走 report_id 索引
+                id_list = case_model.db.session.execute(select(case_model.report_id).where(
+                    case_model.report_id.in_(finish_id_list)).distinct()).scalars().all()
+                if id_list:
+                    yield sorted(id_list)
+            model.db.session.rollback()
+            if report_list[-1].create_time and report_list[-1].create_time >= archive_before:
+                return
+
+    def count_report_data(self, report_id):
+        """ dry_run 时统计报告的用例、步骤数 """
+        stat = {}
+        for stat_key, model in [("case", self.report_case_model), ("step", self.report_step_model)]:
+            stat[stat_key] = model.db.session.execute(
+                select(func.count()).select_from(model).where(model.report_id == report_id)).scalar()
+        self.report_model.db.session.rollback()
+        return stat
+
+    def archive_report(self, report_id):
+        """ 归档一个报告 """
+        if self.dry_run:
+            stat = self.count_report_data(report_id)
+        else:
+            stat = self.archive_model.archive_report(
+                report_id, self.report_case_model, self.report_step_model, self.compress_level)
+            time.sleep(self.chunk_pause)
+        for stat_key, count in {"report": 1, **stat}.items():
+            self.stat[stat_key] = self.stat.get(stat_key, 0) + count
+
+    def run(self):
+        """ 执行归档，返回统计数据 """
+        table_name = self.report_model.__tablename__
+        if not self.archive_days or self.archive_model is None:
+            return {"dry_run": self.dry_run, "is_finish": True, **self.stat}
+        logger.info(f'开始归档测试报告【{table_name}】，dry_run: {self.dry_run}')
+        for report_id_list in self.iter_report_id_list():
+            for report_id in report_id_list:
+                if self.max_report and self.stat.get("report", 0) >= self.max_report:
+                    logger.info(f'测试报告【{table_name}】本次归档已达上限，剩下的下次归档，统计: {self.stat}')
+                    return {"dry_run": self.dry_run, "is_finish": False, **self.stat}
+                self.archive_report(report_id)
+            if self.on_progress:  # 每批报告回调一次，不每个报告都回调
+                self.on_progress({"dry_run": self.dry_run, **self.stat})
+            logger.info(f'归档测试报告【{table_name}】进度: {self.stat}')
+        logger.info(f'测试报告【{table_name}】归档完成，dry_run: {self.dry_run}，统计: {self.stat}')
+        return {"dry_run": self.dry_run, "is_finish": True, **self.stat}
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import threading
+
+from config import _report_event_config
+
+
+class ReportEventBus:
+    """ 测试报告进度的进程内事件总线
+    报告创建时登记到总线，执行过程中进度（process、status）有变化则推送到总线，
+    查询报告进度（轮询、server-sent events）直接读内存，不再每次都查数据库
+    报告是在创建报告的进程中执行的，其他进程中（或进程重启后）没有的批次，由调用方回退到查数据库
+    排队中的报告可能在其他进程中被取消，这类变化不会推送到当前进程，批次长时间没有变化时由调用方用数据库中的进度校正（sync）
+        channel: 报告表名，区分接口、ui、app自动化的报告
+        keep_time: 批次下的报告全部生成后，进度在内存中保留的时间（秒）
+        max_keep_time: 批次登记后在内存中保留的最长时间（秒）
+        check_time: 批次没有全部生成、且超过这个时间（秒）进度没有变化时，视为需要校正
+        heartbeat: server-sent events 心跳间隔（秒）
+    """
+
+    status_list = [[0, 1], [1, 1], [1, 2], [2, 1], [2, 2], [3, 1], [3, 2]]  # 报告进度的先后顺序
+
+    def __init__(self, keep_time=None, heartbeat=None, max_keep_time=None, check_time=None):
+        self.keep_time = keep_time or _report_event_config["keep_time"]
+        self.max_keep_time = max_keep_time or _report_event_config["max_keep_time"]
+        self.check_time = check_time or _report_event_config["check_time"]
+        self.heartbeat = heartbeat or _report_event_config["heartbeat"]
+        # {(channel, batch_id): {"reports": {report_id: [process, status]}, "version": 0, "done_at": None, "create_at": 0, "change_at": 0}}
+        self.batch_dict = {}
+        self.report_dict = {}  # 报告所属的批次 {(channel, report_id): (channel, batch_id)}
+        self.condition = threading.Condition()
+
+    def purge(self, now):
+        """ 清除全部生成后超过保留时间的批次，以及登记后超过最长保留时间的批次 """
+        for batch_key in list(self.batch_dict.keys()):
+            batch = self.batch_dict[batch_key]
+            if (batch["done_at"] and now - batch["done_at"] > self.keep_time) \
+                    or now - batch["create_at"] > self.max_keep_time:
+                for report_id in self.batch_dict.pop(batch_key)["reports"].keys():
+                    self.report_dict.pop((batch_key[0], report_id), None)
+
+    def register(self, channel, batch_id, report_id, process, status):
+        """ 登记新创建的报告 """
+        with self.condition:
+            self.purge(time.time())
+            batch = self.batch_dict.setdefault((channel, batch_id), {
+                "reports": {}, "version": 0, "done_at": None, "create_at": time.time(), "change_at": None})
+            batch["reports"][report_id] = [process, status]
+            self.report_dict[(channel, report_id)] = (channel, batch_id)
+            self.change_batch(batch)
+
+    def publish(self, channel, report_id, process=None, status=None):
+        """ 推送报告进度的变化，没有登记过的报告不处理 """
+        with self.condition:
+            batch_key = self.report_dict.get((channel, report_id))
+            if batch_key is None or batch_key not in self.batch_dict:
+                return
+            batch = self.batch_dict[batch_key]
+            report = batch["reports"][report_id]
+            report[0] = report[0] if process is None else process
+            report[1] = report[1] if status is None else status
+            self.change_batch(batch)
+
+    def sync(self, channel, batch_id, reports):
+        """ 用数据库中的进度校正批次的进度 {report_id: [process, status]}，有变化时推送 """
+        with self.condition:
+            batch = self.batch_dict.get((channel, batch_id))
+            if batch is None:
+                return
+            is_changed = False
+            for report_id, (process, status) in reports.items():
+                if batch["reports"].get(report_id) != [process, status]:
+                    batch["reports"][report_id] = [process, status]
+                    self.report_dict[(channel, report_id)] = (channel, batch_id)
+                    is_changed = True
+            if is_changed:
+                self.change_batch(batch)
+            else:
+                batch["change_at"] = time.time()
+
+    def is_stale(self, channel, batch_id):
+        """ 批次没有全部生成，且超过 check_time 秒进度没有变化 """
+        with self.condition:
+            batch = self.batch_dict.get((channel, batch_id))
+            return bool(batch) and not batch["done_at"] and time.time() - batch["change_at"] > self.check_time
+
+    def change_batch(self, batch):
+        """ 批次的版本号加1，并通知等待中的订阅者 """
+        batch["version"] += 1
+        batch["change_at"] = time.time()
+        batch["done_at"] = batch["change_at"] if self.is_finish(batch["reports"]) else None
+        self.condition.notify_all()
+
+    def get_batch(self, channel, batch_id):
+        """ 获取批次下报告的进度快照 {"version": 1, "reports": {report_id: [process, status]}}，批次不在内存中返回None """
+        with self.condition:
+            batch = self.batch_dict.get((channel, batch_id))
+            if batch:
+                return self.build_snapshot(batch)
+
+    def wait(self, channel, batch_id, version, time_out=None):
+        """ 等待批次进度变化（版本号和传入的不一样），超时返回当前快照 """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.batch_dict.get((channel, batch_id), {}).get("version") != version, timeout=time_out)
+            batch = self.batch_dict.get((channel, batch_id))
+            if batch:
+                return self.build_snapshot(batch)
+
+    @staticmethod
+    def build_snapshot(batch):
+        return {
+            "version": batch["version"],
+            "reports": {report_id: list(report) for report_id, report in batch["reports"].items()}
+        }
+
+    @classmethod
+    def select_status(cls, reports, process_and_status=[1, 1]):
+        """ 批次下离初始化状态最近的报告进度，只看传入状态之后的状态 """
+        index = cls.status_list.index(process_and_status)
+        report_status_list = list(reports.values())
+        for process, status in cls.status_list[index:]:
+            if [process, status] in report_status_list:
+                return {"process": process, "status": status}
+
+    @staticmethod
+    def is_all_done(reports):
+        """ 报告是否全部生成，和数据库查询的条件（process != 3 and status != 2）保持一致 """
+        return all(process == 3 or status == 2 for process, status in reports.values())
+
+    @staticmethod
+    def is_finish(reports):
+        """ 报告是否全部保存完毕 """
+        return all([process, status] == [3, 2] for process, status in reports.values())
+
+    @classmethod
+    def build_event(cls, snapshot, report_id=None):
+        """ 推送给前端的进度数据 """
+        reports = snapshot["reports"]
+        if report_id is not None:
+            reports = {report_id: reports[report_id]} if report_id in reports else {}
+        return {
+            **(cls.select_status(reports, [0, 1]) or {"process": 3, "status": 2}),
+            "reports": {
+                str(report_id): {"process": process, "status": status} for report_id, (process, status) in reports.items()
+            },
+            "is_done": cls.is_finish(reports)
+        }
+
+    @staticmethod
+    def format_event(data=None, retry=None):
+        """ server-sent events 的消息格式 """
+        message = f'retry: {retry}\n' if retry else ''
+        return message + (f'data: {json.dumps(data, ensure_ascii=False)}\n\n' if data is not None else ': heartbeat\n\n')
+
+    def stream(self, channel, batch_id, report_id=None, refresh=None):
+        """ 以 server-sent events 的格式推送批次的进度，有变化才推送，报告全部保存完毕后结束
+        refresh: 用数据库中的进度校正批次的方法，批次长时间没有变化时调用
+        """
+        version = None
+        while True:
+            snapshot = self.wait(channel, batch_id, version, self.heartbeat)
+            if snapshot is None:  # 批次已过期清除
+                return
+            if snapshot["version"] == version:
+                if refresh and self.is_stale(channel, batch_id):
+                    refresh()
+                yield self.format_event()
+                continue
+            version = snapshot["version"]
+            data = self.build_event(snapshot, report_id)
+            yield self.format_event(data)
+            if data["is_done"]:
+                return
+
+
+report_event_bus = ReportEventBus()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func
+
+from config import _report_retention_config
+from utils.logs.log import logger
+from utils.util.file_util import FileUtil
+
+
+class ChunkDeleter:
+    """ 按主键分批删除数据，每批一个短事务，批与批之间暂停，不长时间锁表
+        chunk_size: 每批删除的条数
+        chunk_pause: 每批删除之后暂停的秒数
+        dry_run: 只统计要删除的条数，不删除
+        on_progress: 每删除一批后回调，参数为统计数据 {统计项: 条数}
+    """
+
+    def __init__(self, chunk_size=None, chunk_pause=None, dry_run=None, on_progress=None):
+        self.chunk_size = chunk_size or _report_retention_config["chunk_size"]
+        self.chunk_pause = _report_retention_config["chunk_pause"] if chunk_pause is None else chunk_pause
+        self.dry_run = _report_retention_config["dry_run"] if dry_run is None else dry_run
+        self.on_progress = on_progress
+        self.stat = {}
+
+    def report_progress(self, stat_key, count):
+        self.stat[stat_key] = self.stat.get(stat_key, 0) + count
+        if count and self.on_progress:
+            self.on_progress({"dry_run": self.dry_run, **self.stat})
+
+    def delete_by_id(self, model, id_list, stat_key):
+        """ 按主键删除一批数据 """
+        if not id_list:
+            return
+        if not self.dry_run:
+            with model.db.auto_commit():
+                model.db.session.execute(
+                    delete(model).where(model.id.in_(id_list)).execution_options(synchronize_session=False))
+            time.sleep(self.chunk_pause)
+        self.report_progress(stat_key, len(id_list))
+
+    def delete_by_parent(self, model, parent_column, parent_id_list, stat_key):
+        """ 删除上级id在 parent_id_list 中的数据，每次查出一批主键再按主键删除，直到删完 """
+        if self.dry_run:
+            count = model.db.session.execute(
+                select(func.count()).select_from(model).where(parent_column.in_(parent_id_list))).scalar()
+            model.db.session.rollback()  # 结束查询的事务
+            return self.report_progress(stat_key, count)
+
+        while True:
+            id_list = model.db.session.execute(
+                select(model.id).where(parent_column.in_(parent_id_list)).limit(self.chunk_size)).scalars().all()
+            if not id_list:
+                model.db.session.rollback()
+                return
+            self.delete_by_id(model, id_list, stat_key)
+
+    def delete_orphan(self, model, parent_column, parent_model, stat_key):
+        """ 删除上级数据已不存在的数据
+        沿 parent_column 的索引按上级id分批取出去重的上级id，一次查询判断哪些上级已不存在，再按主键分批删除，不用 NOT IN 全部上级id
+        """
+        last_parent_id = None
+        while True:
+            query = select(parent_column).where(parent_column.isnot(None))
+            if last_parent_id is not None:
+                query = query.where(parent_column > last_parent_id)
+            parent_id_list = model.db.session.execute(
+                query.distinct().order_by(parent_column).limit(self.chunk_size)).scalars().all()
+            if not parent_id_list:
+                model.db.session.rollback()
+                return
+            last_parent_id = parent_id_list[-1]
+            exist_id_set = set(parent_model.db.session.execute(
+                select(parent_model.id).where(parent_model.id.in_(parent_id_list))).scalars().all())
+            orphan_id_list = [parent_id for parent_id in parent_id_list if parent_id not in exist_id_set]
+            if orphan_id_list:
+                self.delete_by_parent(model, parent_column, orphan_id_list, stat_key)
+
+
+class ReportRetention(ChunkDeleter):
+    """ 测试报告保留策略，清理报告和报告下的用例、步骤数据、截图
+    按主键顺序分批扫描报告，满足以下任意一条的报告会被清理：
+        1、通过的报告创建超过 keep_days 天
+        2、不通过、未执行完的报告创建超过 keep_fail_days 天
+        3、通过的报告不在所属服务最新的 keep_count_per_project 个报告之内
+    再清理报告已不存在的用例、步骤、归档数据（如页面上只删除了报告主数据），以及报告已不存在的截图目录
+        report_img_type: 截图类型，ui、app，接口自动化没有截图，不传
+        policy: 覆盖默认的保留策略，见 _report_retention_config
+    """
+
+    def __init__(self, report_model, report_case_model, report_step_model, report_img_type=None, **policy):
+        policy = {**_report_retention_config, **policy}
+        super(ReportRetention, self).__init__(
+            policy["chunk_size"], policy["chunk_pause"], policy["dry_run"], policy.get("on_progress"))
+        self.report_model, self.report_case_model, self.report_step_model = \
+            report_model, report_case_model, report_step_model
+        self.report_archive_model = report_case_model.archive_model  # 报告已归档的用例、步骤数据
+        self.report_img_type = report_img_type
+        self.keep_days, self.keep_fail_days = policy["keep_days"], policy["keep_fail_days"]
+        self.keep_count = policy["keep_count_per_project"]
+
+    def get_count_limit_dict(self):
+        """ 每个服务超出保留个数的最大报告id {服务id: 报告id}，id小于等于它的通过的报告要清理，走 project_id 索引 """
+        if not self.keep_count:
+            return {}
+        model, limit_dict = self.report_model, {}
+        project_id_list = model.db.session.execute(select(model.project_id).distinct()).scalars().all()
+        for project_id in project_id_list:
+            limit_id = model.db.session.execute(select(model.id).where(model.project_id == project_id).order_by(
+                model.id.desc()).offset(self.keep_count).limit(1)).scalar()
+            if limit_id:
+                limit_dict[project_id] = limit_id
+        model.db.session.rollback()
+        return limit_dict
+
+    def is_expired(self, report, now, count_limit_dict):
+        """ 报告是否要清理 """
+        is_keep_longer = report.is_passed == 0 or report.status != 2  # 不通过、未执行完
+        keep_days = self.keep_fail_days if is_keep_longer else self.keep_days
+        if keep_days and report.create_time and report.create_time < now - timedelta(days=keep_days):
+            return True
+        return not is_keep_longer and report.id <= count_limit_dict.get(report.project_id, 0)
+
+    def iter_expired_report_id_list(self):
+        """ 按主键分批扫描报告，每次返回一批要清理的报告id
+        报告id随创建时间递增，扫描到比最短保留天数还新、且超过所有服务保留个数界限的报告时，后面的报告都不用再看
+        """
+        model, now = self.report_model, datetime.now()
+        count_limit_dict = self.get_count_limit_dict()
+        max_limit_id = max(count_limit_dict.values(), default=0)
+        keep_days_list = [days for days in [self.keep_days, self.keep_fail_days] if days]
+        if not keep_days_list and not count_limit_dict:  # 没有配置保留天数、个数，不清理报告
+            return
+        newest_time = now - timedelta(days=min(keep_days_list)) if keep_days_list else None
+        last_id = 0
+        while True:
+            report_list = model.db.session.execute(
+                select(model.id, model.project_id, model.is_passed, model.status, model.create_time).where(
+                    model.id > last_id).order_by(model.id).limit(self.chunk_size)).all()
+            model.db.session.rollback()
+            if not report_list:
+                return
+            last_id = report_list[-1].id
+            expired_id_list = [report.id for report in report_list if self.is_expired(report, now, count_limit_dict)]
+            if expired_id_list:
+                yield expired_id_list
+            last_report = report_list[-1]
+            if last_report.id > max_limit_id and (
+                    newest_time is None or (last_report.create_time and last_report.create_time > newest_time)):
+                return
+
+    def delete_report_img(self, report_id_list, stat_key="img_folder"):
+        """ 删除报告的截图目录 """
+        img_path = FileUtil.get_report_img_path(self.report_img_type)
+        folder_list = [
+            str(report_id) for report_id in report_id_list if os.path.isdir(os.path.join(img_path, str(report_id)))]
+        if not self.dry_run:
+            FileUtil.delete_report_img_by_report_id(folder_list, self.report_img_type)
+        self.report_progress(stat_key, len(folder_list))
+
+    def delete_orphan_report_img(self):
+        """ 删除报告已不存在的截图目录 """
+        img_path = FileUtil.get_report_img_path(self.report_img_type)
+        if not os.path.isdir(img_path):
+            return
+        report_id_list = sorted(int(name) for name in os.listdir(img_path) if name.isdigit())
+        for index in range(0, len(report_id_list), self.chunk_size):
+            chunk_id_list = report_id_list[index:index + self.chunk_size]
+            exist_id_set = set(self.report_model.db.session.execute(
+                select(self.report_model.id).where(self.report_model.id.in_(chunk_id_list))).scalars().all())
+            self.report_model.db.session.rollback()
+            self.delete_report_img(
+                [report_id for report_id in chunk_id_list if report_id not in exist_id_set], "orphan_img_folder")
+
+    def run(self):
+        """ 执行清理，返回统计数据 """
+        table_name = self.report_model.__tablename__
+        logger.info(f'开始清理测试报告【{table_name}】，dry_run: {self.dry_run}')
+        for report_id_list in self.iter_expired_report_id_list():
+            # 先删报告下的数据，再删报告，中途中断也不会留下找不到报告的数据
+            self.delete_by_parent(
+                self.report_step_model, self.report_step_model.report_id, report_id_list, "report_step")
+            self.delete_by_parent(
+                self.report_case_model, self.report_case_model.report_id, report_id_list, "report_case")
+            if self.report_archive_model:
+                self.delete_by_parent(
+                    self.report_archive_model, self.report_archive_model.report_id, report_id_list, "report_archive")
+            if self.report_img_type:
+                self.delete_report_img(report_id_list)
+            self.delete_by_id(self.report_model, report_id_list, "report")
+            logger.info(f'清理测试报告【{table_name}】进度: {self.stat}')
+
+        self.delete_orphan(
+            self.report_step_model, self.report_step_model.report_id, self.report_model, "orphan_report_step")
+        self.delete_orphan(
+            self.report_case_model, self.report_case_model.report_id, self.report_model, "orphan_report_case")
+        if self.report_archive_model:
+            self.delete_orphan(self.report_archive_model, self.report_archive_model.report_id, self.report_model,
+                               "orphan_report_archive")
+        if self.report_img_type:
+            self.delete_orphan_report_img()
+        logger.info(f'测试报告【{table_name}】清理完成，dry_run: {self.dry_run}，统计: {self.stat}')
+        return {"dry_run": self.dry_run, **self.stat}
@@ -6,7 +6,7 @@ from apps import create_app
 from apps.assist.model_factory import Script
 from apps.enums import DataStatusEnum
 from apps.api_test.model_factory import ApiCaseSuite as CaseSuite, ApiMsg as Api, ApiStep as Step, \
-    ApiReportCase as ReportCase, ApiReportStep as reportStep
+    ApiReportCase as ReportCase
 from utils.logs.log import logger
 from utils.client.parse_model import StepModel, FormatModel
 from utils.client.run_test_runner import RunTestRunner
@@ -36,15 +36,15 @@ class RunApi(RunTestRunner):
         logger.info(f'本次测试的接口id：\n{self.api_id_list}')
 
         # 解析api
-        for api_id in self.api_id_list:
-            api_dict = self.get_format_api(self.project, api_id)
+        api_dict_list = [self.get_format_api(self.project, api_id) for api_id in self.api_id_list]
 
-            # 记录解析下后的用例，单接口运行时，没有用例，为了统一数据结构，所以把接口视为一条用例
-            report_case = ReportCase.model_create_and_get({
-                "report_id": self.report_id, "name": api_dict["name"], "case_data": api_dict,
-                "summary": ReportCase.get_summary_template()
-            })
+        # 记录解析下后的用例，单接口运行时，没有用例，为了统一数据结构，所以把接口视为一条用例
+        report_case_list = ReportCase.model_batch_create_and_get([{
+            "report_id": self.report_id, "name": api_dict["name"], "case_data": api_dict,
+            "summary": ReportCase.get_summary_template()
+        } for api_dict in api_dict_list], report_id=self.report_id)
 
+        for api_dict, report_case in zip(api_dict_list, report_case_list):
             # 用例的数据结构
             test_case_template = {
                 "config": {
@@ -61,11 +61,10 @@ class RunApi(RunTestRunner):
             headers.update(api_dict["request"]["headers"])
             api_dict["request"]["headers"] = headers
 
-            report_step = reportStep.model_create_and_get({
+            self.report_step_data_list.append({
                 "element_id": api_dict["id"], "report_id": self.report_id, "report_case_id": report_case.id,
                 "name": api_dict["name"], "step_data": api_dict
             })
-            api_dict["report_step_id"] = report_step.id
 
             # 把api加入到步骤
             test_case_template["step_list"].append(api_dict)
@@ -73,6 +72,7 @@ class RunApi(RunTestRunner):
             # 更新公共变量
             test_case_template["config"]["variables"].update(self.project.variables)
             self.run_data_template["case_list"].append(copy.deepcopy(test_case_template))
+        self.save_report_step_list()
         self.init_parsed_data()
 
 
@@ -80,18 +80,20 @@ class RunCase(RunTestRunner):
     """ 运行测试用例 """
 
     def __init__(self, report_id, case_id_list, env_code, env_name, temp_variables={}, task_dict={}, is_async=0,
-                 extend={}, **kwargs):
+                 extend={}, max_workers=None, **kwargs):
         super().__init__(report_id=report_id, env_code=env_code, env_name=env_name, run_type="api", task_dict=task_dict,
                          extend=extend)
         self.temp_variables = temp_variables
         self.run_data_template["is_async"] = is_async
+        self.run_data_template["max_workers"] = max_workers  # 并行执行时的并行数
         self.case_id_list = case_id_list  # 要执行的用例id_list
         self.all_case_steps = []  # 所有测试步骤
+        self.step_data_dict = {}  # 已序列化的步骤数据 {step_id: step.to_dict()}
 
     def parse_and_run(self):
         """ 把解析放到异步线程里面 """
         with create_app().app_context():  # 手动入栈
-            Script.create_script_file(self.env_code)  # 创建所有函数文件
+            self.script_dict = Script.get_script_snapshot()  # 本次运行使用的脚本快照
             self.report = self.report_model.get_first(id=self.report_id)
             self.parse_all_case()
             self.report.parse_data_finish()
@@ -145,32 +147,47 @@ class RunCase(RunTestRunner):
                 "files": step.data_file,
             }
         }
-        report_step = reportStep.model_create_and_get({
+        self.report_step_data_list.append({
             "element_id": api["id"], "step_id": step.id, "case_id": step.case_id, "report_id": self.report_id,
             "report_case_id": current_case.report_case_id, "name": step_data["name"], "step_data": step_data
-        })
-        step_data["report_step_id"] = report_step.id
+        })  # 所有用例解析完后批量创建，见 save_report_step_list
         return step_data
 
-    def get_all_steps(self, case_id: int):
-        """ 解析引用的用例 """
+    def get_all_steps(self, case_id: int, quote_path: tuple = ()):
+        """ 解析引用的用例
+        quote_path: 当前的用例引用链，用于判断是否循环引用
+        """
         case = self.get_format_case(case_id)
+        if case_id in quote_path:
+            quote_name_list = [self.get_format_case(quote_case_id).name for quote_case_id in (*quote_path, case_id)]
+            raise ValueError(f'用例存在循环引用：{" -> ".join(quote_name_list)}')
 
         if self.parse_case_is_skip(case.skip_if) is not True:  # 不满足跳过条件才解析
-            steps = Step.query.filter_by(
-                case_id=case.id, status=DataStatusEnum.ENABLE.value).order_by(Step.num.asc()).all()
+            if "step" in self.preload_dict:
+                steps = self.get_preload("step", case.id) or []
+            else:
+                steps = Step.query.filter_by(
+                    case_id=case.id, status=DataStatusEnum.ENABLE.value).order_by(Step.num.asc()).all()
             for step in steps:
                 if step.quote_case:
-                    self.get_all_steps(step.quote_case)
+                    self.get_all_steps(step.quote_case, (*quote_path, case_id))
                 else:
                     self.all_case_steps.append(step)
                     self.count_step += 1
                     self.api_set.add(step.api_id)
 
+    def get_step_data(self, step):
+        """ 步骤序列化后的数据，同一个步骤被多次引用、多次运行时只序列化一次 """
+        if step.id not in self.step_data_dict:
+            self.step_data_dict[step.id] = step.to_dict()
+        return self.step_data_dict[step.id]
+
     def parse_all_case(self):
         """ 解析所有用例 """
+        self.preload_case_data(self.case_id_list)  # 批量预加载要用到的数据
 
-        # 遍历要运行的用例
+        # 遍历要运行的用例，[(用例, 用例名)]，一条用例运行多次时，每次运行都是一条报告用例
+        run_case_list, report_case_data_list = [], []
         for case_id in self.case_id_list:
 
             current_case = self.get_format_case(case_id)
@@ -186,74 +203,88 @@ class RunCase(RunTestRunner):
 
             for index in range(current_case.run_times or 1):
                 case_name = f'{current_case.name}_{index + 1}' if current_case.run_times > 1 else current_case.name
-
-                # 记录解析下后的用例
                 case_summary = ReportCase.get_summary_template()
                 case_summary["case_name"] = case_name
-                report_case = ReportCase.model_create_and_get({
+                run_case_list.append((current_case, case_name))
+                report_case_data_list.append({
                     "name": case_name, "case_id": current_case.id, "report_id": self.report_id,
                     "case_data": current_case.get_attr(), "summary": case_summary
                 })
-                current_case.report_case_id = report_case.id
-
-                # 满足跳过条件则跳过
-                if self.parse_case_is_skip(current_case.skip_if) is True:
-                    report_case.test_is_skip()
-                    continue
-
-                current_project = self.get_format_project(CaseSuite.get_first(id=current_case.suite_id).project_id)
-
-                # 用例格式模板
-                case_template = {
-                    "config": {
-                        "report_case_id": report_case.id, "variables": {}, "name": case_name, "run_type": self.run_type
-                    },  # "headers": {}
-                    "step_list": []
-                }
-
-                self.get_all_steps(case_id)  # 递归获取测试步骤（中间有可能某些测试步骤是引用的用例）
-
-                # 循环解析测试步骤
-                all_variables = {}  # 当前用例的所有公共变量
-                for step in self.all_case_steps:
-                    step = StepModel(**step.to_dict())
-                    step_case = self.get_format_case(step.case_id)
-                    api_temp = Api.get_first(id=step.api_id)
-                    api_project = self.get_format_project(api_temp.project_id)
-                    api_data = self.get_format_api(api_project, api_obj=api_temp)
-
-                    if step.data_driver:  # 如果有step.data_driver，则说明是数据驱动， 此功能废弃
-                        """
-                        数据驱动格式
-                        [
-                            {"comment": "用例1描述", "data": "请求数据，支持参数化"},
-                            {"comment": "用例2描述", "data": "请求数据，支持参数化"}
-                        ]
-                        """
-                        for driver_data in step.data_driver:
-                            # 数据驱动的 comment 字段，用于做标识
-                            step.name += driver_data.get("comment", "")
-                            step.params = step.params = step.data_json = step.data_form = driver_data.get("data", {})
-                            case_template["step_list"].append(
-                                self.parse_step(current_project, api_project, current_case, step_case, api_data, step))
-                    else:
+
+        # 批量记录解析下后的用例
+        report_case_list = ReportCase.model_batch_create_and_get(report_case_data_list, report_id=self.report_id)
+
+        for (current_case, case_name), report_case in zip(run_case_list, report_case_list):
+            current_case.report_case_id = report_case.id
+
+            # 满足跳过条件则跳过
+            if self.parse_case_is_skip(current_case.skip_if) is True:
+                report_case.test_is_skip()
+                continue
+
+            current_suite = self.get_preload("suite", current_case.suite_id) or CaseSuite.get_first(
+                id=current_case.suite_id)
+            current_project = self.get_format_project(current_suite.project_id)
+
+            # 用例格式模板
+            case_template = {
+                "config": {
+                    "report_case_id": report_case.id, "variables": {}, "name": case_name, "run_type": self.run_type
+                },  # "headers": {}
+                "step_list": []
+            }
+
+            try:
+                self.get_all_steps(current_case.id)  # 递归获取测试步骤（中间有可能某些测试步骤是引用的用例）
+            except ValueError as error:  # 循环引用
+                logger.error(error.args[0])
+                report_case.test_is_error(error_msg=error.args[0])
+                self.all_case_steps = []
+                continue
+
+            # 循环解析测试步骤
+            all_variables = {}  # 当前用例的所有公共变量
+            for step in self.all_case_steps:
+                step = StepModel(**self.get_step_data(step))
+                step_case = self.get_format_case(step.case_id)
+                api_temp = self.get_preload("api", step.api_id) or Api.get_first(id=step.api_id)
+                api_project = self.get_format_project(api_temp.project_id)
+                api_data = self.get_format_api(api_project, api_obj=api_temp)
+
+                if step.data_driver:  # 如果有step.data_driver，则说明是数据驱动， 此功能废弃
+                    """
+                    数据驱动格式
+                    [
+                        {"comment": "用例1描述", "data": "请求数据，支持参数化"},
+                        {"comment": "用例2描述", "data": "请求数据，支持参数化"}
+                    ]
+                    """
+                    for driver_data in step.data_driver:
+                        # 数据驱动的 comment 字段，用于做标识
+                        step.name += driver_data.get("comment", "")
+                        step.params = step.params = step.data_json = step.data_form = driver_data.get("data", {})
                         case_template["step_list"].append(
                             self.parse_step(current_project, api_project, current_case, step_case, api_data, step))
+                else:
+                    case_template["step_list"].append(
+                        self.parse_step(current_project, api_project, current_case, step_case, api_data, step))
 
-                    # 把服务和用例的的自定义变量留下来
-                    all_variables.update(api_project.variables)
-                    all_variables.update(step_case.variables)
+                # 把服务和用例的的自定义变量留下来
+                all_variables.update(api_project.variables)
+                all_variables.update(step_case.variables)
 
-                # 更新当前服务+当前用例的自定义变量，最后以当前用例设置的自定义变量为准
-                all_variables.update(current_project.variables)
-                all_variables.update(current_case.variables)
-                case_template["config"]["variables"].update(all_variables)  # = all_variables
+            # 更新当前服务+当前用例的自定义变量，最后以当前用例设置的自定义变量为准
+            all_variables.update(current_project.variables)
+            all_variables.update(current_case.variables)
+            case_template["config"]["variables"].update(all_variables)  # = all_variables
 
-                self.run_data_template["case_list"].append(copy.deepcopy(case_template))
+            self.run_data_template["case_list"].append(copy.deepcopy(case_template))
 
-                # 完整的解析完一条用例后，去除对应的解析信息
-                self.all_case_steps = []
+            # 完整的解析完一条用例后，去除对应的解析信息
+            self.all_case_steps = []
 
         # 去除服务级的公共变量，保证用步骤上解析后的公共变量
         self.run_data_template["project_mapping"]["variables"] = {}
+        self.step_data_dict = {}
+        self.save_report_step_list()
         self.init_parsed_data()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import threading
+import traceback
+import itertools
+
+from apps.enums import TriggerTypeEnum
+from utils.logs.log import logger
+from config import _run_queue_config
+
+
+class RunQueue:
+    """ 测试执行队列
+    所有的运行（接口调试、用例、用例集、定时任务、流水线）都放到队列里面，由固定数量的执行线程取出执行，
+    超过并发数的运行排队，避免大任务占满线程和数据库连接
+        优先级: 接口/用例调试 > 手动运行 > 定时任务 > 流水线，同一优先级先进先出
+        max_workers: 同时执行的运行数
+        max_queue_size: 最多排队的运行数，超过则拒绝新的运行
+        project_max_running: 同一个服务同时执行的运行数，达到后这个服务的运行继续排队，先执行其他服务的
+        user_max_running: 同一个用户同时执行的运行数，达到后这个用户的运行继续排队，先执行其他用户的
+    """
+
+    priority_debug, priority_manual, priority_cron, priority_pipeline = 0, 1, 2, 3
+
+    def __init__(self, max_workers=None, max_queue_size=None, project_max_running=None, user_max_running=None):
+        self.max_workers = max_workers or _run_queue_config["max_workers"]
+        self.max_queue_size = max_queue_size or _run_queue_config["max_queue_size"]
+        self.project_max_running = project_max_running or _run_queue_config["project_max_running"]
+        self.user_max_running = user_max_running or _run_queue_config["user_max_running"]
+        self.pending_list = []  # 排队中的运行
+        self.project_running = {}  # 服务正在执行的运行数 {project_id: 1}
+        self.user_running = {}  # 用户正在执行的运行数 {user_id: 1}
+        self.counter = itertools.count()  # 入队顺序，同一优先级先进先出
+        self.condition = threading.Condition()
+        self.worker_list = []
+
+    @classmethod
+    def get_priority(cls, task_type, trigger_type):
+        """ 根据运行类型和触发方式获取优先级 """
+        if trigger_type == TriggerTypeEnum.pipeline:
+            return cls.priority_pipeline
+        if trigger_type == TriggerTypeEnum.cron:
+            return cls.priority_cron
+        if task_type in ("api", "case"):
+            return cls.priority_debug
+        return cls.priority_manual
+
+    def is_full(self):
+        """ 排队数是否已达到上限 """
+        with self.condition:
+            return len(self.pending_list) >= self.max_queue_size
+
+    def start_worker(self):
+        """ 按需启动执行线程，最多 max_workers 个 """
+        if len(self.worker_list) < self.max_workers:
+            worker = threading.Thread(target=self.run_worker, daemon=True)
+            worker.start()
+            self.worker_list.append(worker)
+
+    def submit(self, app, report_model, report_id, target, project_id, user_id=None, priority=None):
+        """ 把运行放到队列里面
+        app: flask app，执行线程中用于更新报告状态
+        report_model: 报告的模型，报告需为排队中的状态（process=0, status=1）
+        target: 执行运行的方法
+        """
+        with self.condition:
+            if len(self.pending_list) >= self.max_queue_size:
+                raise ValueError("当前排队执行的任务过多，请稍后再试")
+            self.pending_list.append({
+                "app": app,
+                "report_model": report_model,
+                "report_id": report_id,
+                "target": target,
+                "project_id": project_id,
+                "user_id": user_id,
+                "priority": self.priority_manual if priority is None else priority,
+                "index": next(self.counter)
+            })
+            self.start_worker()
+            self.condition.notify()
+
+    def cancel(self, report_model, report_id):
+        """ 从队列中移除排队中的运行，报告状态由报告模型自己更新 """
+        with self.condition:
+            self.pending_list = [
+                run for run in self.pending_list
+                if run["report_model"] is not report_model or run["report_id"] != report_id
+            ]
+
+    def get_queue_index(self, report_model, report_id_list):
+        """ 报告在当前进程中最靠前的排队位置，从1开始，都不在当前进程排队中返回None，用于报告状态接口展示排队位置 """
+        with self.condition:
+            pending_list = sorted(self.pending_list, key=lambda run: (run["priority"], run["index"]))
+            for index, run in enumerate(pending_list):
+                if run["report_model"] is report_model and run["report_id"] in report_id_list:
+                    return index + 1
+
+    def pop_runnable(self):
+        """ 取出优先级最高、且服务、用户的并发数没有达到上限的运行 """
+        for run in sorted(self.pending_list, key=lambda run: (run["priority"], run["index"])):
+            if self.project_running.get(run["project_id"], 0) >= self.project_max_running:
+                continue
+            if run["user_id"] is not None and self.user_running.get(run["user_id"], 0) >= self.user_max_running:
+                continue
+            self.pending_list.remove(run)
+            return run
+
+    def change_running_count(self, run, count):
+        self.project_running[run["project_id"]] = self.project_running.get(run["project_id"], 0) + count
+        if run["user_id"] is not None:
+            self.user_running[run["user_id"]] = self.user_running.get(run["user_id"], 0) + count
+
+    def run_worker(self):
+        """ 执行线程，循环从队列中取出运行并执行 """
+        while True:
+            with self.condition:
+                run = self.pop_runnable()
+                while run is None:
+                    self.condition.wait()
+                    run = self.pop_runnable()
+                self.change_running_count(run, 1)
+
+            try:
+                self.execute(run)
+            except Exception:
+                logger.error(f'执行队列运行报告【{run["report_id"]}】出错: \n{traceback.format_exc()}')
+            finally:
+                with self.condition:
+                    self.change_running_count(run, -1)
+                    self.condition.notify_all()
+
+    @staticmethod
+    def execute(run):
+        """ 把报告从排队中改为执行中，再执行运行，报告已被取消（可能是其他进程取消的）的不执行 """
+        with run["app"].app_context():
+            is_started = run["report_model"].start_queued_report(run["report_id"])
+        if is_started is False:
+            logger.info(f'报告【{run["report_id"]}】已取消，不执行')
+            return
+        run["target"]()
+
+
+run_queue = RunQueue()
@@ -1,11 +1,5 @@
 # -*- coding: utf-8 -*-
-import copy
-import json
-import types
-import importlib
-from threading import Thread
 
-from apps import create_app
 from apps.api_test.model_factory import ApiCaseSuite, ApiMsg, ApiCase, ApiStep, ApiProject, ApiProjectEnv, ApiReport, \
     ApiReportCase, ApiReportStep
 from apps.ui_test.model_factory import WebUiProject, WebUiProjectEnv, WebUiElement, WebUiCaseSuite, WebUiCase, \
@@ -16,10 +10,13 @@ from apps.app_test.model_factory import AppUiProject, AppUiProjectEnv, AppUiElem
 from apps.config.model_factory import RunEnv, WebHook
 from apps.assist.model_factory import Script
 from apps.config.model_factory import Config
-from apps.enums import TriggerTypeEnum
+from apps.enums import TriggerTypeEnum, DataStatusEnum
 from utils.client.test_runner.api import TestRunner
+from utils.client.test_runner.client.transport import HttpTransport
+from utils.client.test_runner.client.driver_pool import DriverPool
 from utils.client.test_runner.utils import build_url
 from utils.client.test_runner import built_in
+from utils.util.script_util import ScriptUtil
 from utils.client.parse_model import ProjectModel, ApiModel, CaseModel, ElementModel
 from utils.logs.log import logger
 from utils.message.send_report import async_send_report, call_back_for_pipeline
@@ -47,6 +44,9 @@ class RunTestRunner:
         self.parsed_element_dict = {}
         self.run_env = None
         self.report = None
+        self.preload_dict = {}  # 预加载的数据，见 preload_case_data
+        self.script_dict = None  # 本次运行的脚本快照，见 parse_functions
+        self.report_step_data_list = []  # 解析出来待创建的报告步骤数据，见 save_report_step_list
 
         self.api_model = ApiMsg
         self.element_model = None
@@ -89,6 +89,7 @@ class RunTestRunner:
         # testRunner需要的数据格式
         self.run_data_template = {
             "is_async": 0,
+            "max_workers": None,  # 并行执行时的并行数，不传则取默认配置
             "run_type": self.run_type,
             "report_id": self.report_id,
             "report_model": self.report_model,
@@ -110,8 +111,22 @@ class RunTestRunner:
         self.parsed_case_dict = {}
         self.parsed_api_dict = {}
         self.parsed_element_dict = {}
+        self.preload_dict = {}
         self.run_env = None
 
+    def save_report_step_list(self):
+        """ 所有用例解析完后，批量创建报告步骤数据，并把报告步骤id回填到解析后的步骤中
+        report_step_data_list 和 case_list 中的步骤都是按解析顺序添加的，一一对应
+        """
+        report_step_list = self.report_step_model.model_batch_create_and_get(
+            self.report_step_data_list, report_id=self.report_id)
+        step_list = [step for case in self.run_data_template["case_list"] for step in case["step_list"]]
+        for step, report_step in zip(step_list, report_step_list):
+            step["report_step_id"] = report_step.id
+            if "test_action" in step:  # ui自动化、app自动化，方便存截图
+                step["test_action"]["report_step_id"] = report_step.id
+        self.report_step_data_list = []
+
     def get_report_addr(self):
         """ 获取报告前端地址 """
         report_host = Config.get_report_host()
@@ -131,10 +146,10 @@ class RunTestRunner:
             self.run_env = RunEnv.get_first(code=self.env_code).to_dict()
 
         if project_id not in self.parsed_project_dict:
-            project = self.project_model.get_first(id=project_id).to_dict()
+            project = (self.get_preload("project", project_id) or self.project_model.get_first(id=project_id)).to_dict()
             self.parse_functions(project["script_list"])
-            project_env = self.project_env_model.get_first(
-                env_id=self.run_env["id"], project_id=project["id"]).to_dict()
+            project_env = (self.get_preload("project_env", project_id) or self.project_env_model.get_first(
+                env_id=self.run_env["id"], project_id=project["id"])).to_dict()
             project_env.update(project)
             project_env.update(self.run_env)
             self.parsed_project_dict.update({project_id: ProjectModel(**project_env)})
@@ -143,7 +158,8 @@ class RunTestRunner:
     def get_format_case(self, case_id):
         """ 从已解析的用例字典中取指定id的用例，如果没有，则取出来解析后放进去 """
         if case_id not in self.parsed_case_dict:
-            case = self.case_model.get_first(id=case_id)
+            case = self.get_preload("case", case_id) if "case" in self.preload_dict else self.case_model.get_first(
+                id=case_id)
             if not case:
                 return  # 可能存在任务选择了用例，在那边直接把这条用例删掉了的情况
             self.parse_functions(case.script_list)
@@ -162,22 +178,89 @@ class RunTestRunner:
         if api_obj:
             api_id = api_obj.id
         if api_id not in self.parsed_api_dict:
-            api = api_obj or ApiMsg.get_first(id=api_id)
+            api = api_obj or self.get_preload("api", api_id) or ApiMsg.get_first(id=api_id)
             if api.project_id not in self.parsed_project_dict:
-                self.parse_functions(json.loads(self.project_model.get_first(id=api.project_id).script_list))
+                self.parse_functions(self.project_model.get_first(id=api.project_id).script_list)
             self.parsed_api_dict.update({
                 api.id: self.parse_api(project, ApiModel(**api.to_dict()))
             })
         return self.parsed_api_dict[api_id]
 
+    def get_preload(self, data_type, data_id):
+        """ 从预加载的数据中取数据，没有预加载则返回None """
+        return self.preload_dict.get(data_type, {}).get(data_id)
+
+    def query_all_detached(self, query):
+        """ 查询数据，并把数据从session中移除
+        解析过程中会不断的写入报告数据并提交，提交后session中的数据会过期，再访问时会逐条重新查询，
+        移除后的数据保留已查出来的值，不会再重新查询
+        """
+        data_list = query.all()
+        for data in data_list:
+            self.report_model.db.session.expunge(data)
+        return data_list
+
+    def preload_case_data(self, case_id_list):
+        """ 预加载本次运行要用到的用例、步骤、用例集、接口、服务，避免解析时逐条查询
+        按引用层级批量查询用例和步骤（每一层两个查询），再一次性查出所有的用例集、接口、服务、服务环境
+        """
+        case_dict, step_dict, to_load_case_id_set = {}, {}, set(case_id_list)
+        while to_load_case_id_set:
+            case_dict.update({
+                case.id: case for case in self.query_all_detached(
+                    self.case_model.query.filter(self.case_model.id.in_(to_load_case_id_set)))
+            })
+            step_list = self.query_all_detached(self.step_model.query.filter(
+                self.step_model.case_id.in_(to_load_case_id_set), self.step_model.status == DataStatusEnum.ENABLE.value
+            ).order_by(self.step_model.num.asc()))
+            step_dict.update({case_id: [] for case_id in to_load_case_id_set})
+            for step in step_list:
+                step_dict[step.case_id].append(step)
+            to_load_case_id_set = {step.quote_case for step in step_list if step.quote_case} - set(step_dict.keys())
+
+        suite_id_set = {case.suite_id for case in case_dict.values()}
+        suite_dict = {
+            suite.id: suite
+            for suite in self.query_all_detached(self.suite_model.query.filter(self.suite_model.id.in_(suite_id_set)))
+        } if suite_id_set else {}
+        project_id_set = {suite.project_id for suite in suite_dict.values()}
+
+        api_dict = {}
+        if self.run_type == "api":
+            api_id_set = {step.api_id for step_list in step_dict.values() for step in step_list if not step.quote_case}
+            api_dict = {
+                api.id: api
+                for api in self.query_all_detached(self.api_model.query.filter(self.api_model.id.in_(api_id_set)))
+            } if api_id_set else {}
+            project_id_set.update({api.project_id for api in api_dict.values()})
+
+        if not self.run_env:
+            self.run_env = RunEnv.get_first(code=self.env_code).to_dict()
+        project_dict = {
+            project.id: project
+            for project in self.query_all_detached(self.project_model.query.filter(
+                self.project_model.id.in_(project_id_set)))
+        } if project_id_set else {}
+        project_env_dict = {
+            project_env.project_id: project_env for project_env in self.query_all_detached(
+                self.project_env_model.query.filter(
+                    self.project_env_model.env_id == self.run_env["id"],
+                    self.project_env_model.project_id.in_(project_id_set)))
+        } if project_id_set else {}
+
+        self.preload_dict = {
+            "case": case_dict, "step": step_dict, "suite": suite_dict, "api": api_dict, "project": project_dict,
+            "project_env": project_env_dict
+        }
+
     def parse_functions(self, func_list):
-        """ 获取自定义函数 """
+        """ 获取自定义函数，脚本内容取本次运行的快照，编译后的模块从缓存中取 """
+        if self.script_dict is None:
+            self.script_dict = Script.get_script_snapshot()
         for func_file_id in func_list:
-            func_file_name = Script.get_first(id=func_file_id).name
-            func_file_data = importlib.reload(importlib.import_module(f'script_list.{self.env_code}_{func_file_name}'))
-            self.run_data_template["project_mapping"]["functions"].update({
-                name: item for name, item in vars(func_file_data).items() if isinstance(item, types.FunctionType)
-            })
+            script = self.script_dict[func_file_id]
+            self.run_data_template["project_mapping"]["functions"].update(ScriptUtil.get_script_functions(
+                func_file_id, script["name"], script["script_data"], self.env_code))
 
     def parse_case_is_skip(self, skip_if_list, server_id=None, phone_id=None):
         """ 判断是否跳过用例，暂时只支持对运行环境的判断 """
@@ -251,59 +334,38 @@ class RunTestRunner:
                 self.send_report_if_task([{"report_id": query[0], "report_summary": query[1]} for query in query_res])
 
     def run_case(self):
-        """ 调 testRunner().run() 执行测试 """
+        """ 调 testRunner().run() 执行测试，并行执行（is_async）时由 ParallelCaseEngine 在线程池中按用例维度执行 """
         logger.info(f'请求数据：\n{self.run_data_template}')
-
-        if self.run_data_template.get("is_async", 0):
-            # 并行执行, 遍历case，以case为维度多线程执行，测试报告按顺序排列
-            run_case_res_dict = {}
-            self.report.run_case_start()
-            for index, case in enumerate(self.run_data_template["case_list"]):
-                run_case_res_dict[index] = False  # 用例运行标识，索引：是否运行完成
-                run_case_template = copy.deepcopy(self.run_data_template)
-                run_case_template["case_list"] = [case]
-                Thread(target=self.run_case_on_new_thread, args=[run_case_template, run_case_res_dict, index]).start()
-        else:  # 串行执行
-            self.sync_run_case()
-
-    def run_case_on_new_thread(self, run_case_template, run_case_res_dict, index):
-        """ 新线程运行用例 """
-        with create_app().app_context():  # 手动入栈
+        self.report.run_case_start()
+        summary = None
+        try:
             runner = TestRunner()
-            runner.run(run_case_template)
-            self.update_run_case_status(run_case_res_dict, index, runner.summary)
-
-    def update_run_case_status(self, run_case_res_dict, run_index, summary):
-        """ 每条用例执行完了都更新对应的运行状态，如果更新后的结果是用例全都运行了，则生成测试报告"""
-        run_case_res_dict[run_index] = summary
-        if all(run_case_res_dict.values()):  # 全都执行完毕
+            runner.run(self.run_data_template)
             self.report.run_case_finish()
-            all_summary = run_case_res_dict[0]
-            all_summary["stat"]["count"]["step"] = self.count_step
-            all_summary["stat"]["count"]["api"] = len(self.api_set)
-            all_summary["stat"]["count"]["element"] = len(self.element_set)
-            for index, res in enumerate(run_case_res_dict.values()):
-                if index != 0:
-                    self.build_summary(all_summary, res, ["test_case", "test_step"])  # 合并用例统计, 步骤统计
-                    all_summary["result"] = 'success' if all_summary["result"] == 'success' and res[
-                        "result"] == 'success' else 'fail'  # 测试报告状态
-                    all_summary["time"]["case_duration"] = summary["time"]["case_duration"]  # 总共耗时取运行最长的
-                    all_summary["time"]["step_duration"] = summary["time"]["step_duration"]  # 总共耗时取运行最长的
-            self.save_report_and_send_message(all_summary)
-
-    def sync_run_case(self):
-        """ 串行运行用例 """
-        self.report.run_case_start()
-        runner = TestRunner()
-        runner.run(self.run_data_template)
-        self.report.run_case_finish()
-        logger.info(f'测试执行完成，开始保存测试报告和发送报告')
-        summary = runner.summary
-        summary["stat"]["count"]["step"] = self.count_step
-        summary["stat"]["count"]["api"] = len(self.api_set)
-        summary["stat"]["count"]["element"] = len(self.element_set)
+            logger.info(f'测试执行完成，开始保存测试报告和发送报告')
+            summary = runner.summary
+            summary["stat"]["count"]["step"] = self.count_step
+            summary["stat"]["count"]["api"] = len(self.api_set)
+            summary["stat"]["count"]["element"] = len(self.element_set)
+            if runner.parallel_stat:
+                summary["stat"]["parallel"] = runner.parallel_stat
+        finally:  # 执行出错也要关闭连接池、会话池，否则报告的连接、浏览器会话会一直留在进程里
+            self.close_http_transport(summary)
+            self.close_driver_pool(summary)
         self.save_report_and_send_message(summary)
 
+    def close_http_transport(self, summary=None):
+        """ 关闭报告的http连接池，执行成功时把连接复用统计记录到报告的统计里 """
+        connection_stat = HttpTransport.close_transport(self.report_id)
+        if connection_stat and summary:
+            summary["stat"]["connection"] = connection_stat
+
+    def close_driver_pool(self, summary=None):
+        """ 关闭报告的浏览器/appium会话池，执行成功时把会话复用统计记录到报告的统计里 """
+        driver_pool_stat = DriverPool.close_pool(self.report_id)
+        if driver_pool_stat and summary:
+            summary["stat"]["driver_pool"] = driver_pool_stat
+
     def send_report_if_task(self, notify_list):
         """ 发送测试报告 """
         if self.task_dict:
@@ -353,10 +415,3 @@ class RunTestRunner:
                 "files": api.data_file
             }
         }
-
-    @staticmethod
-    def build_summary(source1, source2, field_list):
-        """ 合并测试报告统计 """
-        for field in field_list:
-            for key in source1["stat"][field]:
-                source1["stat"][field][key] += source2["stat"][field][key]
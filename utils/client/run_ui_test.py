@@ -10,6 +10,7 @@ from apps.assist.model_factory import Script
 from utils.client.run_test_runner import RunTestRunner
 from utils.client.parse_model import StepModel, FormatModel
 from utils.client.test_runner.utils import build_url
+from utils.client.test_runner.client.screenshot import screenshot_writer
 from utils.util.file_util import FileUtil
 from config import ui_action_mapping_reverse
 
@@ -18,7 +19,8 @@ class RunCase(RunTestRunner):
     """ 运行测试用例 """
 
     def __init__(self, case_id_list, temp_variables=None, task_dict={}, report_id=None, is_async=True, browser=True,
-                 env_code="test", env_name=None, appium_config={}, run_type="ui", extend={}, **kwargs):
+                 env_code="test", env_name=None, appium_config={}, run_type="ui", extend={}, driver_pool_size=None,
+                 **kwargs):
 
         super().__init__(report_id=report_id, env_code=env_code, env_name=env_name, run_type=run_type, extend=extend,
                          task_dict=task_dict)
@@ -48,12 +50,13 @@ class RunCase(RunTestRunner):
         self.run_data_template["is_async"] = is_async
         self.case_id_list = case_id_list  # 要执行的用例id_list
         self.appium_config = appium_config
+        self.driver_pool_size = driver_pool_size  # 浏览器/appium会话池大小
         self.all_case_steps = []  # 所有测试步骤
 
     def parse_and_run(self):
         """ 把解析放到异步线程里面 """
         with create_app().app_context():  # 手动入栈
-            Script.create_script_file(self.env_code)  # 创建所有函数文件
+            self.script_dict = Script.get_script_snapshot()  # 本次运行使用的脚本快照
             if self.run_type != "ui":
                 self.device_dict = {device.id: device.to_dict() for device in AppUiRunPhone.query.all()}
             self.report = self.report_model.get_first(id=self.report_id)
@@ -61,6 +64,11 @@ class RunCase(RunTestRunner):
             self.report.parse_data_finish()
             self.run_case()
 
+    def close_driver_pool(self, summary):
+        """ 关闭会话池，并等待步骤截图写入完毕，再保存报告 """
+        super().close_driver_pool(summary)
+        screenshot_writer.flush(self.report_img_folder, time_out=60)
+
     def parse_step(self, project, element, step):
         """ 解析测试步骤
         project: 当前步骤对应元素所在的项目(解析后的)
@@ -92,12 +100,10 @@ class RunCase(RunTestRunner):
             }
         }
 
-        report_step = self.report_step_model.model_create_and_get({
+        self.report_step_data_list.append({
             "element_id": element.id, "step_id": step.id, "case_id": step.case_id, "report_id": self.report_id,
             "report_case_id": step.report_case_id, "name": step_data["name"], "step_data": step_data
-        })
-        step_data["report_step_id"] = report_step.id
-        step_data["test_action"]["report_step_id"] = report_step.id  # 方便存截图
+        })  # 所有用例解析完后批量创建，并回填报告步骤id，见 save_report_step_list
         return step_data
 
     def parse_extracts(self, extracts: list):
@@ -222,7 +228,8 @@ class RunCase(RunTestRunner):
     def parse_all_case(self):
         """ 解析所有用例 """
 
-        # 遍历要运行的用例
+        # 遍历要运行的用例，[(用例, 用例名)]，一条用例运行多次时，每次运行都是一条报告用例
+        run_case_list, report_case_data_list = [], []
         for case_id in self.case_id_list:
 
             current_case = self.get_format_case(case_id)
@@ -236,83 +243,90 @@ class RunCase(RunTestRunner):
 
             for index in range(current_case.run_times or 1):
                 case_name = f'{current_case.name}_{index + 1}' if current_case.run_times > 1 else current_case.name
-
-                # 记录解析下后的用例
-                report_case = self.report_case_model.model_create_and_get({
+                run_case_list.append((current_case, case_name))
+                report_case_data_list.append({
                     "name": case_name, "case_id": current_case.id, "report_id": self.report_id,
                     "case_data": current_case.get_attr(), "summary": self.report_case_model.get_summary_template()
                 })
 
-                # 满足跳过条件则跳过
-                if self.parse_case_is_skip(current_case.skip_if, self.run_server_id, self.run_phone_id) is True:
-                    report_case.test_is_skip()
-                    continue
+        # 批量记录解析下后的用例
+        report_case_list = self.report_case_model.model_batch_create_and_get(
+            report_case_data_list, report_id=self.report_id)
 
-                project_id_query = self.suite_model.db.session.query(
-                    self.suite_model.project_id).filter(self.suite_model.id == current_case.suite_id).first()
-                current_project = self.get_format_project(project_id_query[0])
+        for (current_case, case_name), report_case in zip(run_case_list, report_case_list):
 
-                # 用例格式模板
-                case_template = {
-                    "config": {
-                        "report_case_id": report_case.id, "variables": {}, "name": case_name, "run_type": self.run_type
-                    },
-                    "step_list": []
-                }
-                if self.run_type == 'ui':
-                    # 用例格式模板, # 火狐：geckodriver
-                    case_template["config"]["browser_type"] = self.browser
-                    case_template["config"]["browser_path"] = FileUtil.get_driver_path(self.browser)
+            # 满足跳过条件则跳过
+            if self.parse_case_is_skip(current_case.skip_if, self.run_server_id, self.run_phone_id) is True:
+                report_case.test_is_skip()
+                continue
+
+            project_id_query = self.suite_model.db.session.query(
+                self.suite_model.project_id).filter(self.suite_model.id == current_case.suite_id).first()
+            current_project = self.get_format_project(project_id_query[0])
+
+            # 用例格式模板
+            case_template = {
+                "config": {
+                    "report_case_id": report_case.id, "variables": {}, "name": case_name, "run_type": self.run_type,
+                    "driver_pool_size": self.driver_pool_size
+                },
+                "step_list": []
+            }
+            if self.run_type == 'ui':
+                # 用例格式模板, # 火狐：geckodriver
+                case_template["config"]["browser_type"] = self.browser
+                case_template["config"]["browser_path"] = FileUtil.get_driver_path(self.browser)
+            else:
+                case_template["config"]["appium_config"] = self.appium_config
+
+            self.get_all_steps(current_case.id)  # 递归获取测试步骤（中间有可能某些测试步骤是引用的用例）
+
+            # 循环解析测试步骤
+            all_variables = {}  # 当前用例的所有公共变量
+            for step in self.all_case_steps:
+                step_case = self.get_format_case(step.case_id)
+                step_element = self.get_format_element(step.element_id)
+                step = StepModel(**step.to_dict())
+                step.report_case_id = report_case.id
+                step.execute_name = ui_action_mapping_reverse[step.execute_type]  # 执行方式的别名，用于展示测试报告
+                step.extracts = self.parse_extracts(step.extracts)  # 解析数据提取
+                step.validates = self.parse_validates(step.validates)  # 解析断言
+                element_project = self.get_format_project(step_element.project_id)  # 元素所在的项目
+
+                if step.data_driver:  # 如果有step.data_driver，则说明是数据驱动
+                    """
+                    数据驱动格式
+                    [
+                        {"comment": "用例1描述", "data": "请求数据，支持参数化"},
+                        {"comment": "用例2描述", "data": "请求数据，支持参数化"}
+                    ]
+                    """
+                    for driver_data in step.data_driver:
+                        # 数据驱动的 comment 字段，用于做标识
+                        step.name += driver_data.get("comment", "")
+                        step.params = step.params = step.data_json = step.data_form = driver_data.get("data", {})
+                        case_template["step_list"].append(
+                            self.parse_step(element_project, step_element, step))
                 else:
-                    case_template["config"]["appium_config"] = self.appium_config
-
-                self.get_all_steps(case_id)  # 递归获取测试步骤（中间有可能某些测试步骤是引用的用例）
-
-                # 循环解析测试步骤
-                all_variables = {}  # 当前用例的所有公共变量
-                for step in self.all_case_steps:
-                    step_case = self.get_format_case(step.case_id)
-                    step_element = self.get_format_element(step.element_id)
-                    step = StepModel(**step.to_dict())
-                    step.report_case_id = report_case.id
-                    step.execute_name = ui_action_mapping_reverse[step.execute_type]  # 执行方式的别名，用于展示测试报告
-                    step.extracts = self.parse_extracts(step.extracts)  # 解析数据提取
-                    step.validates = self.parse_validates(step.validates)  # 解析断言
-                    element_project = self.get_format_project(step_element.project_id)  # 元素所在的项目
-
-                    if step.data_driver:  # 如果有step.data_driver，则说明是数据驱动
-                        """
-                        数据驱动格式
-                        [
-                            {"comment": "用例1描述", "data": "请求数据，支持参数化"},
-                            {"comment": "用例2描述", "data": "请求数据，支持参数化"}
-                        ]
-                        """
-                        for driver_data in step.data_driver:
-                            # 数据驱动的 comment 字段，用于做标识
-                            step.name += driver_data.get("comment", "")
-                            step.params = step.params = step.data_json = step.data_form = driver_data.get("data", {})
-                            case_template["step_list"].append(
-                                self.parse_step(element_project, step_element, step))
-                    else:
-                        case_template["step_list"].append(self.parse_step(element_project, step_element, step))
-
-                    # 把服务和用例的的自定义变量留下来
-                    all_variables.update(element_project.variables)
-                    all_variables.update(step_case.variables)
-
-                # 更新当前服务+当前用例的自定义变量，最后以当前用例设置的自定义变量为准
-                all_variables.update(current_project.variables)
-                all_variables.update(current_case.variables)
-                all_variables.update({"device": self.device})  # 强制增加一个变量为设备id，用于去数据库查数据
-                all_variables.update({"device_id": self.device_id})  # 强制增加一个变量为设备id，用于去数据库查数据
-                case_template["config"]["variables"].update(all_variables)
-
-                self.run_data_template["case_list"].append(copy.deepcopy(case_template))
-
-                # 完整的解析完一条用例后，去除对应的解析信息
-                self.all_case_steps = []
+                    case_template["step_list"].append(self.parse_step(element_project, step_element, step))
+
+                # 把服务和用例的的自定义变量留下来
+                all_variables.update(element_project.variables)
+                all_variables.update(step_case.variables)
+
+            # 更新当前服务+当前用例的自定义变量，最后以当前用例设置的自定义变量为准
+            all_variables.update(current_project.variables)
+            all_variables.update(current_case.variables)
+            all_variables.update({"device": self.device})  # 强制增加一个变量为设备id，用于去数据库查数据
+            all_variables.update({"device_id": self.device_id})  # 强制增加一个变量为设备id，用于去数据库查数据
+            case_template["config"]["variables"].update(all_variables)
+
+            self.run_data_template["case_list"].append(copy.deepcopy(case_template))
+
+            # 完整的解析完一条用例后，去除对应的解析信息
+            self.all_case_steps = []
 
         # 去除服务级的公共变量，保证用步骤上解析后的公共变量
         self.run_data_template["project_mapping"]["variables"] = {}
+        self.save_report_step_list()
         self.init_parsed_data()
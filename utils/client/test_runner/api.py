@@ -3,28 +3,25 @@ import traceback
 
 from utils.logs.log import logger
 from . import exceptions, parser, runner
+from .parallel import ParallelCaseEngine
 
 
 class TestRunner:
 
     def __init__(self):
         self.summary = None
+        self.parallel_stat = None  # 并行执行的统计，见 ParallelCaseEngine
 
-    def run_test(self, parsed_tests_mapping):
-        """ 执行测试 """
-        case_summary_list = []
-        functions = parsed_tests_mapping.get("project_mapping", {}).get("functions", {})
-        report_case_model = parsed_tests_mapping.get("report_case_model")
-        report_step_model = parsed_tests_mapping.get("report_step_model")
-
-        for test_case_mapping in parsed_tests_mapping["case_list"]:  # 执行测试用例
-            report_case = report_case_model.query.filter_by(id=test_case_mapping["config"]["report_case_id"]).first()
-            case_runner = runner.Runner(test_case_mapping["config"], functions)
+    def run_case(self, test_case_mapping, functions, report_id, report_case_model, report_step_model):
+        """ 执行一条用例，返回用例的summary """
+        report_case = report_case_model.query.filter_by(id=test_case_mapping["config"]["report_case_id"]).first()
+        case_runner = runner.Runner(test_case_mapping["config"], functions, report_id=report_id)
 
-            report_case.summary["stat"]["total"] = len(test_case_mapping["step_list"])
-            report_case.test_is_running()
+        report_case.summary["stat"]["total"] = len(test_case_mapping["step_list"])
+        report_case.test_is_running()
 
-            report_case.summary["time"]["start_at"] = datetime.datetime.now()  # 开始执行用例时间
+        report_case.summary["time"]["start_at"] = datetime.datetime.now()  # 开始执行用例时间
+        try:
             for test_step in test_case_mapping["step_list"]:
                 try:
                     case_runner.run_step(test_step, report_step_model)  # 执行测试步骤
@@ -42,12 +39,31 @@ class TestRunner:
                     report_case.summary, case_runner.client_session.meta_data)
 
             report_case.summary["time"]["end_at"] = datetime.datetime.now()  # 用例执行结束时间
-            case_runner.try_close_browser()  # 执行完一条用例，不管是不是ui自动化，都强制执行关闭浏览器，防止执行时报错，导致没有关闭到浏览器造成driver进程一直存在
+            report_step_model.flush_write_buffer()  # 用例执行完毕，把缓冲的步骤进度、结果写入数据库
+        finally:
+            # 执行完一条用例，不管是不是ui自动化、是否执行异常，都强制执行关闭浏览器（有会话池的放回池中），防止driver进程一直存在
+            case_runner.try_close_browser()
+
+        report_case.save_case_result_and_summary()
+        return report_case.summary
+
+    def run_test(self, parsed_tests_mapping):
+        """ 执行测试，并行执行时用例在线程池中执行，结果仍按用例顺序返回 """
+        functions = parsed_tests_mapping.get("project_mapping", {}).get("functions", {})
+        report_id = parsed_tests_mapping.get("report_id")
+        report_case_model = parsed_tests_mapping.get("report_case_model")
+        report_step_model = parsed_tests_mapping.get("report_step_model")
+
+        def run_case(test_case_mapping):
+            return self.run_case(test_case_mapping, functions, report_id, report_case_model, report_step_model)
 
-            report_case.save_case_result_and_summary()
-            case_summary_list.append(report_case.summary)
+        if parsed_tests_mapping.get("is_async"):
+            engine = ParallelCaseEngine(run_case, parsed_tests_mapping.get("max_workers"))
+            case_summary_list = engine.run(parsed_tests_mapping["case_list"])
+            self.parallel_stat = engine.stat
+            return case_summary_list
 
-        return case_summary_list
+        return [run_case(test_case_mapping) for test_case_mapping in parsed_tests_mapping["case_list"]]
 
     def run(self, tests_dict):
         """ 执行测试的流程 """
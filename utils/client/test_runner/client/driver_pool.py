@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from ..webdriver_action import GetWebDriver, GetAppDriver
+from config import _driver_pool_config
+
+
+class DriverPool:
+    """ ui自动化、app自动化的浏览器/appium会话池
+    一次报告运行期间复用，按浏览器类型 / appium服务+设备 维护会话，用例执行完毕后重置会话状态放回池中，
+    下一条用例直接使用，不用每条用例都重新启动浏览器、重新建立appium会话
+        pool_size: 每个浏览器类型/设备最多保留的会话数，并行执行时超出的会话用完即关闭
+        max_reuse_count: 单个会话最多被使用的次数，达到后关闭会话，重新创建
+    """
+
+    _pool_dict = {}  # 运行中的报告对应的会话池 {report_id: DriverPool}
+    _pool_lock = threading.Lock()
+
+    def __init__(self, pool_size=None, max_reuse_count=None):
+        self.pool_size = pool_size or _driver_pool_config["pool_size"]
+        self.max_reuse_count = max_reuse_count or _driver_pool_config["max_reuse_count"]
+        self.idle_dict = {}  # 空闲的会话 {driver_key: [driver]}
+        self.driver_dict = {}  # 池中的会话（空闲 + 使用中）{id(driver): {"key": driver_key, "driver": driver, "use_count": 0}}
+        self.lock = threading.Lock()
+        self.stat = {
+            "acquire": 0,  # 获取会话的次数
+            "hit": 0,  # 复用已有会话的次数
+            "new_driver": 0,  # 新建的会话数
+            "overflow": 0,  # 超出池大小，用完即关闭的会话数
+            "broken": 0,  # 健康检查不通过而回收的会话数
+            "recycle": 0,  # 因达到使用次数上限而回收的会话数
+            "reset_fail": 0  # 重置状态失败而回收的会话数
+        }
+
+    @classmethod
+    def get_pool(cls, report_id, pool_size=None):
+        """ 获取报告对应的会话池，没有则创建 """
+        with cls._pool_lock:
+            if report_id not in cls._pool_dict:
+                cls._pool_dict[report_id] = cls(pool_size=pool_size)
+            return cls._pool_dict[report_id]
+
+    @classmethod
+    def close_pool(cls, report_id):
+        """ 报告运行完毕，关闭会话池，并返回会话复用统计 """
+        with cls._pool_lock:
+            pool = cls._pool_dict.pop(report_id, None)
+        return pool.close() if pool else None
+
+    @staticmethod
+    def get_driver_key(run_type, browser_name=None, appium_config={}):
+        """ 会话的key，ui自动化为浏览器类型，app自动化为 appium服务 + 设备 """
+        if run_type == "ui":
+            return f'ui:{browser_name}'
+        return f'app:{appium_config.get("host")}:{appium_config.get("port")}:{appium_config.get("deviceName")}'
+
+    @staticmethod
+    def new_driver(run_type, browser_driver_path=None, browser_name=None, appium_config={}):
+        if run_type == "ui":
+            return GetWebDriver(browser_driver_path=browser_driver_path, browser_name=browser_name)
+        return GetAppDriver(**appium_config)
+
+    @staticmethod
+    def quit_driver(driver):
+        try:
+            if isinstance(driver, GetWebDriver):
+                driver.close_browser()
+            else:
+                driver.driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def is_healthy(driver):
+        """ 健康检查，会话已失效（浏览器崩溃、appium会话超时）的会报错 """
+        try:
+            driver.driver.get_window_size()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def reset_driver(driver, appium_config={}):
+        """ 重置会话状态，浏览器：关闭多余的窗口、清除cookie和storage；app：重启app """
+        if isinstance(driver, GetWebDriver):
+            window_handles = driver.driver.window_handles
+            for handle in window_handles[1:]:
+                driver.driver.switch_to.window(handle)
+                driver.driver.close()
+            driver.driver.switch_to.window(window_handles[0])
+            driver.driver.delete_all_cookies()
+            driver.driver.execute_script("window.localStorage.clear();window.sessionStorage.clear();")
+            if hasattr(driver.driver, "execute_cdp_cmd"):  # chrome 清除所有域名的cookie
+                driver.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.driver.get("about:blank")
+        else:
+            app_package = appium_config.get("appPackage")
+            if app_package:
+                driver.driver.terminate_app(app_package)
+                driver.driver.activate_app(app_package)
+            else:
+                driver.driver.close_app()
+                driver.driver.launch_app()
+
+    def acquire(self, run_type, browser_driver_path=None, browser_name=None, appium_config={}):
+        """ 获取会话，优先复用空闲的会话 """
+        driver_key = self.get_driver_key(run_type, browser_name, appium_config)
+        with self.lock:
+            self.stat["acquire"] += 1
+
+        while True:
+            with self.lock:
+                idle_list = self.idle_dict.get(driver_key)
+                driver = idle_list.pop() if idle_list else None
+            if driver is None:
+                break
+            if self.is_healthy(driver):
+                with self.lock:
+                    self.driver_dict[id(driver)]["use_count"] += 1
+                    self.stat["hit"] += 1
+                return driver
+            with self.lock:
+                self.driver_dict.pop(id(driver), None)
+                self.stat["broken"] += 1
+            self.quit_driver(driver)
+
+        with self.lock:
+            is_pooled = len([item for item in self.driver_dict.values() if item["key"] == driver_key]) < self.pool_size
+
+        # 启动浏览器/app比较耗时，放在锁外面
+        driver = self.new_driver(run_type, browser_driver_path, browser_name, appium_config)
+        with self.lock:
+            self.stat["new_driver"] += 1
+            if is_pooled:
+                self.driver_dict[id(driver)] = {"key": driver_key, "driver": driver, "use_count": 1}
+            else:
+                self.stat["overflow"] += 1
+        return driver
+
+    def release(self, driver, appium_config={}):
+        """ 用例执行完毕，重置会话状态后放回池中，不能复用的直接关闭 """
+        with self.lock:
+            driver_info = self.driver_dict.get(id(driver))
+        if driver_info is None:  # 超出池大小的会话
+            self.quit_driver(driver)
+            return
+
+        if driver_info["use_count"] >= self.max_reuse_count:
+            stat_key = "recycle"
+        else:
+            try:
+                self.reset_driver(driver, appium_config)
+                stat_key = None
+            except Exception:
+                stat_key = "reset_fail"
+
+        with self.lock:
+            if stat_key:
+                self.driver_dict.pop(id(driver), None)
+                self.stat[stat_key] += 1
+            else:
+                self.idle_dict.setdefault(driver_info["key"], []).append(driver)
+        if stat_key:
+            self.quit_driver(driver)
+
+    def close(self):
+        """ 关闭所有会话（空闲的和还在使用中没有放回的），并返回会话复用统计
+        使用中的会话是用例执行异常没有放回的，关闭后再放回时按超出池大小的会话直接关闭
+        """
+        with self.lock:
+            driver_list = [driver_info["driver"] for driver_info in self.driver_dict.values()]
+            self.idle_dict, self.driver_dict = {}, {}
+            stat = dict(self.stat)
+        for driver in driver_list:
+            self.quit_driver(driver)
+        stat["hit_rate"] = round(stat["hit"] / stat["acquire"], 4) if stat["acquire"] else 0
+        return stat
@@ -1,20 +1,81 @@
 # -*- coding: utf-8 -*-
-import copy
+import re
+import codecs
+import logging
 from datetime import datetime
 from urllib import parse
 
 import urllib3
 import requests
 from requests import Request, Response
+from requests.compat import chardet
 from requests.exceptions import InvalidSchema, InvalidURL, MissingSchema, RequestException
 
+from config import _http_response_config
 from utils.util.file_util import FileUtil
 from utils.client.test_runner import logger
 from utils.client.test_runner.client import BaseSession
-from utils.client.test_runner.utils import build_url, lower_dict_keys, omit_long_data
+from utils.client.test_runner.utils import build_url, lower_dict_keys
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+charset_regexp = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+
+
+def get_codec_name(encoding):
+    """ 编码的标准名字，不支持的编码返回None """
+    try:
+        return codecs.lookup(encoding).name
+    except (LookupError, TypeError):
+        return None
+
+
+def get_response_encoding(response):
+    """ 响应体的编码
+    响应头中声明了编码则直接使用，没有声明时，只取响应体前 sniff_size 个字节判断：
+    依次尝试 utf-8、gb18030（兼容gbk、gb2312）解码，都不能解码时再识别编码
+    """
+    matched = charset_regexp.search(response.headers.get("content-type", ""))
+    if matched and get_codec_name(matched.group(1)):
+        return matched.group(1)
+
+    prefix = response.content[:_http_response_config["sniff_size"]]
+    for encoding in ("utf-8", "gb18030"):
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)  # 截取处可能是半个字符，不算解码失败
+            return encoding
+        except UnicodeDecodeError:
+            pass
+    return chardet.detect(prefix)["encoding"] or "utf-8"
+
+
+def load_response_json(response):
+    """ 响应体转json，每个响应只解析一次，解析的结果（包括不是json时的异常）保存在响应对象上 """
+    if "parsed_json" not in response.__dict__:
+        try:
+            response.parsed_json = (True, response.json())
+        except ValueError as error:
+            response.parsed_json = (False, error)
+
+    is_json, value = response.parsed_json
+    if is_json is False:
+        raise value
+    return value
+
+
+def get_response_text_record(response, max_length):
+    """ 报告中记录的文本响应体，只解码前面 max_length 个字符对应的字节，不解码整个响应体 """
+    content = response.content
+    if not content:
+        return ""
+
+    prefix = content[:max_length * 4]  # 一个字符最多4个字节
+    decoder = codecs.getincrementaldecoder(get_codec_name(response.encoding) or "utf-8")(errors="replace")
+    text = decoder.decode(prefix, final=len(prefix) == len(content))
+    if len(prefix) == len(content) and len(text) <= max_length:
+        return text
+    return f'{text[:max_length]} ... OMITTED, {len(content)} BYTES IN TOTAL ...'
+
 
 class ApiResponse(Response):
 
@@ -33,20 +94,23 @@ class HttpSession(BaseSession):
 
     base_url为host，用于批量发请求时，拼接请求地址
     url允许只传接口地址，不传host，此时在发请求时会自动加上base_url
+    transport为报告运行期间共享的连接池（HttpTransport），没有传则每次请求都新建连接
     """
 
-    def __init__(self, base_url=None, *args, **kwargs):
+    def __init__(self, base_url=None, transport=None, *args, **kwargs):
         # super(HttpSession, self).__init__(*args, **kwargs)
         self.base_url = base_url if base_url else ""
+        self.transport = transport
         self.request_at = self.response_at = datetime.now()
         self.init_step_meta_data()
 
-    def get_req_resp_record(self, resp_obj):
-        """ 从response对象中获取请求和响应信息。 """
-        # 把编码统一设为utf-8，防止响应体乱码
-        resp_obj.encoding = 'utf-8'
-
+    def get_req_resp_record(self, resp_obj, record_body=True):
+        """ 从response对象中获取请求和响应信息。
+        record_body: 是否记录响应体，重定向过程中的响应只记录状态码、地址、头部信息
+        """
         def log_print(req_resp_dict, r_type):
+            if not logger.logger.isEnabledFor(logging.DEBUG):  # 不打debug日志时不用拼接，避免格式化大响应体
+                return
             msg = f"\n================== {r_type} 详细信息 ==================\n"
             for key, value in req_resp_dict[r_type].items():
                 msg += "{:<16} : {}\n".format(key, repr(value))
@@ -84,17 +148,23 @@ class HttpSession(BaseSession):
         content_type = lower_resp_headers.get("content-type", "")
         req_resp_dict["response"]["content_type"] = content_type
 
-        if "image" in content_type:
+        if record_body is False:
+            pass
+        elif "image" in content_type:
             # 响应数据为图片，则存bytes数据流
             req_resp_dict["response"]["content"] = resp_obj.content
         else:
-            try:
-                # 响应体转json
-                req_resp_dict["response"]["json"] = resp_obj.json()
-            except ValueError:
+            # 在记录时就按大小截断，超过 record_max_size 的响应体不记录json，文本只解码要记录的部分
+            is_json = len(resp_obj.content or "") <= _http_response_config["record_max_size"]
+            if is_json:
+                try:
+                    req_resp_dict["response"]["json"] = load_response_json(resp_obj)  # 响应体转json
+                except ValueError:
+                    is_json = False
+            if is_json is False:
                 # 若不能转为json，则转为文本，默认最多512个字符
-                resp_text = resp_obj.text
-                req_resp_dict["response"]["text"] = omit_long_data(resp_text)
+                req_resp_dict["response"]["text"] = get_response_text_record(
+                    resp_obj, _http_response_config["record_text_length"])
 
         log_print(req_resp_dict, "response")
 
@@ -114,7 +184,10 @@ class HttpSession(BaseSession):
         # 构建请求的url
         url = build_url(self.base_url, url)
 
-        copy_kwargs = copy.deepcopy(kwargs)  # 保留转码前的内容
+        # 保留转码前的内容，下面只会替换 files、data，修改 headers，不深拷贝请求数据
+        copy_kwargs = dict(kwargs)
+        if isinstance(copy_kwargs.get("headers"), dict):
+            copy_kwargs["headers"] = dict(copy_kwargs["headers"])
         copy_kwargs["files"] = FileUtil.build_request_file(copy_kwargs["files"])  # 构建文件请求对象
         # 如果是 x-www-form-urlencoded 则进行转码
         if copy_kwargs.get("headers", {}).get("Content-Type", None) == 'application/x-www-form-urlencoded':
@@ -122,10 +195,14 @@ class HttpSession(BaseSession):
             copy_kwargs["data"] = parse.urlencode(copy_kwargs["data"])
 
         response = self._send_request_safe_mode(method, url, **copy_kwargs)  # 发送请求
+        self.record_response(response, name, kwargs)
+        return response
 
-        # requests包get响应内容中文乱码解决
+    def record_response(self, response, name, kwargs):
+        """ 记录请求耗时、请求和响应信息 """
+        # 确定响应体的编码，防止中文乱码，不对整个响应体做编码识别
         if response.content:
-            response.encoding = response.apparent_encoding
+            response.encoding = get_response_encoding(response)
 
         # 获取内容的长度，如果stream为True，则从响应头部获取，否则计算响应内容的长度
         if kwargs.get("stream", False):
@@ -140,9 +217,9 @@ class HttpSession(BaseSession):
             "request_at": self.request_at.strftime("%Y-%m-%d %H:%M:%S.%f"),
             "response_at": self.response_at.strftime("%Y-%m-%d %H:%M:%S.%f"),
         }
-        # 记录请求和响应历史记录，包括 3x 的重定向
-        response_list = response.history + [response]
-        self.meta_data["data"] = [self.get_req_resp_record(resp_obj) for resp_obj in response_list]
+        # 记录请求和响应历史记录，包括 3x 的重定向，重定向的响应不记录响应体
+        self.meta_data["data"] = [self.get_req_resp_record(resp_obj, False) for resp_obj in response.history]
+        self.meta_data["data"].append(self.get_req_resp_record(response))
         self.meta_data["data"][0]["request"].update(kwargs)
         try:
             response.raise_for_status()
@@ -154,14 +231,17 @@ class HttpSession(BaseSession):
                 f"""步骤: {name}, 响应状态码: {response.status_code}, 耗时: {self.meta_data["stat"]["elapsed_ms"]} ms, response_length: {content_size} bytes\n"""
             )
 
-        return response
-
     def _send_request_safe_mode(self, method, url, **kwargs):
         """ 发送HTTP请求，并捕获由于连接问题而可能发生的任何异常。 """
         try:
             self.request_at = datetime.now()
             # response = requests.Session.request(self, method, url, **kwargs)
-            response = requests.request(method, url, **kwargs)
+            if self.transport:
+                # 每次请求都用新的session，保证cookie等会话信息与不使用连接池时一致，只复用底层的连接
+                with self.transport.mount(requests.Session()) as session:
+                    response = session.request(method, url, **kwargs)
+            else:
+                response = requests.request(method, url, **kwargs)
             self.response_at = datetime.now()
             return response
         except (MissingSchema, InvalidSchema, InvalidURL):
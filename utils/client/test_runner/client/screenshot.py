@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import queue
+import shutil
+import hashlib
+import threading
+import traceback
+
+try:
+    from PIL import Image
+except ImportError:  # 没有安装 Pillow 则不缩小截图
+    Image = None
+
+from utils.client.test_runner import logger
+from config import _screenshot_config
+
+
+class ScreenshotWriter:
+    """ ui自动化、app自动化的步骤截图写入
+    步骤线程只负责截图（png二进制），缩小、计算hash、写文件都放到后台线程中，不阻塞步骤执行
+    截图以二进制png保存：{report_step_id}_{img_type}.png，比之前的base64文本小1/3
+    同一个报告下内容相同的截图（如上一步的执行后截图和下一步的执行前截图）只写一份，其他的用硬链接指向同一个文件
+        policy: 截图策略，always：执行前后都截图，after：只截执行后的图，fail：只在步骤执行失败时截图
+        max_width: 截图最大宽度，超过则等比缩小，0为不缩小
+        queue_size: 后台写入队列的大小，队列满了则在步骤线程中直接写入
+    """
+
+    policy_always, policy_after, policy_fail = "always", "after", "fail"
+
+    def __init__(self, policy=None, max_width=None, queue_size=None):
+        self.policy = policy or _screenshot_config["policy"]
+        self.max_width = _screenshot_config["max_width"] if max_width is None else max_width
+        self.queue = queue.Queue(maxsize=queue_size or _screenshot_config["queue_size"])
+        self.folder_dict = {}  # 报告截图目录的写入情况 {folder: {"pending": 0, "hash": {content_hash: file_path}, "is_flushed": False}}
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def need_before(self):
+        return self.policy == self.policy_always
+
+    def need_after(self):
+        return self.policy in (self.policy_always, self.policy_after)
+
+    def need_fail(self):
+        """ 只在步骤执行失败时截图，由执行器在步骤结果确定后（包括断言不通过）截图 """
+        return self.policy == self.policy_fail
+
+    def start_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.run_worker, daemon=True)
+            self.worker.start()
+
+    def submit(self, folder, report_step_id, img_type, png_data):
+        """ 把截图放到写入队列 """
+        with self.condition:
+            self.folder_dict.setdefault(folder, {"pending": 0, "hash": {}})["pending"] += 1
+            self.start_worker()
+        task = (folder, f'{report_step_id}_{img_type}.png', png_data)
+        try:
+            self.queue.put_nowait(task)
+        except queue.Full:
+            self.write(*task)
+
+    def run_worker(self):
+        while True:
+            self.write(*self.queue.get())
+
+    def resize(self, png_data):
+        """ 截图宽度超过 max_width 的等比缩小 """
+        if not self.max_width or Image is None:
+            return png_data
+        image = Image.open(io.BytesIO(png_data))
+        if image.width <= self.max_width:
+            return png_data
+        image = image.resize((self.max_width, int(image.height * self.max_width / image.width)))
+        output = io.BytesIO()
+        image.save(output, format="PNG", optimize=True)
+        return output.getvalue()
+
+    def write(self, folder, file_name, png_data):
+        """ 写入截图，同一个报告下内容相同的截图用硬链接，不重复写入 """
+        file_path = os.path.join(folder, file_name)
+        try:
+            content_hash = hashlib.sha1(png_data).hexdigest()  # 原始截图的hash，不用等缩小后再判断是否重复
+            with self.condition:
+                same_file_path = self.folder_dict.get(folder, {"hash": {}})["hash"].get(content_hash)
+            if same_file_path and self.link_file(same_file_path, file_path):
+                return
+            with open(file_path, "wb") as file:
+                file.write(self.resize(png_data))
+            with self.condition:
+                if folder in self.folder_dict:
+                    self.folder_dict[folder]["hash"][content_hash] = file_path
+        except Exception:
+            logger.log_error(f'写入截图【{file_path}】出错: \n{traceback.format_exc()}')
+        finally:
+            with self.condition:
+                folder_data = self.folder_dict.get(folder)
+                if folder_data:
+                    folder_data["pending"] -= 1
+                    if folder_data["pending"] <= 0 and folder_data.get("is_flushed"):  # flush 等待超时后写完的
+                        self.folder_dict.pop(folder, None)
+                self.condition.notify_all()
+
+    @staticmethod
+    def link_file(source_path, file_path):
+        """ 用硬链接指向已写入的截图，不支持硬链接的文件系统则复制 """
+        try:
+            os.link(source_path, file_path)
+        except OSError:
+            try:
+                shutil.copyfile(source_path, file_path)
+            except OSError:
+                return False
+        return True
+
+    def flush(self, folder, time_out=None):
+        """ 等待报告的截图都写入完毕，并释放报告的截图记录
+        等待超时时还有截图没写完的，保留截图记录，由最后一张截图写完时释放
+        """
+        with self.condition:
+            is_done = self.condition.wait_for(
+                lambda: self.folder_dict.get(folder, {}).get("pending", 0) <= 0, timeout=time_out)
+            if is_done:
+                self.folder_dict.pop(folder, None)
+            else:
+                logger.log_error(f'等待报告截图写入超时，还有 {self.folder_dict[folder]["pending"]} 张截图在写入: {folder}')
+                self.folder_dict[folder]["is_flushed"] = True
+
+
+screenshot_writer = ScreenshotWriter()
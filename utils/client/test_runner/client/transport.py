@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from urllib.parse import urlparse
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from config import _http_pool_config
+
+
+class HostPoolAdapter(BaseAdapter):
+    """ 挂载到 requests.Session 上的适配器，根据请求地址把请求分发到对应域名的连接池（包括重定向后的请求） """
+
+    def __init__(self, transport):
+        super(HostPoolAdapter, self).__init__()
+        self.transport = transport
+
+    def send(self, request, **kwargs):
+        host_adapter = self.transport.acquire_host_adapter(request.url)
+        try:
+            return host_adapter["adapter"].send(request, **kwargs)
+        finally:
+            self.transport.release_host_adapter(host_adapter)
+
+    def close(self):
+        """ 连接池的生命周期由 HttpTransport 管理，session关闭时不关闭连接池 """
+
+
+class HttpTransport:
+    """ 接口测试的http连接池
+    一次报告运行期间复用，按域名（scheme + host + port）维护连接池，同一个域名下的步骤复用已建立的TCP连接，
+    不用每个步骤都重新建立连接、TLS握手
+        pool_maxsize: 每个域名连接池的最大连接数
+        max_keep_alive_requests: 单个域名连接池最多处理的请求数，达到后回收连接池，重新建立连接
+        idle_time_out: 域名连接池的空闲超时时间（秒），超过这个时间没有请求，则回收连接池
+    """
+
+    _transport_dict = {}  # 运行中的报告对应的连接池 {report_id: HttpTransport}
+    _transport_lock = threading.Lock()
+
+    def __init__(self, pool_maxsize=None, max_keep_alive_requests=None, idle_time_out=None):
+        self.pool_maxsize = pool_maxsize or _http_pool_config["pool_maxsize"]
+        self.max_keep_alive_requests = max_keep_alive_requests or _http_pool_config["max_keep_alive_requests"]
+        self.idle_time_out = idle_time_out or _http_pool_config["idle_time_out"]
+        self.host_adapter_dict = {}  # {"https://www.xxx.com:443": {"adapter": HTTPAdapter, "request_count": 0, ...}}，见 new_host_adapter
+        self.adapter = HostPoolAdapter(self)
+        self.lock = threading.Lock()
+        self.stat = {
+            "request": 0,  # 发出的请求数
+            "host": 0,  # 创建过的域名连接池数
+            "new_connection": 0,  # 新建的连接数
+            "reuse_connection": 0,  # 复用已有连接的请求数
+            "recycle": 0,  # 因达到请求数上限而回收的连接池数
+            "evict": 0  # 因空闲超时而回收的连接池数
+        }
+
+    @classmethod
+    def get_transport(cls, report_id):
+        """ 获取报告对应的连接池，没有则创建 """
+        with cls._transport_lock:
+            if report_id not in cls._transport_dict:
+                cls._transport_dict[report_id] = cls()
+            return cls._transport_dict[report_id]
+
+    @classmethod
+    def close_transport(cls, report_id):
+        """ 报告运行完毕，关闭连接池，并返回连接复用统计 """
+        with cls._transport_lock:
+            transport = cls._transport_dict.pop(report_id, None)
+        return transport.close() if transport else None
+
+    @staticmethod
+    def get_host_key(url):
+        """ 域名连接池的key，scheme + host + port """
+        parsed_url = urlparse(url)
+        port = parsed_url.port or (443 if parsed_url.scheme == "https" else 80)
+        return f'{parsed_url.scheme}://{parsed_url.hostname}:{port}'
+
+    def new_host_adapter(self):
+        self.stat["host"] += 1
+        return {
+            "adapter": HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize),
+            "request_count": 0,
+            "in_flight": 0,  # 正在使用这个连接池发送的请求数
+            "is_retired": False,  # 已回收（不再分配新请求），正在发送的请求结束后关闭
+            "last_used_at": time.time()
+        }
+
+    def close_host_adapter(self, host_adapter):
+        """ 把域名连接池的连接数统计汇总后，关闭连接池 """
+        pool_manager = host_adapter["adapter"].poolmanager
+        for pool_key in pool_manager.pools.keys():
+            pool = pool_manager.pools.get(pool_key)
+            if pool:
+                self.stat["new_connection"] += pool.num_connections
+                self.stat["reuse_connection"] += max(pool.num_requests - pool.num_connections, 0)
+        host_adapter["adapter"].close()
+
+    def retire_host_adapter(self, host_adapter):
+        """ 回收域名连接池，并行执行的其他用例还在用它发送请求时，等这些请求结束后再关闭 """
+        host_adapter["is_retired"] = True
+        if host_adapter["in_flight"] == 0:
+            self.close_host_adapter(host_adapter)
+
+    def evict_idle_host_adapter(self, now):
+        """ 回收空闲超时的域名连接池 """
+        for host_key in list(self.host_adapter_dict.keys()):
+            if now - self.host_adapter_dict[host_key]["last_used_at"] > self.idle_time_out:
+                self.retire_host_adapter(self.host_adapter_dict.pop(host_key))
+                self.stat["evict"] += 1
+
+    def acquire_host_adapter(self, url):
+        """ 获取请求地址对应域名的连接池，请求结束后要调用 release_host_adapter
+        连接池达到请求数上限时换一个新的连接池，旧的连接池等正在发送的请求结束后再关闭
+        """
+        host_key, now = self.get_host_key(url), time.time()
+        with self.lock:
+            self.evict_idle_host_adapter(now)
+
+            host_adapter = self.host_adapter_dict.get(host_key)
+            if host_adapter and host_adapter["request_count"] >= self.max_keep_alive_requests:
+                self.retire_host_adapter(self.host_adapter_dict.pop(host_key))
+                self.stat["recycle"] += 1
+                host_adapter = None
+
+            if host_adapter is None:
+                host_adapter = self.host_adapter_dict[host_key] = self.new_host_adapter()
+
+            host_adapter["request_count"] += 1
+            host_adapter["in_flight"] += 1
+            host_adapter["last_used_at"] = now
+            self.stat["request"] += 1
+            return host_adapter
+
+    def release_host_adapter(self, host_adapter):
+        """ 请求结束，已回收的连接池在最后一个请求结束后关闭 """
+        with self.lock:
+            host_adapter["in_flight"] -= 1
+            host_adapter["last_used_at"] = time.time()
+            if host_adapter["is_retired"] and host_adapter["in_flight"] == 0:
+                self.close_host_adapter(host_adapter)
+
+    def mount(self, session):
+        """ 把连接池挂载到 requests.Session 上 """
+        session.mount("http://", self.adapter)
+        session.mount("https://", self.adapter)
+        return session
+
+    def close(self):
+        """ 关闭所有域名连接池，并返回连接复用统计 """
+        with self.lock:
+            for host_adapter in self.host_adapter_dict.values():
+                self.close_host_adapter(host_adapter)
+            self.host_adapter_dict = {}
+            return dict(self.stat)
@@ -1,11 +1,10 @@
-import os
 from datetime import datetime
 
 from selenium.common.exceptions import SessionNotCreatedException, InvalidArgumentException, WebDriverException
 
 from utils.client.test_runner.client import BaseSession
 from utils.client.test_runner.exceptions import TimeoutException, RunTimeException, InvalidElementStateException
-from utils.util.file_util import FileUtil
+from utils.client.test_runner.client.screenshot import screenshot_writer
 
 
 class WebDriverSession(BaseSession):
@@ -22,18 +21,23 @@ class WebDriverSession(BaseSession):
         self.meta_data["data"][0]["test_action"] = kwargs  # 记录原始的请求信息
         report_img_folder, report_step_id = kwargs.pop("report_img_folder"), kwargs.pop("report_step_id")
 
-        # 执行前截图
-        before_page_folder = os.path.join(report_img_folder, f'{report_step_id}_before_page.txt')
-        FileUtil.save_file(before_page_folder, driver.get_screenshot_as_base64())
+        # 执行前截图，截图写入文件放到后台线程
+        if screenshot_writer.need_before():
+            screenshot_writer.submit(report_img_folder, report_step_id, "before_page", driver.get_screenshot_as_png())
 
         # 执行测试步骤
         start_at = datetime.now()
-        result = self._do_action(driver, **kwargs)  # 执行步骤
+        try:
+            result = self._do_action(driver, **kwargs)  # 执行步骤
+        except Exception:
+            if screenshot_writer.need_after():  # 执行失败，没有执行后截图，截当前页面（只在失败时截图的，由执行器截图）
+                self.try_screenshot(driver, report_img_folder, report_step_id)
+            raise
         end_at = datetime.now()
 
         # 执行后截图
-        after_page_folder = os.path.join(report_img_folder, f'{report_step_id}_after_page.txt')
-        FileUtil.save_file(after_page_folder, driver.get_screenshot_as_base64())
+        if screenshot_writer.need_after():
+            screenshot_writer.submit(report_img_folder, report_step_id, "after_page", driver.get_screenshot_as_png())
 
         # 记录消耗的时间
         self.meta_data["stat"] = {
@@ -44,6 +48,14 @@ class WebDriverSession(BaseSession):
 
         return result
 
+    @staticmethod
+    def try_screenshot(driver, report_img_folder, report_step_id):
+        """ 步骤执行失败时截图，浏览器/app可能已经不可用，截图失败则跳过 """
+        try:
+            screenshot_writer.submit(report_img_folder, report_step_id, "after_page", driver.get_screenshot_as_png())
+        except Exception:
+            pass
+
     def _do_action(self, driver, **kwargs):
         """ 执行浏览器操作 """
         try:
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from config import _parallel_run_config
+from .parser import extract_variables
+
+
+class ParallelCaseEngine:
+    """ 用例维度的并行执行引擎
+    用例在有限的线程池中并行执行，同一条用例内的步骤仍按顺序执行
+    用例引用了前面用例提取的变量（自身没有定义、也没有提取）时，视为依赖前面的用例，有依赖的用例分到同一组，组内按原顺序执行
+    所有线程共用同一个app和解析好的数据，各自入栈app上下文（数据库会话互不影响），执行结果按用例原本的顺序返回
+        run_case_func: 执行一条用例的方法，返回用例的summary
+        max_workers: 并行数，不传则取默认配置
+    """
+
+    def __init__(self, run_case_func, max_workers=None):
+        self.run_case_func = run_case_func
+        self.max_workers = min(max_workers or _parallel_run_config["max_workers"], _parallel_run_config["limit"])
+        self.stat = {}
+
+    @classmethod
+    def get_extract_key_list(cls, extract):
+        """ 步骤要提取的变量名
+        接口自动化: {"extractors": [{"project_id": "content.data.id"}], "update_to_header_filed_list": []}
+        ui自动化: [{"key": "project_id", "value": "1", "extract_type": "123"}]
+        """
+        if isinstance(extract, dict):
+            extract = extract.get("extractors", [])
+        key_list = []
+        for extractor in extract or []:
+            if isinstance(extractor, dict):
+                key_list.extend([extractor["key"]] if "key" in extractor else extractor.keys())
+        return key_list
+
+    @classmethod
+    def get_case_variables(cls, case):
+        """ 用例定义的变量、提取的变量、引用的变量 """
+        defined, extracted, referenced = set(case["config"].get("variables") or {}), set(), set()
+        for step in case["step_list"]:
+            defined.update(step.get("variables") or {})
+            extracted.update(cls.get_extract_key_list(step.get("extract")))
+            referenced.update(extract_variables(json.dumps(step, ensure_ascii=False, default=str)))
+        return defined, extracted, referenced
+
+    @classmethod
+    def group_case_list(cls, case_list):
+        """ 按依赖关系把用例分组，返回 [[用例索引]]，组按第一条用例的顺序排列，组内按原顺序排列 """
+        parent_list = list(range(len(case_list)))
+
+        def find(index):
+            while parent_list[index] != index:
+                parent_list[index] = parent_list[parent_list[index]]
+                index = parent_list[index]
+            return index
+
+        extracted_dict = {}  # {变量名: [提取了此变量的用例索引]}
+        for index, case in enumerate(case_list):
+            defined, extracted, referenced = cls.get_case_variables(case)
+            for variable_name in referenced - defined - extracted:
+                for depend_index in extracted_dict.get(variable_name, []):
+                    parent_list[find(index)] = find(depend_index)
+            for variable_name in extracted:
+                extracted_dict.setdefault(variable_name, []).append(index)
+
+        group_dict = {}
+        for index in range(len(case_list)):
+            group_dict.setdefault(find(index), []).append(index)
+        return sorted(group_dict.values(), key=lambda index_list: index_list[0])
+
+    def run(self, case_list):
+        """ 并行执行用例，返回按原顺序排列的用例summary列表 """
+        group_list = self.group_case_list(case_list)
+        summary_list = [None] * len(case_list)
+        app = current_app._get_current_object()
+
+        def run_group(index_list):
+            with app.app_context():
+                for index in index_list:
+                    summary_list[index] = self.run_case_func(case_list[index])
+
+        worker_count = max(min(self.max_workers, len(group_list)), 1)
+        with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="case-runner") as executor:
+            future_list = [executor.submit(run_group, index_list) for index_list in group_list]
+            for future in future_list:
+                future.result()
+
+        self.stat = {"max_workers": worker_count, "case": len(case_list), "group": len(group_list)}
+        return summary_list
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import ast
 import re
+from functools import lru_cache
 
 from . import exceptions, utils
 from .compat import basestring, builtin_str, numeric_types
@@ -295,6 +296,18 @@ def get_mapping_variable(variable_name, variables_mapping):
         raise exceptions.VariableNotFound(f"引用的变量 【{variable_name}】 没有找到")
 
 
+_builtin_functions = None  # validate_func 模块的内置函数，第一次使用时加载
+_python_builtin_functions = {}  # 已经解析过的python内置函数 {"len": len}
+
+
+def get_builtin_functions():
+    """ 获取 validate_func 模块的内置函数，只在第一次使用时反射加载，后续直接复用 """
+    global _builtin_functions
+    if _builtin_functions is None:
+        _builtin_functions = load_builtin_functions()
+    return _builtin_functions
+
+
 def get_mapping_function(function_name, functions_mapping):
     """ get function from functions_mapping,
         if not found, then try to check if builtin function.
@@ -315,65 +328,72 @@ def get_mapping_function(function_name, functions_mapping):
 
     try:
         # check if TestRunner builtin functions
-        # from . import loader
-        # built_in_functions = loader.load_builtin_functions()
-        built_in_functions = load_builtin_functions()
-        return built_in_functions[function_name]
+        return get_builtin_functions()[function_name]
     except KeyError:
         pass
 
+    if function_name in _python_builtin_functions:
+        return _python_builtin_functions[function_name]
+
     try:
         # check if Python builtin functions
         item_func = eval(function_name)
         if callable(item_func):
             # is builtin function
+            _python_builtin_functions[function_name] = item_func
             return item_func
     except (NameError, TypeError):
         # is not builtin function
         raise exceptions.FunctionNotFound(f"自定义函数 【{function_name}】 没有找到")
 
 
-def parse_string_functions(content, variables_mapping, functions_mapping):
-    """ 映射字符串中的函数
+def call_mapping_function(function_meta, variables_mapping, functions_mapping):
+    """ 解析函数参数，并执行函数，返回函数的执行结果
     Args:
-        content (str): "abc${add_one(3)}def"
+        function_meta (dict): parse_function 的解析结果 {'func_name': 'func', 'args': [], 'kwargs': {}}
         variables_mapping (dict): 变量字典
         functions_mapping (dict): {"add_one": lambda x: x + 1}
-    Returns:
-        parse_string_functions(content, functions_mapping) >>> "abc4def"
     """
-    functions_list = extract_functions(content)
-    for func_content in functions_list:
-        function_meta = parse_function(func_content)
-        func_name = function_meta["func_name"]
-
-        args = function_meta.get("args", [])
-        kwargs = function_meta.get("kwargs", {})
-        args = parse_data(args, variables_mapping, functions_mapping)
-        kwargs = parse_data(kwargs, variables_mapping, functions_mapping)
-
-        func = get_mapping_function(func_name, functions_mapping)
-        # eval_value = func(*args, **kwargs)
-        # 执行自定义函数，有可能会报错
-        try:
-            eval_value = func(*args, **kwargs)
-        except Exception as error:
-            # 记录错误信息
-            # FuncErrorRecord.create(
-            #     name='执行自定义函数错误',
-            #     detail=f'执行自定义函数【{func_name}】报错了 \n  args参数: {args} \n  kwargs参数: {kwargs} \n\n  '
-            #            f'错误信息: \n{traceback.format_exc()}'
-            # )
-            #
-            # # 发送自定义函数执行错误的信息
-            # send_run_func_error_message(content={
-            #     "title": "执行自定义函数错误",
-            #     "detail": f'### {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} \n> '
-            #               f'### 执行自定义函数【{func_name}】报错了 \n  args参数: {args} \n  kwargs参数: {kwargs} \n  '
-            #               f'### 错误信息: {traceback.format_exc()} \n> '
-            # })
-            raise
+    func_name = function_meta["func_name"]
 
+    args = function_meta.get("args", [])
+    kwargs = function_meta.get("kwargs", {})
+    args = parse_data(args, variables_mapping, functions_mapping)
+    kwargs = parse_data(kwargs, variables_mapping, functions_mapping)
+
+    func = get_mapping_function(func_name, functions_mapping)
+    # eval_value = func(*args, **kwargs)
+    # 执行自定义函数，有可能会报错
+    try:
+        return func(*args, **kwargs)
+    except Exception as error:
+        # 记录错误信息
+        # FuncErrorRecord.create(
+        #     name='执行自定义函数错误',
+        #     detail=f'执行自定义函数【{func_name}】报错了 \n  args参数: {args} \n  kwargs参数: {kwargs} \n\n  '
+        #            f'错误信息: \n{traceback.format_exc()}'
+        # )
+        #
+        # # 发送自定义函数执行错误的信息
+        # send_run_func_error_message(content={
+        #     "title": "执行自定义函数错误",
+        #     "detail": f'### {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} \n> '
+        #               f'### 执行自定义函数【{func_name}】报错了 \n  args参数: {args} \n  kwargs参数: {kwargs} \n  '
+        #               f'### 错误信息: {traceback.format_exc()} \n> '
+        # })
+        raise
+
+
+def replace_string_functions(content, functions_list, eval_value_list):
+    """ 按顺序把字符串中的函数替换为函数的执行结果
+    Args:
+        content (str): "abc${add_one(3)}def"
+        functions_list (list): ["add_one(3)"]
+        eval_value_list (list): [4]
+    Returns:
+        replace_string_functions(content, functions_list, eval_value_list) >>> "abc4def"
+    """
+    for func_content, eval_value in zip(functions_list, eval_value_list):
         func_content = "${" + func_content + "}"
         if func_content == content:
             # content is a function, e.g. "${add_one(3)}"
@@ -384,10 +404,55 @@ def parse_string_functions(content, variables_mapping, functions_mapping):
                 func_content,
                 str(eval_value), 1
             )
-
     return content
 
 
+def parse_string_functions(content, variables_mapping, functions_mapping):
+    """ 映射字符串中的函数
+    Args:
+        content (str): "abc${add_one(3)}def"
+        variables_mapping (dict): 变量字典
+        functions_mapping (dict): {"add_one": lambda x: x + 1}
+    Returns:
+        parse_string_functions(content, functions_mapping) >>> "abc4def"
+    """
+    functions_list = extract_functions(content)
+    eval_value_list = [
+        call_mapping_function(parse_function(func_content), variables_mapping, functions_mapping)
+        for func_content in functions_list
+    ]
+    return replace_string_functions(content, functions_list, eval_value_list)
+
+
+def parse_mapping_variable(variable_name, variables_mapping, functions_mapping):
+    """ 获取变量的值，变量值中引用了其他变量或函数的，会继续解析，并把解析后的值回写到变量映射中 """
+    variable_value = get_mapping_variable(variable_name, variables_mapping)
+
+    if variable_name == "request" and isinstance(variable_value, dict) \
+            and "url" in variable_value and "method" in variable_value:
+        # call setup_hooks action with $request
+        for key, value in variable_value.items():
+            variable_value[key] = parse_data(
+                value,
+                variables_mapping,
+                functions_mapping
+            )
+        return variable_value
+    elif "${}".format(variable_name) == variable_value:
+        # variable_name = "token"
+        # variables_mapping = {"token": "$token"}
+        return variable_value
+
+    parsed_variable_value = parse_data(
+        variable_value,
+        variables_mapping,
+        functions_mapping,
+        raise_if_variable_not_found=False
+    )
+    variables_mapping[variable_name] = parsed_variable_value
+    return parsed_variable_value
+
+
 def parse_string_variables(content, variables_mapping, functions_mapping):
     """ 从字符串中，解析引用变量
 
@@ -407,30 +472,7 @@ def parse_string_variables(content, variables_mapping, functions_mapping):
     """
     variables_list = extract_variables(content)
     for variable_name in variables_list:
-        variable_value = get_mapping_variable(variable_name, variables_mapping)
-
-        if variable_name == "request" and isinstance(variable_value, dict) \
-                and "url" in variable_value and "method" in variable_value:
-            # call setup_hooks action with $request
-            for key, value in variable_value.items():
-                variable_value[key] = parse_data(
-                    value,
-                    variables_mapping,
-                    functions_mapping
-                )
-            parsed_variable_value = variable_value
-        elif "${}".format(variable_name) == variable_value:
-            # variable_name = "token"
-            # variables_mapping = {"token": "$token"}
-            parsed_variable_value = variable_value
-        else:
-            parsed_variable_value = parse_data(
-                variable_value,
-                variables_mapping,
-                functions_mapping,
-                raise_if_variable_not_found=False
-            )
-            variables_mapping[variable_name] = parsed_variable_value
+        parsed_variable_value = parse_mapping_variable(variable_name, variables_mapping, functions_mapping)
         # TODO: replace variable label from $var to {{var}}
         if "${}".format(variable_name) == content:
             # content is a variable
@@ -448,6 +490,136 @@ def parse_string_variables(content, variables_mapping, functions_mapping):
     return content
 
 
+class StringTemplate:
+    """ 编译后的字符串模板
+    同一个字符串（请求地址、请求头、请求体中的 "$var"、"${func()}"）在每个步骤、每次运行都会被解析，
+    编译时把正则匹配、函数参数解析只做一次，渲染时直接按片段拼接，不用每次都findall、replace
+
+    编译结果:
+        functions_list: 字符串中的函数 ["add_one(3)"]
+        function_meta_list: 函数对应的 parse_function 解析结果，解析失败的为None，渲染时再解析一次抛出原异常
+        variables_list: 字符串中（函数以外）的变量 ["uid"]
+        parts: 模板片段 [(0, "abc"), (1, 0), (2, "uid")]，0: 普通字符串，1: 函数（下标），2: 变量（变量名）
+        is_simple: 能否直接按片段拼接，普通字符串中还有 "$"、变量后面紧跟函数的这类写法，
+            替换后可能和旧的逐个replace结果不一致，这种模板渲染时按原来的逐个replace处理
+    """
+
+    _literal, _function, _variable = 0, 1, 2
+
+    def __init__(self, content):
+        self.content = content
+        self.functions_list, self.function_meta_list, self.variables_list, self.parts = [], [], [], []
+        self.is_simple = True
+
+        index = 0
+        for matched in re.finditer(function_regexp, content):
+            self.compile_variables(content[index:matched.start()])
+            if self.parts and self.parts[-1][0] == self._variable:
+                # 变量后面紧跟函数，函数结果会和变量名拼成新的变量名
+                self.is_simple = False
+            func_content = matched.group(1)
+            try:
+                function_meta = parse_function(func_content)
+            except Exception:
+                function_meta = None
+            self.parts.append((self._function, len(self.functions_list)))
+            self.functions_list.append(func_content)
+            self.function_meta_list.append(function_meta)
+            index = matched.end()
+        self.compile_variables(content[index:])
+
+        if any("$" in part for part_type, part in self.parts if part_type == self._literal):
+            self.is_simple = False
+
+        # 只有函数，且函数的结果都是空字符串时，最后一个函数的结果保留原类型
+        self.is_functions_only = not self.variables_list and all(
+            part_type == self._function for part_type, part in self.parts)
+        # 只有变量和函数时，前面的值都是空字符串，最后一个变量的值保留原类型
+        self.is_variables_only = bool(self.variables_list) and all(
+            part_type != self._literal for part_type, part in self.parts)
+
+    def compile_variables(self, content):
+        """ 编译函数以外的字符串片段中的变量 """
+        index = 0
+        for matched in re.finditer(variable_regexp, content):
+            if matched.start() > index:
+                self.parts.append((self._literal, content[index:matched.start()]))
+            self.parts.append((self._variable, matched.group(1)))
+            self.variables_list.append(matched.group(1))
+            index = matched.end()
+        if index < len(content):
+            self.parts.append((self._literal, content[index:]))
+
+    def render_functions(self, variables_mapping, functions_mapping):
+        """ 执行模板中的函数
+        Returns:
+            (替换函数后的内容, 函数结果转字符串后的列表)，不能直接拼接的，函数结果列表为None
+        """
+        if not self.functions_list:
+            return self.content, [] if self.is_simple else None
+
+        eval_value_list = []
+        for func_content, function_meta in zip(self.functions_list, self.function_meta_list):
+            if function_meta is None:
+                function_meta = parse_function(func_content)
+            eval_value_list.append(call_mapping_function(function_meta, variables_mapping, functions_mapping))
+
+        eval_str_list = [str(eval_value) for eval_value in eval_value_list]
+        if not self.is_simple or any("$" in eval_str for eval_str in eval_str_list):
+            return replace_string_functions(self.content, self.functions_list, eval_value_list), None
+
+        if self.is_functions_only and not any(eval_str_list[:-1]):
+            return eval_value_list[-1], eval_str_list
+
+        return self.join_parts(eval_str_list), eval_str_list
+
+    def render_variables(self, content, eval_str_list, variables_mapping, functions_mapping):
+        """ 替换模板中的变量，content、eval_str_list 为 render_functions 的返回 """
+        if eval_str_list is None:
+            return parse_string_variables(content, variables_mapping, functions_mapping)
+
+        if not self.variables_list:
+            return content
+
+        value_list = [
+            parse_mapping_variable(variable_name, variables_mapping, functions_mapping)
+            for variable_name in self.variables_list
+        ]
+        value_str_list = [value if isinstance(value, str) else builtin_str(value) for value in value_list]
+        if any("$" in value_str for value_str in value_str_list):
+            # 变量值里面还有 "$"，按原来的逐个replace处理
+            for variable_name, value, value_str in zip(self.variables_list, value_list, value_str_list):
+                if "${}".format(variable_name) == content:
+                    content = value
+                else:
+                    content = content.replace("${}".format(variable_name), value_str, 1)
+            return content
+
+        if self.is_variables_only and not any(eval_str_list) and not any(value_str_list[:-1]):
+            return value_list[-1]
+
+        return self.join_parts(eval_str_list, value_str_list)
+
+    def join_parts(self, eval_str_list, value_str_list=None):
+        """ 按片段拼接，没有传变量值的，保留变量原样 "$var" """
+        variable_index, content_list = 0, []
+        for part_type, part in self.parts:
+            if part_type == self._literal:
+                content_list.append(part)
+            elif part_type == self._function:
+                content_list.append(eval_str_list[part])
+            else:
+                content_list.append(value_str_list[variable_index] if value_str_list else "$" + part)
+                variable_index += 1
+        return "".join(content_list)
+
+
+@lru_cache(maxsize=4096)
+def compile_string_template(content):
+    """ 编译字符串模板，同样的字符串只编译一次 """
+    return StringTemplate(content)
+
+
 def parse_data(content, variables_mapping=None, functions_mapping=None, raise_if_variable_not_found=True):
     """ 用变量映射解析内容
     Args:
@@ -515,11 +687,20 @@ def parse_data(content, variables_mapping=None, functions_mapping=None, raise_if
         content = content.strip()
 
         try:
-            # 提取并执行自定义函数
-            content = parse_string_functions(content, variables_mapping, functions_mapping)
+            if not isinstance(content, str):
+                # 提取并执行自定义函数
+                content = parse_string_functions(content, variables_mapping, functions_mapping)
+
+                # 用公用变量替换字符串中的占位符
+                content = parse_string_variables(content, variables_mapping, functions_mapping)
+            elif "$" in content:  # 没有 "$" 的字符串不会引用变量、函数，不用解析
+                template = compile_string_template(content)
+
+                # 执行自定义函数
+                content, eval_str_list = template.render_functions(variables_mapping, functions_mapping)
 
-            # 用公用变量替换字符串中的占位符
-            content = parse_string_variables(content, variables_mapping, functions_mapping)
+                # 用公用变量替换字符串中的占位符
+                content = template.render_variables(content, eval_str_list, variables_mapping, functions_mapping)
         except exceptions.VariableNotFound:
             if raise_if_variable_not_found:
                 raise
@@ -686,6 +867,8 @@ def parse_test_data(tests_dict):
         "report_model": tests_dict["report_model"],
         "report_case_model": tests_dict["report_case_model"],
         "report_step_model": tests_dict["report_step_model"],
+        "is_async": tests_dict.get("is_async", 0),  # 是否用例维度并行执行
+        "max_workers": tests_dict.get("max_workers"),  # 并行数
         "case_list": []
     }
 
@@ -1,14 +1,27 @@
 # -*- coding: utf-8 -*-
 import re
+from functools import lru_cache
 
 from . import exceptions, utils
 from .compat import OrderedDict, basestring
 from .parser import extract_functions, parse_function, get_mapping_variable
 from utils.client.test_runner.parser import extract_variables
 from .validator import is_extract_expression, is_const
+from .client.http import load_response_json
 from ...variables.regexp import text_extractor_regexp_compile
 
 
+@lru_cache(maxsize=4096)
+def compile_extract_field(field):
+    """ 编译提取表达式，同一个表达式只编译一次
+    返回 (是否正则提取, 第一级属性, 剩余的路径)，如 "content.data.id" => (False, "content", "data.id")
+    """
+    if text_extractor_regexp_compile.match(field):
+        return True, None, None
+    top_query, _, sub_query = field.partition(".")
+    return False, top_query, sub_query or None
+
+
 class ResponseObject(object):
 
     def __init__(self, resp_obj):
@@ -21,7 +34,7 @@ class ResponseObject(object):
     def __getattr__(self, key):
         try:
             if key == "json":
-                value = self.resp_obj.json()
+                value = load_response_json(self.resp_obj)  # 和记录响应信息时共用解析结果
             elif key == "cookies":
                 value = self.resp_obj.cookies.get_dict()
             else:
@@ -47,10 +60,10 @@ class ResponseObject(object):
             >>> _extract_field_with_regex(field)
             abc
         """
-        matched = re.search(field, self.resp_obj.text)
+        matched = re.search(field, self.text)
         if not matched:
             err_msg = u"正则表达式提取数据失败! => {}\n".format(field)
-            err_msg += u"response body: {}\n".format(self.resp_obj.text)
+            err_msg += u"response body: {}\n".format(self.text)
             raise exceptions.ExtractFailure(err_msg)
 
         return matched.group(1)
@@ -67,13 +80,8 @@ class ResponseObject(object):
                 "headers.content-type"
                 "content.person.name.first_name"
         """
-        # string.split(sep=None, maxsplit=-1) -> list of strings
         # e.g. "content.person.name" => ["content", "person.name"]
-        try:
-            top_query, sub_query = field.split('.', 1)
-        except ValueError:
-            top_query = field
-            sub_query = None
+        top_query, sub_query = compile_extract_field(field)[1:]
 
         # status_code
         if top_query in ["status_code", "encoding", "ok", "reason", "url"]:
@@ -191,7 +199,7 @@ class ResponseObject(object):
             raise exceptions.ParamsError(err_msg)
 
         # 判断是否能被正则编译，如果能被正则编译，则用正则提取方式
-        if text_extractor_regexp_compile.match(field):
+        if compile_extract_field(field)[0]:
             value = self._extract_field_with_regex(field)
         else:
             value = self._extract_field_with_delimiter(field, variable_data)
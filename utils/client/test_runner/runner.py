@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 import traceback
 from unittest.case import SkipTest
 
@@ -9,7 +8,10 @@ from .webdriver_action import GetWebDriver, GetAppDriver
 from utils.logs.redirect_print_log import RedirectPrintLogToMemory
 from utils.client.test_runner import logger
 from utils.client.test_runner.client.http import HttpSession
+from utils.client.test_runner.client.transport import HttpTransport
 from utils.client.test_runner.client.webdriver import WebDriverSession
+from utils.client.test_runner.client.screenshot import screenshot_writer
+from utils.client.test_runner.client.driver_pool import DriverPool
 
 
 class Runner:
@@ -36,7 +38,7 @@ class Runner:
 
     """
 
-    def __init__(self, config, functions, task_type="api"):
+    def __init__(self, config, functions, task_type="api", report_id=None):
         """ 运行测试用例
 
         Args:
@@ -48,7 +50,9 @@ class Runner:
                     "setup_hooks", [],
                     "teardown_hooks", []
                 }
+            report_id: 当前运行的报告id，接口测试时，同一个报告下的用例共享连接池
         """
+        self.report_id = report_id
         self.base_url = config.get("base_url")
         self.run_env = config.get("run_env")
         self.verify = config.get("verify", True)
@@ -58,6 +62,7 @@ class Runner:
         self.run_type = config.get("run_type") or "api"
         self.resp_obj = None
         self.driver = None
+        self.driver_pool = None  # 浏览器/appium会话池，ui、app自动化运行报告时才有
         self.client_session = None
         self.redirect_print = None
         self.client_init_error = None
@@ -65,6 +70,7 @@ class Runner:
         self.browser_driver_path = config.get("browser_path")
         self.browser_name = config.get("browser_type")
         self.appium_config = config.get("appium_config", {})
+        self.driver_pool_size = config.get("driver_pool_size")  # 浏览器/appium会话池大小，不传则取默认配置
 
         # 记录当前步骤的执行进度
         self.report_step = None
@@ -78,7 +84,13 @@ class Runner:
         """ 根据不同的测试类型获取不同的client_session """
         if self.client_session is None:
             if self.run_type == "api":
-                self.client_session = HttpSession(self.base_url)
+                transport = HttpTransport.get_transport(self.report_id) if self.report_id else None
+                self.client_session = HttpSession(self.base_url, transport=transport)
+            elif self.report_id:  # ui、app自动化，同一个报告下的用例复用浏览器/appium会话
+                self.client_session = WebDriverSession()
+                self.driver_pool = DriverPool.get_pool(self.report_id, self.driver_pool_size)
+                self.driver = self.driver_pool.acquire(
+                    self.run_type, self.browser_driver_path, self.browser_name, self.appium_config)
             elif self.run_type == "ui":
                 self.client_session = WebDriverSession()
                 self.driver = GetWebDriver(browser_driver_path=self.browser_driver_path, browser_name=self.browser_name)
@@ -87,7 +99,13 @@ class Runner:
                 self.driver = GetAppDriver(**self.appium_config)
 
     def try_close_browser(self):
-        """ 强制关闭浏览器 """
+        """ 强制关闭浏览器，有会话池的，重置会话状态后放回会话池 """
+        if self.driver is None:
+            return
+        if self.driver_pool:
+            self.driver_pool.release(self.driver, self.appium_config)
+            self.driver = None
+            return
         try:
             self.driver.close_browser()
         except Exception:
@@ -232,10 +250,8 @@ class Runner:
         self.report_step.test_is_start_before()
         self.do_hook_actions(step_dict.get("setup_hooks", []))
 
-        # 深拷贝除 request 的其他数据，请求数据有可能是io，io不能深拷贝，所以先移出再深拷贝，再移入
-        copy_request = self.session_context.test_variables_mapping.pop("request")
-        variables_mapping = copy.deepcopy(self.session_context.test_variables_mapping)
-        self.session_context.test_variables_mapping["request"] = copy_request
+        # 记录发起请求时内存中除 request 以外的变量，变量作用域写时复制，后续写入变量不会影响这里记录的数据，不用深拷贝
+        variables_mapping = self.session_context.test_variables_mapping.snapshot("request")
 
         # 开始执行测试
         self.report_step.test_is_start_running()
@@ -249,7 +265,7 @@ class Runner:
                 url,
                 name=step_name,
                 case_id=case_id,
-                variables_mapping=copy.deepcopy(variables_mapping),
+                variables_mapping=variables_mapping,
                 **parsed_step
             )
             self.resp_obj = response.ResponseObject(resp)
@@ -265,7 +281,7 @@ class Runner:
                 self.driver,
                 name=step_name,
                 case_id=case_id,
-                variables_mapping=copy.deepcopy(variables_mapping),
+                variables_mapping=variables_mapping,
                 **parsed_step
             )
             # 数据提取
@@ -306,9 +322,16 @@ class Runner:
 
         self.report_step.test_is_success(self.get_test_step_data())
 
+    def screenshot_on_fail(self, step_dict):
+        """ 截图策略为只在失败时截图的，步骤执行报错、断言不通过后截当前页面 """
+        report_img_folder = step_dict.get("test_action", {}).get("report_img_folder")
+        if self.run_type == "api" or self.driver is None or not report_img_folder or not screenshot_writer.need_fail():
+            return
+        self.client_session.try_screenshot(self.driver, report_img_folder, step_dict.get("report_step_id"))
+
     def get_test_step_data(self):
         """ 获取测试数据 """
-        request = copy.deepcopy(self.client_session.meta_data["data"][0]["request"])
+        request = dict(self.client_session.meta_data["data"][0]["request"])  # 只会替换 body，浅拷贝即可
         request_body = request.get("body")
         if request_body and isinstance(request_body, bytes):
             request["body"] = str(request_body)
@@ -392,6 +415,7 @@ class Runner:
                     self.client_session.meta_data["result"] = "error"
                 else:
                     self.client_session.meta_data["result"] = "fail"
+                self.screenshot_on_fail(step_dict)
             raise
         finally:
             # 保存自定义函数的 print 打印, 并把print重定向到默认输出
@@ -1,10 +1,30 @@
 # -*- coding: utf-8 -*-
 import json
 import re
+from collections import ChainMap
 
 from . import exceptions, parser, utils, validate_func
 
 
+class VariableScope(ChainMap):
+    """ 分层的变量作用域，写时复制
+    查找变量时从最内层往外层逐层查找，内层的覆盖外层的；写入、删除只作用于最内层，不会修改外层，也不用拷贝外层的变量
+    步骤执行时的作用域，由内到外依次为：
+        步骤执行中写入的变量（前置函数的返回值、请求数据、响应对象、提取的变量）
+        用例执行中提取的变量（会话变量，整条用例有效）
+        步骤预设的变量（解析时已合并了全局、服务、用例的变量）
+    """
+
+    def snapshot(self, *exclude_keys):
+        """ 当前可见的变量合并为一个字典，只复制引用，不深拷贝变量的值 """
+        return {key: value for key, value in self.items() if key not in exclude_keys}
+
+    def reset_to_parent(self, key_list):
+        """ 去掉最内层中这些变量，即这些变量取外层的值 """
+        for key in key_list:
+            self.maps[0].pop(key, None)
+
+
 class SessionContext(object):
     """ TestRunner session
 
@@ -42,10 +62,8 @@ class SessionContext(object):
         variables_mapping = variables_mapping or {}
         variables_mapping = utils.list_to_dict(variables_mapping)
 
-        self.test_variables_mapping = {}
-        # 提取的变量将覆盖预先定义好的变量
-        self.test_variables_mapping.update(variables_mapping)
-        self.test_variables_mapping.update(self.session_variables_mapping)
+        # 提取的变量将覆盖预先定义好的变量，步骤中写入的变量只在当前步骤有效，不拷贝外层的变量
+        self.test_variables_mapping = VariableScope({}, self.session_variables_mapping, variables_mapping)
 
         for variable_name, variable_value in variables_mapping.items():
             variable_value = self.eval_content(variable_value)
@@ -59,7 +77,8 @@ class SessionContext(object):
         """ 使用提取的变量映射更新会话。这些变量在整个运行会话中有效。"""
         variables_mapping = utils.list_to_dict(variables_mapping)
         self.session_variables_mapping.update(variables_mapping)
-        self.test_variables_mapping.update(self.session_variables_mapping)
+        # 会话变量覆盖当前步骤中写入的同名变量
+        self.test_variables_mapping.reset_to_parent(self.session_variables_mapping)
 
     def save_update_to_header_filed(self, filed_list: list, extracted_variables_mapping: dict):
         """ 把提取后需要更新到头部信息的数据保存下来
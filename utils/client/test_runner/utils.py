@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import copy
 import json
+from collections.abc import Mapping
+from functools import lru_cache
 
 from . import exceptions
 from .compat import basestring
@@ -18,6 +20,18 @@ def build_url(base_url, path):
         raise ParamsError(f"域名 '{base_url}' 错误, 请检查服务信息")
 
 
+@lru_cache(maxsize=4096)
+def compile_query(query, delimiter='.'):
+    """ 把路径表达式编译为 ((key, 下标), ...)，不是数字的 key 下标为None，同一个表达式只编译一次 """
+    key_list = []
+    for key in query.split(delimiter):
+        try:
+            key_list.append((key, int(key)))
+        except ValueError:
+            key_list.append((key, None))
+    return tuple(key_list)
+
+
 def query_json(json_content, query, delimiter='.'):
     """ 像xpath一样从json里面获取值
     Args:
@@ -34,25 +48,19 @@ def query_json(json_content, query, delimiter='.'):
         query_json(json_content, "person.name.first_name.0") >> L
         query_json(json_content, "person.cities.0") >> Guangzhou
     """
-    raise_flag = False
-    response_body = u"response body: {}\n".format(json_content)
-    try:
-        for key in query.split(delimiter):
-            if isinstance(json_content, (list, basestring)):
-                json_content = json_content[int(key)]
-            elif isinstance(json_content, dict):
-                json_content = json_content[key]
-            else:
-                raise_flag = True
-    except (KeyError, ValueError, IndexError):
-        raise_flag = True
-
-    if raise_flag:
-        err_msg = u"数据提取失败! => {}\n".format(query)
-        err_msg += response_body
-        raise exceptions.ExtractFailure(err_msg)
+    value = json_content
+    for key, index in compile_query(query, delimiter):
+        if isinstance(value, (list, basestring)) and index is not None and -len(value) <= index < len(value):
+            value = value[index]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            # 提取失败时才把数据转为字符串，避免每次提取都格式化整个响应体
+            err_msg = u"数据提取失败! => {}\n".format(query)
+            err_msg += u"response body: {}\n".format(json_content)
+            raise exceptions.ExtractFailure(err_msg)
 
-    return json_content
+    return value
 
 
 def lower_dict_keys(origin_dict):
@@ -98,7 +106,7 @@ def list_to_dict(variables):
 
         return variables_dict
 
-    elif isinstance(variables, dict):
+    elif isinstance(variables, Mapping):  # 字典、分层的变量作用域
         return variables
 
     else:
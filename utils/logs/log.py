@@ -3,14 +3,20 @@
 
 import os
 import re
+import sys
 import time
+import queue
+import atexit
 import logging
 import logging.config
 import logging.handlers
+import threading
+import traceback
 import portalocker.constants as porta_lock_const
 from logging.handlers import TimedRotatingFileHandler
 from portalocker.utils import Lock as PortaLock
 
+from config import _log_config
 from utils.util.file_util import LOG_ADDRESS
 
 
@@ -73,24 +79,7 @@ class ConcurrentTimedRotatingFileHandler(TimedRotatingFileHandler):
                 处理日志写入哪个日志文件，修改开始
                 """
                 if record.created <= ConcurrentTimedRotatingFileHandler.before_rollover_at:
-                    currentTime = int(record.created)
-                    # v 引用Python3.7标准库logging.TimedRotatingFileHandler.doRollover(110:124)中翻转目标文件名生成代码 v
-                    dstNow = time.localtime(currentTime)[-1]
-                    t = self.computeRollover(currentTime) - self.interval
-                    if self.utc:
-                        timeTuple = time.gmtime(t)
-                    else:
-                        timeTuple = time.localtime(t)
-                        dstThen = timeTuple[-1]
-                        if dstNow != dstThen:
-                            if dstNow:
-                                addend = 3600
-                            else:
-                                addend = -3600
-                            timeTuple = time.localtime(t + addend)
-                    dfn = self.rotation_filename(self.baseFilename + "." +
-                                                 time.strftime(self.suffix, timeTuple))
-                    # ^ 引用标准库TimedRotatingFileHandler中翻转目标文件名生成规则代码                                  ^
+                    dfn = self.get_rollover_filename(record.created)
 
                     # 如果back_count值设置的过低，会出现日志文件实际数量大于设置值
                     # 因为当日志写入负载过高时，之前的某个时刻产生的日志会延迟到现在才进行写入，在写入时又找不到与时间对应的日志文件，
@@ -105,6 +94,26 @@ class ConcurrentTimedRotatingFileHandler(TimedRotatingFileHandler):
             except Exception:
                 self.handleError(record)
 
+    def get_rollover_filename(self, created):
+        """ 日志创建时间对应的翻转文件名 """
+        currentTime = int(created)
+        # v 引用Python3.7标准库logging.TimedRotatingFileHandler.doRollover(110:124)中翻转目标文件名生成代码 v
+        dstNow = time.localtime(currentTime)[-1]
+        t = self.computeRollover(currentTime) - self.interval
+        if self.utc:
+            timeTuple = time.gmtime(t)
+        else:
+            timeTuple = time.localtime(t)
+            dstThen = timeTuple[-1]
+            if dstNow != dstThen:
+                if dstNow:
+                    addend = 3600
+                else:
+                    addend = -3600
+                timeTuple = time.localtime(t + addend)
+        # ^ 引用标准库TimedRotatingFileHandler中翻转目标文件名生成规则代码                                  ^
+        return self.rotation_filename(self.baseFilename + "." + time.strftime(self.suffix, timeTuple))
+
     def doRollover(self):
         """
         本方法继承Python标准库,修改的部分已在下方使用注释标记出
@@ -178,6 +187,166 @@ class ConcurrentTimedRotatingFileHandler(TimedRotatingFileHandler):
             file.write(self.format(record) + self.terminator)
 
 
+class BatchTimedRotatingFileHandler(ConcurrentTimedRotatingFileHandler):
+    """
+    批量写入的按时间翻转文件句柄，由 QueueLogHandler 的后台线程调用 write_batch
+    每批日志只写一次文件，只有到了翻转时间才加一次跨进程的文件锁，不再每条日志都加锁
+    以追加模式写入，多个进程同时写同一个文件时，每批日志的内容不会互相覆盖
+    """
+
+    def write_batch(self, item_list):
+        """ 批量写入日志，item_list: [(日志创建时间, 格式化后的日志)] """
+        if int(time.time()) >= self.rolloverAt:
+            with self.concurrent_lock:  # 翻转时才加锁，其他进程已经翻转过的，doRollover 中不会再翻转
+                self.doRollover()
+
+        # 和 emit 一致，翻转前产生的日志写入翻转后的文件
+        current_list, rollover_dict = [], {}
+        for created, text in item_list:
+            if created <= ConcurrentTimedRotatingFileHandler.before_rollover_at:
+                rollover_dict.setdefault(self.get_rollover_filename(created), []).append(text)
+            else:
+                current_list.append(text)
+
+        for file_name, text_list in rollover_dict.items():
+            with open(file_name, mode="a", encoding=self.encoding) as file:
+                file.write(self.terminator.join(text_list) + self.terminator)
+
+        if current_list:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.terminator.join(current_list) + self.terminator)
+            self.stream.flush()
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    非阻塞的日志句柄，emit 时只格式化日志并放入队列，由进程内唯一的后台线程批量写入文件
+    gunicorn 的 worker 是 fork 出来的，写入线程在每个进程第一次打日志时启动
+    队列满了时按日志级别处理：
+        低于等于 drop_level 的直接丢弃
+        低于 block_level 的最多等待 block_time 秒，仍然满则丢弃
+        高于等于 block_level 的一直等待，不丢弃
+    丢弃的条数会在下一批日志中记录
+    """
+
+    def __init__(self, target: BatchTimedRotatingFileHandler, queue_size=None, batch_size=None, block_time=None,
+                 drop_level=None, block_level=None):
+        logging.Handler.__init__(self, target.level)
+        self.target = target
+        self.queue_size = queue_size or _log_config["queue_size"]
+        self.batch_size = batch_size or _log_config["batch_size"]
+        self.block_time = _log_config["block_time"] if block_time is None else block_time
+        self.drop_level = logging.getLevelName(drop_level or _log_config["drop_level"])
+        self.block_level = logging.getLevelName(block_level or _log_config["block_level"])
+        self.queue, self.writer, self.writer_pid = None, None, None
+        self.drop_count, self.is_closed = 0, False
+        self.writer_lock = threading.Lock()
+
+    def start_writer(self):
+        """ 启动当前进程的写入线程，fork 出来的进程重新创建队列 """
+        with self.writer_lock:
+            if self.writer_pid == os.getpid():
+                return
+            self.queue, self.drop_count = queue.Queue(maxsize=self.queue_size), 0
+            self.writer = threading.Thread(target=self.run_writer, name="log-writer", daemon=True)
+            self.writer.start()
+            self.writer_pid = os.getpid()
+            atexit.register(self.close)
+
+    def handle(self, record):
+        """ 队列本身是线程安全的，不需要像其他句柄一样加句柄锁 """
+        is_pass = self.filter(record)
+        if is_pass:
+            self.emit(record)
+        return is_pass
+
+    def emit(self, record) -> None:
+        try:
+            item = (record.created, self.target.format(record))
+            if self.is_closed:  # 进程退出时写入线程已停止，直接写入
+                return self.target.write_batch([item])
+            if self.writer_pid != os.getpid():
+                self.start_writer()
+            self.put(item, record.levelno)
+        except Exception:
+            self.handleError(record)
+
+    def put(self, item, levelno):
+        """ 放入队列，满了则按日志级别丢弃或等待 """
+        try:
+            return self.queue.put_nowait(item)
+        except queue.Full:
+            pass
+
+        try:
+            if levelno >= self.block_level:
+                return self.queue.put(item)
+            if levelno > self.drop_level and self.block_time:
+                return self.queue.put(item, timeout=self.block_time)
+        except queue.Full:
+            pass
+        with self.writer_lock:
+            self.drop_count += 1
+
+    def get_batch(self):
+        """ 阻塞获取一条日志，再把队列中已有的日志取出，凑成一批 """
+        item_list = [self.queue.get()]
+        while len(item_list) < self.batch_size:
+            try:
+                item_list.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return item_list
+
+    def run_writer(self):
+        log_queue = self.queue
+        while True:
+            item_list = self.get_batch()
+            is_stop = None in item_list
+            write_list = [item for item in item_list if item is not None]
+            with self.writer_lock:
+                drop_count, self.drop_count = self.drop_count, 0
+            if drop_count:
+                drop_record = logging.makeLogRecord({
+                    "msg": f'日志队列已满，丢弃了 {drop_count} 条日志', "levelno": logging.WARNING, "levelname": "WARNING"
+                })
+                write_list.append((drop_record.created, self.target.format(drop_record)))
+            try:
+                if write_list:
+                    self.target.write_batch(write_list)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+            finally:
+                for _ in item_list:
+                    log_queue.task_done()
+            if is_stop:
+                return
+
+    def flush(self, time_out=None):
+        """ 等待队列中的日志写入完成 """
+        if self.writer_pid != os.getpid():
+            return
+        time_out = _log_config["flush_time_out"] if time_out is None else time_out
+        end_at = time.time() + time_out
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and end_at > time.time():
+                self.queue.all_tasks_done.wait(end_at - time.time())
+
+    def close(self):
+        """ 进程退出时，把队列中的日志写完再停止写入线程 """
+        self.is_closed = True
+        if self.writer_pid == os.getpid() and self.writer.is_alive():
+            time_out = _log_config["flush_time_out"]
+            try:
+                self.queue.put(None, timeout=time_out)
+                self.writer.join(time_out)
+            except queue.Full:
+                pass
+        self.target.close()
+        logging.Handler.close(self)
+
+
 class GetLogger:
     """
     自定义logging，方便使用
@@ -208,8 +377,10 @@ class GetLogger:
             console_handler.setFormatter(self.log_formatter)  # 设置日志格式
             log_logger.addHandler(console_handler)
 
-            # 建立一个循环文件handler来把日志记录在文件里
-            file_handler = ConcurrentTimedRotatingFileHandler(
+            # 建立一个循环文件handler来把日志记录在文件里，队列模式下由后台线程批量写入
+            file_handler_class = BatchTimedRotatingFileHandler if _log_config["mode"] == "queue" \
+                else ConcurrentTimedRotatingFileHandler
+            file_handler = file_handler_class(
                 filename=self.logs_dir + "/logger",  # 定义日志的存储
                 when="MIDNIGHT",  # 按照日期进行切分when = D： 表示按天进行切分,or self.when == "MIDNIGHT"
                 interval=1,  # interval = 1： 每天都切分。 比如interval = 2就表示两天切分一下。
@@ -224,7 +395,7 @@ class GetLogger:
             file_handler.setLevel(logging.DEBUG)  # 设置日志级别
             file_handler.setFormatter(self.log_formatter)  # 设置日志格式
             file_handler.doRollover()
-            log_logger.addHandler(file_handler)
+            log_logger.addHandler(QueueLogHandler(file_handler) if _log_config["mode"] == "queue" else file_handler)
 
         return log_logger
 
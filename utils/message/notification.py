@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+import os
+import copy
+import time
+import atexit
+import socket
+import threading
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+import requests
+from flask import current_app, has_app_context
+from sqlalchemy import select, func
+
+from apps.system.models.notification import Notification
+from config import _notification_config
+from utils.logs.log import logger
+
+
+class NotificationSender:
+    """
+    通知发送队列，即时通讯消息（webhook）、流水线回调（call_back）先写入通知表，由每个进程固定数量的发送线程发送
+        1、webhook 消息延迟 coalesce_window 秒发送，同一个webhook这段时间内的文本、markdown消息合并成一条
+        2、同一个webhook每分钟最多发送 rate_limit_per_minute 条，超出的放回通知表，等到可以发送时再发送（按进程限流）
+        3、发送失败按 retry_backoff 秒（每次翻倍）退避重试，超过 retry_times 次标记为发送失败，可在页面上查看、重新发送
+        4、进程中途退出时发送中的通知，超过 stale_time 秒后由其他进程的发送线程重新发送
+    钉钉加签的地址1小时内有效，重试的等待时间不要配置得太长
+    gunicorn 的 worker 是 fork 出来的，发送线程在每个进程第一次写入通知（或 post_worker_init）时启动
+    """
+
+    def __init__(self, **config):
+        self.config = {**_notification_config, **config}
+        self.worker_list, self.worker_pid, self.app = [], None, None
+        self.wake_event, self.stop_event = threading.Event(), threading.Event()
+        self.send_time_dict = {}  # 限流，每个webhook最近一分钟的发送时间 {addr_key: deque([time])}
+        self.lock = threading.Lock()
+
+    def start(self, app=None):
+        """ 启动当前进程的发送线程 """
+        with self.lock:
+            if self.worker_pid == os.getpid():
+                return
+            self.app = app or current_app._get_current_object()
+            self.wake_event, self.stop_event, self.send_time_dict = threading.Event(), threading.Event(), {}
+            self.worker_list = [threading.Thread(
+                target=self.run_worker, args=(index,), name=f'notification-sender-{index}', daemon=True
+            ) for index in range(self.config["worker_count"])]
+            for worker in self.worker_list:
+                worker.start()
+            self.worker_pid = os.getpid()
+            atexit.register(self.close)
+
+    def wake(self):
+        """ 有新的待发送通知，唤醒发送线程，在应用上下文中调用 """
+        if self.worker_pid != os.getpid():
+            self.start()
+        self.wake_event.set()
+
+    def add(self, kind, addr, msg, call_back_id=None):
+        """ 写入通知表并唤醒发送线程，不等待发送
+        不在应用上下文中、当前进程也没有启动发送线程时（如服务启动通知），不经过通知表，直接发送一次
+        """
+        delay = self.config["coalesce_window"] if kind == "webhook" else 0
+        if has_app_context():
+            if self.worker_pid != os.getpid():
+                self.start()
+            Notification.add(kind, addr, msg, delay, call_back_id)
+        elif self.worker_pid == os.getpid():
+            with self.app.app_context():
+                Notification.add(kind, addr, msg, delay, call_back_id)
+        else:
+            try:
+                logger.info(f'发送消息，结果：{self.post_webhook(addr, msg)}')
+            except Exception as error:
+                logger.info(f'发送消息失败，错误信息：\n{error}')
+            return
+        self.wake_event.set()
+
+    def get_wait_time(self):
+        """ 距离最早一条待发送的通知到期的秒数，最多等待 poll_interval 秒 """
+        next_run_time = Notification.db.session.execute(
+            select(func.min(Notification.next_run_time)).where(Notification.status == 0)).scalar()
+        Notification.db.session.rollback()
+        poll_interval = self.config["poll_interval"]
+        if next_run_time is None:
+            return poll_interval
+        return min(max((next_run_time - datetime.now()).total_seconds(), 0.1), poll_interval)
+
+    def run_worker(self, index):
+        sender = f'{socket.gethostname()}:{os.getpid()}:{index}'
+        reset_at = 0
+        while not self.stop_event.is_set():
+            wait_time = self.config["poll_interval"]
+            try:
+                with self.app.app_context():
+                    if index == 0 and time.time() > reset_at:  # 一个线程检查发送中途中断的通知
+                        Notification.reset_stale(self.config["stale_time"])
+                        reset_at = time.time() + self.config["stale_time"]
+                    data_list = Notification.claim(sender, self.config["max_coalesce"])
+                    if data_list:
+                        self.send(data_list)
+                        continue
+                    wait_time = self.get_wait_time()
+            except Exception:
+                logger.error(f'发送通知出错: \n{traceback.format_exc()}')
+            if self.wake_event.wait(wait_time):
+                self.wake_event.clear()
+
+    def send(self, data_list):
+        """ 发送认领到的一组通知 """
+        if data_list[0]["kind"] == "call_back":
+            return self.send_call_back(data_list[0])
+
+        wait_time = self.get_rate_limit_wait(data_list[0]["addr_key"])
+        if wait_time:
+            return Notification.release([data["id"] for data in data_list], wait_time, "webhook发送频率超限，等待发送")
+
+        merge_list = self.get_merge_list(data_list)
+        Notification.release([data["id"] for data in data_list[len(merge_list):]])  # 没有合并的马上再发送
+        msg = self.merge_msg([data["msg"] for data in merge_list])
+        try:
+            result = self.post_webhook(merge_list[-1]["addr"], msg)  # 最后一条的加签时间最新
+        except Exception as error:
+            return self.send_fail(merge_list, error)
+        result = result if len(merge_list) == 1 else f'合并{len(merge_list)}条发送: {result}'
+        Notification.change_status([data["id"] for data in merge_list], 2, result)
+
+    def send_call_back(self, data):
+        """ 回调流水线、模拟数据源的异步回调，流水线回调最终成功、失败时更新回调记录，并发送通知 """
+        from apps.assist.model_factory import CallBack
+        from apps.config.model_factory import Config
+        from .template import call_back_webhook_msg
+        from .send_report import send_msg, send_system_error
+
+        call_back = CallBack.get_first(id=data["call_back_id"]) if data["call_back_id"] else None
+        try:
+            response = requests.request(**{"timeout": self.config["time_out"], **data["msg"]})
+            if response.status_code >= 500:  # 流水线服务异常，重试
+                raise ValueError(f'回调响应状态码: {response.status_code}，响应: {response.text[:1000]}')
+        except Exception as error:
+            if self.send_fail([data], error) and call_back:
+                call_back.fail()
+                send_system_error(title="回调报错通知", content=f'{error}')
+            return
+        Notification.change_status([data["id"]], 2, response.text)
+        logger.info(f'回调{data["addr"]}结束: \n{response.text}')
+        if call_back:  # 流水线回调，模拟数据源的异步回调没有回调记录，不发通知
+            call_back.success(response.text)
+            send_msg(Config.get_call_back_msg_addr(), call_back_webhook_msg(data["msg"].get("json", {})))
+
+    def send_fail(self, data_list, error):
+        """ 发送失败，没超过重试次数的退避后重试，返回是否已标记为发送失败 """
+        id_list, retry_count = [data["id"] for data in data_list], max(data["retry_count"] for data in data_list)
+        result = f'{error!r}'
+        if retry_count >= self.config["retry_times"]:
+            logger.error(f'通知发送失败，已重试 {retry_count} 次，不再重试，通知id: {id_list}，错误信息: {result}')
+            Notification.change_status(id_list, 3, result)
+            return True
+        backoff = min(self.config["retry_backoff"] * (2 ** retry_count), self.config["max_backoff"])
+        logger.warning(f'通知发送失败，{backoff} 秒后第 {retry_count + 1} 次重试，通知id: {id_list}，错误信息: {result}')
+        Notification.change_status(
+            id_list, 0, result, retry_count=retry_count + 1, next_run_time=datetime.now() + timedelta(seconds=backoff))
+        return False
+
+    def get_rate_limit_wait(self, addr_key):
+        """ webhook最近一分钟已发送 rate_limit_per_minute 条时，返回还要等待的秒数，否则记录本次发送并返回0 """
+        limit, now = self.config["rate_limit_per_minute"], time.time()
+        if not limit:
+            return 0
+        with self.lock:
+            send_time_list = self.send_time_dict.setdefault(addr_key, deque())
+            while send_time_list and send_time_list[0] <= now - 60:
+                send_time_list.popleft()
+            if len(send_time_list) >= limit:
+                return send_time_list[0] + 60 - now
+            send_time_list.append(now)
+            return 0
+
+    @staticmethod
+    def get_msg_text_key(msg):
+        """ 可合并的消息的正文字段，文本为 text.content，钉钉markdown为 markdown.text，企业微信markdown为 markdown.content """
+        msg_type = msg.get("msgtype")
+        if msg_type not in ("text", "markdown"):
+            return None
+        return "text" if "text" in msg.get(msg_type, {}) and msg_type == "markdown" else "content"
+
+    def get_merge_list(self, data_list):
+        """ 从第一条开始，取消息类型、@的人都相同，合并后不超过 max_coalesce_length 字节的消息 """
+        first_msg = data_list[0]["msg"]
+        text_key = self.get_msg_text_key(first_msg)
+        if text_key is None:
+            return data_list[:1]
+        msg_type, merge_list = first_msg["msgtype"], data_list[:1]
+        length = len(str(first_msg[msg_type].get(text_key, "")).encode("utf-8"))
+        for data in data_list[1:]:
+            msg = data["msg"]
+            if msg.get("msgtype") != msg_type or msg.get("at") != first_msg.get("at") or text_key not in msg[msg_type]:
+                break
+            length += len(str(msg[msg_type][text_key]).encode("utf-8"))
+            if length > self.config["max_coalesce_length"]:
+                break
+            merge_list.append(data)
+        return merge_list
+
+    def merge_msg(self, msg_list):
+        """ 多条消息的正文用分割线拼成一条 """
+        if len(msg_list) == 1:
+            return msg_list[0]
+        msg = copy.deepcopy(msg_list[0])
+        msg_type, text_key = msg["msgtype"], self.get_msg_text_key(msg)
+        separator = "\n\n--------\n\n" if msg_type == "text" else "\n\n---\n\n"
+        msg[msg_type][text_key] = separator.join(str(item[msg_type][text_key]) for item in msg_list)
+        if "title" in msg[msg_type]:
+            msg[msg_type]["title"] = f'{msg[msg_type]["title"]}等{len(msg_list)}条通知'
+        return msg
+
+    def post_webhook(self, addr, msg):
+        """ 发送到webhook，钉钉、企业微信的响应中 errcode 不为0时视为发送失败 """
+        response = requests.post(addr, json=msg, verify=False, timeout=self.config["time_out"])
+        response.raise_for_status()
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = None
+        if isinstance(response_data, dict) and response_data.get("errcode") not in (None, 0):
+            raise ValueError(f'webhook返回错误: {response.text[:1000]}')
+        return response.text[:1000]
+
+    def close(self):
+        """ 停止发送线程，等待正在发送的通知发送完，未发送的通知留在通知表，下次启动后继续发送 """
+        if self.worker_pid != os.getpid():
+            return
+        self.stop_event.set()
+        self.wake_event.set()
+        for worker in self.worker_list:
+            worker.join(self.config["time_out"])
+        self.worker_pid = None
+
+
+notification_sender = NotificationSender()
@@ -1,7 +1,213 @@
 # -*- coding: utf-8 -*-
+import os
 import json
-import pika
+import time
+import atexit
 import datetime
+import threading
+
+import pika
+from pika.exceptions import AMQPError
+
+from config import _rabbit_mq_publisher_config
+from utils.logs.log import logger
+
+
+class RabbitMqPublisher:
+    """ RabbitMQ 消息发送，每个 MQ 地址一个发送器，维护长连接池，发送消息时取一个空闲的连接，发完放回池中
+        1、每个连接一个通道，已声明过的队列不再重复声明
+        2、开启发布确认（confirm_delivery）时，每条消息等 MQ 确认收到才返回，MQ 拒收会报错重试
+        3、取空闲连接时先处理积压的心跳，空闲期间已被 MQ 断开的连接直接重新建立，不等待、不算重试
+        4、连接断开（MQ 重启、心跳超时）、发送失败时丢弃连接，等待 retry_backoff 秒（每次翻倍）后重新建立连接，从失败的消息继续发送，
+           MQ 已收到但确认丢失的消息重试时会重复发送
+    pika 的 BlockingConnection 不是线程安全的，一个连接同时只给一个线程使用，gunicorn 的 worker 是 fork 出来的，每个进程单独的连接池
+        connection_factory: 建立连接的方法，默认 pika.BlockingConnection
+    """
+
+    _publisher_dict = {}  # {MQ 地址: RabbitMqPublisher}
+    _publisher_pid = None
+    _publisher_lock = threading.Lock()
+
+    def __init__(self, info, connection_factory=None, **config):
+        config = {**_rabbit_mq_publisher_config, **config}
+        self.info = info
+        self.connection_factory = connection_factory or pika.BlockingConnection
+        self.pool_size, self.acquire_time_out = config["pool_size"], config["acquire_time_out"]
+        self.confirm_delivery, self.heartbeat = config["confirm_delivery"], config["heartbeat"]
+        self.retry_times, self.batch_size = config["retry_times"], config["batch_size"]
+        self.retry_backoff, self.max_backoff = config["retry_backoff"], config["max_backoff"]
+        self.idle_list = []  # 空闲的连接 [{"connection": 连接, "channel": 通道, "queue_set": 已声明的队列}]
+        self.link_count = 0  # 池中的连接数（空闲 + 使用中）
+        self.condition = threading.Condition()
+        self.is_closed = False
+        self.stat = {
+            "message": 0,  # 发送成功的消息数
+            "new_connection": 0,  # 新建的连接数
+            "stale_connection": 0,  # 空闲时已被 MQ 断开（如心跳超时）、取出时重新建立的连接数
+            "retry": 0,  # 重试次数
+            "fail": 0  # 重试后仍然失败的发送次数
+        }
+
+    @staticmethod
+    def get_publisher_key(info):
+        return info["host"], int(info["port"]), info["account"], info["password"]
+
+    @classmethod
+    def get_publisher(cls, info, **config):
+        """ 获取 MQ 地址对应的发送器，没有则创建，fork 出来的进程不使用父进程的连接 """
+        key = cls.get_publisher_key(info)
+        with cls._publisher_lock:
+            if cls._publisher_pid != os.getpid():
+                cls._publisher_dict, cls._publisher_pid = {}, os.getpid()
+                atexit.register(cls.close_all)
+            if key not in cls._publisher_dict:
+                cls._publisher_dict[key] = cls(info, **config)
+            return cls._publisher_dict[key]
+
+    @classmethod
+    def close_all(cls):
+        """ 关闭所有发送器的连接，返回发送统计 """
+        with cls._publisher_lock:
+            publisher_dict, cls._publisher_dict = cls._publisher_dict, {}
+        return {f'{key[0]}:{key[1]}': publisher.close() for key, publisher in publisher_dict.items()}
+
+    def new_link(self):
+        """ 建立连接和通道 """
+        credentials = pika.PlainCredentials(self.info["account"], self.info["password"])
+        connection = self.connection_factory(pika.ConnectionParameters(
+            host=self.info["host"], port=int(self.info["port"]), credentials=credentials, heartbeat=self.heartbeat))
+        try:
+            channel = connection.channel()
+            if self.confirm_delivery:
+                channel.confirm_delivery()
+        except Exception:
+            self.close_link({"connection": connection})
+            raise
+        with self.condition:
+            self.stat["new_connection"] += 1
+        return {"connection": connection, "channel": channel, "queue_set": set()}
+
+    @staticmethod
+    def close_link(link):
+        try:
+            if link["connection"].is_open:
+                link["connection"].close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def is_link_alive(link):
+        """ 空闲的连接是否可用
+        BlockingConnection 只在调用时处理心跳，空闲超过心跳超时时间的连接已被 MQ 断开，
+        process_data_events(0) 不等待，处理积压的心跳、关闭帧，连接已断开时报错或 is_open 变为 False
+        """
+        try:
+            if link["connection"].is_open and link["channel"].is_open:
+                link["connection"].process_data_events(0)
+            return link["connection"].is_open and link["channel"].is_open
+        except (AMQPError, OSError):
+            return False
+
+    def acquire(self):
+        """ 获取空闲的连接，没有空闲的且未达到池大小时占一个位置，返回None由调用方建立连接，池满了则等待
+        取到的空闲连接已断开时，关闭它并沿用它的位置，返回None由调用方立即重新建立连接，不算重试、不等待
+        """
+        end_at = time.time() + self.acquire_time_out
+        with self.condition:
+            while True:
+                if self.is_closed:
+                    raise RuntimeError("消息发送器已关闭")
+                if self.idle_list:
+                    link = self.idle_list.pop()
+                    break
+                if self.link_count < self.pool_size:
+                    self.link_count += 1
+                    return None
+                if not self.condition.wait(max(end_at - time.time(), 0)) and end_at <= time.time():
+                    raise TimeoutError(f'等待 MQ 连接超时，连接池大小: {self.pool_size}')
+        if self.is_link_alive(link):  # 在锁外检查，不阻塞其他线程取连接
+            return link
+        self.close_link(link)
+        with self.condition:
+            self.stat["stale_connection"] += 1
+        return None
+
+    def release(self, link, is_broken=False):
+        """ 放回池中，连接已断开的关闭后让出位置 """
+        if is_broken or self.is_closed:
+            if link:
+                self.close_link(link)
+            with self.condition:
+                self.link_count -= 1
+                self.condition.notify()
+            return
+        with self.condition:
+            self.idle_list.append(link)
+            self.condition.notify()
+
+    def publish_with_link(self, link, queue_name, message_list):
+        """ 用一个连接发送一批消息，返回发送成功的条数，中途失败时异常带上已成功的条数 """
+        channel, send_count = link["channel"], 0
+        try:
+            if queue_name not in link["queue_set"]:
+                channel.queue_declare(queue=queue_name)  # 声明消息队列，如不存在，则创建
+                link["queue_set"].add(queue_name)
+            for message in message_list:
+                # exchange为空字符串时使用默认的exchange，按 routing_key 投递到同名的队列
+                channel.basic_publish(exchange='', routing_key=queue_name, body=message)
+                send_count += 1
+        except (AMQPError, OSError) as error:
+            error.send_count = send_count
+            raise error
+        return send_count
+
+    def publish_batch(self, queue_name, message_list):
+        """ 批量发送消息，每 batch_size 条占用一次连接，失败时重新建立连接，从失败的消息继续发送，返回发送的条数 """
+        index, retry_count = 0, 0
+        while index < len(message_list):
+            batch = message_list[index:index + self.batch_size]
+            link, is_broken, backoff = self.acquire(), False, 0
+            try:  # 没有空闲的连接时新建
+                link = link or self.new_link()
+                index += self.publish_with_link(link, queue_name, batch)
+                retry_count = 0
+            except (AMQPError, OSError) as error:
+                is_broken = True
+                index += getattr(error, "send_count", 0)
+                if retry_count >= self.retry_times:
+                    with self.condition:
+                        self.stat["fail"] += 1
+                        self.stat["message"] += index
+                    logger.error(f'发送 MQ 消息失败，已发送 {index}/{len(message_list)} 条: {error!r}')
+                    raise error
+                backoff = min(self.retry_backoff * (2 ** retry_count), self.max_backoff)
+                retry_count += 1
+                with self.condition:
+                    self.stat["retry"] += 1
+                logger.warning(f'发送 MQ 消息失败，{backoff} 秒后第 {retry_count} 次重试: {error!r}')
+            finally:
+                self.release(link, is_broken)
+            if backoff:  # 先让出连接池的位置再等待
+                time.sleep(backoff)
+        with self.condition:
+            self.stat["message"] += len(message_list)
+        return len(message_list)
+
+    def publish(self, queue_name, message):
+        """ 发送一条消息 """
+        return self.publish_batch(queue_name, [message])
+
+    def close(self):
+        """ 关闭空闲的连接，使用中的连接放回时关闭，返回发送统计 """
+        with self.condition:
+            self.is_closed = True
+            idle_list, self.idle_list = self.idle_list, []
+            self.link_count -= len(idle_list)
+            self.condition.notify_all()
+            stat = dict(self.stat)
+        for link in idle_list:
+            self.close_link(link)
+        return stat
 
 
 def send_rocket_mq(info, message):
@@ -9,15 +215,13 @@ def send_rocket_mq(info, message):
 
 
 def send_rabbit_mq(info, message):  # 消息生产者
-    user_info = pika.PlainCredentials(info["account"], info["password"])
-    connection = pika.BlockingConnection(
-        pika.ConnectionParameters(host=info["host"], port=info["port"], credentials=user_info))
-    channel = connection.channel()
-    channel.queue_declare(queue=info["queue_name"])  # 声明消息队列，消息将在这个队列传递，如不存在，则创建
-    # 向队列插入数值 routing_key的队列名为tester，body 就是放入的消息内容，exchange指定消息在哪个队列传递，
-    # 这里是空的exchange但仍然能够发送消息到队列中，因为使用的是定义的空字符串"" exchange（默认的exchange）
-    channel.basic_publish(exchange='', routing_key=info["queue_name"], body=message)
-    connection.close()  # 关闭连接
+    """ 发送一条消息，复用 MQ 地址对应的长连接 """
+    RabbitMqPublisher.get_publisher(info).publish(info["queue_name"], message)
+
+
+def send_rabbit_mq_batch(info, message_list):
+    """ 批量发送消息，返回发送的条数 """
+    return RabbitMqPublisher.get_publisher(info).publish_batch(info["queue_name"], message_list)
 
 
 if __name__ == "__main__":
@@ -2,12 +2,11 @@
 from datetime import datetime
 from threading import Thread
 
-import requests
-
 from apps.config.model_factory import Config, WebHook
 from apps.assist.model_factory import CallBack
 from apps.enums import SendReportTypeEnum, ReceiveTypeEnum
 from .send_email import SendEmail
+from .notification import notification_sender
 from .template import run_time_error_msg, call_back_webhook_msg, render_html_report, \
     get_business_stage_count_msg, inspection_ding_ding, inspection_we_chat
 from ..logs.log import logger
@@ -15,12 +14,9 @@ from config import _default_web_hook_type, _default_web_hook, _web_hook_secret
 
 
 def send_msg(addr, msg):
-    """ 发送消息 """
+    """ 发送消息，写入通知队列，由发送线程合并、限流、失败重试 """
     logger.info(f'发送消息，文本：{msg}')
-    try:
-        logger.info(f'发送消息，结果：{requests.post(addr, json=msg, verify=False).json()}')
-    except Exception as error:
-        logger.info(f'向机器人发送测试报告失败，错误信息：\n{error}')
+    notification_sender.add("webhook", addr, msg)
 
 
 def send_server_status(server_name, app_title=None, action_type="启动"):
@@ -78,8 +74,11 @@ def send_report(**kwargs):
 
 
 def async_send_report(**kwargs):
-    """ 多线程发送测试报告 """
-    Thread(target=send_report, kwargs=kwargs).start()
+    """ 发送测试报告，即时通讯消息写入通知队列即返回，邮件用多线程发送 """
+    if kwargs.get("receive_type") == ReceiveTypeEnum.email:
+        Thread(target=send_report, kwargs=kwargs).start()
+    else:
+        send_report(**kwargs)
 
 
 def call_back_for_pipeline(task_id, call_back_info: list, extend: dict, status):
@@ -101,17 +100,9 @@ def call_back_for_pipeline(task_id, call_back_info: list, extend: dict, status):
             "data_json": call_back.get("json", {}),
         })
 
-        try:
-            call_back_res = requests.request(**call_back).text
-            call_back_obj.success(call_back_res)
-            logger.info(f'回调{call_back.get("url")}结束: \n{call_back_res}')
-            msg = call_back_webhook_msg(call_back.get("json", {}))
-            send_msg(Config.get_call_back_msg_addr(), msg)
-        except Exception as error:
-            logger.info(f'回调{call_back.get("url")}失败')
-            call_back_obj.fail()
-            send_system_error(title="回调报错通知", content=f'{error}')  # 发送通知
-    logger.info("回调执行结束")
+        # 写入通知队列，由发送线程回调，失败重试，最终结果更新到回调记录
+        notification_sender.add("call_back", call_back.get("url") or "", call_back, call_back_id=call_back_obj.id)
+    logger.info("回调已加入发送队列")
 
 
 def send_run_time_error_message(content):
@@ -121,10 +112,10 @@ def send_run_time_error_message(content):
 
 
 def async_send_run_time_error_message(**kwargs):
-    """ 多线程发送错误信息 """
+    """ 发送错误信息，写入通知队列即返回 """
     logger.info("开始发送错误信息")
-    Thread(target=send_run_time_error_message, kwargs=kwargs).start()
-    logger.info("错误信息发送完毕")
+    send_run_time_error_message(**kwargs)
+    logger.info("错误信息已加入发送队列")
 
 
 def send_run_func_error_message(content):
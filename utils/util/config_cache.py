@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import uuid
+import threading
+
+from config import _config_cache_config
+
+
+class ConfigCache:
+    """ 配置的进程内缓存
+    第一次取配置时一次性把所有配置加载到内存，之后直接读内存，不用每次都查数据库
+    修改配置时更新版本文件，所有进程（gunicorn的各个worker、定时任务进程）每隔 check_interval 秒检查一次版本文件，
+    版本有变化则重新加载，多个线程/协程同时加载时只有一个去查数据库
+        version_file: 版本文件的路径，同一台服务器上的进程共用
+        check_interval: 检查版本文件的间隔（秒）
+        time_out: 缓存的最长有效时间（秒），超过则重新加载
+    """
+
+    def __init__(self, version_file, check_interval=None, time_out=None):
+        self.version_file = version_file
+        self.check_interval = _config_cache_config["check_interval"] if check_interval is None else check_interval
+        self.time_out = time_out or _config_cache_config["time_out"]
+        self.value_dict = None  # {config_name: config_value}
+        self.version = None
+        self.loaded_at = self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def read_version(self):
+        try:
+            with open(self.version_file, "r", encoding="utf-8") as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    def change_version(self):
+        """ 配置有修改，更新版本文件，先写临时文件再替换，读的时候不会读到写了一半的内容 """
+        temp_file = f'{self.version_file}.{os.getpid()}.{threading.get_ident()}'
+        with open(temp_file, "w", encoding="utf-8") as file:
+            file.write(uuid.uuid4().hex)
+        os.replace(temp_file, self.version_file)
+        self.clear()
+
+    def clear(self):
+        """ 清除当前进程的缓存 """
+        with self.lock:
+            self.value_dict = None
+
+    def is_expired(self, now):
+        """ 缓存是否失效：没有加载过、超过有效时间、版本文件有变化 """
+        if self.value_dict is None or now - self.loaded_at > self.time_out:
+            return True
+        if now - self.checked_at >= self.check_interval:
+            self.checked_at = now
+            return self.read_version() != self.version
+        return False
+
+    def get_all(self, loader):
+        """ 获取所有配置，缓存失效则调用 loader 重新加载，loader 返回 {config_name: config_value} """
+        now = time.time()
+        with self.lock:
+            if self.is_expired(now):
+                version = self.read_version()  # 先取版本再加载，加载期间版本有变化的，下次检查时会再加载
+                self.value_dict = loader()
+                self.version, self.loaded_at, self.checked_at = version, now, now
+            return self.value_dict
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import json
+import base64
 import os
 import io
 import platform
@@ -151,15 +152,37 @@ class FileUtil:
         return report_folder_path
 
     @classmethod
-    def get_report_step_img(cls, report_id, report_step_id, img_type, report_type='ui'):
-        """ 获取步骤的截图 """
+    def get_report_step_img_path(cls, report_id, report_step_id, img_type, report_type='ui', suffix='png'):
+        """ 步骤截图的文件路径，png为二进制截图，txt为之前保存的base64截图 """
         folder_path = os.path.join(cls.get_report_img_path(report_type), str(report_id))
-        file_path = os.path.join(folder_path, f'{report_step_id}_{img_type}.txt')
+        return os.path.join(folder_path, f'{report_step_id}_{img_type}.{suffix}')
+
+    @classmethod
+    def get_report_step_img(cls, report_id, report_step_id, img_type, report_type='ui'):
+        """ 获取步骤的截图，返回base64 """
+        file_path = cls.get_report_step_img_path(report_id, report_step_id, img_type, report_type)
+        if os.path.exists(file_path):
+            with io.open(file_path, "rb") as file:
+                return base64.b64encode(file.read()).decode("utf-8")
+
+        file_path = cls.get_report_step_img_path(report_id, report_step_id, img_type, report_type, 'txt')
         if os.path.exists(file_path):
-            with io.open(os.path.join(folder_path, f'{report_step_id}_{img_type}.txt')) as file:
+            with io.open(file_path) as file:
                 data = file.read()
             return data
 
+    @classmethod
+    def get_report_step_img_file(cls, report_id, report_step_id, img_type, report_type='ui'):
+        """ 获取步骤的截图，二进制截图返回文件路径，之前保存的base64截图解码后返回二进制数据 """
+        file_path = cls.get_report_step_img_path(report_id, report_step_id, img_type, report_type)
+        if os.path.exists(file_path):
+            return file_path
+
+        file_path = cls.get_report_step_img_path(report_id, report_step_id, img_type, report_type, 'txt')
+        if os.path.exists(file_path):
+            with io.open(file_path) as file:
+                return io.BytesIO(base64.b64decode(file.read()))
+
 
 if __name__ == "__main__":
     pass
@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 import json
-from datetime import datetime
+from enum import Enum
+from decimal import Decimal
+from datetime import datetime, date
 
 from json import JSONEncoder
 
 from utils.parse.parse import encode_object
 
+try:
+    import orjson
+except ImportError:  # 没有安装 orjson 则使用标准库序列化
+    orjson = None
+
 
 class CustomJSONEncoder(JSONEncoder):
     """ 处理返回时间，直接使用 jsonify 会把时间处理成 GMT 时间"""
@@ -20,6 +27,26 @@ class CustomJSONEncoder(JSONEncoder):
 class JsonUtil:
     """ 处理json事件，主要是在dumps时处理编码问题 """
 
+    # 预先注册的非json类型的编码方式，按顺序匹配，都不匹配的由 encode_object 统一转为str
+    # 时间保持 str() 的格式（2023-01-01 12:00:00），和之前的返回一致
+    encoder_list = [
+        (datetime, str),
+        (date, str),
+        (Decimal, str),
+        (Enum, lambda obj: obj.value)
+    ]
+    # orjson 的时间、dataclass 交给 encoder_list 处理，保证两种序列化方式的结果一致
+    orjson_option = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) \
+        if orjson else None
+
+    @classmethod
+    def encode_default(cls, obj):
+        """ 非json类型的编码 """
+        for obj_type, encoder in cls.encoder_list:
+            if isinstance(obj, obj_type):
+                return encoder(obj)
+        return encode_object(obj)
+
     @classmethod
     def dump(cls, obj, fp, *args, **kwargs):
         """ json.dump """
@@ -32,7 +59,19 @@ class JsonUtil:
         """ json.dumps """
         kwargs.setdefault("ensure_ascii", False)
         # kwargs.setdefault("indent", 4)
-        return json.dumps(obj, default=encode_object, cls=CustomJSONEncoder, *args, **kwargs)
+        return json.dumps(obj, default=cls.encode_default, cls=CustomJSONEncoder, *args, **kwargs)
+
+    @classmethod
+    def dumps_bytes(cls, obj):
+        """ 序列化为utf-8的bytes，用于响应，有 orjson 则用 orjson
+        orjson 不支持的数据（超过64位的整数、元组作为key等）使用标准库序列化
+        """
+        if orjson:
+            try:
+                return orjson.dumps(obj, default=cls.encode_default, option=cls.orjson_option)
+            except TypeError:
+                pass
+        return cls.dumps(obj).encode("utf-8")
 
     @classmethod
     def loads(cls, obj, *args, **kwargs):
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import sys
+import types
+import hashlib
+import linecache
+import threading
+
+
+class ScriptUtil:
+    """ 自定义脚本的模块缓存
+    脚本直接从数据库中的内容编译成模块，不再写入 script_list 目录再导入，
+    编译后的模块按 脚本id + 运行环境 缓存，脚本内容（hash）变了才重新编译，并发的运行共用同一份编译结果
+    """
+
+    _module_dict = {}  # {(script_id, env_code): {"content_hash": "xxx", "module": module}}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def build_script_source(content, env="debug"):
+        """ 脚本源码，默认在第一行加上运行环境，和之前写入到文件的内容一致
+        示例：
+            # coding:utf-8
+
+            env = "test"
+
+            脚本内容
+        """
+        return "# coding:utf-8\n\n" + f'env = "{env}"\n\n' + (content or '')
+
+    @staticmethod
+    def get_content_hash(source):
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def compile_module(cls, module_name, source):
+        """ 把源码编译成模块
+        执行时把模块放到 sys.modules 中，脚本里面可能会用 sys.modules[__name__] 取当前模块，
+        文件名注册到 linecache，报错时的堆栈能显示脚本代码
+        """
+        module = types.ModuleType(module_name)
+        module.__file__ = f'<script_list/{module_name.split(".")[-1]}.py>'
+        code = compile(source, module.__file__, "exec")
+        linecache.cache[module.__file__] = (len(source), None, source.splitlines(True), module.__file__)
+
+        previous_module = sys.modules.get(module_name)
+        sys.modules[module_name] = module
+        try:
+            exec(code, module.__dict__)
+        except Exception:
+            if previous_module is None:
+                sys.modules.pop(module_name, None)
+            else:
+                sys.modules[module_name] = previous_module
+            raise
+        return module
+
+    @classmethod
+    def get_module(cls, script_id, script_name, script_data, env_code):
+        """ 获取脚本编译后的模块，脚本内容没变则直接用缓存 """
+        source = cls.build_script_source(script_data, env_code)
+        content_hash, key = cls.get_content_hash(source), (script_id, env_code)
+
+        cache = cls._module_dict.get(key)
+        if cache and cache["content_hash"] == content_hash:
+            return cache["module"]
+
+        # 编译放在锁外面，脚本导入时可能比较耗时（如连接数据库），不阻塞其他脚本
+        module = cls.compile_module(f'script_list.{env_code}_{script_name}', source)
+        with cls._lock:
+            cls._module_dict[key] = {"content_hash": content_hash, "module": module}
+        return module
+
+    @staticmethod
+    def get_module_functions(module):
+        """ 模块中的函数 {"func1_name": func1, "func2_name": func2} """
+        return {name: item for name, item in vars(module).items() if isinstance(item, types.FunctionType)}
+
+    @classmethod
+    def get_script_functions(cls, script_id, script_name, script_data, env_code):
+        """ 获取脚本中的函数 """
+        return cls.get_module_functions(cls.get_module(script_id, script_name, script_data, env_code))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import jwt
+
+from config import _token_cache_config
+
+
+class TokenCache:
+    """ 已校验通过的token的进程内缓存，同一个token只做一次签名校验和解码
+    以token的摘要为key，不在内存中保存原始token，按最近使用淘汰，命中缓存时仍按token的过期时间判断是否有效
+    只缓存校验通过的token，非法的token每次都校验，避免被随意构造的token挤掉正常的缓存
+        max_size: 最多缓存的token数
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or _token_cache_config["max_size"]
+        self.token_dict = OrderedDict()  # {token摘要: {"data": 解析后的数据, "api_permission_set": 接口权限集合}}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_digest(cls, token: str):
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    @classmethod
+    def is_expired(cls, data, now):
+        return "exp" in data and data["exp"] <= now
+
+    def get(self, digest, now):
+        """ 从缓存中取，过期的直接移除 """
+        with self.lock:
+            token_info = self.token_dict.get(digest)
+            if token_info is None:
+                return None
+            if self.is_expired(token_info["data"], now):
+                self.token_dict.pop(digest, None)
+                return None
+            self.token_dict.move_to_end(digest)
+            return token_info
+
+    def set(self, digest, token_info):
+        with self.lock:
+            self.token_dict[digest] = token_info
+            self.token_dict.move_to_end(digest)
+            while len(self.token_dict) > self.max_size:
+                self.token_dict.popitem(last=False)
+
+    def decode(self, token: str, secret_key: str):
+        """ 校验并解析token，校验不通过返回None
+        返回 {"data": 解析后的数据, "api_permission_set": 接口权限集合}，调用方不要修改返回的数据
+        """
+        if not token:
+            return None
+        digest, now = self.get_digest(f'{secret_key}:{token}'), time.time()
+        token_info = self.get(digest, now)
+        if token_info is None:
+            try:
+                data = jwt.decode(token, secret_key, algorithms=["HS256"])
+            except Exception:
+                return None
+            token_info = {"data": data, "api_permission_set": frozenset(data.get("api_permissions") or [])}
+            self.set(digest, token_info)
+        return token_info
+
+    def clear(self):
+        with self.lock:
+            self.token_dict.clear()
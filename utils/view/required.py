@@ -1,20 +1,45 @@
 # -*- coding: utf-8 -*-
-import jwt
 from flask import current_app as app, request, g, abort
 
 from apps.enums import AuthType
+from utils.util.token_cache import TokenCache
+
+token_cache = TokenCache()
 
 
 def parse_access_token(access_token):
-    """ 校验token是否过期，或者是否合法 """
-    try:
-        data = jwt.decode(access_token, app.config["SECRET_KEY"], algorithms=["HS256"])
+    """ 校验token是否过期，或者是否合法，合法则返回 {"data": 解析后的数据, "api_permission_set": 接口权限集合} """
+    token_info = token_cache.decode(access_token, app.config["SECRET_KEY"])
+    if token_info:
         # 把用户数据存到g对象，方便后面使用
+        data = token_info["data"]
         g.user_id, g.user_name = data["id"], data["name"]
         g.api_permissions, g.business_list = data["api_permissions"], data["business_list"]
-        return True
-    except:
-        return False
+    return token_info
+
+
+def compile_route_table(app, url_required_map):
+    """ 把 请求方法+路径 的身份验证类型编译为 {(endpoint, 请求方法): 身份验证类型}
+    请求进来时flask已经匹配好了路由，直接用 request.endpoint 取，不用再拼接、切割路径
+    """
+    route_table = {}
+    for rule in app.url_map.iter_rules():
+        if "<" in rule.rule:  # 带参数的路由，实际路径不固定，请求时按路径取
+            continue
+        request_path = rule.rule.split('/', 3)[-1]  # /api/apiTest/project/detail  =>  project/detail
+        for method in rule.methods:
+            route_table[(rule.endpoint, method)] = url_required_map.get(f'{method}_/{request_path}')
+    return route_table
+
+
+def get_auth_type():
+    """ 获取当前请求的身份验证类型 """
+    route_key = (request.endpoint, request.method)
+    if route_key in app.route_table:
+        return app.route_table[route_key]
+    # 没有匹配到路由（404等）、带参数的路由，按请求路径取
+    request_path = request.path.split('/', 3)[-1]
+    return app.url_required_map.get(f'{request.method}_/{request_path}')
 
 
 def check_login_and_permissions():
@@ -22,19 +47,18 @@ def check_login_and_permissions():
     from apps.system.models.user import User
 
     # 根据请求路径判断是否需要身份验证 GET_/project/list
-    request_path = request.path.split('/', 3)[-1]  # /api/apiTest/project/detail  =>  project/detail
-    auth_type = app.url_required_map.get(f'{request.method}_/{request_path}')
+    auth_type = get_auth_type()
 
     if auth_type != AuthType.not_auth:
 
-        parse_access_token(request.headers.get("access-token"))
+        token_info = parse_access_token(request.headers.get("access-token"))
 
         if auth_type == AuthType.login:
             if not g.user_id:
                 abort(401)
 
         elif auth_type == AuthType.permission:
-            if User.is_not_admin() and request.path not in g.api_permissions:
+            if User.is_not_admin() and (token_info is None or request.path not in token_info["api_permission_set"]):
                 abort(403)
 
         elif auth_type == AuthType.admin:
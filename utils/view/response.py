@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import uuid
+
+from flask import Response
+
+from config import _response_config
+from ..util.json_util import JsonUtil
+
+
+class JsonResponse(Response):
+    """ 接口统一的json响应
+    保留序列化前的数据（payload），打日志时直接用，不用再解析响应体
+    响应数据中的列表（data 或分页的 data.data）超过 stream_min_items 条时，分块流式返回，不在内存中拼接完整的响应体
+    """
+    default_mimetype = "application/json"
+
+    def __init__(self, payload: dict, **kwargs):
+        self.payload = payload
+        self.stream_key_list = self.get_stream_key_list(payload)
+        if self.stream_key_list:
+            body = self.iter_stream_body(_response_config["stream_chunk_items"])
+        else:
+            body = JsonUtil.dumps_bytes(payload)
+        super().__init__(body, **kwargs)
+
+    @classmethod
+    def get_stream_key_list(cls, payload):
+        """ 需要流式返回的列表在 payload 中的路径，不需要流式返回则为None """
+        data = payload.get("data")
+        for key_list, value in [(["data"], data), (["data", "data"], data.get("data") if isinstance(data, dict) else None)]:
+            if isinstance(value, list) and len(value) >= _response_config["stream_min_items"]:
+                return key_list
+
+    def get_stream_list(self):
+        value = self.payload
+        for key in self.stream_key_list:
+            value = value[key]
+        return value
+
+    def build_shell(self, replace_value):
+        """ 把要流式返回的列表替换为 replace_value，沿路径浅拷贝，不修改原数据 """
+        shell = dict(self.payload)
+        container = shell
+        for key in self.stream_key_list[:-1]:
+            container[key] = dict(container[key])
+            container = container[key]
+        container[self.stream_key_list[-1]] = replace_value
+        return shell
+
+    def iter_stream_body(self, chunk_size):
+        """ 先序列化列表以外的部分，再把列表按 chunk_size 条一块序列化返回 """
+        placeholder = f'__stream_{uuid.uuid4().hex}__'
+        prefix, suffix = JsonUtil.dumps_bytes(self.build_shell(placeholder)).split(f'"{placeholder}"'.encode(), 1)
+        data_list = self.get_stream_list()
+
+        yield prefix + b"["
+        for index in range(0, len(data_list), chunk_size):
+            chunk = JsonUtil.dumps_bytes(data_list[index:index + chunk_size])[1:-1]  # 去掉列表的中括号
+            yield chunk if index == 0 else b"," + chunk
+        yield b"]" + suffix
+
+    def get_log_body(self):
+        """ 日志中打印的响应体，流式返回的列表不打印，只打印条数 """
+        if self.stream_key_list:
+            return JsonUtil.dumps(self.build_shell(f'[共{len(self.get_stream_list())}条数据，流式返回，不打印]'))
+        return self.get_data(as_text=True)
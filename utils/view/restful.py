@@ -1,11 +1,10 @@
 # -*- coding: utf-8 -*-
-import json
-from ..util.json_util import JsonUtil
+from .response import JsonResponse
 
 
 def restful_result(code, message, data, **kwargs):
-    """ 统一返 result风格 """
-    return JsonUtil.dumps({"status": code, "message": message, "data": data, **kwargs}, ensure_ascii=False)
+    """ 统一返 result风格，响应对象上保留原始数据，打日志时不用再解析 """
+    return JsonResponse({"status": code, "message": message, "data": data, **kwargs})
 
 
 def success(msg=None, data=None, **kwargs):